@@ -0,0 +1,36 @@
+"""
+_common.py
+
+Shared helpers for the benchmark scripts in this directory.
+
+Scripts are run directly (``python benchmarks/bench_collation.py``) and
+import the application modules from ``src/``.
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import time
+from collections.abc import Callable
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC = os.path.join(ROOT, "src")
+if SRC not in sys.path:
+    sys.path.insert(0, SRC)
+
+
+def measure(fn: Callable[[], object], repeat: int = 5, number: int = 1) -> float:
+    """Return the best wall time (seconds) of *number* calls, over *repeat* runs."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
+
+
+def report(label: str, seconds: float) -> None:
+    """Print one benchmark line in milliseconds."""
+    print(f"{label:<48} {seconds * 1000:>10.3f} ms")
@@ -0,0 +1,78 @@
+"""
+bench_aggregates.py
+
+KPI card and chart inputs summed from the ``ShelterCube`` cells vs. the
+row-level ``len``/``sum``/``value_counts``/``groupby`` calls they replaced.
+
+The row-level versions below are the reference: the script first checks
+that both agree for random sidebar combinations, then times them.
+
+    python benchmarks/bench_aggregates.py [scale]
+"""
+
+from __future__ import annotations
+
+import sys
+
+import _common
+import fixtures
+import numpy as np
+import pandas as pd
+from bench_search import _combinations, _ref_search
+
+import aggregates
+from aggregates import ShelterCube
+
+
+def _ref_stats(df: pd.DataFrame, combo: tuple) -> tuple:
+    filtered = _ref_search(df, *combo)
+    count = len(filtered)
+    capacity = int(filtered["Місткість"].sum())
+    pct = (
+        filtered["Інклюзивність"].value_counts(normalize=True).get("Так", 0) * 100
+        if count
+        else 0.0
+    )
+    by_type = filtered.groupby("Тип", observed=True)["Місткість"].sum()
+    by_city = df[df["ОТГ"] == combo[1]].groupby("Населений пункт", observed=True)["Місткість"].sum()
+    return count, capacity, pct, by_type, by_city
+
+
+def _cube_stats(cube: ShelterCube, combo: tuple) -> tuple:
+    cells = cube.cells(*combo)
+    count, capacity, pct = aggregates.summary(cells)
+    by_type = aggregates.capacity_by(cells, "Тип")
+    by_city = aggregates.capacity_by(cube.cells(otg_name=combo[1]), "Населений пункт")
+    return count, capacity, pct, by_type, by_city
+
+
+def check_equivalence(df: pd.DataFrame, cube: ShelterCube, combos: list[tuple]) -> None:
+    for combo in combos:
+        expected = _ref_stats(df, combo)
+        actual = _cube_stats(cube, combo)
+        assert expected[:2] == actual[:2], combo
+        assert np.isclose(expected[2], actual[2]), combo
+        for exp, act in zip(expected[3:], actual[3:]):
+            exp.index = exp.index.astype(object)
+            pd.testing.assert_series_equal(exp, act, check_dtype=False, check_names=False)
+    print(f"equivalence: {len(combos)} filter combinations OK")
+
+
+def main(scale: int = 1) -> None:
+    df = fixtures.display_frame(fixtures.REGISTRY_SIZE * scale)
+    combos = [c for c in _combinations(df, 100) if c[1] != " "]
+    cube = ShelterCube(df)
+    check_equivalence(df, cube, combos)
+
+    seconds = _common.measure(lambda: ShelterCube(df), repeat=3)
+    _common.report(f"build cube ({len(df)} rows, {cube.n_cells} cells)", seconds)
+
+    n = len(combos)
+    cube_time = _common.measure(lambda: [_cube_stats(cube, c) for c in combos], repeat=3)
+    ref_time = _common.measure(lambda: [_ref_stats(df, c) for c in combos], repeat=3)
+    _common.report("cube: KPIs + pie + bar inputs", cube_time / n)
+    _common.report("rows: KPIs + pie + bar inputs", ref_time / n)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1)
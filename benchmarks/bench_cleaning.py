@@ -0,0 +1,130 @@
+"""
+bench_cleaning.py
+
+Compiled single-pass normalisers vs. the chained ``Series.str.replace``
+implementation of the ``_clean_*`` functions they replaced.
+
+The chained versions below are kept as the timing reference; the
+output of the normalisers is checked against the functions they
+replaced in ``tests/test_normalizer.py``.
+
+    python benchmarks/bench_cleaning.py [scale]
+"""
+
+from __future__ import annotations
+
+import sys
+
+import _common
+import fixtures
+import pandas as pd
+
+import config_regex as rx
+import corrections
+import data_processing as dp
+
+# ---------------------------------------------------------------------------
+# Timing reference: chained Series implementation
+# ---------------------------------------------------------------------------
+
+
+def _ref_str_base(s: pd.Series) -> pd.Series:
+    s = s.str.translate(dp._HOMOGLYPH_TABLE)
+    s = s.str.replace("`", "'", regex=False).str.replace("’", "'", regex=False)
+    s = s.str.replace(rx._RE_DASH_SPACES, "-", regex=True)
+    return s.str.strip()
+
+
+def _ref_str_strict(s: pd.Series) -> pd.Series:
+    raw = s.astype(str)
+    s = _ref_str_base(raw)
+    s = s.str.replace(rx._RE_NEWLINE_TAB, "", regex=True)
+    s = s.str.replace(rx._RE_TRAILING_LETTER, "", regex=True)
+    s = s.str.replace(rx._RE_DIGITS_QUOTES, "", regex=True)
+    s = s.str.replace(rx._RE_EDGE_DOT, "", regex=True)
+    # Missing values keep their plain "None"/"nan" form
+    return s.str.strip().mask(raw.isin(["None", "nan"]), raw)
+
+
+def _ref_otg(s: pd.Series) -> pd.Series:
+    s = _ref_str_strict(s)
+    s = s.str.replace(rx._RE_OTG_SUFFIX, "", regex=True)
+    return s.map(corrections.rules.table("otg").resolve).str.strip()
+
+
+def _ref_city(s: pd.Series) -> pd.Series:
+    s = _ref_str_strict(s)
+    s = s.str.replace(rx._RE_CITY_STREET_SFX, "", regex=True)
+    s = s.str.replace(rx._RE_CITY_PREFIX, "", regex=True)
+    s = s.str.replace(rx._RE_EDGE_DOT_SPACE, "", regex=True)
+    s = s.map(corrections.rules.table("city_abbreviations").resolve)
+    return s.map(corrections.rules.table("city_typos").resolve).str.strip()
+
+
+def _ref_name(s: pd.Series) -> pd.Series:
+    s = _ref_str_base(s)
+    s = s.str.replace(rx._RE_WHITESPACE, " ", regex=True)
+    s = s.str.replace(rx._RE_NAME_EDGE, "", regex=True)
+    s = s.str.replace(rx._RE_EXTRA_QUOTES, '"', regex=True)
+    s = s.str[:1].str.upper() + s.str[1:]
+    return s.str.strip()
+
+
+def _ref_adress(s: pd.Series) -> pd.Series:
+    s = s.str.replace(rx._RE_ADDR_NEWLINE, " ", regex=True)
+    s = s.str.replace(rx._RE_WHITESPACE, " ", regex=True)
+    s = s.str.replace(rx._RE_ADDR_EDGE_DOT, "", regex=True)
+    s = s.str.replace(rx._RE_EXTRA_QUOTES, '"', regex=True)
+    s = s.str.replace(rx._RE_ADDR_NUMBER_ONLY, "Відсутня", regex=True)
+    s = s.str.replace(rx._RE_ADDR_CITY_PREFIX, r"\1", regex=True)
+    s = s.str.replace(rx._RE_ADDR_SPLIT_LN, r"\1, \2", regex=True)
+    s = s.str.replace(rx._RE_ADDR_SPLIT_NL, r"\1 \2", regex=True)
+    s = s.map(corrections.rules.table("address").resolve, na_action="ignore")
+    s = s.str.replace(rx._RE_ADDR_VUL, "вул. ", regex=True)
+    s = s.str.replace(rx._RE_ADDR_PL, "пл. ", regex=True)
+    s = s.str.replace(rx._RE_ADDR_PR, "пр. ", regex=True)
+    s = s.str.replace(rx._RE_ADDR_BUD, "буд. ", regex=True)
+    s = s.str.replace(rx._RE_ADDR_BUDYNOK, "буд.", regex=True)
+    s = s.str.replace(rx._RE_ADDR_DUP_VUL, "вул. ", regex=True)
+    return s.str.strip()
+
+
+CASES = [
+    ("properties.OTG", _ref_otg, dp._clean_otg),
+    ("properties.City", _ref_city, dp._clean_city),
+    ("properties.Name", _ref_name, dp._clean_name),
+    ("properties.Adress", _ref_adress, dp._clean_adress),
+    ("properties.Type", _ref_str_strict, dp._clean_str_strict),
+    ("properties.Rajon", _ref_str_strict, dp._clean_str_strict),
+]
+
+
+def main(scale: int = 1) -> None:
+    raw = pd.json_normalize(
+        fixtures.synthetic_geojson(fixtures.REGISTRY_SIZE * scale),
+        record_path=["features"],
+    )
+    for column, reference, compiled in CASES:
+        s = raw[column]
+        _common.report(
+            f"{column} chained",
+            _common.measure(lambda reference=reference, s=s: reference(s)),
+        )
+        _common.report(
+            f"{column} compiled",
+            _common.measure(lambda compiled=compiled, s=s: compiled(s)),
+        )
+
+    def chained_all() -> None:
+        for column, reference, _ in CASES:
+            reference(raw[column])
+
+    _common.report("all text columns, chained", _common.measure(chained_all))
+    _common.report(
+        "_clean_data_info (compiled)",
+        _common.measure(lambda: dp._clean_data_info(raw)),
+    )
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1)
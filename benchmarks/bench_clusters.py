@@ -0,0 +1,90 @@
+"""
+bench_clusters.py
+
+Server-side map clustering (``cluster_pyramid.ClusterPyramid``): build
+time, the per-viewport answer of the ``"clustered"`` map mode
+(``map_layers.pyramid_view``) for all and for filtered shelters, and
+what it sends compared with the ``"fast"`` mode, which ships every
+shelter up front.
+
+Every level is first checked against a pandas ``groupby`` over the same
+Web Mercator cells.
+
+    python benchmarks/bench_clusters.py [scale]
+"""
+
+from __future__ import annotations
+
+import json
+import sys
+
+import _common
+import fixtures
+import numpy as np
+import pandas as pd
+
+import map_layers
+from cluster_pyramid import TILE_SIZE, ClusterPyramid, mercator
+
+
+def _check(df: pd.DataFrame, pyramid: ClusterPyramid, positions: np.ndarray) -> None:
+    rows = df.iloc[positions].dropna(subset=["latitude", "longitude"])
+    x, y = mercator(rows["latitude"].to_numpy(float), rows["longitude"].to_numpy(float))
+    for zoom in range(pyramid.min_zoom, pyramid.max_zoom + 1):
+        cells = (TILE_SIZE << zoom) // 64
+        groups = rows.groupby(
+            [np.floor(y * cells).astype(int), np.floor(x * cells).astype(int)]
+        )
+        counts = groups.size()
+        _lat, _lon, count, capacity, single = pyramid.clusters(zoom, positions)
+        assert sorted(count) == sorted(counts[counts > 1].tolist()), zoom
+        assert len(single) == (counts == 1).sum(), zoom
+        expected = groups["Місткість"].sum()[counts > 1]
+        assert sorted(np.round(capacity)) == sorted(np.round(expected)), zoom
+
+
+def _kib(value: object) -> float:
+    return len(json.dumps(value, separators=(",", ":")).encode("utf-8")) / 1024
+
+
+def _viewport(df: pd.DataFrame, zoom: int) -> tuple[float, float, float, float]:
+    """Padded viewport of a 1000 x 600 px map at *zoom* over the largest settlement."""
+    largest = df[df["Населений пункт"] == df["Населений пункт"].mode().iloc[0]]
+    lat, lon = largest["latitude"].median(), largest["longitude"].median()
+    half_lon = 1000 / (TILE_SIZE << zoom) * 360
+    half_lat = half_lon * 0.6 * np.cos(np.radians(lat))
+    return lat - half_lat, lon - half_lon, lat + half_lat, lon + half_lon
+
+
+def main(scale: int = 1) -> None:
+    df = fixtures.display_frame(fixtures.REGISTRY_SIZE * scale)
+    pyramid = map_layers.cluster_pyramid(df)
+    filtered = np.flatnonzero((df["Тип"] == df["Тип"].iloc[0]).to_numpy())
+    _check(df, pyramid, np.arange(len(df)))
+    _check(df, pyramid, filtered)
+    print("levels match a pandas groupby")
+
+    _common.report(
+        f"build pyramid ({len(df)} shelters)",
+        _common.measure(lambda: map_layers.cluster_pyramid(df), repeat=3),
+    )
+    fast = _kib(map_layers.shelter_payload(df))
+    print(f'"fast" mode ships {fast:,.0f} KiB of shelters with the map')
+    for zoom in (pyramid.min_zoom, 11, pyramid.max_zoom, pyramid.max_zoom + 2):
+        bounds = None if zoom == pyramid.min_zoom else _viewport(df, zoom)
+        for label, positions in (("all", None), ("filtered", filtered)):
+            view = map_layers.pyramid_view(df, pyramid, zoom, bounds, positions)
+            _common.report(
+                f"zoom {zoom:>2}, {label}: view",
+                _common.measure(
+                    lambda z=zoom, b=bounds, p=positions: map_layers.pyramid_view(
+                        df, pyramid, z, b, p
+                    )
+                ),
+            )
+            markers = len(view["clusters"]["count"]) + len(view["shelters"]["id"])
+            print(f"zoom {zoom:>2}, {label}: {markers:,} markers, {_kib(view):.1f} KiB")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1)
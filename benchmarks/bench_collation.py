@@ -0,0 +1,68 @@
+"""
+bench_collation.py
+
+Ukrainian collation key vs. the previous ``cmp_to_key`` comparator.
+
+    python benchmarks/bench_collation.py
+"""
+
+from __future__ import annotations
+
+import random
+from functools import cmp_to_key
+
+import _common
+import pandas as pd
+
+from collation import _UKR_ALPHABET, ukr_categorical, ukr_sort_keys, ukr_sorted
+
+_UKR_SORT_MAP: dict[str, int] = {c: i for i, c in enumerate(_UKR_ALPHABET)}
+
+
+def _legacy_sort_key(text: str) -> list[int]:
+    return [_UKR_SORT_MAP.get(c.upper(), 999) for c in text]
+
+
+def _legacy_cmp(a: str, b: str) -> int:
+    ka, kb = _legacy_sort_key(a), _legacy_sort_key(b)
+    return (ka > kb) - (ka < kb)
+
+
+_LEGACY_KEY = cmp_to_key(_legacy_cmp)
+
+
+def _random_names(n: int, seed: int = 0) -> list[str]:
+    rng = random.Random(seed)
+    letters = _UKR_ALPHABET + _UKR_ALPHABET.lower() + " -'"
+    return [
+        rng.choice(_UKR_ALPHABET) + "".join(rng.choices(letters, k=rng.randint(4, 14)))
+        for _ in range(n)
+    ]
+
+
+def main() -> None:
+    for n in (60, 400, 5_000):
+        names = _random_names(n)
+        series = pd.Series(names * 3)
+        _common.report(
+            f"cmp_to_key comparator, {n} values",
+            _common.measure(lambda names=names: sorted(names, key=_LEGACY_KEY)),
+        )
+        _common.report(
+            f"ukr_sorted, {n} values",
+            _common.measure(lambda names=names: ukr_sorted(names)),
+        )
+        _common.report(
+            f"Series.sort_values(key=ukr_sort_keys), {n * 3} rows",
+            _common.measure(
+                lambda series=series: series.sort_values(key=ukr_sort_keys)
+            ),
+        )
+        _common.report(
+            f"ukr_categorical, {n * 3} rows",
+            _common.measure(lambda series=series: ukr_categorical(series)),
+        )
+
+
+if __name__ == "__main__":
+    main()
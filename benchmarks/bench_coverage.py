@@ -0,0 +1,80 @@
+"""
+bench_coverage.py
+
+Reachable-capacity coverage (``coverage.CoverageGrid``) for a new filter
+set: the row-wise summed-area disk sum vs. a direct 2-D convolution with
+the disk kernel, the per-OTG rollup, and a memoised repeat.
+
+The disk sum is first checked against the direct convolution on a
+random grid.
+
+    python benchmarks/bench_coverage.py [scale]
+"""
+
+from __future__ import annotations
+
+import sys
+
+import _common
+import fixtures
+import numpy as np
+
+import config
+from coverage import CoverageGrid, disk_sum
+
+
+def _convolve(raster: np.ndarray, radius_cells: float) -> np.ndarray:
+    """Disk sum as one shifted add per kernel cell."""
+    rows, cols = raster.shape
+    reach = int(radius_cells)
+    padded = np.pad(raster, reach)
+    out = np.zeros(raster.shape)
+    for dy in range(-reach, reach + 1):
+        for dx in range(-reach, reach + 1):
+            if dy * dy + dx * dx <= radius_cells**2:
+                out += padded[reach + dy : reach + dy + rows, reach + dx : reach + dx + cols]
+    return out
+
+
+def main(scale: int = 1) -> None:
+    rng = np.random.default_rng(0)
+    sample = rng.random((120, 160))
+    for radius in (0.5, 2, 4.5, 8):
+        np.testing.assert_allclose(disk_sum(sample, radius), _convolve(sample, radius))
+    print("disk sum matches the direct convolution")
+
+    df = fixtures.display_frame(fixtures.REGISTRY_SIZE * scale)
+
+    def build() -> CoverageGrid:
+        return CoverageGrid(df, config.MAP_BOUNDS, config.COVERAGE_CELL_M)
+
+    grid = build()
+    print(f"grid {grid.rows} x {grid.cols} cells of {config.COVERAGE_CELL_M} m")
+    _common.report(f"build ({len(df)} shelters)", _common.measure(build))
+
+    positions = np.flatnonzero((df["Тип"] == df["Тип"].iloc[0]).to_numpy())
+    raster = grid.capacity_raster(positions)
+    for radius_m in config.COVERAGE_RADII_M:
+        radius_cells = radius_m / config.COVERAGE_CELL_M
+        _common.report(
+            f"{radius_m} m: summed-area disk sum",
+            _common.measure(lambda r=radius_cells: disk_sum(raster, r), repeat=3),
+        )
+        _common.report(
+            f"{radius_m} m: direct convolution",
+            _common.measure(lambda r=radius_cells: _convolve(raster, r), repeat=1),
+        )
+        # A fresh grid per run, so nothing is memoised
+        _common.report(
+            f"{radius_m} m: new filter set, grid + OTG rollup",
+            _common.measure(lambda r=radius_m: build().rollup(r, positions), repeat=3),
+        )
+        grid.rollup(radius_m, positions)
+        _common.report(
+            f"{radius_m} m: repeated filter set (memoised)",
+            _common.measure(lambda r=radius_m: grid.rollup(r, positions)),
+        )
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1)
@@ -0,0 +1,124 @@
+"""
+bench_delta.py
+
+Incremental re-cleaning of a new snapshot (only added and changed
+features go through ``_clean_data_info``, see ``feature_delta``) vs.
+cleaning the whole payload again.
+
+A temporary snapshot store is seeded with the synthetic registry and
+cleaned once; a second snapshot then adds, removes and changes a handful
+of shelters. The script asserts that the incremental result equals a
+full clean and that the diff reports exactly those shelters, then times
+both paths and the rebuild of the derived index and cube.
+
+    python benchmarks/bench_delta.py [scale] [changes]
+"""
+
+from __future__ import annotations
+
+import copy
+import json
+import random
+import sys
+import tempfile
+import time
+
+import _common
+import fixtures
+import pandas as pd
+
+import config
+import data_processing as dp
+from aggregates import ShelterCube
+from shelter_index import ShelterIndex
+from snapshot_store import Snapshot, SnapshotStore, content_hash
+
+_URL = config.URL_CARP_GOV_UA + "dataset/bench/resource/bench.geojson"
+
+
+def _identity(feature: dict) -> tuple:
+    props = feature["properties"]
+    return props["OTG"], props["City"], props["Name"], props["Adress"]
+
+
+def _publish(features: list[dict], changes: int, seed: int = 1) -> tuple[list[dict], dict]:
+    """Return the next publication of *features* and the expected diff counts."""
+    rng = random.Random(seed)
+    counts: dict[tuple, int] = {}
+    for feature in features:
+        counts[_identity(feature)] = counts.get(_identity(feature), 0) + 1
+    unique = [i for i, f in enumerate(features) if counts[_identity(f)] == 1]
+
+    removed = set(rng.sample(unique, changes))
+    changed = rng.sample([i for i in range(len(features)) if i not in removed], changes)
+    updated = [copy.deepcopy(f) for i, f in enumerate(features) if i not in removed]
+    for i in changed:
+        target = updated[i - sum(r < i for r in removed)]
+        target["properties"]["People"] = str(rng.randint(3_001, 4_000))
+
+    added = fixtures.synthetic_features(changes, seed=seed + 100)
+    for i, feature in enumerate(added):
+        feature["properties"]["Name"] = f"Нове укриття {i}"
+    updated.extend(added)
+    return updated, {"added": changes, "removed": changes, "changed": changes}
+
+
+def _save(store: SnapshotStore, features: list[dict]) -> Snapshot:
+    raw = json.dumps(
+        {"type": "FeatureCollection", "features": features}, ensure_ascii=False
+    ).encode("utf-8")
+    now = time.time()
+    return store.save_raw(Snapshot(_URL, content_hash(raw), fetched_at=now, checked_at=now), raw)
+
+
+def _clean(snapshot: Snapshot, rules_version: str, incremental: bool) -> pd.DataFrame:
+    clean_version = f"{dp._CLEAN_VERSION}.{rules_version}"
+    previous = dp._previous_clean(snapshot, clean_version) if incremental else None
+    with dp._store.open_raw(snapshot) as fh:
+        df, _table = dp._clean_stream(dp.geojson_stream.iter_file_chunks(fh), previous)
+    return df
+
+
+def main(scale: int = 1, changes: int = 5) -> None:
+    features = fixtures.synthetic_features(fixtures.REGISTRY_SIZE * scale)
+    updated, expected = _publish(features, changes)
+    rules_version = dp._rules_version()
+
+    with tempfile.TemporaryDirectory() as root:
+        dp._store = SnapshotStore(root)
+        first = _save(dp._store, features)
+        dp._load_clean_frame(first, rules_version)  # stores clean file + feature table
+        second = _save(dp._store, updated)
+
+        full = _clean(second, rules_version, incremental=False)
+        delta = dp._load_clean_frame(second, rules_version)  # incremental, stores both
+        delta.attrs = {}
+        pd.testing.assert_frame_equal(delta, full)
+        diff = dp._snapshot_diff(second)
+        got = {
+            "added": len(diff.added),
+            "removed": len(diff.removed),
+            "changed": len(diff.changed),
+        }
+        assert got == expected, (got, expected)
+        print(f"{len(updated)} shelters, {diff.summary()}: OK")
+
+        _common.report(
+            "full clean", _common.measure(lambda: _clean(second, rules_version, False), repeat=3)
+        )
+        _common.report(
+            "incremental clean", _common.measure(lambda: _clean(second, rules_version, True), repeat=3)
+        )
+        _common.report("diff", _common.measure(lambda: dp._snapshot_diff(second), repeat=3))
+        display = dp.get_extended_data(delta)
+        _common.report(
+            "index + cube rebuild",
+            _common.measure(lambda: (ShelterIndex(display), ShelterCube(display)), repeat=3),
+        )
+
+
+if __name__ == "__main__":
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 1,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 5,
+    )
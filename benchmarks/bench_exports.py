@@ -0,0 +1,94 @@
+"""
+bench_exports.py
+
+Export encoders (``exports``) for the whole synthetic registry: time and
+peak traced memory (``tracemalloc``) of each format written in
+``config.EXPORT_CHUNK_ROWS``-row chunks vs. as one chunk, the vector
+tile pyramid, and serving a download from the per-version cache.
+
+pyarrow's buffers are not traced, so the Parquet peak only covers the
+pandas side. Before timing, the chunked output is checked to equal the
+single-chunk one.
+
+    python benchmarks/bench_exports.py [scale]
+"""
+
+from __future__ import annotations
+
+import functools
+import io
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import _common
+import fixtures
+import pandas as pd
+
+import config
+import exports
+import vector_tiles
+
+
+def _write(encode, df, chunk_rows: int) -> int:
+    size = 0
+    for data in encode(df, chunk_rows):
+        size += len(data)
+    return size
+
+
+def _peak_mib(fn) -> float:
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1] / (1 << 20)
+    finally:
+        tracemalloc.stop()
+
+
+def main(scale: int = 1) -> None:
+    df = fixtures.display_frame(fixtures.REGISTRY_SIZE * scale)
+    one_chunk = max(len(df), 1)
+    chunk_rows = min(config.EXPORT_CHUNK_ROWS, max(len(df) // 10, 1))
+    print(f"{len(df)} shelters, {chunk_rows} rows per chunk")
+
+    for fmt, encode in exports._ENCODERS.items():
+        chunked = b"".join(encode(df, chunk_rows))
+        whole = b"".join(encode(df, one_chunk))
+        if fmt == "parquet":
+            assert pd.read_parquet(io.BytesIO(chunked)).equals(
+                pd.read_parquet(io.BytesIO(whole))
+            )
+        else:
+            assert chunked == whole, fmt
+        for label, rows in (("chunked", chunk_rows), ("one chunk", one_chunk)):
+            write = functools.partial(_write, encode, df, rows)
+            seconds = _common.measure(write, repeat=3)
+            peak = _peak_mib(write)
+            print(
+                f"{fmt + ': ' + label:<30} {seconds * 1000:>10.1f} ms "
+                f"{len(chunked) / (1 << 20):>8.1f} MiB   peak traced {peak:>7.1f} MiB"
+            )
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "shelters.mbtiles")
+        start = time.perf_counter()
+        tiles = vector_tiles.write_mbtiles(df, path)
+        seconds = time.perf_counter() - start
+        print(
+            f"{'mbtiles':<30} {seconds * 1000:>10.1f} ms "
+            f"{os.path.getsize(path) / (1 << 20):>8.1f} MiB   {tiles:,} tiles"
+        )
+
+        # A cached export is served by reading its file
+        def cached_download():
+            with open(path, "rb") as f:
+                return f.read()
+
+        _common.report("mbtiles: served from the cache", _common.measure(cached_download))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1)
@@ -0,0 +1,161 @@
+"""
+bench_federation.py
+
+Ingestion of several shelter datasets (``sources``, ``federation``):
+cleaning the sources one after another vs. in worker processes
+(``config.INGEST_WORKERS``), and the cross-source merge.
+
+A temporary snapshot store is seeded with ``--sources`` synthetic
+datasets of ``--size`` shelters each, every second further source as a
+CSV resource. Each further source repeats ``--overlap`` of the
+registry's shelters, moved by less than 3 m and with another capacity;
+the script checks that the merge finds at least those duplicates, then
+times the cold clean and merge of all sources per worker count. The
+pool is capped by the CPUs and the sources to clean
+(``data_processing._ingest_workers``), so on a single core every worker
+count cleans the sources one after another; counts that resolve to the
+same number of processes are timed once.
+
+    python benchmarks/bench_federation.py [--sources 4] [--size 12000] [--overlap 0.3]
+        [--workers 1 2 4]
+"""
+
+from __future__ import annotations
+
+import argparse
+import copy
+import glob
+import os
+import random
+import sys
+import tempfile
+import time
+
+import _common
+import fixtures
+from ckan_standin import Portal
+
+import config
+import data_processing as dp
+import federation
+import sources
+from snapshot_store import Snapshot, content_hash
+
+# Degrees; under 2.3 m north-south and 1.5 m east-west in Zakarpattia
+_JITTER_DEG = 2e-5
+
+
+def _registry(count: int) -> tuple[sources.Source, ...]:
+    extra = tuple(
+        sources.Source(
+            id=f"bench{k}",
+            title=f"Bench {k}",
+            portal="http://bench.invalid/",
+            dataset=f"bench-{k}",
+            format="csv" if k % 2 else "geojson",
+        )
+        for k in range(1, count)
+    )
+    return (sources.PRIMARY, *extra)
+
+
+def _copies(features: list[dict], count: int, rng: random.Random) -> list[dict]:
+    """Return *count* of *features*, moved by less than 3 m, with new capacities."""
+    copies = copy.deepcopy(rng.sample(features, count))
+    for feature in copies:
+        coordinates = feature["geometry"]["coordinates"]
+        if all(coordinates):  # not the [0, 0] fault
+            feature["geometry"]["coordinates"] = [
+                round(value + rng.uniform(-_JITTER_DEG, _JITTER_DEG), 6) for value in coordinates
+            ]
+        feature["properties"]["People"] = str(rng.randint(10, 3_000))
+    return copies
+
+
+def _seed(source: sources.Source, features: list[dict]) -> Snapshot:
+    """Store *features* as the snapshot of *source*, encoded in its format."""
+    portal = Portal({"type": "FeatureCollection", "features": features}, format=source.format)
+    raw = portal.version.payload
+    url = f"{source.portal}{source.dataset}/{portal.resource_name}"
+    now = time.time()
+    return dp._store_for(source).save_raw(
+        Snapshot(url, content_hash(raw), fetched_at=now, checked_at=now), raw
+    )
+
+
+def _cold(snapshot: Snapshot, rules_version: str):
+    """Clean and merge all sources, with no cleaned frame stored."""
+    for path in glob.glob(os.path.join(config.SNAPSHOT_DIR, "**", "*.parquet"), recursive=True):
+        os.remove(path)
+    return dp._load_merged_frame(snapshot, rules_version)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--sources", type=int, default=4, help="datasets, with the registry")
+    parser.add_argument("--size", type=int, default=fixtures.REGISTRY_SIZE * 10,
+                        help="shelters per dataset")
+    parser.add_argument("--overlap", type=float, default=0.3,
+                        help="share of each further dataset repeating registry shelters")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--repeat", type=int, default=2)
+    args = parser.parse_args(argv)
+
+    os.chdir(tempfile.mkdtemp(prefix="bench-federation-"))
+    dp.logger.setLevel("WARNING")
+    rng = random.Random(1)
+    registry = sources.registry = _registry(args.sources)
+    repeated = int(args.size * args.overlap)
+
+    primary = fixtures.synthetic_features(args.size)
+    members = [_seed(registry[0], primary)]
+    for k, source in enumerate(registry[1:], start=1):
+        features = fixtures.synthetic_features(args.size - repeated, seed=10 * k)
+        features += _copies(primary, repeated, rng)
+        rng.shuffle(features)
+        members.append(_seed(source, features))
+    merged = dp._federate(members)
+    rules_version = dp._rules_version()
+    print(
+        f"{args.sources} datasets of {args.size:,} shelters, {repeated:,} of each further "
+        f"one repeating the registry's; {os.cpu_count()} CPUs\n"
+    )
+
+    config.INGEST_WORKERS = 1
+    df = _cold(merged, rules_version)
+    ids = [source.id for source in registry]
+    frames = [
+        dp._load_clean_frame(snapshot, rules_version, source)
+        for source, snapshot in zip(registry, members)
+    ]
+    tables = [
+        dp._store_for(source).load_features(snapshot)
+        for source, snapshot in zip(registry, members)
+    ]
+    _df, _table, report = federation.merge(ids, frames, tables)
+    print(report.to_string(), "\n")
+    assert len(df) == report["shelters"].sum() - report["duplicates"].sum()
+    assert (report["duplicates"].iloc[1:] >= repeated).all(), report
+    print(f"{len(df):,} shelters merged: OK\n")
+
+    timed = set()
+    for requested in args.workers:
+        config.INGEST_WORKERS = requested
+        workers = dp._ingest_workers(args.sources)
+        if workers in timed:
+            print(f"{requested} workers: {workers} processes, timed above")
+            continue
+        timed.add(workers)
+        _common.report(
+            "clean + merge, one source after another" if workers == 1
+            else f"clean + merge, {workers} worker processes",
+            _common.measure(lambda: _cold(merged, rules_version), repeat=args.repeat),
+        )
+    _common.report(
+        "merge of the cleaned frames",
+        _common.measure(lambda: federation.merge(ids, frames, tables), repeat=3),
+    )
+
+
+if __name__ == "__main__":
+    sys.exit(main())
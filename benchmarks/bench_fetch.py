@@ -0,0 +1,156 @@
+"""
+bench_fetch.py
+
+Time-to-data of the fetch layer against the local CKAN stand-in
+(``ckan_standin``) with a healthy, slow, flaky and hanging upstream: the
+pooled session of ``http_client`` (timeouts, retries with backoff) vs.
+the previous one-shot ``ckanapi`` + ``requests.get`` fetch.
+
+A failed fetch leaves the app without new data until the refresher's
+next attempt, ``config.REFRESH_INTERVAL`` later, so the expected time to
+data of a client with success rate *p* and mean attempt time *t* is
+``t + (1 - p) / p * REFRESH_INTERVAL``. The hanging upstream holds a
+request for ``--hang`` seconds before dropping it; without a timeout the
+one-shot fetch waits all of it (in production, possibly forever).
+
+The last table downloads several resources one after another with new
+connections vs. concurrently over the pooled session
+(``http_client.fetch_all``).
+
+    python benchmarks/bench_fetch.py [--size 12000] [--trials 20] [--hang 10]
+"""
+
+from __future__ import annotations
+
+import argparse
+import functools
+import math
+import os
+import random
+import socket
+import statistics
+import sys
+import tempfile
+import time
+
+# The app reads the portal URL and HTTP settings at import: point it at
+# the stand-in, cut hangs after 2 s and keep the metadata cache out of the
+# timings.
+with socket.socket() as _probe:
+    _probe.bind(("127.0.0.1", 0))
+    _PORT = _probe.getsockname()[1]
+os.environ["TC_CKAN_URL"] = f"http://127.0.0.1:{_PORT}/"
+os.environ.setdefault("TC_HTTP_READ_TIMEOUT", "2")
+os.environ["TC_HTTP_CACHE"] = ""
+os.environ["TC_METRICS"] = "0"
+
+import _common
+import ckanapi
+import requests
+from ckan_standin import Behaviour, Portal, StandIn, load_collection
+
+import config
+import data_processing as dp
+import http_client
+
+_FAULTS = ("500", "503", "reset", "truncate")
+
+
+def _scenarios(hang: float) -> dict[str, Behaviour]:
+    return {
+        "healthy": Behaviour(),
+        "slow": Behaviour(latency=0.2, jitter=0.3, bandwidth=20e6),
+        "flaky": Behaviour(failure_rate=0.3, failures=_FAULTS),
+        "hanging": Behaviour(failure_rate=0.2, failures=("hang",), hang_seconds=hang),
+    }
+
+
+def _one_shot() -> bool:
+    """The fetch before ``http_client``: no session, timeout or retry."""
+    portal = ckanapi.RemoteCKAN(config.URL_CARP_GOV_UA)
+    metadata = portal.action.package_show(id=config.ID_BOMBSHELTER)
+    url = next(r["url"] for r in metadata["resources"] if r["format"].lower() == "geojson")
+    response = requests.get(url, stream=True)
+    response.raise_for_status()
+    with tempfile.TemporaryFile() as fh:
+        for chunk in response.iter_content(chunk_size=config.STREAM_CHUNK_SIZE):
+            fh.write(chunk)
+    return True
+
+
+def _pooled() -> bool:
+    """The current fetch, always downloading the whole payload.
+
+    Also hashes, validates and stores the payload, which the one-shot
+    fetch above leaves out.
+    """
+    return dp._get_raw_api_info(None, force=True) is not None
+
+
+def _attempt(fetch) -> tuple[bool, float]:
+    start = time.perf_counter()
+    try:
+        ok = fetch()
+    except Exception:
+        ok = False
+    return ok, time.perf_counter() - start
+
+
+def _time_to_data(success: float, mean: float) -> str:
+    if success == 0:
+        return "never"
+    return f"{mean + (1 - success) / success * config.REFRESH_INTERVAL:,.1f} s"
+
+
+def _body(get, url: str) -> int:
+    return len(get(url).content)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--size", type=int, default=12_000, help="shelters served")
+    parser.add_argument("--trials", type=int, default=20, help="fetches per client")
+    parser.add_argument("--hang", type=float, default=10.0, help="seconds a hang lasts")
+    parser.add_argument("--resources", type=int, default=4, help="concurrent downloads")
+    args = parser.parse_args(argv)
+
+    os.chdir(tempfile.mkdtemp(prefix="bench-fetch-"))
+    dp.logger.setLevel("CRITICAL")
+    portal = Portal(load_collection(args.size))
+    standin = StandIn(portal, port=_PORT).start()
+    print(
+        f"{args.size:,} shelters, {len(portal.version.payload) / 1e6:.1f} MB; "
+        f"read timeout {config.HTTP_TIMEOUT[1]:g} s, {config.HTTP_RETRIES} retries, "
+        f"refresh interval {config.REFRESH_INTERVAL} s\n"
+    )
+    print(
+        f"{'upstream':<10}{'client':<10}{'success':>9}{'p50 s':>9}{'p95 s':>9}"
+        f"{'max s':>9}{'time to data':>16}"
+    )
+    for name, behaviour in _scenarios(args.hang).items():
+        for client, fetch in (("one-shot", _one_shot), ("pooled", _pooled)):
+            portal.behaviour = behaviour
+            portal.random = random.Random(1)
+            results = [_attempt(fetch) for _ in range(args.trials)]
+            times = sorted(seconds for _, seconds in results)
+            success = sum(ok for ok, _ in results) / len(results)
+            print(
+                f"{name:<10}{client:<10}{success:>9.0%}{statistics.median(times):>9.2f}"
+                f"{times[math.ceil(0.95 * len(times)) - 1]:>9.2f}{times[-1]:>9.2f}"
+                f"{_time_to_data(success, statistics.fmean(times)):>16}"
+            )
+
+    portal.behaviour = _scenarios(args.hang)["slow"]
+    url = portal.package(standin.url)["resources"][0]["url"]
+    calls = [functools.partial(_body, requests.get, url)] * args.resources
+    pooled = [functools.partial(_body, http_client.session().get, url)] * args.resources
+    print(f"\n{args.resources} downloads, slow upstream:")
+    _common.report("one after another, new connections", _common.measure(
+        lambda: [call() for call in calls], repeat=3))
+    _common.report("concurrent, pooled session", _common.measure(
+        lambda: http_client.fetch_all(pooled), repeat=3))
+    standin.stop()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
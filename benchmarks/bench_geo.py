@@ -0,0 +1,110 @@
+"""
+bench_geo.py
+
+Coordinate validation (``geo_validation``): axis repair, the grid-hash
+duplicate search vs. a pairwise haversine scan, the point-in-polygon
+lookup vs. testing every polygon for every shelter, and the whole
+anomaly pass.
+
+The registry does not ship boundary polygons, so the lookup runs on a
+rectangle around each synthetic community. Both fast paths are checked
+against the slow ones on the unscaled registry before timing.
+
+    python benchmarks/bench_geo.py [scale]
+"""
+
+from __future__ import annotations
+
+import sys
+
+import _common
+import fixtures
+import numpy as np
+
+import config
+import geo_validation
+from spatial_index import haversine_m
+
+
+def _boundaries() -> geo_validation.Boundaries:
+    return geo_validation.Boundaries(
+        [
+            (otg, rajon, [[[lon - 0.3, lat - 0.2], [lon + 0.3, lat - 0.2],
+                           [lon + 0.3, lat + 0.2], [lon - 0.3, lat + 0.2],
+                           [lon - 0.3, lat - 0.2]]])
+            for otg, rajon, lon, lat in fixtures._COMMUNITIES
+        ],
+        "bench",
+    )
+
+
+def _brute_duplicates(lon: np.ndarray, lat: np.ndarray, radius_m: float) -> np.ndarray:
+    result = np.full(len(lon), -1)
+    for i in range(1, len(lon)):
+        if np.isnan(lon[i]):
+            continue
+        close = np.flatnonzero(haversine_m(lat[i], lon[i], lat[:i], lon[:i]) <= radius_m)
+        if len(close):
+            result[i] = close[0]
+    return result
+
+
+def _brute_locate(lon: np.ndarray, lat: np.ndarray) -> np.ndarray:
+    """First community rectangle containing each point, one polygon at a time."""
+    result = np.full(len(lon), -1)
+    for k, (_otg, _rajon, c_lon, c_lat) in reversed(list(enumerate(fixtures._COMMUNITIES))):
+        inside = (np.abs(lon - c_lon) < 0.3) & (np.abs(lat - c_lat) < 0.2)
+        result[inside] = k
+    return result
+
+
+def main(scale: int = 1) -> None:
+    boundaries = _boundaries()
+    df = fixtures.cleaned_frame(fixtures.REGISTRY_SIZE)
+    lon = df["longitude"].to_numpy(dtype=float, na_value=np.nan)
+    lat = df["latitude"].to_numpy(dtype=float, na_value=np.nan)
+    np.testing.assert_array_equal(
+        geo_validation.find_duplicates(lon, lat, config.GEO_DUPLICATE_M),
+        _brute_duplicates(lon, lat, config.GEO_DUPLICATE_M),
+    )
+    np.testing.assert_array_equal(boundaries.locate(lon, lat), _brute_locate(lon, lat))
+    print("duplicates and polygon lookup match the brute-force scans")
+    keys = np.arange(len(df), dtype=np.uint64)
+    print(geo_validation.report(geo_validation.flag_anomalies(df, keys)).to_string())
+
+    df = fixtures.cleaned_frame(fixtures.REGISTRY_SIZE * scale)
+    lon = df["longitude"].to_numpy(dtype=float, na_value=np.nan)
+    lat = df["latitude"].to_numpy(dtype=float, na_value=np.nan)
+    keys = np.arange(len(df), dtype=np.uint64)
+    print(f"{len(df)} shelters")
+    _common.report(
+        "fix_coordinates",
+        _common.measure(
+            lambda: geo_validation.fix_coordinates(df["longitude"], df["latitude"])
+        ),
+    )
+    _common.report(
+        "duplicates: grid hash",
+        _common.measure(
+            lambda: geo_validation.find_duplicates(lon, lat, config.GEO_DUPLICATE_M)
+        ),
+    )
+    if scale <= 10:
+        _common.report(
+            "duplicates: pairwise scan",
+            _common.measure(
+                lambda: _brute_duplicates(lon, lat, config.GEO_DUPLICATE_M), repeat=1
+            ),
+        )
+    _common.report(
+        "polygon lookup: bbox prefilter + ray casting",
+        _common.measure(lambda: boundaries.locate(lon, lat)),
+    )
+    _common.report(
+        "flag_anomalies (statistical fallback)",
+        _common.measure(lambda: geo_validation.flag_anomalies(df, keys), repeat=3),
+    )
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1)
@@ -0,0 +1,124 @@
+"""
+bench_ingest.py
+
+Streaming GeoJSON ingestion (``geojson_stream`` + batched cleaning in
+``data_processing._clean_stream``) vs. loading the whole payload with
+``json.load`` and ``pd.json_normalize``.
+
+A synthetic registry is written to a temporary file; every mode then
+runs in its own interpreter so the reported peak RSS
+(``resource.getrusage``) belongs to that mode alone. The script first
+asserts that both paths produce the same cleaned frame on a small input.
+
+    python benchmarks/bench_ingest.py [features]
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import _common  # noqa: F401  (puts src/ on sys.path)
+import fixtures
+import pandas as pd
+
+import data_processing as dp
+import geojson_stream
+
+DEFAULT_FEATURES = 500_000
+_DROP = ["type", "geometry.type", "properties.Number"]
+
+
+def _parse_json(path: str) -> int:
+    with open(path, encoding="utf-8") as fh:
+        df = pd.json_normalize(json.load(fh), record_path=["features"])
+    return len(df)
+
+
+def _parse_stream(path: str) -> int:
+    with open(path, "rb") as fh:
+        features = geojson_stream.iter_features(geojson_stream.iter_file_chunks(fh))
+        return sum(len(batch) for batch in geojson_stream.iter_batches(features))
+
+
+def _clean_json(path: str) -> int:
+    with open(path, encoding="utf-8") as fh:
+        df = pd.json_normalize(json.load(fh), record_path=["features"])
+    return len(dp._clean_data_info(df.drop(columns=_DROP, errors="ignore")))
+
+
+def _clean_stream(path: str) -> int:
+    with open(path, "rb") as fh:
+        df, _table = dp._clean_stream(geojson_stream.iter_file_chunks(fh))
+        return len(df)
+
+
+MODES = {
+    "parse: json.load + json_normalize": _parse_json,
+    "parse: streaming batches": _parse_stream,
+    "clean: json.load + json_normalize": _clean_json,
+    "clean: streaming batches": _clean_stream,
+}
+
+
+def _peak_rss_mib() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KiB on Linux
+
+
+def _run_mode(mode: str, path: str) -> None:
+    """Child process: run one mode and print its measurements as JSON."""
+    baseline = _peak_rss_mib()
+    start = time.perf_counter()
+    rows = MODES[mode](path)
+    seconds = time.perf_counter() - start
+    print(json.dumps({"rows": rows, "seconds": seconds,
+                      "peak": _peak_rss_mib(), "baseline": baseline}))
+
+
+def _check_equivalence(n: int = 3_000) -> None:
+    raw = fixtures.synthetic_geojson_bytes(n)
+    # Small chunks and batches exercise values split across chunk borders
+    chunks = [raw[i : i + 997] for i in range(0, len(raw), 997)]
+    streamed = pd.concat(
+        dp._clean_data_info(batch.drop(columns=_DROP, errors="ignore"))
+        for batch in geojson_stream.iter_batches(
+            geojson_stream.iter_features(chunks), batch_size=701
+        )
+    )
+    streamed = dp._compact_schema(streamed)
+    pd.testing.assert_frame_equal(streamed, fixtures.cleaned_frame(n))
+    print(f"equivalence: OK ({n} features)")
+
+
+def main(n: int = DEFAULT_FEATURES) -> None:
+    _check_equivalence()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "registry.geojson")
+        size = fixtures.write_synthetic_geojson(path, n)
+        print(f"{n} features, {size / 2**20:,.0f} MiB GeoJSON")
+        for mode in MODES:
+            out = subprocess.run(
+                [sys.executable, __file__, "--run", mode, path],
+                check=True, capture_output=True, text=True,
+            ).stdout
+            result = json.loads(out.strip().splitlines()[-1])
+            assert result["rows"] == n, result
+            print(
+                f"{mode:<36} {result['seconds']:>7.2f} s "
+                f"{n / result['seconds']:>10,.0f} features/s   "
+                f"peak RSS {result['peak']:>7,.0f} MiB "
+                f"(+{result['peak'] - result['baseline']:,.0f})"
+            )
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--run":
+        _run_mode(sys.argv[2], sys.argv[3])
+    else:
+        main(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_FEATURES)
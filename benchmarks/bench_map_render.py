@@ -0,0 +1,73 @@
+"""
+bench_map_render.py
+
+Server-side cost and HTML payload of the shelter layer modes in
+``map_layers``: one ``folium.Marker`` per shelter vs. a single
+client-side rendered ``ShelterCluster`` vs. server-side clusters drawn
+per viewport (``ShelterPyramid``), plus the per-rerun cost of the cached
+map when only the filter changes.
+
+    python benchmarks/bench_map_render.py [scale]
+"""
+
+from __future__ import annotations
+
+import sys
+
+import _common
+import fixtures
+import folium
+
+import config
+import data_processing as dp
+import map_layers
+
+
+def _render(df, mode: str) -> str:
+    m = folium.Map(location=list(config.MAP_CENTER), zoom_start=config.MAP_MIN_ZOOM)
+    map_layers.add_shelter_layer(m, df, mode=mode)
+    return m.get_root().render()
+
+
+def _rebuild(df, version: str) -> str:
+    m = map_layers.base_map()
+    map_layers.add_shelter_fast_cluster(m, df, version)
+    m.add_layer_control()
+    return m.to_html()
+
+
+def main(scale: int = 1) -> None:
+    df = fixtures.display_frame(fixtures.REGISTRY_SIZE * scale)
+    for mode in ("markers", "fast", "clustered"):
+        html = _render(df, mode)
+        seconds = _common.measure(lambda mode=mode: _render(df, mode), repeat=3)
+        _common.report(f"{mode}: build + render {len(df)} shelters", seconds)
+        print(f"{mode}: HTML payload {len(html.encode('utf-8')) / 1024:,.0f} KiB")
+
+    # A filter change: full leafmap rebuild vs. the IDs sent to the cached map
+    visible = df[df["Тип"] == df["Тип"].iloc[0]]
+    version = dp.dataset_version(df)
+    rebuild = _common.measure(lambda: _rebuild(df, version), repeat=3)
+    _common.report("rerun: rebuild leafmap.Map + to_html", rebuild)
+    bridge = map_layers._filter_bridge_html(version, visible.index.tolist())
+    seconds = _common.measure(
+        lambda: map_layers._filter_bridge_html(version, visible.index.tolist())
+    )
+    _common.report(f"rerun: filter bridge for {len(visible)} visible", seconds)
+    print(f"rerun: filter bridge payload {len(bridge.encode('utf-8')) / 1024:,.1f} KiB")
+
+    # The same filter in "clustered" mode sends the view at the lowest zoom
+    pyramid = map_layers.cluster_pyramid(df)
+    positions = df.index.get_indexer(visible.index)
+
+    def clustered_bridge() -> str:
+        view = map_layers.pyramid_view(df, pyramid, pyramid.min_zoom, None, positions)
+        return map_layers._filter_bridge_html(version, None, view=view)
+
+    bridge = clustered_bridge()
+    _common.report("rerun: clustered filter bridge", _common.measure(clustered_bridge))
+    print(f"rerun: clustered bridge payload {len(bridge.encode('utf-8')) / 1024:,.1f} KiB")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1)
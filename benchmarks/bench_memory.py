@@ -0,0 +1,78 @@
+"""
+bench_memory.py
+
+Memory footprint of the cleaned and display DataFrames with the compact
+schema (``data_processing._SCHEMA``) vs. the previous all-object layout
+with a stored Google Maps link column.
+
+Reported per frame: in-memory size (``memory_usage(deep=True)``) and the
+pickled size, which is what ``st.cache_data`` stores and deserialises
+for every session.
+
+    python benchmarks/bench_memory.py [scale]
+"""
+
+from __future__ import annotations
+
+import pickle
+import sys
+
+import _common
+import fixtures
+import pandas as pd
+
+import data_processing as dp
+
+# Cleaned columns added after the compact schema, not part of the old layout
+_NEW_COLUMNS = {"properties.CityScore"}
+
+
+def _legacy_cleaned(df: pd.DataFrame) -> pd.DataFrame:
+    """Return *df* in the object/float64 layout used before the compact schema."""
+    df = df[[c for c in df if c not in _NEW_COLUMNS and not c.startswith("quality.")]]
+    legacy = {}
+    for column, dtype in dp._SCHEMA.items():
+        if column not in df:
+            continue
+        if dtype in ("category", "string[pyarrow]"):
+            legacy[column] = df[column].astype(object).where(df[column].notna())
+        elif dtype in ("float32", "Int32"):
+            legacy[column] = df[column].astype("float64")
+    return df.assign(**legacy)
+
+
+def _legacy_display(df: pd.DataFrame) -> pd.DataFrame:
+    df = df.assign(link=dp.googlemaps_links(df))
+    df["properties.Bezbar"] = df["properties.Bezbar"].map({True: "Так", False: "Ні"})
+    return df
+
+
+def _report(label: str, df: pd.DataFrame) -> tuple[float, float]:
+    memory = df.memory_usage(deep=True).sum() / 1024
+    pickled = len(pickle.dumps(df)) / 1024
+    print(f"{label:<36} memory {memory:>10,.0f} KiB   pickled {pickled:>10,.0f} KiB")
+    return memory, pickled
+
+
+def main(scale: int = 1) -> None:
+    cleaned = fixtures.cleaned_frame(fixtures.REGISTRY_SIZE * scale)
+    display = dp.get_extended_data(cleaned)
+    print(f"{len(cleaned)} shelters")
+
+    before = _report("cleaned, object schema", _legacy_cleaned(cleaned))
+    after = _report("cleaned, compact schema", cleaned)
+    print(f"{'':<36} {before[0] / after[0]:>10.1f}x        {before[1] / after[1]:>10.1f}x")
+
+    before = _report("display, object schema + link", _legacy_display(_legacy_cleaned(cleaned)))
+    after = _report("display, compact schema", display)
+    print(f"{'':<36} {before[0] / after[0]:>10.1f}x        {before[1] / after[1]:>10.1f}x")
+
+    seconds = _common.measure(lambda: pickle.loads(pickle.dumps(display)), repeat=3)
+    _common.report("display: pickle round trip (compact)", seconds)
+    legacy = _legacy_display(_legacy_cleaned(cleaned))
+    seconds = _common.measure(lambda: pickle.loads(pickle.dumps(legacy)), repeat=3)
+    _common.report("display: pickle round trip (object)", seconds)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1)
@@ -0,0 +1,108 @@
+"""
+bench_nearest.py
+
+Nearest-shelter queries through ``spatial_index.SpatialIndex`` vs. a
+brute-force haversine scan of the filtered rows.
+
+Query points are drawn around the synthetic registry's communities; each
+query is checked against the brute-force result before timing.
+
+    python benchmarks/bench_nearest.py [scale]
+"""
+
+from __future__ import annotations
+
+import random
+import sys
+
+import _common
+import fixtures
+import numpy as np
+
+from shelter_index import ShelterIndex
+from spatial_index import SpatialIndex, haversine_m
+
+QUERIES = 200
+
+
+def _brute_nearest(df, lat, lon, k, positions):
+    rows = df.iloc[positions].dropna(subset=["latitude", "longitude"])
+    dist = haversine_m(
+        lat, lon, rows["latitude"].to_numpy(float), rows["longitude"].to_numpy(float)
+    )
+    order = np.argsort(dist, kind="stable")[:k]
+    return dist[order]
+
+
+def _brute_within(df, lat, lon, radius_m, positions):
+    rows = df.iloc[positions].dropna(subset=["latitude", "longitude"])
+    dist = haversine_m(
+        lat, lon, rows["latitude"].to_numpy(float), rows["longitude"].to_numpy(float)
+    )
+    return np.sort(dist[dist <= radius_m])
+
+
+def main(scale: int = 1) -> None:
+    df = fixtures.display_frame(fixtures.REGISTRY_SIZE * scale)
+    index = ShelterIndex(df)
+    _common.report(f"build ({len(df)} shelters)", _common.measure(lambda: SpatialIndex(df)))
+    spatial = SpatialIndex(df)
+
+    rng = random.Random(0)
+    points = [
+        (lat + rng.gauss(0, 0.05), lon + rng.gauss(0, 0.08))
+        for _otg, _rajon, lon, lat in (
+            rng.choice(fixtures._COMMUNITIES) for _ in range(QUERIES)
+        )
+    ]
+    all_rows = np.arange(len(df))
+    shelter_types = df["Тип"].dropna().unique().tolist()
+    cases = {
+        "no filters": (None, all_rows),
+        "type + capacity filter": (
+            index.positions(shelter_type=shelter_types[:2], max_capacity=1_000),
+        ) * 2,
+        "accessible only": (index.positions(accessible_only=True),) * 2,
+    }
+
+    for label, (positions, brute_positions) in cases.items():
+        for lat, lon in points:
+            _p, dist = spatial.nearest(lat, lon, 5, positions)
+            np.testing.assert_allclose(dist, _brute_nearest(df, lat, lon, 5, brute_positions))
+            _p, dist = spatial.within(lat, lon, 2_000, positions)
+            np.testing.assert_allclose(
+                np.sort(dist), _brute_within(df, lat, lon, 2_000, brute_positions)
+            )
+
+        def run_index(query):
+            for lat, lon in points:
+                query(lat, lon)
+
+        per_query = 1 / QUERIES
+        _common.report(
+            f"{label}: k=5, grid index",
+            _common.measure(
+                lambda p=positions: run_index(lambda a, b: spatial.nearest(a, b, 5, p))
+            )
+            * per_query,
+        )
+        _common.report(
+            f"{label}: k=5, brute force",
+            _common.measure(
+                lambda p=brute_positions: run_index(lambda a, b: _brute_nearest(df, a, b, 5, p)),
+                repeat=3,
+            )
+            * per_query,
+        )
+        _common.report(
+            f"{label}: 2 km, grid index",
+            _common.measure(
+                lambda p=positions: run_index(lambda a, b: spatial.within(a, b, 2_000, p))
+            )
+            * per_query,
+        )
+    print("results match the brute-force scan")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1)
@@ -0,0 +1,101 @@
+"""
+bench_search.py
+
+``search_data`` filter combinations answered by the ``ShelterIndex``
+posting lists vs. the boolean-mask implementation it replaced.
+
+The mask version below is kept as the reference: the script first checks
+that both select the same rows for random sidebar combinations, then
+times a cold index lookup, a memoised one and the reference.
+
+    python benchmarks/bench_search.py [scale]
+"""
+
+from __future__ import annotations
+
+import random
+import sys
+
+import _common
+import fixtures
+import pandas as pd
+
+from shelter_index import ShelterIndex
+
+
+def _ref_search(df, city_name, otg_name, shelter_type, max_capacity, accessible_only):
+    mask = pd.Series(True, index=df.index)
+    if city_name != " ":
+        mask &= df["Населений пункт"] == city_name
+    if otg_name != " ":
+        mask &= df["ОТГ"] == otg_name
+    if shelter_type:
+        mask &= df["Тип"].isin(shelter_type)
+    if accessible_only:
+        mask &= df["Інклюзивність"] == "Так"
+    if max_capacity:
+        mask &= df["Місткість"] <= max_capacity
+    return df[mask]
+
+
+def _combinations(df: pd.DataFrame, n: int, seed: int = 0) -> list[tuple]:
+    rng = random.Random(seed)
+    otgs = [" "] + df["ОТГ"].dropna().unique().tolist()
+    cities = [" "] + df["Населений пункт"].dropna().unique().tolist()
+    types = df["Тип"].dropna().unique().tolist()
+    combos = []
+    for _ in range(n):
+        combos.append(
+            (
+                rng.choice(cities) if rng.random() < 0.3 else " ",
+                rng.choice(otgs),
+                rng.sample(types, rng.randint(1, len(types))),
+                rng.choice([3_876, 3_876, 500, 100, 0]),
+                rng.random() < 0.3,
+            )
+        )
+    return combos
+
+
+def check_equivalence(df: pd.DataFrame, combos: list[tuple]) -> None:
+    index = ShelterIndex(df)
+    for combo in combos:
+        expected = _ref_search(df, *combo).index
+        actual = df.index[index.positions(*combo)]
+        assert actual.equals(expected), combo
+    print(f"equivalence: {len(combos)} filter combinations OK")
+
+
+def main(scale: int = 1) -> None:
+    df = fixtures.display_frame(fixtures.REGISTRY_SIZE * scale)
+    combos = _combinations(df, 200)
+    check_equivalence(df, combos)
+
+    seconds = _common.measure(lambda: ShelterIndex(df), repeat=3)
+    _common.report(f"build index ({len(df)} rows)", seconds)
+
+    def cold():
+        index = ShelterIndex(df)
+        for combo in combos:
+            df.iloc[index.positions(*combo)]
+
+    index = ShelterIndex(df)
+    warm_up = [index.positions(*combo) for combo in combos]
+
+    def memoised():
+        for combo in combos:
+            df.iloc[index.positions(*combo)]
+
+    def reference():
+        for combo in combos:
+            _ref_search(df, *combo)
+
+    n = len(combos)
+    _common.report("index: cold lookup + iloc", _common.measure(cold, repeat=3) / n)
+    _common.report("index: memoised lookup + iloc", _common.measure(memoised, repeat=3) / n)
+    _common.report("mask: reference search", _common.measure(reference, repeat=3) / n)
+    print(f"memo: {index.cache_info()} ({len(warm_up)} warm-up lookups)")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1)
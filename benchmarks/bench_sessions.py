@@ -0,0 +1,147 @@
+"""
+bench_sessions.py
+
+Load test of the page's per-rerun data access with concurrent sessions:
+the shared dataset (``data_processing.get_dataset``)
+vs. the previous ``st.cache_data`` chain, which hashed its DataFrame
+arguments and unpickled a copy of every frame on each call.
+
+Each simulated session runs the data part of one rerun of the main page
+(load, sidebar options, filter, KPI inputs) several times from its own
+thread, as Streamlit does. The data is served from a temporary snapshot
+store seeded with the synthetic registry.
+
+    python benchmarks/bench_sessions.py [sessions] [scale]
+"""
+
+from __future__ import annotations
+
+import random
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import _common
+import fixtures
+import pandas as pd
+import streamlit as st
+
+import aggregates
+import config
+import data_processing as dp
+from collation import ukr_sorted
+from snapshot_store import Snapshot, SnapshotStore, content_hash
+
+RERUNS_PER_SESSION = 10
+
+# ---------------------------------------------------------------------------
+# Reference: st.cache_data chain
+# ---------------------------------------------------------------------------
+
+
+@st.cache_data
+def _legacy_normalized(rules_version: str) -> pd.DataFrame:
+    return dp._load_clean_frame(dp._current_snapshot(), rules_version)
+
+
+@st.cache_data
+def _legacy_extended(df: pd.DataFrame) -> pd.DataFrame:
+    return dp.get_extended_data(df)
+
+
+@st.cache_data
+def _legacy_sorted_values(s: pd.Series) -> list[str]:
+    return ukr_sorted(s.dropna().unique().tolist())
+
+
+def _legacy_rerun(rules_version: str, filters: dict) -> tuple:
+    geo_data = _legacy_normalized(rules_version)
+    df_display = _legacy_extended(geo_data)
+    _legacy_sorted_values(df_display["ОТГ"])
+    otg = filters["otg_name"]
+    cities = geo_data["properties.City"]
+    if otg != " ":
+        cities = geo_data.loc[geo_data["properties.OTG"] == otg, "properties.City"]
+    _legacy_sorted_values(cities)
+    _legacy_sorted_values(df_display["Тип"])
+    filtered = dp.search_data(df_display, **filters)
+    return len(filtered), filtered["Місткість"].sum()
+
+
+# ---------------------------------------------------------------------------
+# Shared dataset
+# ---------------------------------------------------------------------------
+
+
+def _shared_rerun(rules_version: str, filters: dict) -> tuple:
+    dataset = dp.get_dataset()
+    dataset.city_options(filters["otg_name"])
+    positions = dataset.positions(**filters)
+    cells = dataset.cube.cells(**filters)
+    return len(positions), aggregates.summary(cells)[1]
+
+
+def _seed_store(root: str, scale: int) -> None:
+    raw = fixtures.synthetic_geojson_bytes(fixtures.REGISTRY_SIZE * scale)
+    store = SnapshotStore(root)
+    url = config.URL_CARP_GOV_UA + "dataset/bench/resource/bench.geojson"
+    now = time.time()
+    store.save_raw(Snapshot(url, content_hash(raw), fetched_at=now, checked_at=now), raw)
+    dp._store = store
+
+
+def _load_test(rerun, rules_version: str, sessions: int) -> list[float]:
+    df = dp.get_dataset().display
+    otgs = [" "] + df["ОТГ"].dropna().unique().tolist()
+    types = df["Тип"].dropna().unique().tolist()
+
+    def session(seed: int) -> list[float]:
+        rng = random.Random(seed)
+        latencies = []
+        for _ in range(RERUNS_PER_SESSION):
+            filters = dict(
+                city_name=" ",
+                otg_name=rng.choice(otgs),
+                shelter_type=rng.sample(types, rng.randint(1, len(types))),
+                max_capacity=rng.choice([3_876, 500]),
+                accessible_only=rng.random() < 0.3,
+            )
+            start = time.perf_counter()
+            rerun(rules_version, filters)
+            latencies.append(time.perf_counter() - start)
+        return latencies
+
+    with ThreadPoolExecutor(max_workers=sessions) as pool:
+        results = pool.map(session, range(sessions))
+    return [latency for latencies in results for latency in latencies]
+
+
+def main(sessions: int = 50, scale: int = 1) -> None:
+    with tempfile.TemporaryDirectory(prefix="tc-bench-") as root:
+        _seed_store(root, scale)
+        rules_version = dp._rules_version()
+        dp.get_dataset()  # build and clean once, outside the measurement
+        _legacy_rerun(rules_version, dict(city_name=" ", otg_name=" "))
+
+        print(
+            f"{sessions} sessions x {RERUNS_PER_SESSION} reruns, "
+            f"{fixtures.REGISTRY_SIZE * scale} shelters"
+        )
+        for label, rerun in (
+            ("st.cache_data chain", _legacy_rerun),
+            ("shared dataset", _shared_rerun),
+        ):
+            start = time.perf_counter()
+            latencies = _load_test(rerun, rules_version, sessions)
+            wall = time.perf_counter() - start
+            _common.report(f"{label}: mean per rerun", statistics.mean(latencies))
+            _common.report(
+                f"{label}: p95 per rerun", statistics.quantiles(latencies, n=20)[-1]
+            )
+            _common.report(f"{label}: wall time, all sessions", wall)
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:]]
+    main(*args)
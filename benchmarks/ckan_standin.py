@@ -0,0 +1,523 @@
+"""
+ckan_standin.py
+
+Local stand-in for the carpathia.gov.ua CKAN portal, for offline
+development and load tests of the fetch and refresh path.
+
+Implements the part of the CKAN API the app uses: the ``package_show``
+action (POST with a JSON body, as ``ckanapi`` sends it, or GET) for one
+dataset with a GeoJSON resource, and the resource download with
+``ETag`` / ``Last-Modified`` validators and ``304`` answers. It serves
+the synthetic registry (``fixtures``) at any size or a recorded GeoJSON
+file, as GeoJSON or as a CSV resource (properties plus ``longitude`` /
+``latitude`` columns), with configurable latency, bandwidth and failures:
+
+    python benchmarks/ckan_standin.py [--port 8765] [--size 12000 | --payload raw.geojson]
+        [--latency 0.2] [--jitter 0.1] [--bandwidth 2000000]
+        [--failure-rate 0.1] [--failures 500 503 hang reset truncate]
+        [--fail-on api download]
+        [--publish-every 600] [--changes 10] [--gzip] [--format csv]
+
+Point the app (or ``cli.py``) at it with ``TC_CKAN_URL``:
+
+    TC_CKAN_URL=http://localhost:8765/ streamlit run src/1_🏠︎_Main.py
+
+Publishing a version changes the capacity of ``--changes`` random
+shelters and the metadata dates, so the app sees a new snapshot and its
+delta; it happens every ``--publish-every`` seconds and on
+``POST /_standin/publish``. ``GET /_standin/stats`` returns the request
+counters as JSON. :class:`StandIn` runs the same server on a thread for
+benchmarks.
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import gzip
+import hashlib
+import io
+import json
+import random
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import _common  # noqa: F401  (puts src/ on sys.path)
+import fixtures
+
+import config
+
+FAILURE_MODES = ("500", "503", "hang", "reset", "truncate")
+FORMATS = ("geojson", "csv")
+_CONTENT_TYPES = {"geojson": "application/geo+json", "csv": "text/csv; charset=utf-8"}
+_WRITE_CHUNK = 64 * 1024
+
+
+@dataclass
+class Behaviour:
+    """How the stand-in answers.
+
+    Attributes:
+        latency: Seconds added before every answer.
+        jitter: Up to this many seconds added at random on top.
+        bandwidth: Download rate limit in bytes per second, ``None`` for
+            none.
+        failure_rate: Probability that a request fails.
+        failures: Failure modes drawn from: ``500`` and ``503`` answers,
+            ``hang`` (no answer for *hang_seconds*), ``reset`` (connection
+            closed without an answer) and ``truncate`` (download cut off
+            halfway; ``500`` for the API).
+        fail_on: Endpoints that fail: ``api``, ``download`` or both.
+        hang_seconds: Duration of a ``hang``.
+        changes: Shelters changed by each publication.
+        gzip: Send the download gzip-encoded to clients that accept it.
+        seed: Seed of the random draws.
+    """
+
+    latency: float = 0.0
+    jitter: float = 0.0
+    bandwidth: float | None = None
+    failure_rate: float = 0.0
+    failures: tuple[str, ...] = ("500", "503")
+    fail_on: tuple[str, ...] = ("api", "download")
+    hang_seconds: float = 60.0
+    changes: int = 10
+    gzip: bool = False
+    seed: int = 0
+
+
+@dataclass
+class _Version:
+    number: int
+    payload: bytes
+    etag: str
+    last_modified: str  # HTTP date
+    metadata_modified: str  # CKAN ISO timestamp
+    gzipped: bytes | None = None
+
+
+@dataclass
+class Stats:
+    """Request counters, by ``"<endpoint> <status or failure>"``."""
+
+    counts: Counter = field(default_factory=Counter)
+    bytes_sent: int = 0
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def count(self, key: str, sent: int = 0) -> None:
+        with self.lock:
+            self.counts[key] += 1
+            self.bytes_sent += sent
+
+    def as_dict(self) -> dict:
+        with self.lock:
+            return {"requests": dict(self.counts), "bytes_sent": self.bytes_sent}
+
+
+class Portal:
+    """Dataset state of the stand-in: the features and the published version.
+
+    Args:
+        collection: GeoJSON FeatureCollection to serve.
+        dataset_id: CKAN id (and name) of the dataset.
+        behaviour: Answer and publication settings.
+        format: Resource format served, one of :data:`FORMATS`.
+    """
+
+    def __init__(
+        self, collection: dict, dataset_id: str = config.ID_BOMBSHELTER,
+        behaviour: Behaviour | None = None, format: str = "geojson",
+    ):
+        self.collection = collection
+        self.dataset_id = dataset_id
+        self.format = format
+        self.resource_id = f"shelters-{format}"
+        self.resource_name = f"shelters.{format}"
+        self.behaviour = behaviour or Behaviour()
+        self.stats = Stats()
+        self.random = random.Random(self.behaviour.seed)
+        self._lock = threading.Lock()
+        self.version = self._encode(1)
+
+    def _csv(self) -> bytes:
+        features = self.collection["features"]
+        columns = list(dict.fromkeys(
+            name for feature in features for name in feature.get("properties") or {}
+        ))
+        out = io.StringIO()
+        writer = csv.writer(out)
+        writer.writerow(columns + ["longitude", "latitude"])
+        for feature in features:
+            properties = feature.get("properties") or {}
+            point = ((feature.get("geometry") or {}).get("coordinates") or [None, None])[:2]
+            writer.writerow(
+                ["" if properties.get(name) is None else properties[name] for name in columns]
+                + ["" if value is None else value for value in point]
+            )
+        return out.getvalue().encode("utf-8")
+
+    def _encode(self, number: int) -> _Version:
+        if self.format == "csv":
+            payload = self._csv()
+        else:
+            payload = json.dumps(self.collection, ensure_ascii=False).encode("utf-8")
+        now = time.time()
+        return _Version(
+            number=number,
+            payload=payload,
+            gzipped=gzip.compress(payload, 6) if self.behaviour.gzip else None,
+            etag=f'"{hashlib.sha256(payload).hexdigest()[:32]}"',
+            last_modified=formatdate(now, usegmt=True),
+            metadata_modified=time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(now))
+            + f".{int(now * 1e6) % 1_000_000:06d}",
+        )
+
+    def publish(self) -> _Version:
+        """Change the capacity of ``behaviour.changes`` shelters and re-publish."""
+        with self._lock:
+            features = self.collection["features"]
+            for feature in self.random.sample(features, min(self.behaviour.changes, len(features))):
+                properties = feature.setdefault("properties", {})
+                old = properties.get("People")
+                try:
+                    people = int(float(old or 0)) + self.random.randint(1, 50)
+                except (TypeError, ValueError):
+                    people = self.random.randint(10, 500)
+                # Keep the upstream type: the registry mixes strings and numbers
+                properties["People"] = str(people) if isinstance(old, str) else people
+            self.version = self._encode(self.version.number + 1)
+            return self.version
+
+    def package(self, base_url: str) -> dict:
+        """Return the ``package_show`` result of the dataset."""
+        version = self.version
+        return {
+            "id": self.dataset_id,
+            "name": self.dataset_id,
+            "title": "Укриття (stand-in)",
+            "metadata_modified": version.metadata_modified,
+            "resources": [
+                {
+                    "id": self.resource_id,
+                    "format": "GeoJSON" if self.format == "geojson" else self.format.upper(),
+                    "name": self.resource_name,
+                    "url": f"{base_url}dataset/{self.dataset_id}/resource/"
+                    f"{self.resource_id}/download/{self.resource_name}",
+                    "last_modified": version.metadata_modified,
+                    "size": len(version.payload),
+                }
+            ],
+        }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, as the real portal
+    server: _Server
+
+    # -- plumbing ---------------------------------------------------------
+
+    def _send(self, status: int, body: bytes, content_type: str, headers: dict | None = None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _send_json(self, status: int, value: dict, headers: dict | None = None) -> None:
+        body = json.dumps(value, ensure_ascii=False).encode("utf-8")
+        self._send(status, body, "application/json; charset=utf-8", headers)
+
+    def _ckan_error(self, status: int, kind: str, message: str) -> None:
+        self._send_json(
+            status,
+            {"success": False, "error": {"__type": kind, "message": message}},
+        )
+
+    def _delay(self) -> None:
+        behaviour = self.server.portal.behaviour
+        delay = behaviour.latency + self.server.portal.random.random() * behaviour.jitter
+        if delay > 0:
+            time.sleep(delay)
+
+    def _failure(self, endpoint: str) -> str | None:
+        behaviour = self.server.portal.behaviour
+        portal = self.server.portal
+        if (
+            endpoint in behaviour.fail_on
+            and behaviour.failures
+            and portal.random.random() < behaviour.failure_rate
+        ):
+            return portal.random.choice(behaviour.failures)
+        return None
+
+    def _fail(self, endpoint: str, mode: str, body: bytes | None = None) -> None:
+        """Answer with failure *mode*; *body* is the download to truncate."""
+        self.server.portal.stats.count(f"{endpoint} {mode}")
+        if mode == "hang":
+            time.sleep(self.server.portal.behaviour.hang_seconds)
+            self.close_connection = True
+        elif mode == "reset":
+            self.close_connection = True
+        elif mode == "truncate" and body is not None:
+            self.send_response(200)
+            self.send_header("Content-Type", _CONTENT_TYPES[self.server.portal.format])
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body[: len(body) // 2])
+            self.close_connection = True
+        elif mode == "503":
+            self._send(503, b"Service Unavailable", "text/plain", {"Retry-After": "1"})
+        else:
+            self._send(500, b"Internal Server Error", "text/plain")
+
+    def log_message(self, format: str, *args) -> None:
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    # -- routes -----------------------------------------------------------
+
+    def do_GET(self) -> None:
+        self._route()
+
+    def do_HEAD(self) -> None:
+        self._route()
+
+    def do_POST(self) -> None:
+        self._route()
+
+    def _route(self) -> None:
+        path = urlsplit(self.path).path
+        portal = self.server.portal
+        if path.startswith("/api/") and path.rstrip("/").endswith("/action/package_show"):
+            self._package_show()
+        elif path.endswith(f"/resource/{portal.resource_id}/download/{portal.resource_name}"):
+            self._download()
+        elif path == "/_standin/publish" and self.command == "POST":
+            self._drain_body()
+            version = self.server.portal.publish()
+            self._send_json(200, {"version": version.number, "etag": version.etag})
+        elif path == "/_standin/stats":
+            self._send_json(200, self.server.portal.stats.as_dict())
+        else:
+            self._drain_body()
+            self._ckan_error(404, "Not Found Error", "Not found")
+
+    def _drain_body(self) -> bytes:
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _request_params(self) -> dict:
+        params = {key: values[-1] for key, values in parse_qs(urlsplit(self.path).query).items()}
+        body = self._drain_body()
+        if body:
+            try:
+                params.update(json.loads(body))
+            except ValueError:
+                params.update(
+                    {key: values[-1] for key, values in parse_qs(body.decode("utf-8")).items()}
+                )
+        return params
+
+    def _package_show(self) -> None:
+        params = self._request_params()
+        self._delay()
+        if (mode := self._failure("api")) is not None:
+            self._fail("package_show", "500" if mode == "truncate" else mode)
+            return
+        portal = self.server.portal
+        if params.get("id") != portal.dataset_id:
+            portal.stats.count("package_show 404")
+            self._ckan_error(404, "Not Found Error", "Not found: Dataset not found")
+            return
+        portal.stats.count("package_show 200")
+        self._send_json(
+            200,
+            {
+                "help": f"{self.server.base_url}api/3/action/help_show?name=package_show",
+                "success": True,
+                "result": portal.package(self.server.base_url),
+            },
+        )
+
+    def _download(self) -> None:
+        self._drain_body()
+        portal = self.server.portal
+        version = portal.version
+        self._delay()
+        if (mode := self._failure("download")) is not None:
+            self._fail("download", mode, version.payload)
+            return
+
+        body, etag, encoding = version.payload, version.etag, {}
+        if version.gzipped is not None and "gzip" in self.headers.get("Accept-Encoding", ""):
+            # A strong ETag differs per encoding
+            body, etag = version.gzipped, version.etag[:-1] + '-gzip"'
+            encoding = {"Content-Encoding": "gzip"}
+        validators = {"ETag": etag, "Last-Modified": version.last_modified}
+        if self.headers.get("If-None-Match") in (version.etag, etag) or (
+            "If-None-Match" not in self.headers
+            and self.headers.get("If-Modified-Since") == version.last_modified
+        ):
+            portal.stats.count("download 304")
+            self.send_response(304)
+            for name, value in validators.items():
+                self.send_header(name, value)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", _CONTENT_TYPES[portal.format])
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Vary", "Accept-Encoding")
+        for name, value in {**validators, **encoding}.items():
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command == "HEAD":
+            portal.stats.count("download 200")
+            return
+        bandwidth = portal.behaviour.bandwidth
+        started = time.perf_counter()
+        for start in range(0, len(body), _WRITE_CHUNK):
+            chunk = body[start : start + _WRITE_CHUNK]
+            self.wfile.write(chunk)
+            if bandwidth:
+                # Sleep until the bytes sent so far fit the rate
+                ahead = (start + len(chunk)) / bandwidth - (time.perf_counter() - started)
+                if ahead > 0:
+                    time.sleep(ahead)
+        portal.stats.count("download 200", len(body))
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: tuple[str, int], portal: Portal, verbose: bool = False):
+        super().__init__(address, _Handler)
+        self.portal = portal
+        self.verbose = verbose
+        host, port = self.server_address[:2]
+        self.base_url = f"http://{'localhost' if host in ('', '0.0.0.0') else host}:{port}/"
+
+
+class StandIn:
+    """The stand-in server on a daemon thread, e.g. for a benchmark.
+
+    Args:
+        portal: Dataset state and behaviour to serve.
+        port: Port to listen on; ``0`` picks a free one.
+        host: Interface to listen on.
+        publish_every: Seconds between automatic publications, ``None``
+            for none.
+    """
+
+    def __init__(
+        self, portal: Portal, port: int = 0, host: str = "127.0.0.1",
+        publish_every: float | None = None, verbose: bool = False,
+    ):
+        self.portal = portal
+        self.server = _Server((host, port), portal, verbose)
+        self.publish_every = publish_every
+        self._stopped = threading.Event()
+
+    @property
+    def url(self) -> str:
+        """Base URL of the portal, for ``TC_CKAN_URL``."""
+        return self.server.base_url
+
+    def start(self) -> StandIn:
+        threading.Thread(
+            target=self.server.serve_forever, name="ckan-standin", daemon=True
+        ).start()
+        if self.publish_every:
+            threading.Thread(target=self._publisher, name="ckan-publisher", daemon=True).start()
+        return self
+
+    def _publisher(self) -> None:
+        while not self._stopped.wait(self.publish_every):
+            version = self.portal.publish()
+            print(f"Published version {version.number} ({len(version.payload):,} bytes)")
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self) -> StandIn:
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.stop()
+
+
+def load_collection(size: int = fixtures.REGISTRY_SIZE, payload: str | None = None) -> dict:
+    """Return the recorded collection at *payload*, or a synthetic one of *size*."""
+    if payload is None:
+        return fixtures.synthetic_geojson(size)
+    with open(payload, "rb") as fh:
+        return json.load(fh)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--size", type=int, default=fixtures.REGISTRY_SIZE,
+                        help="synthetic shelters served (default: %(default)s)")
+    source.add_argument("--payload", help="recorded GeoJSON file to serve instead")
+    parser.add_argument("--dataset-id", default=config.ID_BOMBSHELTER)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds per answer")
+    parser.add_argument("--jitter", type=float, default=0.0, help="random extra seconds")
+    parser.add_argument("--bandwidth", type=float, help="download bytes per second")
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--failures", nargs="+", choices=FAILURE_MODES, default=["500", "503"])
+    parser.add_argument("--fail-on", nargs="+", choices=("api", "download"),
+                        default=["api", "download"], help="endpoints that fail")
+    parser.add_argument("--hang-seconds", type=float, default=60.0)
+    parser.add_argument("--publish-every", type=float, help="seconds between new versions")
+    parser.add_argument("--changes", type=int, default=10, help="shelters changed per version")
+    parser.add_argument("--gzip", action="store_true", help="gzip the download")
+    parser.add_argument("--format", choices=FORMATS, default="geojson", help="resource format")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    args = parser.parse_args(argv)
+
+    behaviour = Behaviour(
+        latency=args.latency,
+        jitter=args.jitter,
+        bandwidth=args.bandwidth,
+        failure_rate=args.failure_rate,
+        failures=tuple(args.failures),
+        fail_on=tuple(args.fail_on),
+        hang_seconds=args.hang_seconds,
+        changes=args.changes,
+        gzip=args.gzip,
+        seed=args.seed,
+    )
+    portal = Portal(
+        load_collection(args.size, args.payload), args.dataset_id, behaviour, args.format
+    )
+    standin = StandIn(portal, args.port, args.host, args.publish_every, args.verbose).start()
+    print(
+        f"Serving {len(portal.collection['features']):,} shelters "
+        f"({len(portal.version.payload):,} bytes) at {standin.url}\n"
+        f"Run the app with TC_CKAN_URL={standin.url}"
+    )
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        standin.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""
+fixtures.py
+
+Synthetic shelter GeoJSON modelled on the carpathia.gov.ua registry
+(~1 200 features), including the kinds of dirty values the
+``_clean_*`` functions exist for: prefixes, abbreviations, homoglyphs,
+stray quotes, numbers stored as strings, blank booleans and faulty
+coordinates (swapped axes, ``[0, 0]``, points outside the region or in
+another community, duplicates).
+
+Shelter names are drawn from ``notebooks/csv_test_data/row_Name.csv``.
+"""
+
+from __future__ import annotations
+
+import csv
+import json
+import os
+import random
+from collections.abc import Iterator
+
+import _common
+import pandas as pd
+
+REGISTRY_SIZE = 1_200
+
+_NAMES_CSV = os.path.join(_common.ROOT, "notebooks", "csv_test_data", "row_Name.csv")
+
+# (OTG, rajon, lon, lat) — approximate community centres
+_COMMUNITIES = [
+    ("Ужгородська", "Ужгородський", 22.29, 48.62),
+    ("Мукачівська", "Мукачівський", 22.72, 48.44),
+    ("Хустська", "Хустський", 23.29, 48.17),
+    ("Берегівська", "Берегівський", 22.64, 48.20),
+    ("Тячівська", "Тячівський", 23.57, 48.01),
+    ("Рахівська", "Рахівський", 24.20, 48.06),
+    ("Чопська", "Ужгородський", 22.20, 48.43),
+    ("Кольчинська", "Мукачівський", 22.70, 48.61),
+    ("Великобичківська", "Рахівський", 24.02, 47.97),
+    ("Усть-Чорнянська", "Тячівський", 23.92, 48.32),
+    ("Косоньська", "Берегівський", 22.45, 48.25),
+    ("Свалявська", "Мукачівський", 22.99, 48.55),
+]
+
+_CITIES = {
+    "Ужгородська": ["м.Ужгород", "м. Ужгород", "Ужгород вул. Собранецька"],
+    "Мукачівська": ["м.Мукачево,", "м. Мукачево", "с. Нове Давидково", "Н.Давидково"],
+    "Хустська": ["м. Хуст", "с.Горинчево", "Горінчево", "с. Iза"],
+    "Берегівська": ["м. Берегове", "с. Заріччя"],
+    "Тячівська": ["м.Тячів", "с. Тячівка", "с.Руська Мокра"],
+    "Рахівська": ["м. Рахів", "с. Кваси"],
+    "Чопська": ["м. Чоп", "с. Соловка"],
+    "Кольчинська": ["с. Крите", ".Кольчино", "смт Кольчино"],
+    "Великобичківська": ["смт Вел. Бичків", "В.Бичків", "с. Луг"],
+    "Усть-Чорнянська": ["Усть- Чорна", "с. Дубове"],
+    "Косоньська": ["с. Косонь", "с. Оклі", "с.Оклі Гедь"],
+    "Свалявська": ["м. Свалява", "с. Неліпино", "c. Чорний Потік"],
+}
+
+_OTG_VARIANTS = ["{}", "{}", "{} ТГ", "{} отг", " {}\n", "{} ОТГ"]
+_ADDRESSES = [
+    "вул.Миру, {n}",
+    "вул Шевченка {n}",
+    "{n}А",
+    "Миру",
+    "пл.Свободи,{n}",
+    "просп. Свободи буд {n}",
+    "без назви",
+    "с. Кольчино вул.Гагаріна {n}",
+    "вул. Європейська, 18 Тячівського району",
+    None,
+]
+_TYPES = ["Найпростіші укриття", "Сховище", "ПРУ", "Динамічна споруда"]
+_TYPES_ZS = ["вбудоване", "окремо розташоване", "вбудоване "]
+_PROPERTY = ["Комунальна", "Державна", "Приватна"]
+_BEZBAR = ["true", "false", "false", "false", "", None]
+
+
+def _load_names() -> list[str]:
+    with open(_NAMES_CSV, encoding="utf-8") as fh:
+        rows = list(csv.reader(fh))
+    return [row[0] for row in rows[1:] if row]
+
+
+def _coordinate_fault(
+    rng: random.Random, coordinates: list[float], previous: list[float] | None
+) -> list[float]:
+    """Return *coordinates* with an occasional upstream-style fault."""
+    roll = rng.random()
+    if roll < 0.01:
+        return coordinates[::-1]  # [lat, lon]
+    if roll < 0.015:
+        return [0, 0]
+    if roll < 0.02:
+        return [24.03, 49.84]  # Lviv
+    if roll < 0.025:
+        _otg, _rajon, lon, lat = rng.choice(_COMMUNITIES)
+        return [lon, lat]  # another (or the same) community's centre
+    if roll < 0.03 and previous is not None:
+        return [previous[0] + 0.00001, previous[1]]  # ~1 m from the previous one
+    return coordinates
+
+
+def iter_synthetic_features(n: int = REGISTRY_SIZE, seed: int = 0) -> Iterator[dict]:
+    """Yield *n* GeoJSON ``Feature`` dicts shaped like the upstream registry."""
+    rng = random.Random(seed)
+    # Separate stream, so the faults leave the other values unchanged
+    faults = random.Random(seed + 1)
+    names = _load_names()
+    previous = None
+    for i in range(n):
+        otg, rajon, lon, lat = rng.choice(_COMMUNITIES)
+        address = rng.choice(_ADDRESSES)
+        properties = {
+            "OTG": rng.choice(_OTG_VARIANTS).format(otg),
+            "Number": str(i),
+            "City": rng.choice(_CITIES[otg]),
+            "Name": rng.choice(names),
+            "Area": rng.choice([str(rng.randint(20, 900)), "51,3", 84.4]),
+            "People": rng.choice([str(rng.randint(10, 3_000)), rng.randint(10, 500)]),
+            "TypeZs": rng.choice(_TYPES_ZS),
+            "Property": rng.choice(_PROPERTY),
+            "Adress": address.format(n=rng.randint(1, 120)) if address else None,
+            "Rajon": rajon,
+            "Type": rng.choice(_TYPES),
+            "Bezbar": rng.choice(_BEZBAR),
+        }
+        coordinates = [
+            round(lon + rng.gauss(0, 0.05), 6),
+            round(lat + rng.gauss(0, 0.03), 6),
+        ]
+        yield {
+            "type": "Feature",
+            "properties": properties,
+            "geometry": {
+                "type": "Point",
+                "coordinates": _coordinate_fault(faults, coordinates, previous),
+            },
+        }
+        previous = coordinates
+
+
+def synthetic_features(n: int = REGISTRY_SIZE, seed: int = 0) -> list[dict]:
+    """Return *n* GeoJSON ``Feature`` dicts shaped like the upstream registry."""
+    return list(iter_synthetic_features(n, seed))
+
+
+def synthetic_geojson(n: int = REGISTRY_SIZE, seed: int = 0) -> dict:
+    """Return a synthetic ``FeatureCollection`` with *n* features."""
+    return {"type": "FeatureCollection", "features": synthetic_features(n, seed)}
+
+
+def synthetic_geojson_bytes(n: int = REGISTRY_SIZE, seed: int = 0) -> bytes:
+    """Return :func:`synthetic_geojson` serialised as UTF-8 JSON."""
+    return json.dumps(synthetic_geojson(n, seed), ensure_ascii=False).encode("utf-8")
+
+
+def write_synthetic_geojson(path: str, n: int = REGISTRY_SIZE, seed: int = 0) -> int:
+    """Write :func:`synthetic_geojson` to *path* one feature at a time.
+
+    Large registries are written without building the collection in
+    memory. Returns the file size in bytes.
+    """
+    with open(path, "w", encoding="utf-8") as fh:
+        fh.write('{"type": "FeatureCollection", "features": [')
+        for i, feature in enumerate(iter_synthetic_features(n, seed)):
+            fh.write(",\n" if i else "\n")
+            fh.write(json.dumps(feature, ensure_ascii=False))
+        fh.write("\n]}\n")
+    return os.path.getsize(path)
+
+
+def cleaned_frame(n: int = REGISTRY_SIZE, seed: int = 0) -> pd.DataFrame:
+    """Return the synthetic registry after ``_clean_data_info``."""
+    import data_processing as dp
+
+    df = pd.json_normalize(synthetic_geojson(n, seed), record_path=["features"])
+    df = df.drop(columns=["type", "geometry.type", "properties.Number"], errors="ignore")
+    return dp._clean_data_info(df)
+
+
+def display_frame(n: int = REGISTRY_SIZE, seed: int = 0) -> pd.DataFrame:
+    """Return the synthetic registry as ``get_extended_data`` output."""
+    import data_processing as dp
+
+    return dp.get_extended_data(cleaned_frame(n, seed))
@@ -0,0 +1,583 @@
+"""
+suite.py
+
+Benchmark suite of the data pipeline and page render, with results
+stored as JSON so that regressions can be compared across commits.
+
+Every case runs offline, on the synthetic registry (``fixtures``) or on
+a recorded GeoJSON payload (``--fixture``, e.g. a ``raw-*.geojson`` of
+the snapshot store), scaled to 1×, 10× and 100× its size; a recorded
+payload is scaled by repeating its features with shifted coordinates.
+For each case and scale the suite records the best and median wall
+time of up to ``--repeat`` runs (fewer once a case has used its
+``--budget`` seconds) and the peak traced memory (``tracemalloc``) of
+one more run.
+
+The suite runs in a temporary working directory, so no snapshot store
+or gazetteer cache of an earlier run is reused, and with the
+instrumentation timers off (``TC_METRICS=0``). Streamlit caches are not
+involved: the cases call the pipeline functions directly, and the
+per-filter memos of the index and the coverage grid are cleared before
+each run.
+
+    python benchmarks/suite.py run [--scales 1 10 100] [--cases clean. search.]
+        [--fixture raw.geojson] [--output results.json] [--compare baseline.json]
+    python benchmarks/suite.py compare baseline.json results.json [--threshold 1.2]
+
+Results are written to ``benchmarks/results/<commit>.json`` by default;
+``compare`` (and ``run --compare``) exits with status 1 if a case got
+slower than ``--threshold`` times its baseline.
+"""
+
+from __future__ import annotations
+
+import os
+
+os.environ.setdefault("TC_METRICS", "0")  # before the application modules read it
+
+import argparse
+import json
+import logging
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections.abc import Callable, Iterator
+from dataclasses import asdict, dataclass
+from functools import cached_property
+
+import _common
+import fixtures
+import folium
+import numpy as np
+import pandas as pd
+import pyarrow
+from bench_search import _combinations
+
+import aggregates
+import config
+import data_processing as dp
+import feature_delta
+import geo_validation
+import geojson_stream
+import map_layers
+from aggregates import ShelterCube
+from cluster_pyramid import ClusterPyramid
+from coverage import CoverageGrid
+from shelter_index import ShelterIndex
+from spatial_index import SpatialIndex
+
+RESULTS_DIR = os.path.join(_common.ROOT, "benchmarks", "results")
+# Shift of each repeated copy of a recorded payload, in degrees (~50 m)
+_COPY_SHIFT = 0.0005
+# Differences below this many seconds are noise, whatever the ratio
+_NOISE_S = 0.0005
+
+
+# ---------------------------------------------------------------------------
+# Inputs
+# ---------------------------------------------------------------------------
+
+
+def _scaled_payload(path: str, scale: int) -> bytes:
+    """Return the recorded payload at *path* with its features repeated *scale* times."""
+    with open(path, "rb") as fh:
+        collection = json.load(fh)
+    features = collection["features"]
+    copies = []
+    for k in range(scale):
+        for feature in features:
+            geometry = feature.get("geometry") or {}
+            coordinates = geometry.get("coordinates")
+            if k and isinstance(coordinates, list) and len(coordinates) == 2:
+                try:
+                    lon, lat = float(coordinates[0]), float(coordinates[1])
+                except (TypeError, ValueError):
+                    pass
+                else:
+                    shift = k * _COPY_SHIFT
+                    geometry = {**geometry, "coordinates": [lon + shift, lat + shift]}
+                    feature = {**feature, "geometry": geometry}
+            copies.append(feature)
+    return json.dumps({**collection, "features": copies}, ensure_ascii=False).encode("utf-8")
+
+
+class Inputs:
+    """Inputs of one scale, built on first use and shared by the cases.
+
+    Args:
+        payload: Raw GeoJSON bytes.
+    """
+
+    def __init__(self, payload: bytes):
+        self.payload = payload
+
+    def chunks(self) -> Iterator[bytes]:
+        """Yield the payload in download-sized chunks."""
+        size = config.STREAM_CHUNK_SIZE
+        for start in range(0, len(self.payload), size):
+            yield self.payload[start : start + size]
+
+    @cached_property
+    def raw(self) -> pd.DataFrame:
+        """Flattened features, as cleaning receives them."""
+        df = pd.json_normalize(json.loads(self.payload), record_path=["features"])
+        return df.drop(columns=["type", "geometry.type", "properties.Number"], errors="ignore")
+
+    @cached_property
+    def stream(self) -> tuple[pd.DataFrame, pd.DataFrame]:
+        """Cleaned frame and feature table, as ``_clean_stream`` returns them."""
+        return dp._clean_stream(self.chunks())
+
+    @cached_property
+    def cleaned(self) -> pd.DataFrame:
+        df = self.stream[0]
+        # As set by _load_clean_frame; without it every lookup hashes the frame
+        df.attrs["dataset_version"] = f"suite-{len(df)}"
+        return df
+
+    @cached_property
+    def keys(self) -> np.ndarray:
+        """Identity key of every cleaned row."""
+        return self.stream[1][feature_delta.KEY_COL].to_numpy()
+
+    @cached_property
+    def display(self) -> pd.DataFrame:
+        return dp.get_extended_data(self.cleaned)
+
+    @cached_property
+    def combos(self) -> list[tuple]:
+        """Sidebar filter combinations, as in ``bench_search``."""
+        return _combinations(self.display, 50)
+
+    @cached_property
+    def index(self) -> ShelterIndex:
+        return ShelterIndex(self.display)
+
+    @cached_property
+    def cube(self) -> ShelterCube:
+        return ShelterCube(self.display)
+
+    @cached_property
+    def pyramid(self) -> ClusterPyramid:
+        return ClusterPyramid(
+            self.display,
+            min_zoom=config.MAP_MIN_ZOOM,
+            max_zoom=config.MAP_CLUSTER_MAX_ZOOM,
+            cell_px=config.MAP_CLUSTER_CELL_PX,
+        )
+
+    @cached_property
+    def coverage(self) -> CoverageGrid:
+        return CoverageGrid(self.display, config.MAP_BOUNDS, config.COVERAGE_CELL_M)
+
+
+# ---------------------------------------------------------------------------
+# Cases
+# ---------------------------------------------------------------------------
+
+
+@dataclass(frozen=True)
+class Case:
+    """One benchmark.
+
+    Attributes:
+        name: Dotted name, ``<area>.<what>``.
+        setup: Returns the timed callable for the inputs of a scale.
+        max_scale: Largest scale the case runs at, ``None`` for all.
+    """
+
+    name: str
+    setup: Callable[[Inputs], Callable[[], object]]
+    max_scale: int | None = None
+
+
+CASES: list[Case] = []
+
+
+def case(name: str, max_scale: int | None = None) -> Callable:
+    """Register the decorated setup function as case *name*."""
+
+    def register(setup: Callable[[Inputs], Callable[[], object]]) -> Callable:
+        CASES.append(Case(name, setup, max_scale))
+        return setup
+
+    return register
+
+
+@case("parse.json_normalize")
+def _parse_whole(inputs: Inputs):
+    return lambda: pd.json_normalize(json.loads(inputs.payload), record_path=["features"])
+
+
+@case("parse.stream")
+def _parse_stream(inputs: Inputs):
+    def run():
+        features = geojson_stream.iter_features(inputs.chunks())
+        return list(geojson_stream.iter_batches(features))
+
+    return run
+
+
+@case("pipeline.clean")
+def _pipeline_clean(inputs: Inputs):
+    # _load_clean_frame's cleaning of a new snapshot: parse, clean, flag
+    return lambda: dp._clean_stream(inputs.chunks())
+
+
+@case("pipeline.clean_data_info")
+def _clean_data_info(inputs: Inputs):
+    return lambda: dp._clean_data_info(inputs.raw)
+
+
+# Column-level cleaning functions and the raw column each is applied to
+_COLUMN_CLEANERS = {
+    "otg": (dp._clean_otg, "properties.OTG"),
+    "city": (dp._clean_city, "properties.City"),
+    "name": (dp._clean_name, "properties.Name"),
+    "adress": (dp._clean_adress, "properties.Adress"),
+    "str_strict": (dp._clean_str_strict, "properties.Type"),
+    "num": (dp._clean_num, "properties.People"),
+    "bool": (dp._clean_bool, "properties.Bezbar"),
+    "coordinates": (dp._normalize_coordinates, "geometry.coordinates"),
+}
+
+for _suffix, (_clean, _column) in _COLUMN_CLEANERS.items():
+
+    def _setup(inputs: Inputs, clean=_clean, column=_column):
+        return lambda: clean(inputs.raw[column])
+
+    case(f"clean.{_suffix}")(_setup)
+
+
+@case("clean.snap_settlements")
+def _snap_settlements(inputs: Inputs):
+    frame = inputs.cleaned[["properties.OTG", "properties.City"]]
+    # Snapping assigns columns in place; the copy is part of the run
+    return lambda: dp._snap_settlements(frame.copy())
+
+
+@case("clean.flag_anomalies")
+def _flag_anomalies(inputs: Inputs):
+    return lambda: geo_validation.flag_anomalies(inputs.cleaned, inputs.keys)
+
+
+@case("pipeline.display")
+def _display(inputs: Inputs):
+    return lambda: dp.get_extended_data(inputs.cleaned)
+
+
+@case("build.index")
+def _build_index(inputs: Inputs):
+    return lambda: ShelterIndex(inputs.display)
+
+
+@case("build.cube")
+def _build_cube(inputs: Inputs):
+    return lambda: ShelterCube(inputs.display)
+
+
+@case("build.spatial")
+def _build_spatial(inputs: Inputs):
+    return lambda: SpatialIndex(inputs.display)
+
+
+@case("build.clusters")
+def _build_clusters(inputs: Inputs):
+    return lambda: ClusterPyramid(
+        inputs.display,
+        min_zoom=config.MAP_MIN_ZOOM,
+        max_zoom=config.MAP_CLUSTER_MAX_ZOOM,
+        cell_px=config.MAP_CLUSTER_CELL_PX,
+    )
+
+
+@case("build.coverage")
+def _build_coverage(inputs: Inputs):
+    return lambda: CoverageGrid(inputs.display, config.MAP_BOUNDS, config.COVERAGE_CELL_M)
+
+
+@case("options.sorted_values")
+def _sorted_values(inputs: Inputs):
+    return lambda: dp.get_sorted_column_values(inputs.display["Населений пункт"])
+
+
+@case("search.filter")
+def _search_filter(inputs: Inputs):
+    # As the page filters: the dataset's index, then the matching rows
+    index = inputs.index
+
+    def run():
+        index._cached_positions.cache_clear()
+        return [inputs.display.iloc[index.positions(*combo)] for combo in inputs.combos]
+
+    return run
+
+
+@case("charts.aggregates")
+def _chart_aggregates(inputs: Inputs):
+    cube = inputs.cube
+
+    def run():
+        # KPI card, type pie and settlement bar of every combination
+        for combo in inputs.combos:
+            cells = cube.cells(*combo)
+            aggregates.summary(cells)
+            aggregates.capacity_by(cells, "Тип")
+            aggregates.capacity_by(cube.cells(otg_name=combo[1]), "Населений пункт")
+
+    return run
+
+
+@case("map.markers", max_scale=10)
+def _markers(inputs: Inputs):
+    def run():
+        m = folium.Map(location=list(config.MAP_CENTER), zoom_start=config.MAP_MIN_ZOOM)
+        map_layers.add_shelter_markers(m, inputs.display)
+        return m
+
+    return run
+
+
+@case("map.payload")
+def _map_payload(inputs: Inputs):
+    return lambda: map_layers.shelter_payload(inputs.display)
+
+
+@case("map.cluster_views")
+def _cluster_views(inputs: Inputs):
+    # Every zoom level over the whole region: the largest views sent
+    pyramid = inputs.pyramid
+    positions = inputs.index.positions(*inputs.combos[0])
+    return lambda: [
+        map_layers.pyramid_view(inputs.display, pyramid, zoom, None, positions)
+        for zoom in range(pyramid.min_zoom, pyramid.max_zoom + 1)
+    ]
+
+
+@case("coverage.rollup")
+def _coverage_rollup(inputs: Inputs):
+    grid = inputs.coverage
+    positions = inputs.index.positions(*inputs.combos[0])
+    radius = config.COVERAGE_RADII_M[1]
+
+    def run():
+        grid._cache.clear()
+        return grid.reachable(radius, positions), grid.rollup(radius, positions)
+
+    return run
+
+
+# ---------------------------------------------------------------------------
+# Running
+# ---------------------------------------------------------------------------
+
+
+@dataclass
+class Result:
+    """Measurements of one case at one scale."""
+
+    case: str
+    scale: int
+    rows: int
+    runs: int
+    best_s: float
+    median_s: float
+    peak_mib: float
+
+
+def _peak_mib(fn: Callable[[], object]) -> float:
+    """Return the peak traced memory of one call above the memory before it."""
+    tracemalloc.start()
+    try:
+        base = tracemalloc.get_traced_memory()[0]
+        fn()
+        return (tracemalloc.get_traced_memory()[1] - base) / (1 << 20)
+    finally:
+        tracemalloc.stop()
+
+
+def measure(
+    name: str, fn: Callable[[], object], scale: int, rows: int, repeat: int, budget: float
+) -> Result:
+    """Time *fn* (after one warm-up call) and trace its peak memory."""
+    start = time.perf_counter()
+    fn()
+    times: list[float] = []
+    while len(times) < repeat and (not times or time.perf_counter() - start < budget):
+        run_start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - run_start)
+    return Result(
+        case=name,
+        scale=scale,
+        rows=rows,
+        runs=len(times),
+        best_s=min(times),
+        median_s=statistics.median(times),
+        peak_mib=_peak_mib(fn),
+    )
+
+
+def _git(*args: str) -> str | None:
+    try:
+        out = subprocess.run(
+            ["git", *args], cwd=_common.ROOT, capture_output=True, text=True, check=True
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.stdout.strip()
+
+
+def _metadata(fixture: str | None) -> dict:
+    commit = _git("rev-parse", "--short", "HEAD")
+    dirty = bool(_git("status", "--porcelain", "--untracked-files=no"))
+    return {
+        "commit": commit,
+        "dirty": dirty,
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "fixture": os.path.abspath(fixture) if fixture else "synthetic",
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "pyarrow": pyarrow.__version__,
+        "machine": f"{platform.system()} {platform.machine()}, {os.cpu_count()} CPUs",
+    }
+
+
+def _default_output(meta: dict) -> str:
+    name = meta["commit"] or "results"
+    if meta["dirty"]:
+        name += "-dirty"
+    return os.path.join(RESULTS_DIR, f"{name}.json")
+
+
+def _print(result: Result) -> None:
+    print(
+        f"{result.case:<28} {result.scale:>4}× {result.rows:>8} rows "
+        f"{result.median_s * 1000:>11.3f} ms (best {result.best_s * 1000:.3f}, "
+        f"{result.runs} runs)   peak {result.peak_mib:>8.1f} MiB",
+        flush=True,
+    )
+
+
+def run(args: argparse.Namespace) -> int:
+    cases = [c for c in CASES if not args.cases or c.name.startswith(tuple(args.cases))]
+    if not cases:
+        print(f"No case matches {args.cases}", file=sys.stderr)
+        return 1
+    meta = _metadata(args.fixture)
+    output = os.path.abspath(args.output or _default_output(meta))
+    fixture = os.path.abspath(args.fixture) if args.fixture else None
+
+    # The pipeline logs every stage at INFO; only problems are of interest here
+    logging.getLogger(config.LOGGER_NAME).setLevel(logging.WARNING)
+    results: list[Result] = []
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        try:
+            for scale in args.scales:
+                if fixture:
+                    payload = _scaled_payload(fixture, scale)
+                else:
+                    payload = fixtures.synthetic_geojson_bytes(fixtures.REGISTRY_SIZE * scale)
+                inputs = Inputs(payload)
+                rows = len(inputs.display)
+                for c in cases:
+                    if c.max_scale is not None and scale > c.max_scale:
+                        continue
+                    result = measure(
+                        c.name, c.setup(inputs), scale, rows, args.repeat, args.budget
+                    )
+                    _print(result)
+                    results.append(result)
+                del inputs
+        finally:
+            os.chdir(cwd)
+
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as fh:
+        json.dump(
+            {"meta": meta, "results": [asdict(r) for r in results]},
+            fh,
+            ensure_ascii=False,
+            indent=1,
+        )
+    print(f"Results written to {output}")
+
+    if args.compare:
+        return _compare(args.compare, output, args.threshold)
+    return 0
+
+
+def _load(path: str) -> tuple[dict, dict[tuple[str, int], dict]]:
+    with open(path, encoding="utf-8") as fh:
+        data = json.load(fh)
+    return data["meta"], {(r["case"], r["scale"]): r for r in data["results"]}
+
+
+def _compare(baseline: str, current: str, threshold: float) -> int:
+    """Print the median time and peak memory ratios; 1 if a case regressed."""
+    base_meta, base = _load(baseline)
+    meta, results = _load(current)
+    print(f"Baseline {base_meta['commit']} ({base_meta['date']}) vs {meta['commit']}")
+    regressions = 0
+    for key in sorted(results.keys() & base.keys()):
+        old, new = base[key], results[key]
+        ratio = new["median_s"] / old["median_s"] if old["median_s"] else float("inf")
+        slower = ratio > threshold and new["median_s"] - old["median_s"] > _NOISE_S
+        regressions += slower
+        print(
+            f"{key[0]:<28} {key[1]:>4}× {old['median_s'] * 1000:>11.3f} → "
+            f"{new['median_s'] * 1000:>11.3f} ms  ×{ratio:5.2f}  "
+            f"peak {old['peak_mib']:>7.1f} → {new['peak_mib']:>7.1f} MiB"
+            f"{'  SLOWER' if slower else ''}"
+        )
+    for key in sorted(results.keys() - base.keys()):
+        print(f"{key[0]:<28} {key[1]:>4}×  not in the baseline")
+    if missing := len(base.keys() - results.keys()):
+        print(f"{missing} baseline case(s) not run")
+    print(f"{regressions} case(s) slower than ×{threshold}")
+    return 1 if regressions else 0
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    command = commands.add_parser("run", help="run the cases and write the results")
+    command.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100])
+    command.add_argument(
+        "--cases", nargs="+", default=[], help="case name prefixes (default: all)"
+    )
+    command.add_argument("--fixture", help="recorded GeoJSON payload to scale")
+    command.add_argument("--repeat", type=int, default=5, help="timed runs per case")
+    command.add_argument(
+        "--budget", type=float, default=10.0, help="seconds after which a case stops repeating"
+    )
+    command.add_argument("--output", help="results file (default: results/<commit>.json)")
+    command.add_argument("--compare", help="baseline results to compare against")
+    command.add_argument("--threshold", type=float, default=1.2)
+    command.add_argument("--list", action="store_true", help="list the cases and exit")
+
+    command = commands.add_parser("compare", help="compare two results files")
+    command.add_argument("baseline")
+    command.add_argument("current")
+    command.add_argument("--threshold", type=float, default=1.2)
+
+    args = parser.parse_args(argv)
+    if args.command == "compare":
+        return _compare(args.baseline, args.current, args.threshold)
+    if args.list:
+        for c in CASES:
+            print(c.name)
+        return 0
+    return run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -7,15 +7,23 @@ civil-defence shelters in Transcarpathia.
 
 from __future__ import annotations
 
+import time
+
 import streamlit as st
-import leafmap.foliumap as leafmap
-import folium
-from folium.plugins import MarkerCluster
 
+import aggregates
+import config
 import data_processing as dp
+import diagnostics
+import exports
+import geo_validation
+import instrumentation
 import kpi_display as kd
+import map_layers
 
 dp.logger.info("Main: Initialize page")
+instrumentation.serve()
+page_span = instrumentation.stage("page").start()
 # ---------------------------------------------------------------------------
 # Page config
 # ---------------------------------------------------------------------------
@@ -38,38 +46,48 @@ st.markdown(
 
 
 # ---------------------------------------------------------------------------
-# Data loading  (both raw + extended needed for different operations)
+# Data loading  (one shared, read-only dataset for all sessions)
 # ---------------------------------------------------------------------------
 
-dp.logger.info("Main-data: Initialize data loading dp.get_normalize_data() and dp.get_extended_data()")
+dp.logger.info("Main-data: Initialize data loading dp.get_dataset()")
 
-geo_data = dp.get_normalized_data()
+with instrumentation.stage("page.data"):
+    dataset = dp.get_dataset()
 
-if geo_data is None:
-    dp.logger.error("Main-data: FAIL Couldn`t load data from dp.get_normalize_data()")
-    st.error("Не вдалося завантажити дані. Спробуйте оновити сторінку.")
+if dataset is None:
+    status = dp.get_refresh_status()
+    if status.refreshing or status.last_attempt is None:
+        dp.logger.info("Main-data: No local snapshot yet, first download is running")
+        st.info("Дані завантажуються. Оновіть сторінку за кілька секунд.")
+    else:
+        dp.logger.error(f"Main-data: FAIL Couldn`t load data: {status.last_error}")
+        st.error("Не вдалося завантажити дані. Спробуйте оновити сторінку.")
     st.stop()
 
-df_display = dp.get_extended_data(geo_data)
+df_display = dataset.display
 
-dp.logger.info("Main-data: Succesfully finished data loading dp.get_normalize_data() and dp.get_extended_data()")
+dp.logger.info(f"Main-data: Succesfully finished data loading, dataset {dataset.version}")
+
+# A profile requested from the diagnostics view covers the rest of this run
+profile_capture = diagnostics.begin_run()
 
 # ---------------------------------------------------------------------------
 # Sidebar filters
 # ---------------------------------------------------------------------------
 dp.logger.info("Main-search: Initialize st.sidebar for filter and search")
+section = instrumentation.stage("page.sidebar").start()
 
 st.sidebar.title("Фільтр та Пошук")
 
-otg_options: list[str] = [" "] + dp.get_sorted_column_values(df_display["ОТГ"])
+otg_options: list[str] = [" "] + dataset.otg_options
 selected_otg: str = st.sidebar.selectbox(
     "ОТГ (об'єднана територіальна громада)", otg_options
 )
 
-city_options: list[str] = dp.get_city_options(selected_otg, geo_data)
+city_options: list[str] = dataset.city_options(selected_otg)
 selected_city: str = st.sidebar.selectbox("Населений пункт", city_options)
 
-all_types: list[str] = dp.get_sorted_column_values(df_display["Тип"])
+all_types: list[str] = dataset.type_options
 selected_types: list[str] = st.sidebar.multiselect(
     "Тип укриття", all_types, default=all_types
 )
@@ -78,6 +96,80 @@ max_capacity: int = st.sidebar.slider("Місткість бомбосховищ
 
 accessible_only: bool = st.sidebar.checkbox("Безбар'єрність")
 
+
+def query_coordinate(name: str) -> float | None:
+    """Return a ``?lat=``/``?lon=`` query parameter as a float, if valid."""
+    try:
+        return float(st.query_params[name])
+    except (KeyError, ValueError):
+        return None
+
+
+# Nearest-shelter mode: the point comes from the inputs or from the map
+# (a click or the browser location sets ?lat=&lon=)
+st.sidebar.subheader("Найближчі укриття")
+query_lat, query_lon = query_coordinate("lat"), query_coordinate("lon")
+nearest_mode: bool = st.sidebar.toggle(
+    "Найближчі до точки",
+    value=query_lat is not None and query_lon is not None,
+    help="Клікніть на мапі або натисніть 📍, щоб обрати точку.",
+)
+nearest_point: tuple[float, float] | None = None
+if nearest_mode:
+    point_lat = st.sidebar.number_input(
+        "Широта", min_value=-90.0, max_value=90.0, value=query_lat, format="%.5f"
+    )
+    point_lon = st.sidebar.number_input(
+        "Довгота", min_value=-180.0, max_value=180.0, value=query_lon, format="%.5f"
+    )
+    nearest_k: int = st.sidebar.slider("Кількість укриттів", 1, 20, 5)
+    if point_lat is not None and point_lon is not None:
+        nearest_point = (point_lat, point_lon)
+        st.query_params.update(lat=f"{point_lat:.5f}", lon=f"{point_lon:.5f}")
+else:
+    st.query_params.pop("lat", None)
+    st.query_params.pop("lon", None)
+
+refresh_status = dp.get_refresh_status()
+if refresh_status.last_success is not None:
+    updated_at = time.strftime("%d.%m.%Y %H:%M", time.localtime(refresh_status.last_success))
+    st.sidebar.caption(
+        f"Дані перевірено: {updated_at} ({refresh_status.last_duration:.1f} с)"
+    )
+if refresh_status.last_error is not None:
+    st.sidebar.caption("Останнє оновлення не вдалося, показано збережену версію.")
+
+# Shelters added/removed/changed by the last upstream publication
+diff = dataset.diff
+if diff is not None and not diff.is_empty:
+    DIFF_COLUMNS = ["ОТГ", "Населений пункт", "Назва", "Адреса"]
+    with st.sidebar.expander(
+        f"Зміни в реєстрі: +{len(diff.added)} / −{len(diff.removed)} / ~{len(diff.changed)}"
+    ):
+        for label, rows in (
+            ("Додані", dataset.rows(diff.added)[DIFF_COLUMNS]),
+            ("Змінені", dataset.rows(diff.changed)[DIFF_COLUMNS]),
+            ("Видалені", diff.removed.set_axis(DIFF_COLUMNS, axis=1)),
+        ):
+            if len(rows):
+                st.caption(label)
+                st.dataframe(rows, hide_index=True)
+
+# Coordinate problems found by the geo-validation stage of cleaning
+quality = geo_validation.report(dataset.cleaned)
+if quality.any():
+    with st.sidebar.expander(f"Якість координат: {int(quality.sum())} зауважень"):
+        st.dataframe(quality[quality > 0], width="stretch")
+
+filters = dict(
+    city_name=selected_city,
+    otg_name=selected_otg,
+    shelter_type=selected_types,
+    max_capacity=max_capacity,
+    accessible_only=accessible_only,
+)
+
+section.stop()
 dp.logger.info("Main-search: Finish initializing st.sidebar for filter and search")
 
 # ---------------------------------------------------------------------------
@@ -85,79 +177,51 @@ dp.logger.info("Main-search: Finish initializing st.sidebar for filter and searc
 # ---------------------------------------------------------------------------
 
 dp.logger.info("Main-map: Initialize leafmap.folium map")
+section = instrumentation.stage("page.map").start()
 
 st.subheader("Мапа")
-min_lon, max_lon = 22.0, 24.8
-min_lat, max_lat = 47.8, 49.1
-map = leafmap.Map(
-    center=[48.63176, 24],
-    zoom=8,
-    min_zoom=8,
-    max_bounds=True,
-    min_lat=min_lat,
-    max_lat=max_lat,
-    min_lon=min_lon,
-    max_lon=max_lon,
-)
-map.add_basemap("HYBRID")
-#map.add_basemap("Stadia.StamenTerrainLines")
-#map.add_basemap("Stadia.StamenTerrainLabels")
-
 
+# Positions into the shared display frame; no filtered copy is made
+if nearest_point is not None:
+    visible_positions, distances = dataset.nearest(*nearest_point, nearest_k, **filters)
+else:
+    visible_positions = dataset.positions(**filters)
+dp.logger.info("Main-map:  Data loading for dots and popups")
 
-df_filtered = dp.search_data(
+# The base map is cached per dataset version; filters and viewport changes
+# only send the clusters and shelters in view to the map already in the
+# browser.
+map_layers.show_shelter_map(
     df_display,
-    city_name=selected_city,
-    otg_name=selected_otg,
-    shelter_type=selected_types,
-    max_capacity=max_capacity,
-    accessible_only=accessible_only,
+    visible_positions,
+    point=nearest_point,
+    pick=nearest_mode,
+    pyramid=dataset.clusters,
 )
-df_filtered = df_filtered.copy()
-df_filtered["ID"] = df_filtered.index
-
-dp.logger.info("Main-map:  Data loading for dots and popups")
 
-marker_cluster = MarkerCluster(name="").add_to(map)
-for _, row in df_filtered.iterrows():
-
-    popup_html = f"""
-    <div style="font-family:sans-serif; font-size:14px; min-width: 200px;">
-    <b>ID: </b>{row['ID']}<br>
-    <b>Назва: </b>{row['Назва']}<br>
-    <b>ОТГ: </b>{row['ОТГ']}<br>
-    <b>Населений пункт: </b>{row['Населений пункт']}<br>
-    <b>Адреса: </b>{row['Адреса']}<br>
-    <b>Тип: </b>{row['Тип']}<br>
-    <b>Місткість: </b>{row['Місткість']}<br>
-    <b>Інклюзивність: </b>{row['Інклюзивність']}<br>
-    <a href="{row['Посилання']}" target="_blank">Відкрити в Google Maps</a>
-    </div>
-    """
-
-    folium.Marker(
-        location=[row["latitude"], row["longitude"]],
-        popup=folium.Popup(popup_html, max_width=300),
-        tooltip=str(row["Назва"]),  # Shows name when hovering over the marker
-    ).add_to(marker_cluster)
-
-map.to_streamlit()
+if nearest_point is not None:
+    nearest_rows = dataset.rows(visible_positions)[
+        ["Назва", "Населений пункт", "Адреса", "Тип", "Місткість", "Інклюзивність"]
+    ].assign(**{"Відстань, км": (distances / 1000).round(2)})
+    if len(nearest_rows):
+        st.dataframe(nearest_rows, hide_index=True, width="stretch")
+    else:
+        st.info("Немає укриттів, що відповідають фільтрам.")
 
+section.stop()
 dp.logger.info("Main-map: Finish display leafmap.folium map")
 
 # ---------------------------------------------------------------------------
 # KPI card
 # ---------------------------------------------------------------------------
 
-shelter_count: int = len(df_filtered)
-total_capacity: int = int(df_filtered["Місткість"].sum())
+# KPIs and charts are sums over the pre-aggregated cells of the dataset,
+# so their cost does not grow with the number of shelters.
+section = instrumentation.stage("page.analytics").start()
+cube = dataset.cube
+filtered_cells = cube.cells(**filters)
 
-if shelter_count > 0:
-    accessibility_pct = (
-        df_filtered["Інклюзивність"].value_counts(normalize=True).get("Так", 0) * 100
-    )
-else:
-    accessibility_pct = 0.0
+shelter_count, total_capacity, accessibility_pct = aggregates.summary(filtered_cells)
 
 kd.display_kpi_card(
     title="Аналітичні дані",
@@ -175,7 +239,11 @@ BAR_PALETTE = ["#53a664", "#255c54"]
 CAPACITY_COL = "Місткість"
 
 with col_left:
-    type_capacity = df_filtered.groupby("Тип")[CAPACITY_COL].sum().to_frame()
+    type_capacity = (
+        aggregates.capacity_by(filtered_cells, "Тип")
+        .sort_index(key=dp.ukr_sort_keys)
+        .to_frame()
+    )
     kd.display_pie_chart(
         type_capacity,
         color_palette=PIE_PALETTE,
@@ -189,24 +257,97 @@ with col_right:
     if selected_otg != " ":
         target_otg = selected_otg
     elif selected_city != " ":
-        match = df_display.loc[df_display["Населений пункт"] == selected_city, "ОТГ"]
-        target_otg = match.iloc[0] if not match.empty else None
+        target_otg = cube.first_otg(selected_city)
 
     if target_otg:
-        df_chart_source = df_display[df_display["ОТГ"] == target_otg]
+        chart_cells = cube.cells(otg_name=target_otg)
         bar_title = f"Топ-5: {target_otg} громада<br><sup>Рейтинг населених пунктів за місткістю бомбосховищ</sup>"
         top_n = 5
     else:
-        df_chart_source = df_display
+        chart_cells = cube.cells()
         bar_title = "Топ-10: Закарпатська обл.<br><sup>Рейтинг населених пунктів за місткістю бомбосховищ</sup>"
         top_n = 10
 
     city_capacity = (
-        df_chart_source.groupby("Населений пункт")[CAPACITY_COL]
-        .sum()
+        aggregates.capacity_by(chart_cells, "Населений пункт")
         .sort_values(ascending=True)
         .tail(top_n)
     )
     kd.display_bar_chart(
         city_capacity, title=bar_title, color=CAPACITY_COL, color_palette=BAR_PALETTE
     )
+section.stop()
+
+# ---------------------------------------------------------------------------
+# Coverage
+# ---------------------------------------------------------------------------
+
+dp.logger.info("Main-coverage: Display capacity coverage")
+section = instrumentation.stage("page.coverage").start()
+
+st.subheader("Покриття місткістю")
+st.caption(
+    "Скільки місць в укриттях (з урахуванням фільтрів) доступно пішки "
+    "в межах радіуса від кожної точки області."
+)
+coverage_radius: int = st.select_slider(
+    "Радіус пішої доступності, м",
+    options=list(config.COVERAGE_RADII_M),
+    value=config.COVERAGE_RADII_M[1],
+)
+# Memoised per filter combination and radius on the shared coverage grid
+coverage_positions = dataset.positions(**filters)
+map_layers.show_coverage_map(
+    dataset.coverage, coverage_positions, coverage_radius, dataset.version
+)
+st.dataframe(
+    dataset.coverage.rollup(coverage_radius, coverage_positions),
+    hide_index=True,
+    width="stretch",
+)
+
+section.stop()
+dp.logger.info("Main-coverage: Finish display capacity coverage")
+
+# ---------------------------------------------------------------------------
+# Export
+# ---------------------------------------------------------------------------
+
+dp.logger.info("Main-export: Display export")
+section = instrumentation.stage("page.export").start()
+
+st.subheader("Експорт даних")
+export_format: str = st.selectbox(
+    "Формат", list(exports.FORMATS), format_func=lambda fmt: exports.FORMATS[fmt].label
+)
+export_filtered: bool = st.toggle(
+    "Лише укриття, що відповідають фільтрам",
+    value=len(coverage_positions) < len(df_display),
+)
+export_positions = coverage_positions if export_filtered else None
+
+
+def export_data() -> bytes:
+    """Return the export file; the full dataset's is pre-built per version."""
+    with exports.open_export(dataset, export_format, export_positions) as f:
+        return f.read()
+
+
+# Generated on click, off the script run
+st.download_button(
+    "Завантажити",
+    data=export_data,
+    file_name=exports.file_name(dataset, export_format, filtered=export_filtered),
+    mime=exports.FORMATS[export_format].mime,
+    on_click="ignore",
+)
+
+section.stop()
+dp.logger.info("Main-export: Finish display export")
+
+diagnostics.end_run(profile_capture)
+page_span.stop()
+
+# Hidden diagnostics view (?diagnostics)
+if diagnostics.requested():
+    diagnostics.show_diagnostics()
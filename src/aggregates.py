@@ -0,0 +1,182 @@
+"""
+aggregates.py
+
+Pre-aggregated shelter statistics for the KPI card and the charts.
+
+The display DataFrame is collapsed once per dataset version into a cube
+of cells, one per distinct ``(ОТГ, Населений пункт, Тип, Інклюзивність)``
+combination, holding the shelter count and capacity sum. The capacities
+inside each cell are also kept sorted with prefix sums, so the
+``Місткість`` slider is answered with one ``searchsorted`` per cell.
+
+Every sidebar filter maps onto a cell selection; KPIs and chart series
+are sums over the selected cells and their cost depends on the number of
+cells, not on the number of shelters.
+"""
+
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+
+DIMENSIONS: list[str] = ["ОТГ", "Населений пункт", "Тип", "Інклюзивність"]
+COUNT_COL = "Кількість"
+CAPACITY_COL = "Місткість"
+ACCESSIBLE = "Так"
+
+
+def _codes(s: pd.Series) -> tuple[np.ndarray, pd.Index]:
+    codes, uniques = pd.factorize(s)
+    return codes, pd.Index(np.asarray(uniques, dtype=object))
+
+
+class ShelterCube:
+    """Cell aggregates of one display DataFrame.
+
+    Args:
+        df: Display-ready DataFrame (``get_extended_data`` output).
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self.size = len(df)
+        self.labels = df.index
+        dim_codes = []
+        self._values: dict[str, pd.Index] = {}
+        for column in DIMENSIONS:
+            codes, uniques = _codes(df[column])
+            dim_codes.append(codes)
+            self._values[column] = uniques
+
+        # Combine the per-dimension codes (-1 = missing) into one cell code
+        key = np.zeros(self.size, dtype=np.int64)
+        for codes, column in zip(dim_codes, DIMENSIONS):
+            key = key * (len(self._values[column]) + 1) + (codes + 1)
+        cell_key, first_row, cell = np.unique(key, return_index=True, return_inverse=True)
+        n_cells = len(cell_key)
+
+        # Per-cell dimension codes, taken from the first row of each cell
+        self._cell_codes = {
+            column: codes[first_row] for codes, column in zip(dim_codes, DIMENSIONS)
+        }
+        self._first_row = first_row
+
+        capacity = df[CAPACITY_COL].to_numpy(dtype=float, na_value=np.nan)
+        self._count = np.bincount(cell, minlength=n_cells)
+        known = ~np.isnan(capacity)
+        self._capacity = np.bincount(cell[known], capacity[known], minlength=n_cells)
+
+        # Capacities sorted within each cell: rank them among the distinct
+        # capacities so (cell, rank) forms one exact, sortable integer key.
+        self._cap_values = np.unique(capacity[known])
+        rank = np.searchsorted(self._cap_values, capacity[known])
+        self._stride = len(self._cap_values) + 1
+        sort_key = cell[known].astype(np.int64) * self._stride + rank
+        order = np.argsort(sort_key, kind="stable")
+        self._sorted_key = sort_key[order]
+        self._prefix = np.concatenate(([0.0], np.cumsum(capacity[known][order])))
+        self._cell_start = np.searchsorted(
+            self._sorted_key, np.arange(n_cells, dtype=np.int64) * self._stride
+        )
+
+    @property
+    def n_cells(self) -> int:
+        return len(self._count)
+
+    def matches(self, df: pd.DataFrame) -> bool:
+        """Return ``True`` if the cube was built for the rows of *df*."""
+        return len(df) == self.size and df.index.equals(self.labels)
+
+    def _code(self, column: str, value: object) -> int | None:
+        """Return the cell code of *value* in *column* or ``None`` if absent."""
+        uniques = self._values[column]
+        return int(uniques.get_loc(value)) if value in uniques else None
+
+    def _select(
+        self,
+        city_name: str | None,
+        otg_name: str | None,
+        shelter_type: list[str] | None,
+        accessible_only: bool | None,
+    ) -> np.ndarray:
+        mask = np.ones(self.n_cells, dtype=bool)
+        for column, value in (("Населений пункт", city_name), ("ОТГ", otg_name)):
+            if value not in (None, " "):
+                code = self._code(column, value)
+                mask &= self._cell_codes[column] == (-2 if code is None else code)
+        if shelter_type:
+            codes = [self._code("Тип", t) for t in shelter_type]
+            mask &= np.isin(self._cell_codes["Тип"], [c for c in codes if c is not None])
+        if accessible_only:
+            code = self._code("Інклюзивність", ACCESSIBLE)
+            mask &= self._cell_codes["Інклюзивність"] == (-2 if code is None else code)
+        return np.flatnonzero(mask)
+
+    def cells(
+        self,
+        city_name: str | None = None,
+        otg_name: str | None = None,
+        shelter_type: list[str] | None = None,
+        max_capacity: int | None = None,
+        accessible_only: bool | None = None,
+    ) -> pd.DataFrame:
+        """Return the non-empty cells matching the sidebar filters.
+
+        Arguments follow ``data_processing.search_data``. Summing the
+        ``Кількість``/``Місткість`` columns of the result, in total or per
+        dimension, equals aggregating the filtered rows.
+
+        Returns:
+            One row per cell with the ``DIMENSIONS`` columns, ``Кількість``
+            and ``Місткість``.
+        """
+        selected = self._select(city_name, otg_name, shelter_type, accessible_only)
+        if max_capacity:
+            rank = np.searchsorted(self._cap_values, max_capacity, side="right")
+            start = self._cell_start[selected]
+            end = np.searchsorted(
+                self._sorted_key, selected.astype(np.int64) * self._stride + rank
+            )
+            count = end - start
+            capacity = self._prefix[end] - self._prefix[start]
+        else:
+            count = self._count[selected]
+            capacity = self._capacity[selected]
+
+        non_empty = count > 0
+        selected = selected[non_empty]
+        data = {
+            column: self._values[column].take(self._cell_codes[column][selected])
+            .where(self._cell_codes[column][selected] >= 0)
+            for column in DIMENSIONS
+        }
+        data[COUNT_COL] = count[non_empty]
+        data[CAPACITY_COL] = capacity[non_empty]
+        return pd.DataFrame(data, index=pd.Index(self._first_row[selected], name="row"))
+
+    def first_otg(self, city_name: str) -> str | None:
+        """Return the OTG of the first shelter in *city_name*, if any."""
+        code = self._code("Населений пункт", city_name)
+        if code is None:
+            return None
+        cells = np.flatnonzero(self._cell_codes["Населений пункт"] == code)
+        first = cells[np.argmin(self._first_row[cells])]
+        otg_code = self._cell_codes["ОТГ"][first]
+        return self._values["ОТГ"][otg_code] if otg_code >= 0 else None
+
+
+def summary(cells: pd.DataFrame) -> tuple[int, int, float]:
+    """Return ``(shelter count, total capacity, accessible %)`` of *cells*."""
+    count = int(cells[COUNT_COL].sum())
+    capacity = int(cells[CAPACITY_COL].sum())
+    if count == 0:
+        return 0, capacity, 0.0
+    accessible = cells.loc[cells["Інклюзивність"] == ACCESSIBLE, COUNT_COL].sum()
+    return count, capacity, accessible / count * 100
+
+
+def capacity_by(cells: pd.DataFrame, column: str) -> pd.Series:
+    """Return the capacity sum per value of *column*, sorted by value.
+
+    Matches ``filtered.groupby(column)["Місткість"].sum()``.
+    """
+    return cells.groupby(column)[CAPACITY_COL].sum()
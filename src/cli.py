@@ -0,0 +1,179 @@
+"""
+cli.py
+
+Headless pipeline commands, for cron jobs and container start-up
+scripts: fetch the upstream snapshot, clean it, build the dataset and
+the full-dataset exports, and print statistics, without Streamlit.
+
+Every stage writes to the same local stores the web app reads
+(``config.SNAPSHOT_DIR`` and ``config.EXPORT_DIR``), so a store prepared
+with ``build`` serves the first page load without fetching, cleaning or
+indexing anything. Run from the repository root, like the app::
+
+    python src/cli.py fetch [--force]
+    python src/cli.py clean [--offline]
+    python src/cli.py build [--offline] [--skip-exports]
+    python src/cli.py stats
+
+``--timings`` (before the command) prints the per-stage timings of the
+run (see ``instrumentation``). The exit status is 1 if no snapshot could be fetched or loaded.
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+
+import config
+import data_processing
+import exports
+import geo_validation
+import instrumentation
+from snapshot_store import Snapshot
+
+
+def _snapshot(offline: bool) -> Snapshot | None:
+    """Return the snapshot to process, revalidated against upstream unless *offline*."""
+    if offline:
+        snapshot = data_processing.stored_snapshot()
+    else:
+        snapshot = data_processing.fetch_snapshot()
+    if snapshot is None:
+        print("No snapshot: upstream unavailable and the store is empty", file=sys.stderr)
+    return snapshot
+
+
+def _timed(label: str, start: float) -> None:
+    print(f"{label} in {time.perf_counter() - start:.1f} s")
+
+
+def fetch(args: argparse.Namespace) -> int:
+    """Revalidate the snapshot against upstream and store a changed payload."""
+    start = time.perf_counter()
+    snapshot = data_processing.fetch_snapshot(force=args.force)
+    if snapshot is None:
+        print("No snapshot: upstream unavailable and the store is empty", file=sys.stderr)
+        return 1
+    _timed(f"Snapshot {snapshot.version[:12]} ({snapshot.resource_url})", start)
+    return 0
+
+
+def clean(args: argparse.Namespace) -> int:
+    """Clean the latest snapshot and store the cleaned frame."""
+    snapshot = _snapshot(args.offline)
+    if snapshot is None:
+        return 1
+    start = time.perf_counter()
+    df = data_processing.clean_snapshot(snapshot)
+    if df is None:
+        print(f"Snapshot {snapshot.version[:12]} could not be read", file=sys.stderr)
+        return 1
+    _timed(f"Cleaned {len(df)} shelters of snapshot {snapshot.version[:12]}", start)
+    return 0
+
+
+def build(args: argparse.Namespace) -> int:
+    """Clean the latest snapshot, build its dataset and the full-dataset exports."""
+    snapshot = _snapshot(args.offline)
+    if snapshot is None:
+        return 1
+    start = time.perf_counter()
+    dataset = data_processing.build_dataset(snapshot)
+    if dataset is None:
+        print(f"Snapshot {snapshot.version[:12]} could not be read", file=sys.stderr)
+        return 1
+    _timed(f"Built dataset {dataset.version} ({len(dataset.display)} shelters)", start)
+
+    if not args.skip_exports:
+        start = time.perf_counter()
+        exports.store.prebuild(dataset)
+        _timed(f"Wrote exports to {exports.store.directory}", start)
+    return 0
+
+
+def _files(directory: str) -> list[tuple[str, int]]:
+    """Return the names and sizes of the files in *directory*, by name."""
+    if not os.path.isdir(directory):
+        return []
+    return sorted(
+        (entry.name, entry.stat().st_size) for entry in os.scandir(directory) if entry.is_file()
+    )
+
+
+def stats(args: argparse.Namespace) -> int:
+    """Print the stored dataset's version, counts, coordinate quality and files."""
+    snapshot = data_processing.stored_snapshot()
+    if snapshot is None:
+        print("The snapshot store is empty", file=sys.stderr)
+        return 1
+    dataset = data_processing.build_dataset(snapshot)
+    if dataset is None:
+        print(f"Snapshot {snapshot.version[:12]} could not be read", file=sys.stderr)
+        return 1
+
+    display = dataset.display
+    checked = time.strftime("%Y-%m-%d %H:%M", time.localtime(snapshot.checked_at))
+    print(f"Dataset:    {dataset.version}")
+    print(f"Source:     {snapshot.resource_url} (checked {checked})")
+    print(f"Shelters:   {len(display)}, capacity {int(display['Місткість'].sum())}")
+    print(f"Located:    {int(display['latitude'].notna().sum())}")
+    if dataset.diff is not None:
+        print(f"Changes:    {dataset.diff.summary()}")
+    for column, top in (("Джерело", None), ("Тип", None), ("ОТГ", args.top)):
+        if column not in display:
+            continue  # "Джерело" (source) is only in a merged dataset
+        counts = display[column].value_counts()
+        print(f"\n{column}:")
+        print(counts.head(top).to_string(header=False))
+
+    print("\nЯкість координат:")
+    print(geo_validation.report(dataset.cleaned).to_string(header=False))
+
+    for directory in (config.SNAPSHOT_DIR, config.EXPORT_DIR):
+        print(f"\n{directory}:")
+        for name, size in _files(directory):
+            print(f"{size / (1 << 20):>10.1f} MiB  {name}")
+    return 0
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument(
+        "--timings", action="store_true", help="print the per-stage timings of the run"
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    command = commands.add_parser("fetch", help=fetch.__doc__)
+    command.add_argument(
+        "--force", action="store_true", help="revalidate even if the snapshot is fresh"
+    )
+    command.set_defaults(run=fetch)
+
+    for run in (clean, build):
+        command = commands.add_parser(run.__name__, help=run.__doc__)
+        command.add_argument(
+            "--offline", action="store_true", help="use the stored snapshot, do not fetch"
+        )
+        command.set_defaults(run=run)
+    command.add_argument(
+        "--skip-exports", action="store_true", help="do not write the export files"
+    )
+
+    command = commands.add_parser("stats", help=stats.__doc__)
+    command.add_argument(
+        "--top", type=int, default=10, help="number of OTGs listed (default: 10)"
+    )
+    command.set_defaults(run=stats)
+
+    args = parser.parse_args(argv)
+    status = args.run(args)
+    if args.timings:
+        print()
+        print(instrumentation.registry.summary().to_string(index=False))
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,157 @@
+"""
+cluster_pyramid.py
+
+Server-side, per-zoom clustering of the shelters for the map.
+
+Shelters are projected to Web Mercator once per dataset version and
+assigned, for every zoom level from ``min_zoom`` to ``max_zoom``, to a
+grid cell of ``cell_px`` screen pixels. The grids are aligned powers of
+two, so each cell splits into four at the next zoom and clusters nest
+like supercluster's. The positions are pre-sorted by cell for every
+level, which makes aggregating any filtered subset one linear pass per
+level: no sorting or hashing at query time.
+
+A level is returned column-wise (centroid, shelter count and capacity
+sum per cluster, row positions of the shelters alone in their cell) and
+can be cut to a viewport, so the map only receives the clusters it
+draws; past ``max_zoom`` it receives the individual shelters in view
+(:meth:`ClusterPyramid.located`).
+"""
+
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+
+TILE_SIZE = 256
+
+# (south, west, north, east) in degrees
+Bounds = tuple[float, float, float, float]
+
+
+def mercator(lat: np.ndarray, lon: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Return Web Mercator ``(x, y)`` in ``[0, 1)`` for degrees *lat*/*lon*."""
+    x = (lon + 180.0) / 360.0
+    sin = np.sin(np.radians(np.clip(lat, -85.0511, 85.0511)))
+    y = 0.5 - np.log((1 + sin) / (1 - sin)) / (4 * np.pi)
+    return x, y
+
+
+class ClusterPyramid:
+    """Grid clusters of one display DataFrame for every zoom level.
+
+    Args:
+        df: Display DataFrame with ``latitude``, ``longitude`` and
+            ``Місткість`` columns.
+        min_zoom: Lowest zoom level of the map.
+        max_zoom: Highest zoom level that is clustered; beyond it the
+            map shows individual shelters.
+        cell_px: Cluster cell size in screen pixels (a power of two).
+    """
+
+    def __init__(
+        self,
+        df: pd.DataFrame,
+        min_zoom: int = 8,
+        max_zoom: int = 14,
+        cell_px: int = 64,
+    ):
+        self.size = len(df)
+        self.labels = df.index
+        self.min_zoom = min_zoom
+        self.max_zoom = max_zoom
+        lat = df["latitude"].to_numpy(dtype=float, na_value=np.nan)
+        lon = df["longitude"].to_numpy(dtype=float, na_value=np.nan)
+        located = np.flatnonzero(~np.isnan(lat) & ~np.isnan(lon))
+        self._lat, self._lon = lat, lon
+        self._located = located
+        capacity = df["Місткість"].to_numpy(dtype=float, na_value=np.nan)
+        self._capacity = np.nan_to_num(capacity)
+
+        x, y = mercator(lat[located], lon[located])
+        self._order: dict[int, np.ndarray] = {}
+        self._keys: dict[int, np.ndarray] = {}
+        for zoom in range(min_zoom, max_zoom + 1):
+            cells = (TILE_SIZE << zoom) // cell_px
+            key = (
+                np.minimum(y * cells, cells - 1).astype(np.int64) * cells
+                + np.minimum(x * cells, cells - 1).astype(np.int64)
+            )
+            order = np.argsort(key, kind="stable")
+            self._order[zoom] = located[order]
+            self._keys[zoom] = key[order]
+
+    def matches(self, df: pd.DataFrame) -> bool:
+        """Return ``True`` if the pyramid was built for the rows of *df*."""
+        return len(df) == self.size and df.index.equals(self.labels)
+
+    def clusters(
+        self,
+        zoom: int,
+        positions: np.ndarray | None = None,
+        bounds: Bounds | None = None,
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Return the clusters of one zoom level as arrays.
+
+        Args:
+            zoom: Zoom level, clamped to ``min_zoom``..``max_zoom``.
+            positions: Row positions to cluster; ``None`` clusters all.
+            bounds: ``(south, west, north, east)`` of the viewport; only
+                clusters whose centroid and single shelters that lie
+                inside are returned. ``None`` returns the whole level.
+
+        Returns:
+            ``(lat, lon, count, capacity, single)``: centroid, shelter
+            count and capacity sum of the clusters with two or more
+            shelters, and the row positions of the shelters alone in
+            their cell.
+        """
+        zoom = min(max(zoom, self.min_zoom), self.max_zoom)
+        order, key = self._order[zoom], self._keys[zoom]
+        if positions is not None:
+            allowed = np.zeros(self.size, dtype=bool)
+            allowed[positions] = True
+            keep = allowed[order]
+            order, key = order[keep], key[keep]
+
+        if not len(order):
+            empty = np.empty(0)
+            return empty, empty, empty.astype(np.int64), empty, order
+
+        starts = np.flatnonzero(np.r_[True, key[1:] != key[:-1]])
+        count = np.diff(np.r_[starts, len(order)])
+        multi = count > 1
+        n = count[multi]
+        lat = np.add.reduceat(self._lat[order], starts)[multi] / n
+        lon = np.add.reduceat(self._lon[order], starts)[multi] / n
+        capacity = np.add.reduceat(self._capacity[order], starts)[multi]
+        single = order[starts[~multi]]
+        if bounds is not None:
+            inside = _inside(lat, lon, bounds)
+            lat, lon = lat[inside], lon[inside]
+            n, capacity = n[inside], capacity[inside]
+            single = single[_inside(self._lat[single], self._lon[single], bounds)]
+        return lat, lon, n, capacity, single
+
+    def located(
+        self, bounds: Bounds | None = None, positions: np.ndarray | None = None
+    ) -> np.ndarray:
+        """Return the row positions of the shelters inside *bounds*.
+
+        Args:
+            bounds: ``(south, west, north, east)``; ``None`` for anywhere.
+            positions: Row positions to choose from; ``None`` for all.
+        """
+        located = self._located
+        if positions is not None:
+            allowed = np.zeros(self.size, dtype=bool)
+            allowed[positions] = True
+            located = located[allowed[located]]
+        if bounds is not None:
+            located = located[_inside(self._lat[located], self._lon[located], bounds)]
+        return located
+
+
+def _inside(lat: np.ndarray, lon: np.ndarray, bounds: Bounds) -> np.ndarray:
+    south, west, north, east = bounds
+    return (lat >= south) & (lat <= north) & (lon >= west) & (lon <= east)
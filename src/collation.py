@@ -0,0 +1,108 @@
+"""
+collation.py
+
+Ukrainian alphabetical collation.
+
+Every string is translated once into a compact sort key whose plain
+code-point order is the Ukrainian alphabetical order, so sorting uses
+the C-level string comparison instead of a Python comparator.
+
+Key layout (one key character per source character):
+
+* letters of ``_UKR_ALPHABET`` (either case) sort by alphabet position,
+  so Ґ follows Г, Є follows Е and І, Ї follow И;
+* any other character (digits, spaces, punctuation, apostrophes, Latin
+  letters) becomes one shared key character that sorts after Я.
+
+This is the order of the former ``cmp_to_key`` comparator, which ranked
+every other character 999. The primary key is followed by ``"\\x00"`` and
+the original string so strings the comparator ranked equal (e.g. that
+differ only in case or punctuation) still sort deterministically.
+"""
+
+from __future__ import annotations
+
+from collections.abc import Iterable
+
+import numpy as np
+import pandas as pd
+
+# Ukrainian alphabet order for sorting
+_UKR_ALPHABET = "АБВГҐДЕЄЖЗИІЇЙКЛМНОПРСТУФХЦЧШЩЬЮЯ"
+
+_LETTER_BASE = 0x10
+_OTHER = chr(_LETTER_BASE + len(_UKR_ALPHABET))
+
+
+class _CollationTable(dict):
+    """``str.translate`` table that fills in unknown code points on demand."""
+
+    def __missing__(self, codepoint: int) -> str:
+        self[codepoint] = _OTHER
+        return _OTHER
+
+
+def _build_table() -> _CollationTable:
+    table = _CollationTable()
+    for i, char in enumerate(_UKR_ALPHABET):
+        table[ord(char)] = chr(_LETTER_BASE + i)
+        table[ord(char.lower())] = chr(_LETTER_BASE + i)
+    return table
+
+
+_UKR_TABLE = _build_table()
+
+
+def ukr_sort_key(text: str) -> str:
+    """Return the Ukrainian collation key of *text*.
+
+    Args:
+        text: A Ukrainian (or mixed) string.
+
+    Returns:
+        A string whose natural ordering is the Ukrainian alphabetical
+        ordering of *text*; usable as ``key=`` for ``sorted``.
+    """
+    return text.translate(_UKR_TABLE) + "\x00" + text
+
+
+def ukr_sort_keys(s: pd.Series) -> pd.Series:
+    """Vectorised :func:`ukr_sort_key` for a Series.
+
+    Each distinct value is translated once and the keys are broadcast
+    back through factorized codes. Missing values stay missing, so the
+    result can be passed straight to ``sort_values(key=...)`` /
+    ``sort_index(key=...)``.
+
+    Args:
+        s: Series (or Index) of strings.
+
+    Returns:
+        Series of collation keys aligned with *s*.
+    """
+    codes, uniques = pd.factorize(s)
+    keys = np.array([ukr_sort_key(str(u)) for u in uniques] + [np.nan], dtype=object)
+    index = s.index if isinstance(s, pd.Series) else None
+    return pd.Series(keys[codes], index=index, name=getattr(s, "name", None))
+
+
+def ukr_sorted(values: Iterable[str]) -> list[str]:
+    """Return *values* sorted by Ukrainian alphabet order."""
+    return sorted(values, key=ukr_sort_key)
+
+
+def ukr_categorical(s: pd.Series) -> pd.Series:
+    """Convert *s* to an ordered Categorical in Ukrainian alphabet order.
+
+    Sorting, ``groupby`` (with ``sort=True``) and comparisons on the
+    result follow the Ukrainian order without any further key function.
+
+    Args:
+        s: Series of strings.
+
+    Returns:
+        Series with an ordered ``category`` dtype.
+    """
+    categories = ukr_sorted(s.dropna().unique().tolist())
+    dtype = pd.CategoricalDtype(categories=categories, ordered=True)
+    return s.astype(dtype)
@@ -1,4 +1,140 @@
+import os
 from typing import Final
 
-URL_CARP_GOV_UA: Final = "https://data.carpathia.gov.ua/"
-ID_BOMBSHELTER: Final = "f9a3dd3a-0204-490d-b6e0-013ddecfcc4c"
+# CKAN portal and dataset; TC_CKAN_URL points the app at another portal,
+# e.g. the local stand-in (benchmarks/ckan_standin.py)
+URL_CARP_GOV_UA: Final = os.environ.get("TC_CKAN_URL", "https://data.carpathia.gov.ua/")
+ID_BOMBSHELTER: Final = os.environ.get(
+    "TC_CKAN_DATASET_ID", "f9a3dd3a-0204-490d-b6e0-013ddecfcc4c"
+)
+
+# Project root; the local data and logs live below it whatever the
+# working directory of the app, the CLI or a benchmark is
+PROJECT_DIR: Final = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+LOGGER_NAME: Final = "CKAN_App"
+LOG_FILE: Final = os.path.join(PROJECT_DIR, "logs", "log.txt")
+
+# Local snapshot store for the raw GeoJSON and the cleaned DataFrame
+SNAPSHOT_DIR: Final = os.path.join(PROJECT_DIR, "data", "snapshots")
+SNAPSHOT_MAX_AGE: Final = 3600 * 24  # 24hrs before upstream is revalidated
+SNAPSHOT_KEEP_VERSIONS: Final = 3
+
+# Streaming ingestion: download/read chunk size and rows per cleaning batch
+STREAM_CHUNK_SIZE: Final = 1 << 20
+INGEST_BATCH_SIZE: Final = 50_000
+
+# Further CKAN datasets merged with the registry above (see sources.py),
+# the most worker processes cleaning them in parallel (also capped by the
+# CPUs and the sources to clean), and the distance within which shelters
+# of two sources in the same settlement are one shelter
+SOURCES_FILE: Final = os.environ.get(
+    "TC_SOURCES_FILE",
+    os.path.join(os.path.dirname(__file__), "resources", "sources.json"),
+)
+INGEST_WORKERS: Final = int(
+    os.environ.get("TC_INGEST_WORKERS", str(min(4, os.cpu_count() or 1)))
+)
+FEDERATION_DUPLICATE_M: Final = 25.0
+
+# Seconds between background checks of the snapshot; upstream is only
+# contacted once the snapshot is older than SNAPSHOT_MAX_AGE
+REFRESH_INTERVAL: Final = int(os.environ.get("TC_REFRESH_INTERVAL", "900"))  # 15 min
+
+# HTTP client of the fetch layer: (connect, read) timeouts in seconds,
+# retries with exponential backoff (0, 1, 2, 4 s, ...) on connection
+# errors and 429/5xx answers, pooled connections per host, and threads
+# for concurrent fetches
+HTTP_TIMEOUT: Final = (
+    float(os.environ.get("TC_HTTP_CONNECT_TIMEOUT", "5")),
+    float(os.environ.get("TC_HTTP_READ_TIMEOUT", "30")),
+)
+HTTP_RETRIES: Final = int(os.environ.get("TC_HTTP_RETRIES", "4"))
+HTTP_BACKOFF_FACTOR: Final = 0.5
+HTTP_BACKOFF_MAX: Final = 30
+HTTP_POOL_SIZE: Final = 8
+HTTP_MAX_WORKERS: Final = 4
+
+# requests-cache store of the CKAN API answers, reused for
+# HTTP_CACHE_EXPIRE seconds (TC_HTTP_CACHE="" disables it); the GeoJSON
+# downloads are not cached there, the snapshot store revalidates them
+HTTP_CACHE_PATH: Final = os.environ.get(
+    "TC_HTTP_CACHE", os.path.join(PROJECT_DIR, "data", "http_cache.sqlite")
+)
+HTTP_CACHE_EXPIRE: Final = 60
+
+# Correction dictionaries for the cleaning pipeline (hot-reloaded on change)
+CORRECTIONS_FILE: Final = os.environ.get(
+    "TC_CORRECTIONS_FILE",
+    os.path.join(os.path.dirname(__file__), "resources", "corrections.json"),
+)
+
+# Canonical settlement names and fuzzy snapping of ``properties.City``.
+# Snapping is off (only the match score is recorded) until GAZETTEER_FILE
+# lists every settlement of the KATOTTG codifier: the bundled file is a
+# seed, and a settlement missing from it would be snapped onto another
+# one of its community. TC_GAZETTEER_SNAP=1 turns it on.
+GAZETTEER_FILE: Final = os.path.join(
+    os.path.dirname(__file__), "resources", "gazetteer.csv"
+)
+GAZETTEER_SNAP: Final = os.environ.get("TC_GAZETTEER_SNAP", "0") == "1"
+GAZETTEER_CACHE_FILE: Final = os.environ.get(
+    "TC_GAZETTEER_CACHE_FILE",
+    os.path.join(PROJECT_DIR, "data", "gazetteer_cache.json"),
+)
+GAZETTEER_MIN_SCORE: Final = 0.8
+
+# Shelter layer rendering: "clustered" (cached map, server-side clusters,
+# markers drawn per viewport), "fast" (cached map, client-side markers and
+# filtering) or "markers" (one server-rendered folium.Marker per shelter)
+MAP_RENDER_MODE: Final = os.environ.get("TC_MAP_RENDER_MODE", "clustered")
+
+# Map extent of Zakarpattia: (min lon, min lat, max lon, max lat), and
+# the initial map center (lat, lon); shelters outside MAP_BOUNDS are
+# treated as invalid coordinates
+MAP_BOUNDS: Final = (22.0, 47.8, 24.8, 49.1)
+MAP_CENTER: Final = (48.63176, 24.0)
+
+# Zoom levels clustered on the server and the cluster cell size in pixels;
+# above MAP_CLUSTER_MAX_ZOOM the map shows individual shelters
+MAP_MIN_ZOOM: Final = 8
+MAP_CLUSTER_MAX_ZOOM: Final = 14
+MAP_CLUSTER_CELL_PX: Final = 64
+
+# Coverage heatmap: grid cell edge in metres and the walking radii offered
+COVERAGE_CELL_M: Final = 250
+COVERAGE_RADII_M: Final = (500, 1000, 2000)
+
+# Coordinate validation: optional community boundaries (GeoJSON polygons
+# with "otg" and "rajon" properties), and without them the distance from
+# the community's median point beyond which a shelter is flagged:
+# max(GEO_OUTLIER_MIN_KM, GEO_OUTLIER_SCALE × the community's median
+# distance), for communities of at least GEO_OUTLIER_MIN_GROUP shelters
+BOUNDARIES_FILE: Final = os.path.join(
+    os.path.dirname(__file__), "resources", "boundaries.geojson"
+)
+GEO_OUTLIER_MIN_KM: Final = 15.0
+GEO_OUTLIER_SCALE: Final = 5.0
+GEO_OUTLIER_MIN_GROUP: Final = 5
+# Shelters closer than this to an earlier one are flagged as duplicates
+GEO_DUPLICATE_M: Final = 5.0
+
+# Exports: rows per encoded chunk, the per-version cache of the full
+# dataset, and the highest vector tile zoom (one level of unclustered
+# shelters above the map's cluster pyramid)
+EXPORT_DIR: Final = os.path.join(PROJECT_DIR, "data", "exports")
+EXPORT_CHUNK_ROWS: Final = 10_000
+EXPORT_TILE_MAX_ZOOM: Final = MAP_CLUSTER_MAX_ZOOM + 1
+
+# Instrumentation: per-stage timers of the pipeline and page (TC_METRICS=0
+# turns them into no-ops), the port of the Prometheus text endpoint (unset:
+# no endpoint), histogram bucket bounds, and the rows of a profile capture
+METRICS_ENABLED: Final = os.environ.get("TC_METRICS", "1") != "0"
+METRICS_PORT: Final = (
+    int(os.environ["TC_METRICS_PORT"]) if os.environ.get("TC_METRICS_PORT") else None
+)
+METRICS_SECONDS_BUCKETS: Final = (
+    0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0
+)
+METRICS_BYTES_BUCKETS: Final = tuple(1 << shift for shift in range(10, 31, 4))
+PROFILE_TOP: Final = 30
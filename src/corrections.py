@@ -0,0 +1,172 @@
+"""
+corrections.py
+
+Data-file driven correction dictionaries for the ``_clean_*`` normalisers.
+
+The tables live in ``config.CORRECTIONS_FILE`` (JSON) instead of code, so
+new typos from the portal can be fixed by editing that file: it is
+re-read whenever its modification time changes, without restarting the
+Streamlit server.
+
+Each table is compiled into a :class:`CorrectionTable`: an exact hash map
+plus, for tables listed under ``"fuzzy"``, a second map keyed by a
+spelling-folded form that also catches near-miss variants such as
+"Горинчево" / "Горінчево".
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+from collections.abc import Mapping
+
+import config
+from normalizer import Rule
+
+logger = logging.getLogger(config.LOGGER_NAME)
+
+# Letters that are routinely confused in the source data fold together
+_FOLD_TABLE = str.maketrans(
+    {
+        "і": "и",
+        "ї": "и",
+        "є": "е",
+        "ґ": "г",
+        "ь": None,
+        "'": None,
+        "’": None,
+        "ʼ": None,
+        "`": None,
+    }
+)
+_RE_FOLD_SPACES = re.compile(r"\s*-\s*|\s+")
+
+
+def fold(text: str) -> str:
+    """Return the spelling-folded form of *text* used for near-miss matching."""
+    folded = text.lower().translate(_FOLD_TABLE)
+    return _RE_FOLD_SPACES.sub(lambda m: "-" if "-" in m.group() else " ", folded).strip()
+
+
+class CorrectionTable:
+    """Compiled lookup for one correction dictionary.
+
+    Args:
+        name: Table name in the rules file.
+        mapping: Raw value -> corrected value.
+        fuzzy: Also match values whose folded spelling equals a key's.
+    """
+
+    def __init__(self, name: str, mapping: Mapping[str, str], fuzzy: bool = False):
+        self.name = name
+        self.exact: dict[str, str] = dict(mapping)
+        self.folded: dict[str, str] = {}
+        if fuzzy:
+            ambiguous: set[str] = set()
+            for raw, corrected in self.exact.items():
+                key = fold(raw)
+                if self.folded.get(key, corrected) != corrected:
+                    ambiguous.add(key)
+                self.folded[key] = corrected
+            for key in ambiguous:
+                logger.warning(
+                    f"Corrections: folded key '{key}' in table '{name}' is ambiguous; "
+                    "only exact matches are used for it."
+                )
+                del self.folded[key]
+
+    def resolve(self, text: str) -> str:
+        """Return the correction for *text*, or *text* itself if none applies."""
+        corrected = self.exact.get(text)
+        if corrected is not None:
+            return corrected
+        if self.folded:
+            return self.folded.get(fold(text), text)
+        return text
+
+
+class CorrectionRules:
+    """Hot-reloadable set of :class:`CorrectionTable` loaded from a JSON file.
+
+    Args:
+        path: Path of the rules file.
+    """
+
+    def __init__(self, path: str = config.CORRECTIONS_FILE):
+        self.path = path
+        self.version = "none"
+        self._tables: dict[str, CorrectionTable] = {}
+        self._mtime_ns: int | None = None
+        self._lock = threading.Lock()
+        self.reload_if_changed()
+
+    def table(self, name: str) -> CorrectionTable:
+        """Return the compiled table *name* (empty if the file lacks it)."""
+        table = self._tables.get(name)
+        if table is None:
+            table = CorrectionTable(name, {})
+        return table
+
+    def rule(self, name: str) -> Rule:
+        """Return a normaliser rule resolving values through table *name*.
+
+        The table is looked up on every call, so a reload takes effect
+        for rules compiled before it.
+        """
+
+        def _resolve(text: str) -> str:
+            return self.table(name).resolve(text)
+
+        return _resolve
+
+    def reload_if_changed(self) -> str:
+        """Re-read the rules file if it changed on disk.
+
+        A file that fails to parse is logged and ignored; the previously
+        loaded tables stay in use.
+
+        Returns:
+            The version token of the rules in use.
+        """
+        try:
+            mtime_ns = os.stat(self.path).st_mtime_ns
+        except OSError as exc:
+            if self._mtime_ns is None:
+                logger.error(f"Corrections: rules file is not readable: {exc}")
+                self._mtime_ns = -1
+            return self.version
+
+        if mtime_ns == self._mtime_ns:
+            return self.version
+
+        with self._lock:
+            if mtime_ns == self._mtime_ns:
+                return self.version
+            try:
+                with open(self.path, "rb") as fh:
+                    content = fh.read()
+                data = json.loads(content)
+                fuzzy = set(data.get("fuzzy", []))
+                tables = {
+                    name: CorrectionTable(name, mapping, fuzzy=name in fuzzy)
+                    for name, mapping in data["tables"].items()
+                }
+            except (OSError, ValueError, KeyError, TypeError, AttributeError) as exc:
+                logger.error(f"Corrections: keeping previous rules, reload failed: {exc}")
+                self._mtime_ns = mtime_ns
+                return self.version
+
+            self._tables = tables
+            self._mtime_ns = mtime_ns
+            self.version = (
+                f"{data.get('version', 0)}-{hashlib.sha256(content).hexdigest()[:8]}"
+            )
+            logger.info(f"Corrections: loaded rules version {self.version}.")
+        return self.version
+
+
+rules = CorrectionRules()
@@ -0,0 +1,237 @@
+"""
+coverage.py
+
+Shelter capacity coverage: how many shelter seats can be reached on foot
+from every point of the region.
+
+The map extent is divided into square cells of ``cell_m`` metres. For a
+filtered set of shelters, their capacity is rasterised onto the grid
+with one ``np.bincount`` and summed over a disk of the walking radius
+around every cell. The disk sum uses a summed-area table per grid row
+(cumulative sums along the columns): each of the ``2r + 1`` row offsets
+of the disk is one vectorised difference of two prefix sums, so the cost
+is ``O(r × cells)`` instead of ``O(r² × cells)`` for a direct
+convolution, and every step is a contiguous slice operation.
+
+Results are memoised per filter combination (the filtered positions)
+and radius with LRU eviction, like ``ShelterIndex``.
+"""
+
+from __future__ import annotations
+
+import hashlib
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from collation import ukr_sort_keys
+from spatial_index import EARTH_RADIUS_M
+
+ROLLUP_COLUMNS = [
+    "ОТГ",
+    "Укриттів",
+    "Місткість",
+    "Площа покриття, км²",
+    "Місць на км²",
+    "Медіана досяжних місць",
+]
+
+
+def positions_key(positions: np.ndarray | None) -> bytes | None:
+    """Return a compact cache key for a filtered position array."""
+    if positions is None:
+        return None
+    data = np.asarray(positions, dtype=np.intp).tobytes()
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+def disk_sum(raster: np.ndarray, radius_cells: float) -> np.ndarray:
+    """Return the sum of *raster* over a disk around every cell.
+
+    Args:
+        raster: 2-D array of values per cell.
+        radius_cells: Disk radius in cells; cells whose centre lies
+            within it are included.
+    """
+    rows, cols = raster.shape
+    reach = int(radius_cells)
+    # Zero padding keeps every window inside the array: one extra column
+    # on the left so that a prefix difference never needs index -1
+    prefix = np.cumsum(np.pad(raster, ((reach, reach), (reach + 1, reach))), axis=1)
+    out = np.zeros((rows, cols))
+    for dy in range(-reach, reach + 1):
+        half = int(np.sqrt(radius_cells**2 - dy**2))
+        source = prefix[reach + dy : reach + dy + rows]
+        out += source[:, reach + 1 + half : reach + 1 + half + cols]
+        out -= source[:, reach - half : reach - half + cols]
+    return out
+
+
+class CoverageGrid:
+    """Capacity coverage grid over a display DataFrame.
+
+    Args:
+        df: Display DataFrame with ``latitude``, ``longitude``,
+            ``Місткість`` and ``ОТГ`` columns.
+        bounds: ``(min lon, min lat, max lon, max lat)`` of the grid.
+        cell_m: Approximate cell edge length in metres.
+        cache_size: Number of (filter combination, radius) results
+            memoised.
+    """
+
+    def __init__(
+        self,
+        df: pd.DataFrame,
+        bounds: tuple[float, float, float, float],
+        cell_m: float = 250,
+        cache_size: int = 32,
+    ):
+        self.size = len(df)
+        self.labels = df.index
+        self.bounds = bounds
+        self.cell_m = cell_m
+        min_lon, min_lat, max_lon, max_lat = bounds
+        self._dlat = np.degrees(cell_m / EARTH_RADIUS_M)
+        self._dlon = self._dlat / np.cos(np.radians((min_lat + max_lat) / 2))
+        self.rows = int(np.ceil((max_lat - min_lat) / self._dlat))
+        self.cols = int(np.ceil((max_lon - min_lon) / self._dlon))
+
+        lat = df["latitude"].to_numpy(dtype=float, na_value=np.nan)
+        lon = df["longitude"].to_numpy(dtype=float, na_value=np.nan)
+        with np.errstate(invalid="ignore"):
+            # Row 0 is the northern edge, as in an image
+            row = np.floor((max_lat - lat) / self._dlat)
+            col = np.floor((lon - min_lon) / self._dlon)
+        inside = (row >= 0) & (row < self.rows) & (col >= 0) & (col < self.cols)
+        self._cell = np.where(inside, row * self.cols + col, -1).astype(np.intp)
+        capacity = df["Місткість"].to_numpy(dtype=float, na_value=np.nan)
+        self._capacity = np.nan_to_num(capacity)
+        self._otg_codes, self._otg_names = pd.factorize(df["ОТГ"])
+
+        self._cache: OrderedDict[tuple, object] = OrderedDict()
+        self._cache_size = cache_size
+
+    def matches(self, df: pd.DataFrame) -> bool:
+        """Return ``True`` if the grid was built for the rows of *df*."""
+        return len(df) == self.size and df.index.equals(self.labels)
+
+    @property
+    def cell_km2(self) -> float:
+        """Area of one grid cell in square kilometres."""
+        return (self.cell_m / 1000) ** 2
+
+    @property
+    def latlon_bounds(self) -> list[list[float]]:
+        """``[[south, west], [north, east]]`` of the grid, for Leaflet."""
+        min_lon, _min_lat, _max_lon, max_lat = self.bounds
+        south = max_lat - self.rows * self._dlat
+        east = min_lon + self.cols * self._dlon
+        return [[south, min_lon], [max_lat, east]]
+
+    def _memo(self, kind: str, radius_m: float, positions: np.ndarray | None, compute):
+        key = (kind, radius_m, positions_key(positions))
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key]
+        result = compute()
+        self._cache[key] = result
+        if len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+        return result
+
+    def _selected(self, positions: np.ndarray | None) -> np.ndarray:
+        """Return the selected positions that fall inside the grid."""
+        selected = np.arange(self.size) if positions is None else np.asarray(positions)
+        return selected[self._cell[selected] >= 0]
+
+    def capacity_raster(self, positions: np.ndarray | None = None) -> np.ndarray:
+        """Return the shelter capacity per cell (``rows × cols``)."""
+        selected = self._selected(positions)
+        return np.bincount(
+            self._cell[selected],
+            weights=self._capacity[selected],
+            minlength=self.rows * self.cols,
+        ).reshape(self.rows, self.cols)
+
+    def reachable(
+        self, radius_m: float, positions: np.ndarray | None = None
+    ) -> np.ndarray:
+        """Return the seats reachable within *radius_m* of every cell.
+
+        Args:
+            radius_m: Walking radius in metres (straight line).
+            positions: Row positions allowed by the filters; ``None``
+                allows every shelter.
+
+        Returns:
+            Read-only ``rows × cols`` array, row 0 at the northern edge.
+        """
+
+        def compute():
+            result = disk_sum(self.capacity_raster(positions), radius_m / self.cell_m)
+            result.flags.writeable = False
+            return result
+
+        return self._memo("reachable", radius_m, positions, compute)
+
+    def rollup(
+        self, radius_m: float, positions: np.ndarray | None = None
+    ) -> pd.DataFrame:
+        """Return the coverage per OTG for the allowed shelters.
+
+        A cell counts towards an OTG's covered area if one of the OTG's
+        shelters lies within *radius_m* of it (areas of neighbouring OTGs
+        may overlap). The median of reachable seats is taken over those
+        cells and includes the shelters of every OTG.
+
+        Args:
+            radius_m: Walking radius in metres.
+            positions: Row positions allowed by the filters.
+
+        Returns:
+            One row per OTG with :data:`ROLLUP_COLUMNS`, in Ukrainian
+            alphabet order. The frame is shared with the memo and must
+            not be modified.
+        """
+        return self._memo(
+            "rollup", radius_m, positions, lambda: self._rollup(radius_m, positions)
+        )
+
+    def _rollup(self, radius_m: float, positions: np.ndarray | None) -> pd.DataFrame:
+        reachable = self.reachable(radius_m, positions)
+        selected = self._selected(positions)
+        selected = selected[self._otg_codes[selected] >= 0]
+        radius_cells = radius_m / self.cell_m
+        pad = int(radius_cells)
+
+        codes = self._otg_codes[selected]
+        order = np.argsort(codes, kind="stable")
+        bounds = np.searchsorted(codes[order], np.arange(len(self._otg_names) + 1))
+        records = []
+        for code, name in enumerate(self._otg_names):
+            members = selected[order[bounds[code] : bounds[code + 1]]]
+            if not len(members):
+                continue
+            row, col = np.divmod(self._cell[members], self.cols)
+            # Only the OTG's bounding box plus the radius can be covered
+            r0, r1 = max(row.min() - pad, 0), min(row.max() + pad + 1, self.rows)
+            c0, c1 = max(col.min() - pad, 0), min(col.max() + pad + 1, self.cols)
+            window = np.zeros((r1 - r0, c1 - c0))
+            np.add.at(window, (row - r0, col - c0), 1)
+            covered = disk_sum(window, radius_cells) > 0
+            area = covered.sum() * self.cell_km2
+            capacity = self._capacity[members].sum()
+            records.append(
+                (
+                    name,
+                    len(members),
+                    int(round(capacity)),
+                    round(area, 2),
+                    round(capacity / area, 1) if area else 0.0,
+                    float(np.median(reachable[r0:r1, c0:c1][covered])),
+                )
+            )
+
+        result = pd.DataFrame.from_records(records, columns=ROLLUP_COLUMNS)
+        return result.sort_values("ОТГ", key=ukr_sort_keys, ignore_index=True)
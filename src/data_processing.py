@@ -1,18 +1,42 @@
+import functools
+import json
 import logging
+import multiprocessing
 import os
+import threading
+import time
+from collections.abc import Iterable
+from concurrent.futures import ProcessPoolExecutor
 
 import requests
 import ckanapi
 from ckanapi.errors import NotFound, CKANAPIError, NotAuthorized
 
-
-import streamlit as st
+import numpy as np
 import pandas as pd
 
 import config_regex as rx
 import config
-
-from functools import cmp_to_key
+import corrections
+import exports
+import feature_delta
+import federation
+import geo_validation
+import geojson_stream
+import http_client
+import instrumentation
+import normalizer as nz
+import sources
+from gazetteer import ResolutionCache, gazetteer
+from aggregates import ShelterCube
+from cluster_pyramid import ClusterPyramid
+from collation import ukr_sort_keys, ukr_sorted
+from coverage import CoverageGrid
+from dataset import ShelterDataset
+from refresher import DatasetRefresher, RefreshStatus, StaleData
+from shelter_index import ShelterIndex
+from snapshot_store import Snapshot, SnapshotStore, content_hash
+from spatial_index import SpatialIndex
 
 _HOMOGLYPHS: dict[str, str] = {
     "A": "А",
@@ -38,19 +62,14 @@ _HOMOGLYPHS: dict[str, str] = {
 }
 _HOMOGLYPH_TABLE = str.maketrans(_HOMOGLYPHS)
 
-# Ukrainian alphabet order for sorting
-_UKR_ALPHABET = "АБВГҐДЕЄЖЗИІЇЙКЛМНОПРСТУФХЦЧШЩЬЮЯ"
-_UKR_SORT_MAP: dict[str, int] = {c: i for i, c in enumerate(_UKR_ALPHABET)}
-
 
-@st.cache_resource
 def _setup_logger():
     """
-    Sets up a logger using st.cache_resource to prevent duplicate
-    log handlers when Streamlit reruns the script.
+    Sets up the application logger once; later calls (Streamlit reruns,
+    CLI commands) find the handlers in place and do not duplicate them.
     """
 
-    logger = logging.getLogger("CKAN_App")
+    logger = logging.getLogger(config.LOGGER_NAME)
 
     if not logger.handlers:
         logger.setLevel(logging.INFO)
@@ -58,10 +77,9 @@ def _setup_logger():
             "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
         )
 
-        log_file_path = "./logs/log.txt"
-        os.makedirs(os.path.dirname(log_file_path), exist_ok=True)
+        os.makedirs(os.path.dirname(config.LOG_FILE), exist_ok=True)
 
-        file_handler = logging.FileHandler(log_file_path)
+        file_handler = logging.FileHandler(config.LOG_FILE)
         file_handler.setFormatter(formatter)
         logger.addHandler(file_handler)
 
@@ -74,46 +92,197 @@ def _setup_logger():
 
 logger = _setup_logger()
 
+# Bump whenever the cleaning pipeline changes so stored cleaned snapshots
+# are rebuilt from their raw payload.
+_CLEAN_VERSION = "5"
+# Bump whenever ShelterDataset or one of the structures built by
+# _dataset_for changes, so stored built datasets are rebuilt.
+_BUILD_VERSION = "1"
+# Bump whenever federation.merge changes, so merged snapshots are rebuilt.
+_FEDERATION_VERSION = "1"
+_store = SnapshotStore()
+# Further sources (see sources.py) have a store each in a sub-directory of
+# config.SNAPSHOT_DIR; the merged snapshots of all sources are recorded in
+# another one
+_stores: dict[str, SnapshotStore] = {}
+_merged_store = SnapshotStore(os.path.join(config.SNAPSHOT_DIR, "merged"))
+
+
+def _store_for(source: sources.Source) -> SnapshotStore:
+    """Return the snapshot store of *source*."""
+    if source == sources.PRIMARY:
+        return _store
+    return _stores.setdefault(
+        source.id, SnapshotStore(os.path.join(config.SNAPSHOT_DIR, source.id))
+    )
+
+
+def _store_of(snapshot: Snapshot) -> SnapshotStore:
+    """Return the store holding *snapshot*: the merged or the primary store."""
+    return _merged_store if snapshot.members is not None else _store
+
+
+@instrumentation.timed("fetch.package_show")
+def _get_resource_info(
+    ua_portal: ckanapi.RemoteCKAN,
+    refresh: bool = False,
+    source: sources.Source = sources.PRIMARY,
+) -> tuple[str, str | None] | None:
+    """Look up the resource of a shelter dataset on its CKAN portal.
+
+    Args:
+        ua_portal: Client for ``source.portal``.
+        refresh: Ask the portal even if its last answer is still cached.
+        source: Dataset to look up; by default the GeoJSON resource of the
+            oblast registry.
 
-@st.cache_data(ttl=3600 * 24)  # 24hrs
-def _get_raw_api_info() -> dict | None:
-    """Fetch raw GeoJSON data from the carpathia.gov.ua.
     Returns:
-        Pased GeoJSON dictionary on success or ``None`` if request fails.
-    Raises:
-        DataFetchError: Propagated to the caller after displaying an
-            ``st.error`` notification so the Streamlit UI can react.
+        ``(resource_url, metadata_modified)`` or ``None`` if the dataset has
+        no matching resource.
+    """
+    metadata = ua_portal.call_action(
+        "package_show",
+        {"id": source.dataset},
+        requests_kwargs={"force_refresh": refresh},
+    )
+
+    for resource in metadata["resources"]:
+        if source.matches(resource):
+            resources_url = resource["url"]
+            logger.info(f"Successfully fetched {resources_url} url from CKAN.")
+            metadata_modified = resource.get("last_modified") or metadata.get(
+                "metadata_modified"
+            )
+            return resources_url, metadata_modified
+
+    logger.error(f"{source.format.upper()} resource not found in the dataset metadata.")
+    return None
+
+
+def _download(
+    url: str, headers: dict[str, str], store: SnapshotStore
+) -> tuple[requests.Response, str | None, str]:
+    """GET a resource and stage a changed body in *store*.
 
+    Returns:
+        ``(response, staged path, SHA-256 hex digest)``; the path is
+        ``None`` for a ``304`` answer to conditional *headers*.
+
+    Raises:
+        http_client.BrokenBody: The body broke off; nothing is staged.
     """
-    logger.info(f"Initiating API request to {config.URL_CARP_GOV_UA}")
-    logger.debug(f"Parameters: {config.ID_BOMBSHELTER}")
+    with http_client.session().get(url, headers=headers, stream=True) as response:
+        response.raise_for_status()
+        if headers and response.status_code == 304:
+            return response, None, ""
+        # The body is streamed to disk and hashed on the way, never held whole
+        try:
+            with instrumentation.stage("fetch.download"):
+                staged, digest = store.stage_raw(
+                    response.iter_content(chunk_size=config.STREAM_CHUNK_SIZE)
+                )
+        except requests.RequestException as exc:
+            raise http_client.BrokenBody(str(exc)) from exc
+        return response, staged, digest
+
+
+@instrumentation.timed("fetch")
+def _get_raw_api_info(
+    cached: Snapshot | None = None,
+    force: bool = False,
+    source: sources.Source = sources.PRIMARY,
+) -> Snapshot | None:
+    """Fetch raw GeoJSON data from the carpathia.gov.ua into the snapshot store.
+
+    Other sources are fetched the same way into their own store.
+
+    Upstream is revalidated against *cached*: an unchanged CKAN
+    ``metadata_modified`` skips the download entirely, and the GeoJSON
+    request is sent with ``If-None-Match`` / ``If-Modified-Since`` so an
+    unchanged resource costs a ``304`` instead of a full body. Requests
+    go through the pooled session of ``http_client``, with its timeouts
+    and retries.
 
-    try:
+    Args:
+        cached: Latest stored snapshot, if any.
+        force: Bypass the cached CKAN metadata.
+        source: Dataset to fetch.
 
-        ua_portal = ckanapi.RemoteCKAN(config.URL_CARP_GOV_UA)
-        metadata = ua_portal.action.package_show(id=config.ID_BOMBSHELTER)
+    Returns:
+        Snapshot describing the current upstream content on success or
+        ``None`` if the request fails.
+    """
+    logger.info(f"Initiating API request to {source.portal}")
+    logger.debug(f"Parameters: {source.dataset}")
+    store = _store_for(source)
 
-        resources_url: str | None = None
-        for resource in metadata["resources"]:
-            if resource["format"].lower() == "geojson":
-                resources_url = resource["url"]
-                logger.info(f"Successfully fetched {resources_url} url from CKAN.")
-                break
+    try:
 
-        if resources_url is None:
-            logger.error("GEOJSON resource not found in the dataset metadata.")
+        ua_portal = ckanapi.RemoteCKAN(source.portal, session=http_client.session())
+        resource_info = _get_resource_info(ua_portal, refresh=force, source=source)
+        if resource_info is None:
             return None
+        resources_url, metadata_modified = resource_info
+
+        if cached is not None and cached.resource_url != resources_url:
+            cached = None
+
+        if (
+            cached is not None
+            and metadata_modified is not None
+            and cached.metadata_modified == metadata_modified
+        ):
+            logger.info("Snapshot is up to date with CKAN metadata_modified.")
+            return store.mark_checked(cached)
+
+        headers = cached.conditional_headers() if cached is not None else {}
+        response, staged, digest = http_client.with_retries(
+            functools.partial(_download, resources_url, headers, store), resources_url
+        )
 
-        response = requests.get(resources_url)
-        response.raise_for_status()
+        validators = {
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "metadata_modified": metadata_modified,
+        }
+        if staged is None:
+            logger.info("GeoJSON not modified upstream (304).")
+            return store.mark_checked(cached, **validators)
+
+        if cached is not None and cached.content_hash == digest:
+            store.discard(staged)
+            logger.info("GeoJSON content hash unchanged.")
+            return store.mark_checked(cached, **validators)
+
+        if source.format == "geojson":
+            with open(staged, "rb") as fh:
+                valid = geojson_stream.has_features(geojson_stream.iter_file_chunks(fh))
+            problem = "has no 'features' collection"
+        else:
+            valid = os.path.getsize(staged) > 0
+            problem = "is empty"
+        if not valid:
+            store.discard(staged)
+            logger.error(f"{source.format.upper()} payload {problem}.")
+            return None
 
-        source: str = "CACHE" if getattr(response, "from_cache", False) else "API"
-        logger.info(f"Successfully fetched data records from {source}.")
-        return response.json()
+        origin: str = "CACHE" if getattr(response, "from_cache", False) else "API"
+        logger.info(f"Successfully fetched data records from {origin}.")
+        now = time.time()
+        return store.commit_raw(
+            Snapshot(
+                resource_url=resources_url,
+                content_hash=digest,
+                fetched_at=now,
+                checked_at=now,
+                **validators,
+            ),
+            staged,
+        )
 
     except NotFound:
         logger.error(
-            f"Dataset ID '{config.ID_BOMBSHELTER}' was not found on the portal."
+            f"Dataset ID '{source.dataset}' was not found on the portal."
         )
     except NotAuthorized:
         logger.error(
@@ -129,49 +298,669 @@ def _get_raw_api_info() -> dict | None:
     return None
 
 
-@st.cache_data
-def get_normalized_data():
+def _rules_version() -> str:
+    """Return the version of the correction rules, gazetteer and boundaries.
+
+    The rules file is checked for changes on every call (a single
+    ``stat``), so edited corrections are picked up without restarting
+    the server. The ``config.GAZETTEER_SNAP`` setting is part of the
+    version.
+    """
+    snap = "" if config.GAZETTEER_SNAP else "-scored"
+    return (
+        f"{corrections.rules.reload_if_changed()}.{gazetteer.version}{snap}"
+        f".{geo_validation.boundaries.version}"
+    )
+
+
+_refresher: DatasetRefresher | None = None
+_refresher_lock = threading.Lock()
+
+
+def _get_refresher() -> DatasetRefresher:
+    """Create and start the process-wide dataset refresher once."""
+    global _refresher
+    with _refresher_lock:
+        if _refresher is None:
+            # Exports of the full dataset are written in the background
+            _refresher = DatasetRefresher(
+                _load_dataset, on_publish=exports.store.prebuild_async
+            ).start()
+    return _refresher
+
+
+def get_dataset() -> ShelterDataset | None:
+    """
+    Return the shared dataset without waiting on the network.
+
+    The dataset is one process-wide object per version: reruns and
+    sessions only read the refresher's current dataset. Upstream is
+    revalidated by the refresher's background thread; if the correction
+    rules changed since the dataset was built, a rebuild is requested and
+    the current version keeps being served until it is ready.
+
+    Returns:
+        ShelterDataset or ``None`` if no data has been loaded yet
+    """
+    refresher = _get_refresher()
+    dataset = refresher.current()
+    if dataset is not None and dataset.rules_version != _rules_version():
+        refresher.request_refresh()
+    return dataset
+
+
+def get_refresh_status() -> RefreshStatus:
+    """Return the last-success time, duration and error of the refreshes."""
+    return _get_refresher().status
+
+
+@instrumentation.timed("dataset.load")
+def _load_dataset(
+    revalidate: bool, current: ShelterDataset | None = None
+) -> ShelterDataset | None:
+    """
+    Return the dataset for the latest snapshot and current rules.
+
+    Called by the refresher, off the request path.
+
+    Args:
+        revalidate: Revalidate a stale snapshot against upstream; with
+            ``False`` only the local snapshot store is read.
+        current: Dataset being served; returned as is if the snapshot
+            and rules are unchanged.
+
+    Returns:
+        New or unchanged dataset, or ``None`` if no data is available.
+
+    Raises:
+        StaleData: Upstream could not be revalidated; carries the dataset
+            of the last stored snapshot.
+    """
+    rules_version = _rules_version()
+    snapshot = _current_snapshot(revalidate)
+    if snapshot is None:
+        return None
+
+    dataset = _dataset_for(snapshot, rules_version, current)
+    if revalidate and dataset is not None and not snapshot.is_fresh():
+        raise StaleData(dataset, f"upstream unavailable, serving {snapshot.version}")
+    return dataset
+
+
+def fetch_snapshot(force: bool = False) -> Snapshot | None:
+    """Revalidate the snapshot against upstream and return the latest one.
+
+    Pipeline stage for ``cli.py fetch``; the web app fetches through the
+    refresher instead. With further sources configured, all of them are
+    fetched concurrently and the merged snapshot is returned.
+
+    Args:
+        force: Contact upstream even if the snapshot is still fresh.
+
+    Returns:
+        Latest stored snapshot, ``None`` if there is none and upstream
+        is unavailable.
+    """
+    if not force:
+        return _current_snapshot(revalidate=True)
+    if len(sources.registry) == 1:
+        return _fetch_source(sources.PRIMARY)
+    return _federate(
+        http_client.fetch_all(
+            functools.partial(_fetch_source, source) for source in sources.registry
+        )
+    )
+
+
+def _fetch_source(source: sources.Source) -> Snapshot | None:
+    """Revalidate *source* regardless of its age; return its latest snapshot."""
+    store = _store_for(source)
+    return _get_raw_api_info(store.latest(), force=True, source=source) or store.latest()
+
+
+def stored_snapshot() -> Snapshot | None:
+    """Return the latest stored snapshot without contacting upstream."""
+    return _current_snapshot(revalidate=False)
+
+
+def clean_snapshot(snapshot: Snapshot) -> pd.DataFrame | None:
+    """Return the cleaned frame of *snapshot*, cleaning and storing it if needed.
+
+    Pipeline stage for ``cli.py clean``; see ``_load_clean_frame``.
+    """
+    return _load_clean_frame(snapshot, _rules_version())
+
+
+def build_dataset(snapshot: Snapshot) -> ShelterDataset | None:
+    """Return the dataset of *snapshot*, building and storing it if needed.
+
+    Pipeline stage for ``cli.py build``: the stored dataset is what the
+    web app loads on start, so a prebuilt store serves the first page
+    without cleaning or indexing anything.
     """
-    Fetch, clean and normalize data from _get_raw_api_info()
+    return _dataset_for(snapshot, _rules_version(), None)
+
+
+def _dataset_for(
+    snapshot: Snapshot, rules_version: str, current: ShelterDataset | None
+) -> ShelterDataset | None:
+    """Return *current* if it matches *snapshot* and the rules, else build one."""
+    version = f"{snapshot.version}.{_CLEAN_VERSION}.{rules_version}"
+    if current is not None and current.version == version:
+        return current
+
+    build_version = f"{_CLEAN_VERSION}.{rules_version}.{_BUILD_VERSION}"
+    store = _store_of(snapshot)
+    stored = instrumentation.call(
+        "build.load_stored", store.load_dataset, snapshot, build_version
+    )
+    if isinstance(stored, ShelterDataset) and stored.version == version:
+        logger.info(f"DP-normalize: Loaded prebuilt dataset {version}")
+        return stored
+
+    df = _load_clean_frame(snapshot, rules_version)
+    if df is None:
+        return None
+
+    display = get_extended_data(df)
+    dataset = ShelterDataset.build(
+        version=dataset_version(df),
+        rules_version=rules_version,
+        cleaned=df,
+        display=display,
+        index=instrumentation.call("build.index", ShelterIndex, display),
+        cube=instrumentation.call("build.cube", ShelterCube, display),
+        spatial=instrumentation.call("build.spatial", SpatialIndex, display),
+        clusters=instrumentation.call(
+            "build.clusters",
+            ClusterPyramid,
+            display,
+            min_zoom=config.MAP_MIN_ZOOM,
+            max_zoom=config.MAP_CLUSTER_MAX_ZOOM,
+            cell_px=config.MAP_CLUSTER_CELL_PX,
+        ),
+        coverage=instrumentation.call(
+            "build.coverage",
+            CoverageGrid,
+            display,
+            config.MAP_BOUNDS,
+            config.COVERAGE_CELL_M,
+        ),
+        diff=_snapshot_diff(snapshot),
+    )
+    with instrumentation.stage("build.save_stored"):
+        store.save_dataset(snapshot, build_version, dataset)
+    logger.info(f"DP-normalize: Shared dataset {dataset.version} is ready")
+    return dataset
+
+
+def _current_snapshot(revalidate: bool = True) -> Snapshot | None:
+    """
+    Return the latest stored snapshot, refreshing it from
+    _get_raw_api_info() first when it is older than
+    ``config.SNAPSHOT_MAX_AGE`` and *revalidate* is set. If the portal is
+    unreachable the last stored snapshot is returned.
+
+    With further sources configured (see ``sources``), each source is
+    revalidated that way, concurrently, and their merged snapshot is
+    returned (see ``_federate``).
+    """
+    if len(sources.registry) == 1:
+        return _source_snapshot(sources.PRIMARY, revalidate)
+    return _federate(
+        http_client.fetch_all(
+            functools.partial(_source_snapshot, source, revalidate)
+            for source in sources.registry
+        )
+    )
+
+
+def _source_snapshot(source: sources.Source, revalidate: bool) -> Snapshot | None:
+    """Return the latest snapshot of *source* (see ``_current_snapshot``)."""
+    store = _store_for(source)
+    snapshot = store.latest()
+    if revalidate and (snapshot is None or not snapshot.is_fresh()):
+        refreshed = _get_raw_api_info(snapshot, source=source)
+        if refreshed is not None:
+            snapshot = refreshed
+        elif snapshot is not None:
+            logger.warning(
+                f"DP-normalize: Upstream unavailable, serving snapshot {snapshot.version}."
+            )
+    return snapshot
+
+
+def _federate(members: list[Snapshot | None]) -> Snapshot | None:
+    """Record and return the merged snapshot of the sources' snapshots.
+
+    Its content hash covers the members' content, their column mappings
+    and the merge settings, so the merged table is rebuilt whenever one
+    of them changes. It counts as checked when its stalest member was.
+
+    Args:
+        members: Latest snapshot of each source of ``sources.registry``,
+            ``None`` for a source that was never fetched.
+
     Returns:
-        Cleaned DataFrame or ``None`` if data could not be retrieved
+        The merged snapshot of the available sources, ``None`` if there
+        are none.
+    """
+    available = [
+        (source, snapshot)
+        for source, snapshot in zip(sources.registry, members)
+        if snapshot is not None
+    ]
+    missing = [source.id for source, snapshot in zip(sources.registry, members) if snapshot is None]
+    if missing:
+        logger.warning(f"DP-federation: No snapshot of {', '.join(missing)}, merging the others.")
+    if not available:
+        return None
+
+    spec = json.dumps(
+        [_FEDERATION_VERSION, config.FEDERATION_DUPLICATE_M]
+        + [[source.id, source.mapping_version, s.content_hash] for source, s in available]
+    )
+    return _merged_store.record(
+        Snapshot(
+            resource_url="merged:" + "+".join(source.id for source, _ in available),
+            content_hash=content_hash(spec.encode("utf-8")),
+            fetched_at=max(s.fetched_at for _, s in available),
+            checked_at=min(s.checked_at for _, s in available),
+            members={source.id: s.content_hash for source, s in available},
+        )
+    )
+
+
+def _members(snapshot: Snapshot) -> list[tuple[sources.Source, Snapshot]] | None:
+    """Return the sources and snapshots merged into *snapshot*.
+
+    ``None`` if a source is no longer configured or its snapshot was
+    pruned from its store.
+    """
+    configured = {source.id: source for source in sources.registry}
+    members = []
+    for source_id, digest in snapshot.members.items():
+        source = configured.get(source_id)
+        member = _store_for(source).get(digest) if source is not None else None
+        if member is None:
+            logger.error(
+                f"DP-federation: Snapshot {snapshot.version} of source {source_id} is gone."
+            )
+            return None
+        members.append((source, member))
+    return members
+
+
+@instrumentation.timed("clean")
+def _load_clean_frame(
+    snapshot: Snapshot, rules_version: str, source: sources.Source = sources.PRIMARY
+):
+    """
+    Return the cleaned DataFrame of *snapshot*.
+
+    Cleaning only re-runs when the raw content hash, ``_CLEAN_VERSION`` or
+    the correction rules version changes; otherwise the stored Parquet
+    file is read back as is. A merged snapshot is built from the cleaned
+    frames of its sources (see ``_load_merged_frame``).
+
+    Args:
+        snapshot: Snapshot to load.
+        rules_version: Version of the loaded correction rules and
+            gazetteer; part of the stored cleaned file name.
+        source: Source *snapshot* was fetched from.
+
+    Returns:
+        Cleaned DataFrame or ``None`` if the raw payload is unreadable.
+        Its ``attrs["dataset_version"]`` identifies the snapshot and
+        cleaning version (used as cache key).
+    """
+    if snapshot.members is not None:
+        return _load_merged_frame(snapshot, rules_version)
+    return _load_source_frame(_store_for(source), source, snapshot, rules_version)
+
+
+def _clean_version(source: sources.Source, rules_version: str) -> str:
+    """Return the version of the cleaned frames of *source*."""
+    version = f"{_CLEAN_VERSION}.{rules_version}"
+    return f"{version}.{source.mapping_version}" if source.is_mapped else version
+
+
+def _load_source_frame(
+    store: SnapshotStore, source: sources.Source, snapshot: Snapshot, rules_version: str
+) -> pd.DataFrame | None:
+    """Return the cleaned DataFrame of a snapshot of *source* held in *store*."""
+    logger.info("DP-normalize: Start _load_source_frame().")
+    clean_version = _clean_version(source, rules_version)
+    df = store.load_clean(snapshot, clean_version)
+    if df is not None:
+        df = _compact_schema(df)  # Parquet reads Arrow strings back as Python strings
+        df.attrs["dataset_version"] = f"{snapshot.version}.{clean_version}"
+        logger.info(
+            f"DP-normalize: Finish _load_source_frame(). Loaded cleaned snapshot {snapshot.version}"
+        )
+        return df
+
+    fh = store.open_raw(snapshot)
+    if fh is None:
+        return None
+    with fh:
+        df, table = _clean_features(
+            source.iter_feature_texts(fh),
+            previous=_previous_clean(snapshot, clean_version, store),
+        )
+    store.save_features(snapshot, table)
+    if df is None:
+        logger.error(f"DP-normalize: Snapshot {snapshot.version} has no features.")
+        return None
+    store.save_clean(snapshot, clean_version, df)
+    df.attrs["dataset_version"] = f"{snapshot.version}.{clean_version}"
+
+    logger.info(f"DP-normalize: Finish _load_source_frame(). Succesfully normalize and raw geojson data from snapshot {snapshot.version}")
+
+    return df
+
+
+def _clean_member(
+    store: SnapshotStore, source: sources.Source, snapshot: Snapshot, rules_version: str
+) -> tuple[pd.DataFrame | None, pd.DataFrame | None]:
+    """Return the cleaned frame and feature table of one source of a merged snapshot.
+
+    Runs in a worker process of ``_clean_members``, so it takes the store
+    rather than looking it up.
+    """
+    df = _load_source_frame(store, source, snapshot, rules_version)
+    if df is None:
+        return None, None
+    return df, _source_feature_table(store, source, snapshot)
+
+
+def _ingest_workers(pending: int) -> int:
+    """Return the number of processes to clean *pending* sources in.
+
+    At most ``config.INGEST_WORKERS``, one per source and one per CPU;
+    ``1`` means cleaning in this process, as a pool on a single CPU only
+    adds its start-up and transfer time.
     """
-    logger.info("DP-normalize: Start get_normalize_data().")
-    raw_data = _get_raw_api_info()
-    if raw_data is None:
+    return max(1, min(config.INGEST_WORKERS, pending, os.cpu_count() or 1))
+
+
+def _clean_members(
+    members: list[tuple[sources.Source, Snapshot]], rules_version: str
+) -> list[tuple[pd.DataFrame | None, pd.DataFrame | None]]:
+    """Return the cleaned frame and feature table of each member, in order.
+
+    Members without a stored cleaned frame are cleaned in worker processes
+    (see ``_ingest_workers``), the parsing and cleaning being CPU-bound;
+    stored frames are read meanwhile in this process.
+    """
+    jobs = [(_store_for(source), source, snapshot) for source, snapshot in members]
+    pending = [
+        position
+        for position, (store, source, snapshot) in enumerate(jobs)
+        if not os.path.exists(store.clean_path(snapshot, _clean_version(source, rules_version)))
+    ]
+    workers = _ingest_workers(len(pending))
+    if workers < 2:
+        return [_clean_member(*job, rules_version) for job in jobs]
+
+    logger.info(f"DP-federation: Cleaning {len(pending)} sources in {workers} processes.")
+    # Spawned, not forked: the refresher and HTTP threads hold locks
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(
+        workers, mp_context=context, initializer=logger.setLevel, initargs=(logger.level,)
+    ) as pool:
+        futures = {
+            position: pool.submit(_clean_member, *jobs[position], rules_version)
+            for position in pending
+        }
+        return [
+            futures[position].result() if position in futures
+            else _clean_member(*job, rules_version)
+            for position, job in enumerate(jobs)
+        ]
+
+
+@instrumentation.timed("clean.merge")
+def _load_merged_frame(snapshot: Snapshot, rules_version: str) -> pd.DataFrame | None:
+    """Return the cleaned DataFrame of a merged snapshot.
+
+    The sources' cleaned frames are merged by ``federation.merge`` and the
+    location and duplicate flags recomputed over the merged table, which
+    is stored like the cleaned frame of a single source.
+    """
+    clean_version = f"{_CLEAN_VERSION}.{rules_version}"
+    df = _merged_store.load_clean(snapshot, clean_version)
+    if df is not None:
+        df = _compact_schema(df)
+        df.attrs["dataset_version"] = f"{snapshot.version}.{clean_version}"
+        logger.info(f"DP-federation: Loaded merged snapshot {snapshot.version}")
+        return df
+
+    members = _members(snapshot)
+    if members is None:
+        return None
+    cleaned = [
+        (source.id, df, table)
+        for (source, _), (df, table) in zip(members, _clean_members(members, rules_version))
+        if df is not None
+    ]
+    if not cleaned:
         return None
 
-    df = pd.json_normalize(raw_data, record_path=["features"])
-    df = df.drop(
-        columns=["type", "geometry.type", "properties.Number"], errors="ignore"
+    ids, frames, tables = zip(*cleaned)
+    df, table, report = federation.merge(ids, frames, tables)
+    df = instrumentation.call(
+        "clean.flag_anomalies",
+        geo_validation.flag_anomalies,
+        _compact_schema(df),
+        table[feature_delta.KEY_COL].to_numpy(),
     )
-    df = _clean_data_info(df)
-    
-    source: str = "CACHE" if getattr(raw_data, "from_cache", False) else "API"
-    logger.info(f"DP-normalize: Finish get_normalize_data(). Succesfully normalize and raw geojson data from {source}")
-    
+    logger.info(f"DP-federation: Merged snapshot {snapshot.version}: {report.to_dict('index')}")
+    _merged_store.save_features(snapshot, table)
+    _merged_store.save_clean(snapshot, clean_version, df)
+    df.attrs["dataset_version"] = f"{snapshot.version}.{clean_version}"
     return df
 
 
-@st.cache_data
+def _previous_clean(
+    snapshot: Snapshot, clean_version: str, store: SnapshotStore | None = None
+) -> tuple[pd.DataFrame, pd.DataFrame] | None:
+    """
+    Return the cleaned frame and feature table of the newest older
+    snapshot cleaned with *clean_version*, or ``None`` if there is none.
+    The snapshots are looked up in *store*, by default the primary one.
+    """
+    store = store or _store
+    for previous in store.previous(snapshot):
+        table = store.load_features(previous)
+        if table is None:
+            continue
+        df = store.load_clean(previous, clean_version)
+        if df is not None and len(df) == len(table):
+            return _compact_schema(df), table
+    return None
+
+
+def _clean_stream(
+    chunks: Iterable[bytes],
+    previous: tuple[pd.DataFrame, pd.DataFrame] | None = None,
+) -> tuple[pd.DataFrame | None, pd.DataFrame]:
+    """Parse and clean a raw GeoJSON payload; see ``_clean_features``."""
+    return _clean_features(geojson_stream.iter_feature_texts(chunks), previous)
+
+
+@instrumentation.timed("clean.stream")
+def _clean_features(
+    features: Iterable[tuple[dict, str]],
+    previous: tuple[pd.DataFrame, pd.DataFrame] | None = None,
+) -> tuple[pd.DataFrame | None, pd.DataFrame]:
+    """
+    Clean a stream of registry-shaped features batch by batch.
+
+    Features are decoded incrementally and cleaned in batches of
+    ``config.INGEST_BATCH_SIZE`` rows, so peak memory is bounded by one
+    batch plus the compact cleaned frame rather than by the whole
+    payload and its dict tree.
+
+    Cleaning is row-independent: features whose fingerprint occurs in
+    *previous* take their cleaned row from there, and only added or
+    changed features are cleaned. The location and duplicate flags of
+    ``geo_validation.flag_anomalies`` depend on all rows and are computed
+    once over the assembled frame.
+
+    Args:
+        features: ``(feature, source text)`` pairs, as yielded by
+            ``geojson_stream.iter_feature_texts`` or
+            ``sources.Source.iter_feature_texts``.
+        previous: Cleaned frame and feature table of an older snapshot,
+            cleaned with the same pipeline and rules version.
+
+    Returns:
+        ``(cleaned DataFrame, feature table)``; the DataFrame is ``None``
+        if the payload has no features.
+
+    Raises:
+        ValueError: If the payload is not a GeoJSON ``FeatureCollection``
+            or not readable as the source's table.
+    """
+    table = feature_delta.FeatureTable()
+    reuse = feature_delta.reuse_positions(previous[1]) if previous is not None else {}
+    fresh_at: list[int] = []
+    reused_at: list[int] = []
+    reused_from: list[int] = []
+
+    def fresh_features():
+        for feature, text in features:
+            position = len(table)
+            row = reuse.get(table.add(feature, text))
+            if row is None:
+                fresh_at.append(position)
+                yield feature
+            else:
+                reused_at.append(position)
+                reused_from.append(row)
+
+    batches = []
+    parsed = geojson_stream.iter_batches(fresh_features())
+    for batch in instrumentation.timed_iter("parse.batch", parsed):
+        # Label rows with their position in the payload
+        batch.index = pd.Index(fresh_at[batch.index[0] : batch.index[-1] + 1])
+        batches.append(
+            _clean_data_info(
+                batch.drop(
+                    columns=["type", "geometry.type", "properties.Number"],
+                    errors="ignore",
+                )
+            )
+        )
+    if reused_at:
+        # Location and duplicate flags depend on all rows; recomputed below
+        reused = previous[0].drop(columns=geo_validation.ANOMALY_COLUMNS, errors="ignore")
+        batches.append(reused.iloc[reused_from].set_axis(reused_at))
+        logger.info(
+            f"DP-normalize: Cleaned {len(fresh_at)} new or changed features, "
+            f"reused {len(reused_at)}."
+        )
+    if not batches:
+        return None, table.frame()
+
+    if len(batches) == 1:
+        df = batches[0]
+    else:
+        # Categories differ between batches, so the concatenation falls
+        # back to object columns; re-apply the compact schema once.
+        df = _compact_schema(pd.concat(batches).sort_index())
+    df.index = pd.RangeIndex(len(df))
+
+    features = table.frame()
+    df = instrumentation.call(
+        "clean.flag_anomalies",
+        geo_validation.flag_anomalies,
+        df,
+        features[feature_delta.KEY_COL].to_numpy(),
+    )
+    logger.info(
+        f"DP-normalize: Coordinate checks {geo_validation.report(df).to_dict()}"
+    )
+    return df, features
+
+
+@instrumentation.timed("build.feature_table")
+def _feature_table(snapshot: Snapshot) -> pd.DataFrame | None:
+    """Return the feature table of *snapshot*, built from the raw file if missing.
+
+    The table of a merged snapshot is stored when it is cleaned.
+    """
+    if snapshot.members is not None:
+        return _merged_store.load_features(snapshot)
+    return _source_feature_table(_store, sources.PRIMARY, snapshot)
+
+
+def _source_feature_table(
+    store: SnapshotStore, source: sources.Source, snapshot: Snapshot
+) -> pd.DataFrame | None:
+    table = store.load_features(snapshot)
+    if table is not None:
+        return table
+    fh = store.open_raw(snapshot)
+    if fh is None:
+        return None
+    builder = feature_delta.FeatureTable()
+    with fh:
+        for feature, text in source.iter_feature_texts(fh):
+            builder.add(feature, text)
+    table = builder.frame()
+    store.save_features(snapshot, table)
+    return table
+
+
+@instrumentation.timed("build.diff")
+def _snapshot_diff(snapshot: Snapshot) -> feature_delta.FeatureDiff | None:
+    """
+    Return the shelters added, removed and changed since the previous
+    stored snapshot, or ``None`` if there is no previous snapshot.
+    """
+    older = _store_of(snapshot).previous(snapshot)
+    if not older:
+        return None
+    try:
+        current, previous = _feature_table(snapshot), _feature_table(older[0])
+    except ValueError as exc:
+        logger.error(f"DP-normalize: Could not compare snapshots: {exc}")
+        return None
+    if current is None or previous is None:
+        return None
+    diff = feature_delta.diff(previous, current, older[0].version)
+    logger.info(f"DP-normalize: Snapshot {snapshot.version}: {diff.summary()}")
+    return diff
+
+
+_BEZBAR_LABELS = ["Так", "Ні", "Невідомо"]
+
+
+@instrumentation.timed("build.display")
 def get_extended_data(df: pd.DataFrame) -> pd.DataFrame:
     """
-    Add derived columns and rename to Ukrainian display names.
+    Rename to Ukrainian display names, label the accessibility flag and,
+    in a merged dataset, the source of each shelter.
+
+    Computed once per dataset version by ``_load_dataset``; the frame keeps
+    the ``dataset_version`` attribute of *df*.
+
+    The Google Maps link is not stored; use ``googlemaps_links`` on the
+    rows being rendered.
 
     Args:
-        df: Cleaned DataFrame returned by ``get_normalized_data``.
+        df: Cleaned DataFrame returned by ``_load_clean_frame``.
 
     Returns:
-        Display-ready DataFrame with Ukrainian column headers and a
-        Google Maps hyperlink column.
+        Display-ready DataFrame with Ukrainian column headers.
     """
     logger.info("DP-normalize: Start get_extended_data" )
 
-    df = df.copy()
-    df = _add_get_googlemaps_links(df)
-    df["properties.Bezbar"] = (
-        df["properties.Bezbar"].map({True: "Так", False: "Ні"}).fillna("Невідомо")
-    )
+    bezbar = df["properties.Bezbar"]
+    codes = np.where(bezbar.isna(), 2, np.where(bezbar.fillna(False), 0, 1))
+    labels = pd.Categorical.from_codes(codes, categories=_BEZBAR_LABELS)
 
     column_map: dict[str, str] = {
         "properties.Name": "Назва",
@@ -185,48 +974,101 @@ def get_extended_data(df: pd.DataFrame) -> pd.DataFrame:
         "properties.TypeZs": "Будова",
         "properties.People": "Місткість",
         "properties.Bezbar": "Інклюзивність",
-        "link": "Посилання",
+        "quality.Coords": "Якість координат",
+        "quality.OtgMismatch": "Не відповідає ОТГ",
+        "quality.RajonMismatch": "Не відповідає району",
+        "quality.DuplicateOf": "Дублікат",
+        "source": "Джерело",
     }
+    if "source" in df:
+        # Source ids of a merged dataset, shown by title
+        titles = {source.id: source.title for source in sources.registry}
+        df = df.assign(source=df["source"].map(titles))
+
+    # Shallow: unchanged columns share the cleaned frame's buffers, which
+    # is safe because dataset frames are read-only (see ``dataset.py``);
+    # the replaced column below does not write through to *df*.
+    display = df.rename(columns=column_map, copy=False)
+    display["Інклюзивність"] = labels
 
     logger.info("DP-normalize: Finished get_extended_data()")
 
-    return df.rename(columns=column_map)
+    return display
 
 
-def get_city_options(otg_name: str, df: pd.DataFrame) -> pd.Series:
-    """Return sorted, unique city names, optionally filtered by OTG.
+def get_sorted_column_values(s: pd.Series) -> pd.Series:
+    """Return unique, non-null values from *s* sorted by Ukrainian alphabet.
 
     Args:
-        otg_name: OTG (community) name to filter on.  Pass ``" "`` to
-            return cities from all communities.
-        df: Cleaned DataFrame (before renaming columns).
+        s: A pandas Series of Ukrainian strings.
 
     Returns:
-        List starting with ``" "`` (blank sentinel) followed by unique
-        city names sorted by Ukrainian alphabet order.
+        Sorted list of unique string values.
     """
-    city_series = (
-        df["properties.City"]
-        if otg_name == " "
-        else df.loc[df["properties.OTG"] == otg_name, "properties.City"]
-    )
-    return [" "] + get_sorted_column_values(city_series)
+    unique_values = s.dropna().unique().tolist()
+    logger.info("DP-sort: Finish get_sorted_column_values(). Succesfully sorted values by ukranian alphabet")
 
+    return ukr_sorted(unique_values)
 
-@st.cache_data
-def get_sorted_column_values(s: pd.Series) -> pd.Series:
-    """Return unique, non-null values from *s* sorted by Ukrainian alphabet.
+
+def dataset_version(df: pd.DataFrame) -> str:
+    """Return the dataset version of a cleaned or display DataFrame.
+
+    Uses ``attrs["dataset_version"]`` set by ``_load_clean_frame`` and
+    falls back to a content hash for frames built elsewhere.
 
     Args:
-        s: A pandas Series of Ukrainian strings.
+        df: DataFrame derived from ``_load_clean_frame`` output.
 
     Returns:
-        Sorted list of unique string values.
+        Version token usable as a cache key.
     """
-    unique_values = s.dropna().unique().tolist()
-    logger.info("DP-sort: Finish get_sorted_column_values(). Succesfully sorted values by ukranian alphabet")
+    version = df.attrs.get("dataset_version")
+    if version is None:
+        version = f"{pd.util.hash_pandas_object(df, index=True).sum():x}"
+    return version
+
+
+def get_shelter_index(df: pd.DataFrame) -> ShelterIndex:
+    """Return the filter index of a display DataFrame.
+
+    The served dataset's index is reused when *df* holds its display
+    rows, so it is built once per version and shared by all sessions;
+    any other frame (e.g. an already filtered one) gets a fresh index.
+
+    Args:
+        df: Display-ready DataFrame (``get_extended_data`` output).
+    """
+    dataset = _refresher.current() if _refresher is not None else None
+    if dataset is not None and dataset.index.matches(df):
+        return dataset.index
+    return ShelterIndex(df)
 
-    return sorted(unique_values, key=_UKR_KEY)
+
+def search_positions(
+    df: pd.DataFrame,
+    city_name: str | None = None,
+    otg_name: str | None = None,
+    shelter_type: list[str] | None = None,
+    max_capacity: int | None = None,
+    accessible_only: bool | None = None,
+) -> np.ndarray:
+    """Return the row positions of *df* matching the filters.
+
+    Same criteria as ``search_data``, answered from the cached
+    ``ShelterIndex``; use ``df.iloc[positions]`` or ``df.take`` to select
+    the rows.
+
+    Returns:
+        Sorted, read-only array of integer positions.
+    """
+    return get_shelter_index(df).positions(
+        city_name=city_name,
+        otg_name=otg_name,
+        shelter_type=shelter_type,
+        max_capacity=max_capacity,
+        accessible_only=accessible_only,
+    )
 
 
 def search_data(
@@ -236,92 +1078,62 @@ def search_data(
     shelter_type: list[str] | None = None,
     max_capacity: int | None = None,
     accessible_only: bool | None = None,
+    sort_by: str | None = None,
 ) -> pd.DataFrame:
     """Filter the display DataFrame by the given criteria.
 
     Args:
         df: Display-ready DataFrame (Ukrainian column names from
             ``get_extended_data``).
-        city_name: Settlement to filter on; ``" "`` means no filter.
-        otg: OTG community name; ``" "`` means no filter.
+        city_name: Settlement to filter on; ``" "`` or ``None`` means no
+            filter.
+        otg_name: OTG community name; ``" "`` or ``None`` means no filter.
         shelter_type: List of shelter-type strings to include.
         max_capacity: Upper bound on the ``Місткість`` column.
         accessible_only: If ``True``, keep only wheelchair-accessible
             shelters (``Інклюзивність == 'Так'``).
+        sort_by: Optional column to sort the result by, in Ukrainian
+            alphabet order.
 
     Returns:
         Filtered DataFrame.
     """
+    positions = search_positions(
+        df,
+        city_name=city_name,
+        otg_name=otg_name,
+        shelter_type=shelter_type,
+        max_capacity=max_capacity,
+        accessible_only=accessible_only,
+    )
+    result = df.iloc[positions]
 
-    mask = pd.Series(True, index=df.index)
-
-    if city_name != " ":
-        mask &= df["Населений пункт"] == city_name
-
-    if otg_name != " ":
-        mask &= df["ОТГ"] == otg_name
-
-    if shelter_type and len(shelter_type) > 0:
-        mask &= df["Тип"].isin(shelter_type)
-
-    if accessible_only:
-
-        mask &= df["Інклюзивність"] == "Так"
-
-    if max_capacity:
-
-        mask &= df["Місткість"] <= max_capacity
-
-    return df[mask]
-
-
-def _ukr_sort_key(text: str) -> list[int]:
-    """Return a sort key list based on Ukrainian alphabet order.
-
-    Args:
-        text: A Ukrainian (or mixed) string to sort.
-
-    Returns:
-        A list of integer positions in the Ukrainian alphabet.
-        Unknown characters map to 999 so they sort last.
-    """
-    return [_UKR_SORT_MAP.get(c.upper(), 999) for c in text]
-
-
-def _ukr_cmp(a: str, b: str) -> int:
-    """Comparator for Ukrainian strings, used with ``cmp_to_key``."""
-    ka, kb = _ukr_sort_key(a), _ukr_sort_key(b)
-    return (ka > kb) - (ka < kb)
-
+    if sort_by is not None:
+        return result.sort_values(sort_by, key=ukr_sort_keys)
+    return result
 
-_UKR_KEY = cmp_to_key(_ukr_cmp)
 
+def googlemaps_links(df: pd.DataFrame) -> pd.Series:
+    """Return Google Maps URLs derived from the coordinates of *df*.
 
-def _add_get_googlemaps_links(df: pd.DataFrame) -> pd.DataFrame:
-    """Append a ``link`` column with Google Maps URLs derived from coordinates.
+    Computed at render time for the rows shown instead of being stored
+    as a column of the dataset.
 
     Args:
         df: DataFrame containing ``latitude`` and ``longitude`` columns.
 
     Returns:
-        DataFrame with an additional ``link`` column.
-
-    Bug fix:
-        Original code referenced ``df['latitude']`` / ``df['longitude']``
-        but the source columns were named inconsistently in some branches.
-        We now rely on the standardised column names set by
-        ``_normalize_coordinates``.
+        String Series of URLs aligned with *df*.
     """
-    df = df.copy()
-    df["link"] = (
+    return (
         "https://www.google.com/maps?q="
         + df["latitude"].astype(str)
         + ","
         + df["longitude"].astype(str)
     )
-    return df
 
 
+@instrumentation.timed("clean.batch")
 def _clean_data_info(df: pd.DataFrame) -> pd.DataFrame:
     """Apply all column-level cleaning transforms to the raw GeoJSON DataFrame.
 
@@ -350,9 +1162,12 @@ def _clean_data_info(df: pd.DataFrame) -> pd.DataFrame:
                 "properties.Adress": lambda x: _clean_adress(x["properties.Adress"]),
             }
         )
+        .pipe(_snap_settlements)
         .pipe(__merge_geometry_columns)
+        .pipe(_validate_coordinates)
     )
     df_clean = df_clean.drop(columns=["geometry.coordinates"], errors="ignore")
+    df_clean = _compact_schema(df_clean)
 
     logger.info("DP-cleaning: Finish _clean_data_info().")
 
@@ -360,6 +1175,69 @@ def _clean_data_info(df: pd.DataFrame) -> pd.DataFrame:
     return df_clean
 
 
+# Column dtypes of the cleaned dataset. Repeated names are categoricals,
+# free text is Arrow-backed; columns not listed keep their dtype.
+_SCHEMA: dict[str, str] = {
+    "properties.OTG": "category",
+    "properties.City": "category",
+    "properties.Rajon": "category",
+    "properties.Type": "category",
+    "properties.TypeZs": "category",
+    "properties.Property": "category",
+    "properties.Name": "string[pyarrow]",
+    "properties.Adress": "string[pyarrow]",
+    "properties.People": "Int32",
+    "properties.Area": "float32",
+    "properties.CityScore": "float32",
+    "properties.Bezbar": "bool",
+    "longitude": "float32",
+    "latitude": "float32",
+    "quality.Coords": "category",
+    "quality.OtgMismatch": "bool",
+    "quality.RajonMismatch": "bool",
+    "quality.DuplicateOf": "UInt64",
+    "source": "category",
+}
+
+
+@instrumentation.timed("clean.compact_schema")
+def _compact_schema(df: pd.DataFrame) -> pd.DataFrame:
+    """Convert the cleaned columns to the compact ``_SCHEMA`` dtypes.
+
+    Capacities are people counts and are rounded before the conversion to
+    a nullable integer.
+
+    Args:
+        df: Cleaned DataFrame.
+
+    Returns:
+        DataFrame with categorical, Arrow string, nullable integer and
+        32-bit float columns.
+    """
+    if "properties.People" in df:
+        df["properties.People"] = df["properties.People"].round()
+    schema = {col: dtype for col, dtype in _SCHEMA.items() if col in df}
+    return df.astype(schema)
+
+
+@instrumentation.timed("clean.snap_settlements")
+def _snap_settlements(df: pd.DataFrame) -> pd.DataFrame:
+    """Snap ``properties.City`` onto canonical gazetteer names per OTG.
+
+    Adds ``properties.CityScore`` with the match confidence (``0.0``-``1.0``)
+    so unmatched or low-confidence settlements can be reviewed. The names
+    are only replaced with ``config.GAZETTEER_SNAP`` set.
+    """
+    cache = ResolutionCache(config.GAZETTEER_CACHE_FILE, gazetteer.version)
+    city, df["properties.CityScore"] = gazetteer.snap(
+        df["properties.City"], df["properties.OTG"], cache=cache
+    )
+    if config.GAZETTEER_SNAP:
+        df["properties.City"] = city
+    return df
+
+
+@instrumentation.timed("clean.geometry")
 def __merge_geometry_columns(df: pd.DataFrame) -> pd.DataFrame:
     # Calculate coords
     coords = _normalize_coordinates(df["geometry.coordinates"])
@@ -369,6 +1247,93 @@ def __merge_geometry_columns(df: pd.DataFrame) -> pd.DataFrame:
     return df
 
 
+@instrumentation.timed("clean.validate_coordinates")
+def _validate_coordinates(df: pd.DataFrame) -> pd.DataFrame:
+    """Swap back or drop coordinates outside Zakarpattia.
+
+    Adds ``quality.Coords``; see ``geo_validation.fix_coordinates``.
+    """
+    fixed = geo_validation.fix_coordinates(df["longitude"], df["latitude"])
+    df["longitude"] = fixed["longitude"]
+    df["latitude"] = fixed["latitude"]
+    df["quality.Coords"] = fixed["quality.Coords"]
+    return df
+
+
+# ---------------------------------------------------------------------------
+# Compiled normalisation rules (see ``normalizer.py``); whole-value
+# corrections come from ``config.CORRECTIONS_FILE`` (see ``corrections.py``)
+# ---------------------------------------------------------------------------
+
+# Homoglyphs, quotes, dash spacing
+_STR_BASE = nz.Normalizer(
+    (
+        nz.translate(_HOMOGLYPH_TABLE),
+        nz.replace("`", "'"),
+        nz.replace("\u2019", "'"),
+        nz.sub(rx._RE_DASH_SPACES, "-"),
+        nz.strip,
+    )
+)
+
+# Removes newlines, stray digits, trailing letters
+_STR_STRICT = _STR_BASE + (
+    nz.sub(rx._RE_NEWLINE_TAB, ""),
+    nz.sub(rx._RE_TRAILING_LETTER, ""),
+    nz.sub(rx._RE_DIGITS_QUOTES, ""),
+    nz.sub(rx._RE_EDGE_DOT, ""),
+    nz.strip,
+)
+
+_OTG = _STR_STRICT + (
+    nz.sub(rx._RE_OTG_SUFFIX, ""),
+    corrections.rules.rule("otg"),
+    nz.strip,
+)
+
+_CITY = _STR_STRICT + (
+    nz.sub(rx._RE_CITY_STREET_SFX, ""),
+    nz.sub(rx._RE_CITY_PREFIX, ""),
+    nz.sub(rx._RE_EDGE_DOT_SPACE, ""),
+    corrections.rules.rule("city_abbreviations"),
+    corrections.rules.rule("city_typos"),
+    nz.strip,
+)
+
+_NAME = nz.Normalizer(
+    _STR_BASE.rules
+    + (
+        nz.sub(rx._RE_WHITESPACE, " "),
+        nz.sub(rx._RE_NAME_EDGE, ""),
+        nz.sub(rx._RE_EXTRA_QUOTES, '"'),
+        nz.capitalize_first,
+        nz.strip,
+    ),
+)
+
+_ADDRESS = nz.Normalizer(
+    (
+        nz.sub(rx._RE_ADDR_NEWLINE, " "),
+        nz.sub(rx._RE_WHITESPACE, " "),
+        nz.sub(rx._RE_ADDR_EDGE_DOT, ""),
+        nz.sub(rx._RE_EXTRA_QUOTES, '"'),
+        nz.sub(rx._RE_ADDR_NUMBER_ONLY, "Відсутня"),
+        nz.sub(rx._RE_ADDR_CITY_PREFIX, r"\1"),
+        nz.sub(rx._RE_ADDR_SPLIT_LN, r"\1, \2"),
+        nz.sub(rx._RE_ADDR_SPLIT_NL, r"\1 \2"),
+        corrections.rules.rule("address"),
+        nz.sub(rx._RE_ADDR_VUL, "вул. "),
+        nz.sub(rx._RE_ADDR_PL, "пл. "),
+        nz.sub(rx._RE_ADDR_PR, "пр. "),
+        nz.sub(rx._RE_ADDR_BUD, "буд. "),
+        nz.sub(rx._RE_ADDR_BUDYNOK, "буд."),
+        nz.sub(rx._RE_ADDR_DUP_VUL, "вул. "),
+        nz.strip,
+    ),
+)
+
+
+@instrumentation.timed("clean.str_base")
 def _clean_str_base(s: pd.Series) -> pd.Series:
     """Apply base string normalisation: homoglyphs, quotes, dash spacing.
 
@@ -378,18 +1343,10 @@ def _clean_str_base(s: pd.Series) -> pd.Series:
     Returns:
         Cleaned string Series.
     """
-    s_str = s.astype(dtype=str)
-    s_str = s.str.translate(_HOMOGLYPH_TABLE)
-
-    s_str = s_str.str.replace("`", "'", regex=False).str.replace(
-        "\u2019", "'", regex=False
-    )
-    s_str = rx._RE_DASH_SPACES.sub("-", s.str.cat(sep="\x00"))
-
-    s_str = s.str.replace(rx._RE_DASH_SPACES, "-", regex=True)
-    return s_str.str.strip()
+    return _STR_BASE.apply(s)
 
 
+@instrumentation.timed("clean.str_strict")
 def _clean_str_strict(s: pd.Series) -> pd.Series:
     """Strict string cleaning: removes newlines, stray digits, trailing letters.
 
@@ -399,16 +1356,10 @@ def _clean_str_strict(s: pd.Series) -> pd.Series:
     Returns:
         Cleaned string Series.
     """
-    s_str = _clean_str_base(s.astype(dtype=str))
-
-    s_str = s_str.str.replace(rx._RE_NEWLINE_TAB, "", regex=True)
-    s_str = s_str.str.replace(rx._RE_TRAILING_LETTER, "", regex=True)
-    s_str = s_str.str.replace(rx._RE_DIGITS_QUOTES, "", regex=True)
-    s_str = s_str.str.replace(rx._RE_EDGE_DOT, "", regex=True)
-
-    return s_str.str.strip()
+    return _STR_STRICT.apply(s)
 
 
+@instrumentation.timed("clean.num")
 def _clean_num(s: pd.Series) -> pd.Series:
     """Coerce a mixed-type Series to numeric, removing units and formatting.
 
@@ -432,6 +1383,7 @@ def _clean_num(s: pd.Series) -> pd.Series:
     return pd.to_numeric(s)
 
 
+@instrumentation.timed("clean.bool")
 def _clean_bool(s: pd.Series) -> pd.Series:
 
     s_bezbar = s.astype(str).str.lower().str.strip()
@@ -443,6 +1395,7 @@ def _clean_bool(s: pd.Series) -> pd.Series:
     return s_bezbar.astype(bool)
 
 
+@instrumentation.timed("clean.otg")
 def _clean_otg(s: pd.Series) -> pd.Series:
     """Normalise OTG (community) names.
 
@@ -452,16 +1405,10 @@ def _clean_otg(s: pd.Series) -> pd.Series:
     Returns:
         Normalised OTG name Series.
     """
-    s = _clean_str_strict(s)
-    s = s.str.replace(rx._RE_OTG_SUFFIX, "", regex=True)
-
-    corrections: dict[str, str] = {
-        "Усть-Чорна": "Усть-Чорнянська",
-        "Косонська": "Косоньська",
-    }
-    return s.replace(corrections).str.strip()
+    return _OTG.apply(s)
 
 
+@instrumentation.timed("clean.city")
 def _clean_city(s: pd.Series) -> pd.Series:
     """Normalise settlement (city/village) names.
 
@@ -471,51 +1418,10 @@ def _clean_city(s: pd.Series) -> pd.Series:
     Returns:
         Normalised city name Series.
     """
-    s = _clean_str_strict(s)
-    s = s.str.replace(rx._RE_CITY_STREET_SFX, "", regex=True)
-    s = s.str.replace(rx._RE_CITY_PREFIX, "", regex=True)
-    s = s.str.replace(rx._RE_EDGE_DOT_SPACE, "", regex=True)
-
-    abbreviation_map = {
-        "Вел. Бичків": "Великий Бичків",
-        "В.Бичків": "Великий Бичків",
-        "В.Ворота": "Верхні Ворота",
-        "В. Ворота": "Верхні Ворота",
-        "Н.Ворота": "Нижні Ворота",
-        "В.Коропець": "Верхній Коропець",
-        "Н.Коропець": "Нижній Коропець",
-        "В.Визниця": "Верхня Визниця",
-        "М.Раковець": "Малий Раковець",
-        "В.Раковець": "Великий Раковець",
-        "Р.Поле": "Руське Поле",
-        "Н.Селище": "Нижнє Селище",
-        "В.Водяне": "Верхнє Водяне",
-        "Н.Давидково": "Нове Давидково",
-        "Н. Ремета": "Нижні Ремети",
-    }
-    s = s.replace(abbreviation_map)
-
-    typo_correct = {
-        "Золотарево": "Золотарьово",
-        "Зарічово": "Зарічево",
-        "Копашнево": "Копашново",
-        "Кленовець": "Кленовець",
-        "Клиновець": "Кленовець",
-        "Верхне Водяне": "Верхнє Водяне",
-        "Горінчево": "Горінчово",
-        "Усть- Чорна": "Усть-Чорна",
-        "Бедевля": "Бедевля",
-        "Березово": "Березове",
-        "Оклі": "Оклі Гедь",
-        "Горинчево": "Горінчово",
-        "Вільхівські -Лази": "Вільхівські-Лази",
-        "Оклі Гедь Гедь": "Оклі Гедь",
-        "Неветленфолувул": "Неветленфолу",
-    }
-
-    return s.replace(typo_correct).str.strip()
+    return _CITY.apply(s)
 
 
+@instrumentation.timed("clean.name")
 def _clean_name(s: pd.Series) -> pd.Series:
     """Normalise shelter name: collapse whitespace, fix quotes, capitalise.
 
@@ -525,15 +1431,10 @@ def _clean_name(s: pd.Series) -> pd.Series:
     Returns:
         Normalised name Series.
     """
-    s = _clean_str_base(s)
-    s = s.str.replace(rx._RE_WHITESPACE, " ", regex=True)
-    s = s.str.replace(rx._RE_NAME_EDGE, "", regex=True)
-    s = s.str.replace(rx._RE_EXTRA_QUOTES, '"', regex=True)
-    # Capitalise first character using vectorised string operations
-    s = s.str[:1].str.upper() + s.str[1:]
-    return s.str.strip()
+    return _NAME.apply(s)
 
 
+@instrumentation.timed("clean.address")
 def _clean_adress(s: pd.Series) -> pd.Series:
     """Normalise Ukrainian postal address strings.
 
@@ -543,39 +1444,10 @@ def _clean_adress(s: pd.Series) -> pd.Series:
     Returns:
         Normalised address Series.
     """
-    s_adress = s.astype(str)
-    s_adress = s_adress.str.replace(rx._RE_ADDR_NEWLINE, " ", regex=True)
-    s_adress = s_adress.str.replace(rx._RE_WHITESPACE, " ", regex=True)
-    s_adress = s_adress.str.replace(rx._RE_ADDR_EDGE_DOT, "", regex=True)
-    s_adress = s_adress.str.replace(rx._RE_EXTRA_QUOTES, '"', regex=True)
-    s_adress = s_adress.str.replace(rx._RE_ADDR_NUMBER_ONLY, "Відсутня", regex=True)
-    s_adress = s_adress.str.replace(rx._RE_ADDR_CITY_PREFIX, r"\1", regex=True)
-    s_adress = s_adress.str.replace(rx._RE_ADDR_SPLIT_LN, r"\1, \2", regex=True)
-    s_adress = s_adress.str.replace(rx._RE_ADDR_SPLIT_NL, r"\1 \2", regex=True)
-
-    exact_dict: dict[str, str] = {
-        "Миру": "вул. Миру",
-        "Шевченка": "вул. Шевченка",
-        "Студентська набережна": "наб. Студентська",
-        "без назви": "вул. Без Назви",
-        "Без назви": "вул. Без Назви",
-        "наб. Киівська, 16": "наб. Київська, 16",
-        "вул.Пушкіна (Й. Волощукв), 2": "вул. Пушкіна (Й. Волощука), 2",
-        "с.Руська Мокра, Тячівського району, Миру, 97": "вул. Миру, 97",
-        "вул. Визволення, 21 /2-пов будівля/": "вул. Визволення, 21",
-        "вул. Європейська, 18 Тячівського району": "вул. Європейська, 18",
-    }
-    s_adress = s_adress.replace(exact_dict)
-
-    s_adress = s_adress.str.replace(rx._RE_ADDR_VUL, "вул. ", regex=True)
-    s_adress = s_adress.str.replace(rx._RE_ADDR_PL, "пл. ", regex=True)
-    s_adress = s_adress.str.replace(rx._RE_ADDR_PR, "пр. ", regex=True)
-    s_adress = s_adress.str.replace(rx._RE_ADDR_BUD, "буд. ", regex=True)
-    s_adress = s_adress.str.replace(rx._RE_ADDR_BUDYNOK, "буд.", regex=True)
-    s_adress = s_adress.str.replace(rx._RE_ADDR_DUP_VUL, "вул. ", regex=True)
-    return s.str.strip()
+    return _ADDRESS.apply(s)
 
 
+@instrumentation.timed("clean.coordinates")
 def _normalize_coordinates(s: pd.Series) -> pd.DataFrame:
     """Expand a Series of [lon, lat] lists into a two-column DataFrame.
 
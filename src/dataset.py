@@ -0,0 +1,152 @@
+"""
+dataset.py
+
+Process-wide, immutable shelter dataset shared by all Streamlit sessions.
+
+A :class:`ShelterDataset` bundles one version of the cleaned and display
+DataFrames with everything derived from them once: the filter index, the
+aggregate cube, the spatial index, the map cluster pyramid, the coverage
+grid and the sorted sidebar options. It is served by a process-wide
+refresher (see ``data_processing.get_dataset``), so sessions share the
+same objects instead of hashing and unpickling the frames on every rerun;
+filters return position arrays into ``display``. Built datasets are also
+pickled to the snapshot store, so a restart (or a store prepared with
+``cli.py build``) loads them instead of rebuilding.
+
+The frames are shared and must be treated as read-only; derive new frames
+(``iloc``, ``assign``, ...) instead of modifying them in place.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+from aggregates import ShelterCube
+from cluster_pyramid import ClusterPyramid
+from collation import ukr_sorted
+from coverage import CoverageGrid
+from feature_delta import FeatureDiff
+from shelter_index import ShelterIndex
+from spatial_index import SpatialIndex
+
+
+@dataclass(frozen=True)
+class ShelterDataset:
+    """One version of the shelter data and its derived structures.
+
+    Attributes:
+        version: Snapshot and cleaning version token, used as cache key.
+        rules_version: Correction rules and gazetteer version it was
+            cleaned with.
+        cleaned: Cleaned DataFrame (``properties.*`` columns).
+        display: Display DataFrame with Ukrainian column names.
+        index: Filter index over ``display``.
+        cube: Aggregate cube over ``display``.
+        spatial: Nearest-shelter index over ``display``.
+        clusters: Per-zoom map clusters of ``display``.
+        coverage: Capacity coverage grid over ``display``.
+        otg_options: OTG names in Ukrainian alphabet order.
+        type_options: Shelter types in Ukrainian alphabet order.
+        diff: Shelters added, removed and changed since the previous
+            snapshot, ``None`` if there is none.
+    """
+
+    version: str
+    rules_version: str
+    cleaned: pd.DataFrame
+    display: pd.DataFrame
+    index: ShelterIndex
+    cube: ShelterCube
+    spatial: SpatialIndex
+    clusters: ClusterPyramid
+    coverage: CoverageGrid
+    otg_options: list[str]
+    type_options: list[str]
+    _cities: dict[str, list[str]] = field(repr=False)
+    diff: FeatureDiff | None = field(default=None, repr=False)
+
+    @classmethod
+    def build(
+        cls,
+        version: str,
+        rules_version: str,
+        cleaned: pd.DataFrame,
+        display: pd.DataFrame,
+        index: ShelterIndex,
+        cube: ShelterCube,
+        spatial: SpatialIndex,
+        clusters: ClusterPyramid,
+        coverage: CoverageGrid,
+        diff: FeatureDiff | None = None,
+    ) -> ShelterDataset:
+        """Assemble a dataset and precompute the sidebar options."""
+        otg = display["ОТГ"]
+        city = display["Населений пункт"]
+        cities = {" ": ukr_sorted(city.dropna().unique().tolist())}
+        pairs = pd.DataFrame({"otg": otg, "city": city}).dropna().drop_duplicates()
+        for otg_name, group in pairs.groupby("otg", observed=True)["city"]:
+            cities[otg_name] = ukr_sorted(group.tolist())
+
+        return cls(
+            version=version,
+            rules_version=rules_version,
+            cleaned=cleaned,
+            display=display,
+            index=index,
+            cube=cube,
+            spatial=spatial,
+            clusters=clusters,
+            coverage=coverage,
+            otg_options=ukr_sorted(otg.dropna().unique().tolist()),
+            type_options=ukr_sorted(display["Тип"].dropna().unique().tolist()),
+            _cities=cities,
+            diff=diff,
+        )
+
+    def city_options(self, otg_name: str = " ") -> list[str]:
+        """Return ``" "`` followed by the sorted settlements of *otg_name*.
+
+        Args:
+            otg_name: OTG to list settlements for; ``" "`` lists all.
+        """
+        return [" "] + self._cities.get(otg_name, [])
+
+    def positions(self, **filters) -> np.ndarray:
+        """Return the ``display`` row positions matching the sidebar filters.
+
+        Keyword arguments are those of ``ShelterIndex.positions``.
+        """
+        return self.index.positions(**filters)
+
+    def nearest(
+        self, lat: float, lon: float, k: int = 5, **filters
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Return the *k* filtered shelters closest to ``(lat, lon)``.
+
+        Keyword arguments are those of ``ShelterIndex.positions``.
+
+        Returns:
+            ``(display row positions, distances in metres)``, closest first.
+        """
+        return self.spatial.nearest(lat, lon, k, positions=self._filtered(filters))
+
+    def within(
+        self, lat: float, lon: float, radius_m: float, **filters
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Return the filtered shelters within *radius_m* metres of ``(lat, lon)``.
+
+        Keyword arguments and return value as for :meth:`nearest`.
+        """
+        return self.spatial.within(lat, lon, radius_m, positions=self._filtered(filters))
+
+    def _filtered(self, filters: dict) -> np.ndarray | None:
+        """Return the positions matching *filters*, ``None`` if all rows do."""
+        positions = self.index.positions(**filters)
+        return None if len(positions) == self.index.size else positions
+
+    def rows(self, positions: np.ndarray) -> pd.DataFrame:
+        """Return the ``display`` rows at *positions* as a new DataFrame."""
+        return self.display.iloc[positions]
@@ -0,0 +1,83 @@
+"""
+diagnostics.py
+
+Hidden diagnostics view of the page, shown with ``?diagnostics`` in the
+URL: per-stage timings of the pipeline and page (see
+``instrumentation``), their Prometheus text, and a ``cProfile`` /
+``tracemalloc`` capture of a single page run.
+"""
+
+from __future__ import annotations
+
+import streamlit as st
+
+import instrumentation
+
+_PROFILE_NEXT = "diagnostics_profile_next"
+_PROFILE_RESULT = "diagnostics_profile_result"
+
+
+def requested() -> bool:
+    """Return ``True`` if the page was opened with ``?diagnostics``."""
+    return "diagnostics" in st.query_params
+
+
+def begin_run() -> instrumentation.ProfileCapture | None:
+    """Start profiling this run if the previous one asked for it."""
+    if not st.session_state.pop(_PROFILE_NEXT, False):
+        return None
+    capture = instrumentation.ProfileCapture()
+    if not capture.start():
+        st.session_state[_PROFILE_RESULT] = None
+        st.toast("Інше профілювання ще триває.")
+        return None
+    return capture
+
+
+def end_run(capture: instrumentation.ProfileCapture | None) -> None:
+    """Stop the profile of this run and keep its result for the session."""
+    if capture is not None:
+        st.session_state[_PROFILE_RESULT] = capture.stop()
+
+
+def _profile_next_run() -> None:
+    st.session_state[_PROFILE_NEXT] = True
+
+
+def show_diagnostics() -> None:
+    """Render the stage timings, the Prometheus text and the last profile."""
+    st.subheader("Діагностика")
+
+    summary = instrumentation.registry.summary()
+    st.caption(
+        "Час етапів обробки та відображення з моменту запуску процесу "
+        "(квантилі оцінено за гістограмою)."
+    )
+    st.dataframe(summary, hide_index=True, width="stretch")
+
+    col_profile, col_reset = st.columns(2)
+    col_profile.button(
+        "Профілювати наступний перезапуск",
+        on_click=_profile_next_run,
+        help="cProfile і tracemalloc для одного виконання сторінки.",
+    )
+    col_reset.button("Скинути лічильники", on_click=instrumentation.registry.reset)
+
+    with st.expander("Prometheus"):
+        st.code(instrumentation.registry.prometheus(), language="text")
+
+    profile = st.session_state.get(_PROFILE_RESULT)
+    if profile is not None:
+        st.markdown(
+            f"**Профіль:** {profile.seconds * 1000:,.0f} мс, "
+            f"пік пам'яті {profile.peak_bytes / (1 << 20):,.1f} МіБ"
+        )
+        st.dataframe(profile.functions, hide_index=True, width="stretch")
+        st.dataframe(profile.allocations, hide_index=True, width="stretch")
+        st.download_button(
+            "Завантажити звіт cProfile",
+            data=profile.text,
+            file_name="profile.txt",
+            mime="text/plain",
+            on_click="ignore",
+        )
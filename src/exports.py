@@ -0,0 +1,337 @@
+"""
+exports.py
+
+Downloadable exports of the shelter registry: GeoJSON, CSV, Parquet and
+vector tiles (MBTiles).
+
+Every format is encoded from the display DataFrame in chunks of
+``config.EXPORT_CHUNK_ROWS`` rows with the column-wise pandas and
+pyarrow writers (GeoJSON features are assembled from one JSON-lines
+string per chunk), so memory stays flat and no Python code runs per row.
+Exports are written to a file and downloads read the file.
+
+The unfiltered dataset is exported once per version to
+``config.EXPORT_DIR`` (:class:`ExportStore`), in the background as soon
+as the refresher publishes the version; filtered exports are written to
+a temporary file on request.
+"""
+
+from __future__ import annotations
+
+import codecs
+import io
+import logging
+import os
+import tempfile
+import threading
+from collections.abc import Iterator
+from dataclasses import dataclass
+from typing import BinaryIO
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import config
+import vector_tiles
+from dataset import ShelterDataset
+
+logger = logging.getLogger(config.LOGGER_NAME)
+
+# Display columns exported, in order, if present ("Джерело" only in a
+# merged dataset); the row index is exported as ``id``
+EXPORT_COLUMNS = [
+    "Назва",
+    "ОТГ",
+    "Населений пункт",
+    "Район",
+    "Адреса",
+    "Тип",
+    "Будова",
+    "Власність",
+    "Площа",
+    "Місткість",
+    "Інклюзивність",
+    "Якість координат",
+    "Не відповідає ОТГ",
+    "Не відповідає району",
+    "Дублікат",
+    "Джерело",
+    "latitude",
+    "longitude",
+]
+# float32 columns keep ~7 significant digits; 5 decimals is ~1 m
+_FLOAT_DECIMALS = 5
+
+
+@dataclass(frozen=True)
+class ExportFormat:
+    """A downloadable file format.
+
+    Attributes:
+        label: Name shown in the UI.
+        extension: File name extension.
+        mime: MIME type of the download.
+    """
+
+    label: str
+    extension: str
+    mime: str
+
+
+FORMATS: dict[str, ExportFormat] = {
+    "geojson": ExportFormat("GeoJSON", "geojson", "application/geo+json"),
+    "csv": ExportFormat("CSV", "csv", "text/csv"),
+    "parquet": ExportFormat("Parquet", "parquet", "application/vnd.apache.parquet"),
+    "mbtiles": ExportFormat(
+        "Векторні тайли (MBTiles)", "mbtiles", "application/vnd.sqlite3"
+    ),
+}
+
+
+def export_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Return the exported columns of a display DataFrame.
+
+    Float columns are widened and rounded, so text formats do not show
+    float32 artefacts (``51.299999``); the index is named ``id``.
+    """
+    columns = [column for column in EXPORT_COLUMNS if column in df.columns]
+    frame = df[columns]
+    floats = frame.select_dtypes("floating").columns
+    frame = frame.assign(
+        **{column: frame[column].astype(float).round(_FLOAT_DECIMALS) for column in floats}
+    )
+    return frame.rename_axis("id")
+
+
+def _chunks(df: pd.DataFrame, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    """Yield :func:`export_frame` of consecutive row slices of *df*.
+
+    At least one chunk is yielded, possibly empty.
+    """
+    for start in range(0, max(len(df), 1), chunk_rows):
+        yield export_frame(df.iloc[start : start + chunk_rows])
+
+
+def _json_lines(values: pd.DataFrame | pd.Series) -> pd.Series:
+    """Return the JSON encoding of every row (or value) as a string Series."""
+    if not len(values):
+        return pd.Series([], dtype=object)
+    encoded = values.to_json(orient="records", lines=True, force_ascii=False)
+    # Newlines inside strings are escaped, so this splits on records only
+    return pd.Series(encoded.rstrip("\n").split("\n"), dtype=object)
+
+
+def iter_geojson(
+    df: pd.DataFrame, chunk_rows: int = config.EXPORT_CHUNK_ROWS
+) -> Iterator[bytes]:
+    """Yield a GeoJSON FeatureCollection of *df* in chunks.
+
+    Shelters without coordinates have a ``null`` geometry.
+    """
+    yield b'{"type":"FeatureCollection","features":[\n'
+    separator = ""
+    for chunk in _chunks(df, chunk_rows):
+        if not len(chunk):
+            continue
+        properties = _json_lines(chunk.drop(columns=["latitude", "longitude"]))
+        ids = _json_lines(chunk.index.to_series())
+        lat, lon = chunk["latitude"], chunk["longitude"]
+        point = (
+            '{"type":"Point","coordinates":['
+            + lon.astype(str).to_numpy(dtype=object)
+            + ","
+            + lat.astype(str).to_numpy(dtype=object)
+            + "]}"
+        )
+        geometry = np.where(lat.notna() & lon.notna(), point, "null")
+        features = (
+            '{"type":"Feature","id":'
+            + ids.to_numpy()
+            + ',"geometry":'
+            + geometry
+            + ',"properties":'
+            + properties.to_numpy()
+            + "}"
+        )
+        yield (separator + ",\n".join(features)).encode("utf-8")
+        separator = ",\n"
+    yield b"\n]}\n"
+
+
+def iter_csv(df: pd.DataFrame, chunk_rows: int = config.EXPORT_CHUNK_ROWS) -> Iterator[bytes]:
+    """Yield a UTF-8 CSV of *df* in chunks, with a BOM for spreadsheets."""
+    yield codecs.BOM_UTF8
+    for i, chunk in enumerate(_chunks(df, chunk_rows)):
+        yield chunk.to_csv(header=i == 0).encode("utf-8")
+
+
+class _ChunkSink(io.RawIOBase):
+    """Writable stream that hands out what was written since the last drain."""
+
+    def __init__(self):
+        super().__init__()
+        self._parts: list[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._parts.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts.clear()
+        return data
+
+
+def iter_parquet(
+    df: pd.DataFrame, chunk_rows: int = config.EXPORT_CHUNK_ROWS
+) -> Iterator[bytes]:
+    """Yield a Parquet file of *df*, one row group per chunk.
+
+    Column types are kept (categories as dictionaries, nullable
+    integers), and ``id`` is a regular column.
+    """
+    schema = pa.Schema.from_pandas(
+        export_frame(df.iloc[:0]).reset_index(), preserve_index=False
+    )
+    sink = _ChunkSink()
+    with pq.ParquetWriter(sink, schema) as writer:
+        for chunk in _chunks(df, chunk_rows):
+            table = pa.Table.from_pandas(chunk.reset_index(), schema, preserve_index=False)
+            writer.write_table(table)
+            yield sink.drain()
+    yield sink.drain()
+
+
+_ENCODERS = {"geojson": iter_geojson, "csv": iter_csv, "parquet": iter_parquet}
+
+
+def write_export(df: pd.DataFrame, fmt: str, path: str) -> None:
+    """Write *df* in format *fmt* (a key of :data:`FORMATS`) to *path*."""
+    if fmt == "mbtiles":
+        vector_tiles.write_mbtiles(df, path)
+        return
+    with open(path, "wb") as f:
+        for data in _ENCODERS[fmt](df):
+            f.write(data)
+
+
+class ExportStore:
+    """Exports of the full dataset, one file per format and version.
+
+    Args:
+        directory: Directory of the export files.
+        keep_versions: Number of dataset versions kept on disk.
+    """
+
+    def __init__(
+        self,
+        directory: str = config.EXPORT_DIR,
+        keep_versions: int = config.SNAPSHOT_KEEP_VERSIONS,
+    ):
+        self.directory = directory
+        self.keep_versions = keep_versions
+        self._lock = threading.Lock()  # one writer per store
+
+    def path(self, version: str, fmt: str) -> str:
+        """Return the file of *fmt* exports of dataset *version*."""
+        return os.path.join(self.directory, f"shelters-{version}.{FORMATS[fmt].extension}")
+
+    def get(self, dataset: ShelterDataset, fmt: str) -> str:
+        """Return the export file of the full dataset, writing it if missing."""
+        path = self.path(dataset.version, fmt)
+        if os.path.exists(path):
+            return path
+        with self._lock:
+            if not os.path.exists(path):
+                os.makedirs(self.directory, exist_ok=True)
+                fd, staged = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+                os.close(fd)
+                try:
+                    write_export(dataset.display, fmt, staged)
+                    os.replace(staged, path)
+                except BaseException:
+                    os.remove(staged)
+                    raise
+                logger.info(f"Exports: wrote {path}")
+        return path
+
+    def prebuild(self, dataset: ShelterDataset) -> None:
+        """Write every format of *dataset* and drop old versions' files."""
+        for fmt in FORMATS:
+            self.get(dataset, fmt)
+        self._prune(dataset.version)
+
+    def prebuild_async(self, dataset: ShelterDataset) -> None:
+        """Run :meth:`prebuild` on a daemon thread; errors are logged."""
+
+        def run():
+            try:
+                self.prebuild(dataset)
+            except Exception:
+                logger.exception(f"Exports: prebuilding {dataset.version} failed")
+
+        threading.Thread(target=run, name="export-prebuild", daemon=True).start()
+
+    def _prune(self, current: str) -> None:
+        """Remove the files of all but the newest ``keep_versions`` versions."""
+        with self._lock:
+            files: dict[str, list[str]] = {}
+            for name in os.listdir(self.directory):
+                if name.startswith("shelters-"):
+                    version = name.removeprefix("shelters-").rsplit(".", 1)[0]
+                    files.setdefault(version, []).append(os.path.join(self.directory, name))
+            older = sorted(
+                (version for version in files if version != current),
+                key=lambda version: max(map(os.path.getmtime, files[version])),
+                reverse=True,
+            )
+            for version in older[max(self.keep_versions - 1, 0) :]:
+                for path in files[version]:
+                    os.remove(path)
+
+
+store = ExportStore()
+
+
+def file_name(dataset: ShelterDataset, fmt: str, filtered: bool = False) -> str:
+    """Return the download file name of an export."""
+    suffix = "-filtered" if filtered else ""
+    return f"shelters-{dataset.version[:12]}{suffix}.{FORMATS[fmt].extension}"
+
+
+def open_export(
+    dataset: ShelterDataset, fmt: str, positions: np.ndarray | None = None
+) -> BinaryIO:
+    """Return an open file of the export of *dataset*.
+
+    Args:
+        dataset: Dataset to export.
+        fmt: Key of :data:`FORMATS`.
+        positions: ``display`` row positions to export; ``None`` (or all
+            rows) serves the cached export of the full dataset.
+
+    Returns:
+        Binary file positioned at the start; a filtered export is a
+        temporary file removed when closed.
+    """
+    if positions is None or len(positions) == len(dataset.display):
+        return open(store.get(dataset, fmt), "rb")
+
+    fd, path = tempfile.mkstemp(suffix=f".{FORMATS[fmt].extension}")
+    os.close(fd)
+    try:
+        write_export(dataset.rows(positions), fmt, path)
+        return open(path, "rb")
+    finally:
+        # The open file stays readable after the name is removed
+        os.remove(path)
@@ -0,0 +1,158 @@
+"""
+feature_delta.py
+
+Feature-level change detection between snapshots of the shelter registry.
+
+Every raw feature gets a content fingerprint (64-bit BLAKE2b of its
+published text, i.e. its properties and coordinates) and an identity
+made of its raw OTG, settlement, name and address. Per snapshot these are kept as a small
+*feature table*, row ``i`` describing feature ``i`` of the payload and
+row ``i`` of its cleaned DataFrame.
+
+Cleaning is row-independent, so a feature whose fingerprint already
+occurs in a previously cleaned snapshot can reuse that cleaned row
+(:func:`reuse_positions`). Comparing the identities of two feature tables
+gives the added/removed/changed shelters of a refresh (:func:`diff`).
+Upstream has no stable feature ID (``Number`` is mostly ``0``): an edit
+to an identity field shows up as one removed and one added shelter, and
+shelters sharing an identity are paired in payload order. Any edit of a
+feature's text, including ``Number``, counts as a change.
+"""
+
+from __future__ import annotations
+
+import hashlib
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+IDENTITY: list[str] = ["OTG", "City", "Name", "Adress"]
+KEY_COL = "key"
+FINGERPRINT_COL = "fingerprint"
+
+
+def _hash64(text: str) -> int:
+    digest = hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+def fingerprint(text: str) -> int:
+    """Return the 64-bit content fingerprint of a feature's source text."""
+    return _hash64(text)
+
+
+class FeatureTable:
+    """Collects the feature table of a payload while its features stream past."""
+
+    def __init__(self) -> None:
+        self._identity: dict[str, list] = {column: [] for column in IDENTITY}
+        self._keys: list[int] = []
+        self._fingerprints: list[int] = []
+
+    def __len__(self) -> int:
+        return len(self._fingerprints)
+
+    def add(self, feature: dict, text: str) -> int:
+        """Record *feature*, published as *text*, and return its fingerprint."""
+        properties = feature.get("properties") or {}
+        identity = []
+        for column, values in self._identity.items():
+            value = properties.get(column)
+            value = None if value is None else str(value)
+            values.append(value)
+            identity.append("\0" if value is None else value)
+        self._keys.append(_hash64("\x1f".join(identity)))
+        fp = fingerprint(text)
+        self._fingerprints.append(fp)
+        return fp
+
+    def frame(self) -> pd.DataFrame:
+        """Return the table: raw identity columns, ``key`` and ``fingerprint``."""
+        data: dict[str, object] = {
+            column: pd.array(values, dtype="string[pyarrow]")
+            for column, values in self._identity.items()
+        }
+        data[KEY_COL] = np.array(self._keys, dtype=np.uint64)
+        data[FINGERPRINT_COL] = np.array(self._fingerprints, dtype=np.uint64)
+        return pd.DataFrame(data)
+
+
+def reuse_positions(previous: pd.DataFrame) -> dict[int, int]:
+    """Return ``fingerprint -> row position`` for a previous feature table."""
+    prints = previous[FINGERPRINT_COL].tolist()
+    return dict(zip(prints, range(len(prints))))
+
+
+@dataclass(frozen=True)
+class FeatureDiff:
+    """Shelters added, removed and changed between two snapshots.
+
+    Attributes:
+        previous: Version of the snapshot compared against.
+        added: Row positions of new shelters in the current data.
+        changed: Row positions of shelters whose properties or
+            coordinates changed, in the current data.
+        removed: Raw identity columns of the shelters no longer present.
+        unchanged: Number of shelters present in both, unchanged.
+    """
+
+    previous: str
+    added: np.ndarray
+    changed: np.ndarray
+    removed: pd.DataFrame
+    unchanged: int
+
+    @property
+    def is_empty(self) -> bool:
+        return not (len(self.added) or len(self.changed) or len(self.removed))
+
+    def summary(self) -> str:
+        return (
+            f"{len(self.added)} added, {len(self.removed)} removed, "
+            f"{len(self.changed)} changed, {self.unchanged} unchanged "
+            f"since {self.previous}"
+        )
+
+
+def _keys(table: pd.DataFrame) -> pd.DataFrame:
+    """Return the identity key with an occurrence number, to pair duplicates."""
+    keys = table[[KEY_COL]]
+    return keys.assign(
+        _n=keys.groupby(KEY_COL, sort=False).cumcount(), _pos=np.arange(len(table))
+    )
+
+
+def diff(
+    previous: pd.DataFrame, current: pd.DataFrame, previous_version: str
+) -> FeatureDiff:
+    """Compare two feature tables by shelter identity.
+
+    Args:
+        previous: Feature table of the older snapshot.
+        current: Feature table of the newer snapshot.
+        previous_version: Version of the older snapshot.
+    """
+    merged = _keys(previous).merge(
+        _keys(current), on=[KEY_COL, "_n"], how="outer", suffixes=("_old", "_new")
+    )
+    old_pos = merged["_pos_old"].to_numpy(dtype=float, na_value=np.nan)
+    new_pos = merged["_pos_new"].to_numpy(dtype=float, na_value=np.nan)
+    in_old, in_new = ~np.isnan(old_pos), ~np.isnan(new_pos)
+
+    both = in_old & in_new
+    paired_old = old_pos[both].astype(np.intp)
+    paired_new = new_pos[both].astype(np.intp)
+    differs = (
+        previous[FINGERPRINT_COL].to_numpy()[paired_old]
+        != current[FINGERPRINT_COL].to_numpy()[paired_new]
+    )
+    removed = np.sort(old_pos[in_old & ~in_new].astype(np.intp))
+
+    return FeatureDiff(
+        previous=previous_version,
+        added=np.sort(new_pos[in_new & ~in_old].astype(np.intp)),
+        changed=np.sort(paired_new[differs]),
+        removed=previous[IDENTITY].iloc[removed].reset_index(drop=True),
+        unchanged=int((~differs).sum()),
+    )
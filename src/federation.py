@@ -0,0 +1,184 @@
+"""
+federation.py
+
+Merge of the cleaned shelter tables of several sources (see ``sources``)
+into one table.
+
+The tables are stacked in source priority order, with a ``source``
+column. A shelter of a later source is the same shelter as one of an
+earlier source when the two are in the same settlement and within
+``config.FEDERATION_DUPLICATE_M`` metres, or, when either has no
+coordinates, when their community, settlement and address (or name,
+without an address) are equal.
+Such a duplicate is dropped; the empty fields of the shelter it
+duplicates (including missing coordinates) are filled from it first.
+
+Rows keep their source order, so positions of the merged table map back
+to the feature tables of the sources (see ``feature_delta``).
+"""
+
+from __future__ import annotations
+
+from collections.abc import Sequence
+
+import numpy as np
+import pandas as pd
+
+import config
+import geo_validation
+
+SOURCE_COL = "source"
+
+_POINT = ["longitude", "latitude", "quality.Coords"]
+
+
+def _nearby(df: pd.DataFrame, rank: np.ndarray, radius_m: float) -> np.ndarray:
+    """Match shelters to the earliest one of an earlier source nearby, per settlement."""
+    lon = df["longitude"].to_numpy(dtype=float, na_value=np.nan)
+    lat = df["latitude"].to_numpy(dtype=float, na_value=np.nan)
+    match = np.full(len(df), -1, dtype=np.intp)
+    settlements = df.groupby("properties.City", observed=True, dropna=False, sort=False)
+    for positions in settlements.indices.values():
+        # Positions are ascending, so ranks are too: skip single-source groups
+        if rank[positions[0]] == rank[positions[-1]]:
+            continue
+        first = geo_validation.find_duplicates(lon[positions], lat[positions], radius_m)
+        found = first >= 0
+        i, j = positions[found], positions[first[found]]
+        earlier = rank[j] < rank[i]
+        match[i[earlier]] = j[earlier]
+    return match
+
+
+def _same_address(df: pd.DataFrame, rank: np.ndarray) -> np.ndarray:
+    """Match shelters without coordinates by community, settlement and address or name."""
+    place = df["properties.Adress"].astype("string").fillna(df["properties.Name"].astype("string"))
+    key = (
+        df["properties.OTG"].astype("string")
+        + "\x1f"
+        + df["properties.City"].astype("string")
+        + "\x1f"
+        + place.str.casefold()
+    )
+    codes, _ = pd.factorize(key, use_na_sentinel=True)
+    match = np.full(len(df), -1, dtype=np.intp)
+    valid = codes >= 0
+    if not valid.any():
+        return match
+    positions = np.arange(len(df))
+    first = np.full(codes.max() + 1, len(df), dtype=np.intp)
+    np.minimum.at(first, codes[valid], positions[valid])
+
+    j = np.where(valid, first[np.maximum(codes, 0)], -1)
+    no_point = df["longitude"].isna().to_numpy() | df["latitude"].isna().to_numpy()
+    candidate = valid & (j != positions) & (rank[np.maximum(j, 0)] < rank)
+    candidate &= no_point | no_point[np.maximum(j, 0)]
+    match[candidate] = j[candidate]
+    return match
+
+
+def find_matches(
+    df: pd.DataFrame, rank: np.ndarray, radius_m: float = config.FEDERATION_DUPLICATE_M
+) -> np.ndarray:
+    """Return, per row, the row of an earlier source with the same shelter.
+
+    Args:
+        df: Stacked cleaned tables, in source priority order.
+        rank: Priority of each row's source (``0`` first).
+        radius_m: Distance within which two shelters are the same.
+
+    Returns:
+        Position of the shelter each row duplicates, ``-1`` if none. A
+        duplicate of a duplicate points at the shelter that is kept.
+    """
+    match = _nearby(df, rank, radius_m)
+    unmatched = match < 0
+    match[unmatched] = _same_address(df, rank)[unmatched]
+    # Resolve chains: a source matched to a row that is itself dropped
+    for _ in range(int(rank.max(initial=0))):
+        chained = (match >= 0) & (match[np.maximum(match, 0)] >= 0)
+        if not chained.any():
+            break
+        match[chained] = match[match[chained]]
+    return match
+
+
+def _fill_gaps(df: pd.DataFrame, match: np.ndarray) -> pd.DataFrame:
+    """Fill empty fields of the kept shelters from their duplicates."""
+    duplicates = np.flatnonzero(match >= 0)
+    if not len(duplicates):
+        return df
+    # First non-empty value of each column over a shelter's duplicates
+    donors = df.iloc[duplicates].set_axis(match[duplicates]).groupby(level=0, sort=False).first()
+    targets = donors.index.to_numpy()
+    kept = df.iloc[targets].set_axis(targets)
+
+    no_point = kept["longitude"].isna() | kept["latitude"].isna()
+    has_donor_point = donors["longitude"].notna() & donors["latitude"].notna()
+    take_point = (no_point & has_donor_point).to_numpy()
+    for column in df.columns:
+        if column in _POINT or column == SOURCE_COL:
+            continue
+        gaps = kept[column].isna().to_numpy() & donors[column].notna().to_numpy()
+        if gaps.any():
+            df[column] = df[column].astype(object)
+            df.iloc[targets[gaps], df.columns.get_loc(column)] = donors[column].to_numpy()[gaps]
+    if take_point.any():
+        for column in _POINT:
+            df[column] = df[column].astype(object)
+            df.iloc[targets[take_point], df.columns.get_loc(column)] = (
+                donors[column].to_numpy()[take_point]
+            )
+    return df
+
+
+def merge(
+    ids: Sequence[str],
+    frames: Sequence[pd.DataFrame],
+    tables: Sequence[pd.DataFrame],
+    radius_m: float = config.FEDERATION_DUPLICATE_M,
+) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """Merge the cleaned tables of several sources into one.
+
+    Args:
+        ids: Source ids, in priority order.
+        frames: Cleaned table of each source.
+        tables: Feature table of each source, row ``i`` describing row
+            ``i`` of its cleaned table.
+        radius_m: Distance within which two shelters are the same.
+
+    Returns:
+        ``(merged table, merged feature table, report)``. The merged
+        table has a ``source`` column and mixed column dtypes: re-apply
+        the cleaned schema, and recompute the location and duplicate flags
+        over it. The report has the shelters and merged duplicates per
+        source.
+    """
+    stacked = pd.concat(
+        [
+            frame.drop(columns=geo_validation.ANOMALY_COLUMNS, errors="ignore").assign(
+                **{SOURCE_COL: source_id}
+            )
+            for source_id, frame in zip(ids, frames)
+        ],
+        ignore_index=True,
+    )
+    rank = np.repeat(np.arange(len(frames)), [len(frame) for frame in frames])
+    match = find_matches(stacked, rank, radius_m)
+
+    merged = _fill_gaps(stacked, match)
+    keep = match < 0
+    features = pd.concat(tables, ignore_index=True)
+    dropped = np.bincount(rank[~keep], minlength=len(frames))
+    report = pd.DataFrame(
+        {
+            "shelters": [len(frame) for frame in frames],
+            "duplicates": dropped,
+        },
+        index=pd.Index(list(ids), name=SOURCE_COL),
+    )
+    return (
+        merged[keep].reset_index(drop=True),
+        features[keep].reset_index(drop=True),
+        report,
+    )
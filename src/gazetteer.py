@@ -0,0 +1,253 @@
+"""
+gazetteer.py
+
+Canonical settlement names for Zakarpattia and an approximate-matching
+index that snaps cleaned ``properties.City`` values onto them.
+
+The bundled ``config.GAZETTEER_FILE`` (``rajon,otg,name`` CSV) lists
+canonical settlement names per OTG; rows with an empty OTG apply to every
+community. Names are indexed by character trigrams of their folded
+spelling (see ``corrections.fold``) and candidates are scored with the
+Dice coefficient, restricted to the settlement's own OTG. The bundled
+file is a seed rather than the full KATOTTG codifier, so the cleaning
+pipeline only records the match scores unless ``config.GAZETTEER_SNAP``
+is set.
+
+Resolutions are cached per ``(OTG, city)`` pair in
+``config.GAZETTEER_CACHE_FILE`` so that only new spellings are matched
+after a restart or an upstream refresh.
+"""
+
+from __future__ import annotations
+
+import csv
+import hashlib
+import json
+import logging
+import os
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+
+import pandas as pd
+
+import config
+from corrections import fold
+
+logger = logging.getLogger(config.LOGGER_NAME)
+
+
+def _trigrams(folded: str) -> set[str]:
+    padded = f"  {folded} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+@dataclass(frozen=True)
+class Match:
+    """Result of matching one settlement spelling.
+
+    Attributes:
+        name: Canonical name, or ``None`` if no candidate shares a trigram.
+        score: Dice similarity of the folded spellings, ``0.0``-``1.0``.
+    """
+
+    name: str | None
+    score: float
+
+
+class Gazetteer:
+    """Trigram index over canonical settlement names.
+
+    Args:
+        entries: ``(rajon, otg, name)`` rows; an empty OTG makes the
+            settlement a candidate for every community.
+        version: Token identifying the entries, used for cache keys.
+    """
+
+    def __init__(self, entries: list[tuple[str, str, str]], version: str = "none"):
+        self.version = version
+        self.names: list[str] = []
+        self._folded: list[str] = []
+        self._grams: list[set[str]] = []
+        self._scope: dict[str, list[int]] = defaultdict(list)
+        self._postings: dict[str, list[int]] = defaultdict(list)
+
+        for _rajon, otg, name in entries:
+            i = len(self.names)
+            folded = fold(name)
+            self.names.append(name)
+            self._folded.append(folded)
+            self._grams.append(_trigrams(folded))
+            self._scope[fold(otg)].append(i)
+            for gram in self._grams[i]:
+                self._postings[gram].append(i)
+
+    @classmethod
+    def from_csv(cls, path: str = config.GAZETTEER_FILE) -> Gazetteer:
+        """Load a gazetteer from a ``rajon,otg,name`` CSV file.
+
+        A missing or unreadable file yields an empty gazetteer, which
+        leaves every city value unchanged.
+        """
+        try:
+            with open(path, "rb") as fh:
+                content = fh.read()
+        except OSError as exc:
+            logger.error(f"Gazetteer: file is not readable, matching disabled: {exc}")
+            return cls([])
+
+        rows = csv.DictReader(content.decode("utf-8").splitlines())
+        entries = [
+            (row["rajon"].strip(), row["otg"].strip(), row["name"].strip())
+            for row in rows
+            if row.get("name", "").strip()
+        ]
+        return cls(entries, version=hashlib.sha256(content).hexdigest()[:8])
+
+    def match(self, city: str, otg: str | None = None) -> Match:
+        """Return the best canonical candidate for *city* within *otg*.
+
+        Args:
+            city: Cleaned settlement name.
+            otg: Cleaned OTG name; candidates are that OTG's settlements
+                plus the ones listed without an OTG.
+        """
+        folded = fold(city)
+        allowed = set(self._scope.get("", []))
+        if otg:
+            allowed.update(self._scope.get(fold(otg), []))
+        if not allowed:
+            return Match(None, 0.0)
+
+        grams = _trigrams(folded)
+        shared: Counter[int] = Counter()
+        for gram in grams:
+            for i in self._postings.get(gram, ()):
+                if i in allowed:
+                    shared[i] += 1
+        if not shared:
+            return Match(None, 0.0)
+
+        best, best_score = None, 0.0
+        for i, common in shared.items():
+            if self._folded[i] == folded:
+                return Match(self.names[i], 1.0)
+            score = 2 * common / (len(grams) + len(self._grams[i]))
+            if score > best_score:
+                best, best_score = i, score
+        return Match(self.names[best], round(best_score, 3))
+
+    def snap(
+        self,
+        city: pd.Series,
+        otg: pd.Series,
+        min_score: float = config.GAZETTEER_MIN_SCORE,
+        cache: ResolutionCache | None = None,
+    ) -> tuple[pd.Series, pd.Series]:
+        """Snap a city column onto canonical names, scoped by OTG.
+
+        Each distinct ``(otg, city)`` pair is matched once (or read from
+        *cache*); values scoring below *min_score* are kept unchanged.
+
+        Args:
+            city: Cleaned ``properties.City`` Series.
+            otg: Cleaned ``properties.OTG`` Series aligned with *city*.
+            min_score: Minimum Dice score to replace a value.
+            cache: Optional persistent resolution cache.
+
+        Returns:
+            ``(snapped_city, score)`` Series aligned with *city*; the score
+            is ``NaN`` for missing city values.
+        """
+        if city.empty:
+            return city.copy(), pd.Series(index=city.index, dtype=float)
+        pairs = pd.MultiIndex.from_arrays([otg, city])
+        codes, uniques = pd.factorize(pairs)
+
+        resolved_names: list[str] = []
+        resolved_scores: list[float] = []
+        unmatched: list[str] = []
+        for otg_name, city_name in uniques:
+            if not isinstance(city_name, str):
+                resolved_names.append(city_name)
+                resolved_scores.append(float("nan"))
+                continue
+            otg_key = otg_name if isinstance(otg_name, str) else ""
+            found = cache.get(otg_key, city_name) if cache is not None else None
+            if found is None:
+                found = self.match(city_name, otg_key)
+                if cache is not None:
+                    cache.put(otg_key, city_name, found)
+            if found.name is not None and found.score >= min_score:
+                resolved_names.append(found.name)
+            else:
+                resolved_names.append(city_name)
+                unmatched.append(city_name)
+            resolved_scores.append(found.score)
+
+        if cache is not None:
+            cache.save()
+        if self.names:
+            logger.info(
+                f"Gazetteer: {len(uniques) - len(unmatched)}/{len(uniques)} "
+                f"distinct settlements matched; unmatched: {sorted(set(unmatched))[:20]}"
+            )
+
+        names = pd.Series(resolved_names, dtype=object).take(codes)
+        scores = pd.Series(resolved_scores, dtype=float).take(codes)
+        names.index = scores.index = city.index
+        return names.rename(city.name), scores
+
+
+class ResolutionCache:
+    """Persistent ``(otg, city) -> Match`` cache for one gazetteer version.
+
+    Args:
+        path: JSON file the cache is stored in.
+        version: Gazetteer version; a cache written for another version
+            is discarded.
+    """
+
+    def __init__(self, path: str, version: str):
+        self.path = path
+        self.version = version
+        self._entries: dict[str, list] = {}
+        self._dirty = False
+        try:
+            with open(path, encoding="utf-8") as fh:
+                data = json.load(fh)
+            if data.get("version") == version:
+                self._entries = data["entries"]
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError) as exc:
+            logger.warning(f"Gazetteer: ignoring unreadable resolution cache: {exc}")
+
+    def get(self, otg: str, city: str) -> Match | None:
+        entry = self._entries.get(f"{otg}\t{city}")
+        return Match(*entry) if entry is not None else None
+
+    def put(self, otg: str, city: str, match: Match) -> None:
+        self._entries[f"{otg}\t{city}"] = [match.name, match.score]
+        self._dirty = True
+
+    def save(self) -> None:
+        """Write the cache back if new resolutions were added."""
+        if not self._dirty:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            # Per process: sources are cleaned in parallel worker processes
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as fh:
+                json.dump(
+                    {"version": self.version, "entries": self._entries},
+                    fh,
+                    ensure_ascii=False,
+                )
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+        except OSError as exc:
+            logger.warning(f"Gazetteer: could not store resolution cache: {exc}")
+
+
+gazetteer = Gazetteer.from_csv()
@@ -0,0 +1,337 @@
+"""
+geo_validation.py
+
+Coordinate validation and geo-anomaly flags for the cleaned shelters.
+
+Two vectorised passes:
+
+* :func:`fix_coordinates` runs per cleaning batch (it is row-independent,
+  so reused rows stay valid). Points outside ``config.MAP_BOUNDS`` are
+  swapped back if the swapped ``[lat, lon]`` lies inside, otherwise their
+  coordinates are dropped; ``[0, 0]`` counts as missing. The outcome is
+  kept in ``quality.Coords``.
+* :func:`flag_anomalies` runs once over the whole cleaned frame. It flags
+  shelters whose point disagrees with the declared ``properties.OTG`` /
+  ``properties.Rajon`` (``quality.OtgMismatch``, ``quality.RajonMismatch``)
+  and shelters within ``config.GEO_DUPLICATE_M`` metres of an earlier one
+  (``quality.DuplicateOf``, the earlier shelter's identity key as in
+  ``feature_delta``, which stays valid across payload versions).
+
+Location consistency uses point-in-polygon tests against the optional
+``config.BOUNDARIES_FILE`` (GeoJSON polygons with ``otg`` and ``rajon``
+properties, names as in the cleaned registry). Without it, a shelter is
+flagged when it lies further from the median point of its community than
+``config.GEO_OUTLIER_MIN_KM`` and ``config.GEO_OUTLIER_SCALE`` times the
+community's median distance.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+import config
+from spatial_index import EARTH_RADIUS_M, haversine_m
+
+logger = logging.getLogger(config.LOGGER_NAME)
+
+COORDS_OK = "ok"
+COORDS_SWAPPED = "swapped"
+COORDS_OUTSIDE = "outside"
+COORDS_MISSING = "missing"
+COORDS_STATUSES = [COORDS_OK, COORDS_SWAPPED, COORDS_OUTSIDE, COORDS_MISSING]
+
+# Points of all shelters tested against one polygon at a time, in blocks
+# of at most this many point × edge pairs
+_PIP_BLOCK = 1 << 22
+
+
+def _inside(
+    lon: np.ndarray, lat: np.ndarray, bounds: tuple[float, float, float, float]
+) -> np.ndarray:
+    min_lon, min_lat, max_lon, max_lat = bounds
+    return (lon >= min_lon) & (lon <= max_lon) & (lat >= min_lat) & (lat <= max_lat)
+
+
+def fix_coordinates(
+    lon: pd.Series,
+    lat: pd.Series,
+    bounds: tuple[float, float, float, float] = config.MAP_BOUNDS,
+) -> pd.DataFrame:
+    """Validate and repair parsed coordinates.
+
+    Args:
+        lon: Longitudes as parsed from the feature geometry.
+        lat: Latitudes as parsed from the feature geometry.
+        bounds: ``(min lon, min lat, max lon, max lat)`` of valid points.
+
+    Returns:
+        DataFrame with ``longitude``, ``latitude`` (swapped back where
+        needed, ``NaN`` for missing and out-of-bounds points) and
+        ``quality.Coords`` (one of :data:`COORDS_STATUSES`).
+    """
+    x = lon.to_numpy(dtype=float, na_value=np.nan)
+    y = lat.to_numpy(dtype=float, na_value=np.nan)
+    missing = np.isnan(x) | np.isnan(y) | ((x == 0) & (y == 0))
+    inside = _inside(x, y, bounds)
+    swapped = ~missing & ~inside & _inside(y, x, bounds)
+    outside = ~missing & ~inside & ~swapped
+
+    status = np.select(
+        [missing, swapped, outside], [3, 1, 2], default=0
+    ).astype(np.int8)
+    keep = ~(missing | outside)
+    fixed_lon = np.where(swapped, y, np.where(keep, x, np.nan))
+    fixed_lat = np.where(swapped, x, np.where(keep, y, np.nan))
+    return pd.DataFrame(
+        {
+            "longitude": fixed_lon,
+            "latitude": fixed_lat,
+            "quality.Coords": pd.Categorical.from_codes(
+                status, categories=COORDS_STATUSES
+            ),
+        },
+        index=lon.index,
+    )
+
+
+class Boundaries:
+    """Community polygons for point-in-polygon lookups.
+
+    Every polygon keeps its bounding box and its ring edges as arrays;
+    a lookup pre-selects the candidate points with a binary search on the
+    longitude-sorted points and a latitude test, then counts ray crossings
+    over all edges at once (even-odd rule, so holes work).
+
+    Args:
+        polygons: ``(otg, rajon, rings)`` per polygon, each ring a
+            sequence of ``[lon, lat]`` vertices.
+        version: Token identifying the source file, used for cache keys.
+    """
+
+    def __init__(self, polygons: list[tuple[str, str | None, list]], version: str):
+        self.version = version
+        self.otg = np.array([otg for otg, _rajon, _rings in polygons], dtype=object)
+        self.rajon = np.array([rajon for _otg, rajon, _rings in polygons], dtype=object)
+        self._edges: list[np.ndarray] = []
+        self._bbox = np.empty((len(polygons), 4))
+        for i, (_otg, _rajon, rings) in enumerate(polygons):
+            edges = []
+            for ring in rings:
+                ring = np.asarray(ring, dtype=float)[:, :2]
+                edges.append(np.hstack([ring, np.roll(ring, -1, axis=0)]))
+            edges = np.vstack(edges)
+            self._edges.append(edges)
+            self._bbox[i] = (
+                edges[:, 0].min(), edges[:, 1].min(), edges[:, 0].max(), edges[:, 1].max()
+            )
+
+    def __len__(self) -> int:
+        return len(self._edges)
+
+    @classmethod
+    def from_geojson(cls, path: str = config.BOUNDARIES_FILE) -> Boundaries:
+        """Load ``Polygon``/``MultiPolygon`` features; empty if *path* is missing."""
+        if not os.path.exists(path):
+            return cls([], version="none")
+        with open(path, "rb") as fh:
+            raw = fh.read()
+        polygons = []
+        for feature in json.loads(raw)["features"]:
+            props = feature.get("properties") or {}
+            geometry = feature.get("geometry") or {}
+            parts = geometry.get("coordinates") or []
+            if geometry.get("type") == "Polygon":
+                parts = [parts]
+            elif geometry.get("type") != "MultiPolygon":
+                continue
+            for rings in parts:
+                polygons.append((props.get("otg"), props.get("rajon"), rings))
+        version = hashlib.sha256(raw).hexdigest()[:12]
+        logger.info(f"Geo: Loaded {len(polygons)} boundary polygons ({version})")
+        return cls(polygons, version)
+
+    def locate(self, lon: np.ndarray, lat: np.ndarray) -> np.ndarray:
+        """Return the index of the polygon containing each point, ``-1`` if none."""
+        result = np.full(len(lon), -1, dtype=np.intp)
+        located = np.flatnonzero(~np.isnan(lon) & ~np.isnan(lat))
+        order = located[np.argsort(lon[located], kind="stable")]
+        sorted_lon = lon[order]
+        for i, edges in enumerate(self._edges):
+            min_lon, min_lat, max_lon, max_lat = self._bbox[i]
+            lo = np.searchsorted(sorted_lon, min_lon, side="left")
+            hi = np.searchsorted(sorted_lon, max_lon, side="right")
+            candidates = order[lo:hi]
+            candidates = candidates[(lat[candidates] >= min_lat) & (lat[candidates] <= max_lat)]
+            candidates = candidates[result[candidates] < 0]
+            block = max(1, _PIP_BLOCK // len(edges))
+            x1, y1, x2, y2 = (edges[:, k] for k in range(4))
+            for start in range(0, len(candidates), block):
+                points = candidates[start : start + block]
+                px, py = lon[points, None], lat[points, None]
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    crosses = ((y1 > py) != (y2 > py)) & (
+                        px < (x2 - x1) * (py - y1) / (y2 - y1) + x1
+                    )
+                inside = crosses.sum(axis=1) % 2 == 1
+                result[points[inside]] = i
+        return result
+
+
+boundaries = Boundaries.from_geojson()
+
+
+def _group_outliers(lon: np.ndarray, lat: np.ndarray, groups: pd.Series) -> np.ndarray:
+    """Flag points far from the median point of their group."""
+    codes, _uniques = pd.factorize(groups)
+    usable = (codes >= 0) & ~np.isnan(lon) & ~np.isnan(lat)
+    frame = pd.DataFrame({"code": codes[usable], "lon": lon[usable], "lat": lat[usable]})
+    center = frame.groupby("code")[["lon", "lat"]].transform("median")
+    frame["dist"] = haversine_m(frame["lat"], frame["lon"], center["lat"], center["lon"])
+    grouped = frame.groupby("code")["dist"]
+    threshold = np.maximum(
+        config.GEO_OUTLIER_MIN_KM * 1000,
+        config.GEO_OUTLIER_SCALE * grouped.transform("median").to_numpy(),
+    )
+    flagged = np.zeros(len(lon), dtype=bool)
+    flagged[usable] = (grouped.transform("size").to_numpy() >= config.GEO_OUTLIER_MIN_GROUP) & (
+        frame["dist"].to_numpy() > threshold
+    )
+    return flagged
+
+
+def _polygon_mismatch(
+    located: np.ndarray, names: np.ndarray, declared: pd.Series, has_point: np.ndarray
+) -> np.ndarray:
+    """Flag points whose containing polygon is not the declared one."""
+    if all(name is None for name in names):
+        return np.zeros(len(located), dtype=bool)
+    declared = declared.astype(object).to_numpy()
+    found = np.where(located >= 0, names[np.maximum(located, 0)], None)
+    known = has_point & pd.notna(declared)
+    return known & ((located < 0) | (found != declared))
+
+
+def find_duplicates(lon: np.ndarray, lat: np.ndarray, radius_m: float) -> np.ndarray:
+    """Return, per point, the position of the first point within *radius_m*.
+
+    Points are hashed into cells of *radius_m*; only the 3 × 3 cells
+    around each point are compared, all at once.
+
+    Returns:
+        Position of the earliest other point within the radius, ``-1``
+        if there is none (or the point has no coordinates).
+    """
+    result = np.full(len(lon), -1, dtype=np.intp)
+    located = np.flatnonzero(~np.isnan(lon) & ~np.isnan(lat))
+    if len(located) < 2:
+        return result
+    x, y = lon[located], lat[located]
+    dlat = np.degrees(radius_m / EARTH_RADIUS_M)
+    dlon = dlat / np.cos(np.radians(min(np.abs(y).max(), 89.0)))
+    cy = np.floor(y / dlat).astype(np.int64)
+    cx = np.floor(x / dlon).astype(np.int64)
+    cy -= cy.min() - 1
+    cx -= cx.min() - 1
+    width = int(cx.max()) + 2
+    key = cy * width + cx
+    order = np.argsort(key, kind="stable")
+    sorted_key = key[order]
+
+    first = np.full(len(located), len(located), dtype=np.intp)
+    for offset in (-width - 1, -width, -width + 1, -1, 0, 1, width - 1, width, width + 1):
+        lo = np.searchsorted(sorted_key, key + offset, side="left")
+        hi = np.searchsorted(sorted_key, key + offset, side="right")
+        counts = hi - lo
+        if not counts.any():
+            continue
+        i = np.repeat(np.arange(len(located)), counts)
+        within = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        j = order[np.repeat(lo, counts) + within]
+        close = (j < i) & (haversine_m(y[i], x[i], y[j], x[j]) <= radius_m)
+        np.minimum.at(first, i[close], j[close])
+    duplicate = first < len(located)
+    result[located[duplicate]] = located[first[duplicate]]
+    return result
+
+
+def flag_anomalies(df: pd.DataFrame, keys: np.ndarray) -> pd.DataFrame:
+    """Add the location and duplicate quality columns to a cleaned frame.
+
+    Args:
+        df: Cleaned DataFrame with ``longitude``/``latitude`` (after
+            :func:`fix_coordinates`), ``properties.OTG`` and
+            ``properties.Rajon``.
+        keys: Identity key of every row of *df* (``feature_delta.KEY_COL``).
+
+    Returns:
+        *df* with ``quality.OtgMismatch``, ``quality.RajonMismatch`` and
+        ``quality.DuplicateOf`` (nullable identity key).
+    """
+    lon = df["longitude"].to_numpy(dtype=float, na_value=np.nan)
+    lat = df["latitude"].to_numpy(dtype=float, na_value=np.nan)
+    has_point = ~np.isnan(lon) & ~np.isnan(lat)
+
+    if len(boundaries):
+        located = boundaries.locate(lon, lat)
+        otg = _polygon_mismatch(located, boundaries.otg, df["properties.OTG"], has_point)
+        rajon = _polygon_mismatch(
+            located, boundaries.rajon, df["properties.Rajon"], has_point
+        )
+    else:
+        otg = _group_outliers(lon, lat, df["properties.OTG"])
+        rajon = _group_outliers(lon, lat, df["properties.Rajon"])
+
+    duplicate = find_duplicates(lon, lat, config.GEO_DUPLICATE_M)
+    df["quality.OtgMismatch"] = otg
+    df["quality.RajonMismatch"] = rajon
+    keys = np.asarray(keys, dtype=np.uint64)
+    duplicate_of = pd.array(keys[duplicate], dtype="UInt64")
+    duplicate_of[duplicate < 0] = pd.NA
+    df["quality.DuplicateOf"] = duplicate_of
+    return df
+
+
+ANOMALY_COLUMNS = ["quality.OtgMismatch", "quality.RajonMismatch", "quality.DuplicateOf"]
+
+# Summary labels of :func:`report`
+REPORT_LABELS = {
+    "swapped": "Виправлено переставлені координати",
+    "outside": "Поза межами області (приховано)",
+    "missing": "Без координат",
+    "otg": "Не відповідає ОТГ",
+    "rajon": "Не відповідає району",
+    "duplicates": "Дублікати (до {m} м)",
+}
+
+
+def report(df: pd.DataFrame) -> pd.Series:
+    """Return the number of shelters per quality finding.
+
+    Args:
+        df: Cleaned DataFrame with the ``quality.*`` columns.
+
+    Returns:
+        Counts indexed by the Ukrainian labels of :data:`REPORT_LABELS`.
+    """
+    coords = df["quality.Coords"]
+    counts = {
+        "swapped": int((coords == COORDS_SWAPPED).sum()),
+        "outside": int((coords == COORDS_OUTSIDE).sum()),
+        "missing": int((coords == COORDS_MISSING).sum()),
+        "otg": int(df["quality.OtgMismatch"].sum()),
+        "rajon": int(df["quality.RajonMismatch"].sum()),
+        "duplicates": int(df["quality.DuplicateOf"].notna().sum()),
+    }
+    return pd.Series(
+        {
+            REPORT_LABELS[key].format(m=config.GEO_DUPLICATE_M): value
+            for key, value in counts.items()
+        },
+        name="Кількість",
+    )
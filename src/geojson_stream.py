@@ -0,0 +1,196 @@
+"""
+geojson_stream.py
+
+Incremental GeoJSON ingestion with bounded memory.
+
+The ``FeatureCollection`` is read chunk by chunk; top-level members are
+walked with ``json.JSONDecoder.raw_decode`` and each element of the
+``features`` array is decoded on its own, so neither the raw text nor the
+whole dict tree has to be held at once. Features are flattened into
+per-column lists and emitted as DataFrames of at most ``batch_size`` rows
+with the same columns ``pd.json_normalize(raw, record_path=["features"])``
+produces for flat ``properties`` (``type``, ``properties.*``,
+``geometry.type``, ``geometry.coordinates``).
+"""
+
+from __future__ import annotations
+
+import codecs
+import json
+import re
+from collections.abc import Iterable, Iterator
+from typing import BinaryIO
+
+import pandas as pd
+
+import config
+
+_DECODER = json.JSONDecoder()
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+_MISSING = float("nan")  # absent keys, as filled in by ``pd.json_normalize``
+
+
+class _Reader:
+    """Text buffer over a chunked byte stream with ``raw_decode`` access."""
+
+    def __init__(self, chunks: Iterable[bytes]):
+        self._chunks = iter(chunks)
+        self._utf8 = codecs.getincrementaldecoder("utf-8-sig")()
+        self._buf = ""
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self) -> bool:
+        """Append the next chunk; return ``False`` at end of stream."""
+        if self._eof:
+            return False
+        if self._pos > len(self._buf) // 2:
+            self._buf = self._buf[self._pos :]
+            self._pos = 0
+        chunk = next(self._chunks, None)
+        if chunk is None:
+            self._buf += self._utf8.decode(b"", final=True)
+            self._eof = True
+        else:
+            self._buf += self._utf8.decode(chunk)
+        return True
+
+    def peek(self) -> str:
+        """Return the next non-whitespace character, ``""`` at the end."""
+        while True:
+            self._pos = _WHITESPACE.match(self._buf, self._pos).end()
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, char: str) -> None:
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"GeoJSON: expected {char!r}, found {found!r}")
+        self._pos += 1
+
+    def value(self) -> object:
+        """Decode the next complete JSON value, reading more as needed."""
+        return self.value_text()[0]
+
+    def value_text(self) -> tuple[object, str]:
+        """Like :meth:`value`, also returning the value's source text."""
+        self.peek()
+        while True:
+            try:
+                value, end = _DECODER.raw_decode(self._buf, self._pos)
+            except json.JSONDecodeError:
+                if self._fill():
+                    continue
+                raise
+            # A number may continue in the next chunk
+            if end == len(self._buf) and not self._eof and self._fill():
+                continue
+            text = self._buf[self._pos : end]
+            self._pos = end
+            return value, text
+
+
+def iter_features(chunks: Iterable[bytes]) -> Iterator[dict]:
+    """Yield the features of a ``FeatureCollection`` one at a time.
+
+    Args:
+        chunks: Raw UTF-8 bytes of the document, in any chunk sizes.
+
+    Raises:
+        ValueError: If the document is not an object with a ``features``
+            array.
+    """
+    for feature, _text in iter_feature_texts(chunks):
+        yield feature
+
+
+def iter_feature_texts(chunks: Iterable[bytes]) -> Iterator[tuple[dict, str]]:
+    """Like :func:`iter_features`, yielding ``(feature, source text)`` pairs.
+
+    The source text is the feature exactly as published, e.g. for
+    fingerprinting it without re-serialising.
+    """
+    reader = _Reader(chunks)
+    reader.expect("{")
+    found = False
+    while reader.peek() != "}":
+        key = reader.value()
+        reader.expect(":")
+        if key == "features":
+            found = True
+            reader.expect("[")
+            while reader.peek() != "]":
+                yield reader.value_text()
+                if reader.peek() == ",":
+                    reader.expect(",")
+            reader.expect("]")
+        else:
+            reader.value()  # other members (type, name, crs, ...) are skipped
+        if reader.peek() == ",":
+            reader.expect(",")
+    if not found:
+        raise ValueError("GeoJSON payload has no 'features' collection.")
+
+
+def has_features(chunks: Iterable[bytes]) -> bool:
+    """Return ``True`` if the document is an object with a ``features`` array.
+
+    Only the first feature is decoded.
+    """
+    try:
+        next(iter_features(chunks), None)
+    except ValueError:
+        return False
+    return True
+
+
+def iter_batches(
+    features: Iterable[dict], batch_size: int = config.INGEST_BATCH_SIZE
+) -> Iterator[pd.DataFrame]:
+    """Flatten features into DataFrames of at most *batch_size* rows.
+
+    Row labels continue across batches (``0 .. n-1`` overall), as with a
+    single ``pd.json_normalize`` call; keys a feature lacks are ``NaN``
+    and explicit ``null`` values stay ``None``, also as there.
+    """
+    offset = 0
+    columns: dict[str, list] = {}
+    rows = 0
+
+    def put(column: str, value: object) -> None:
+        values = columns.get(column)
+        if values is None:
+            values = columns[column] = [_MISSING] * rows
+        values.append(value)
+
+    for feature in features:
+        if "type" in feature:
+            put("type", feature["type"])
+        for key, value in (feature.get("properties") or {}).items():
+            put(f"properties.{key}", value)
+        geometry = feature.get("geometry")
+        if isinstance(geometry, dict):
+            for key, value in geometry.items():
+                put(f"geometry.{key}", value)
+        rows += 1
+        for values in columns.values():
+            if len(values) < rows:
+                values.append(_MISSING)
+
+        if rows == batch_size:
+            yield pd.DataFrame(columns, index=pd.RangeIndex(offset, offset + rows))
+            offset += rows
+            columns, rows = {}, 0
+
+    if rows:
+        yield pd.DataFrame(columns, index=pd.RangeIndex(offset, offset + rows))
+
+
+def iter_file_chunks(
+    fh: BinaryIO, chunk_size: int = config.STREAM_CHUNK_SIZE
+) -> Iterator[bytes]:
+    """Yield *fh* in chunks of *chunk_size* bytes."""
+    while chunk := fh.read(chunk_size):
+        yield chunk
@@ -0,0 +1,155 @@
+"""
+http_client.py
+
+HTTP client of the fetch layer: one pooled, cached session for the CKAN
+API and the GeoJSON downloads, with connect/read timeouts on every
+request, bounded exponential-backoff retries and concurrent fetches.
+
+Requests up to the response headers (connection errors, read timeouts,
+``429``/``5xx`` answers, honouring ``Retry-After``) are retried by the
+session's adapter; a streamed body that breaks off is retried by
+:func:`with_retries`. Compressed bodies (gzip, deflate) are negotiated and
+decoded by ``urllib3``. The CKAN API answers are kept in a ``requests-cache``
+SQLite store for ``config.HTTP_CACHE_EXPIRE`` seconds.
+"""
+
+from __future__ import annotations
+
+import logging
+import random
+import threading
+import time
+from collections.abc import Callable, Iterable
+from concurrent.futures import ThreadPoolExecutor
+from typing import TypeVar
+
+import requests
+import requests_cache
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import config
+
+logger = logging.getLogger(config.LOGGER_NAME)
+
+T = TypeVar("T")
+
+# Answers retried by the adapter; everything else is returned as is
+_RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class BrokenBody(requests.RequestException):
+    """The connection broke off while a response body was being read."""
+
+
+class _Session(requests_cache.CachedSession):
+    """Cached session that applies ``config.HTTP_TIMEOUT`` to every request."""
+
+    def request(self, method: str, url: str, *args, **kwargs) -> requests.Response:
+        # ckanapi passes timeout=None explicitly
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = config.HTTP_TIMEOUT
+        return super().request(method, url, *args, **kwargs)
+
+
+def _retry() -> Retry:
+    return Retry(
+        total=config.HTTP_RETRIES,
+        status_forcelist=_RETRY_STATUSES,
+        # package_show is POSTed by ckanapi but only reads
+        allowed_methods=frozenset({"GET", "HEAD", "POST"}),
+        backoff_factor=config.HTTP_BACKOFF_FACTOR,
+        backoff_max=config.HTTP_BACKOFF_MAX,
+        backoff_jitter=config.HTTP_BACKOFF_FACTOR,
+        raise_on_status=False,
+    )
+
+
+def _create_session() -> _Session:
+    if config.HTTP_CACHE_PATH:
+        cache = {"cache_name": config.HTTP_CACHE_PATH, "backend": "sqlite"}
+        api_expire = config.HTTP_CACHE_EXPIRE
+    else:
+        cache = {"backend": "memory"}
+        api_expire = requests_cache.DO_NOT_CACHE
+    session = _Session(
+        **cache,
+        expire_after=requests_cache.DO_NOT_CACHE,
+        urls_expire_after={"*/api/action/*": api_expire},
+        allowable_methods=("GET", "HEAD", "POST"),
+    )
+    adapter = HTTPAdapter(
+        pool_connections=config.HTTP_POOL_SIZE,
+        pool_maxsize=config.HTTP_POOL_SIZE,
+        max_retries=_retry(),
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+_session: _Session | None = None
+_session_lock = threading.Lock()
+
+
+def session() -> requests.Session:
+    """Return the process-wide session, created on first use."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = _create_session()
+    return _session
+
+
+def backoff(attempt: int) -> float:
+    """Return the seconds to wait before retry *attempt* (from 1).
+
+    Same schedule as the adapter's retries: the first retry is
+    immediate, then the delay doubles from ``2 * HTTP_BACKOFF_FACTOR``,
+    with jitter.
+    """
+    if attempt <= 1:
+        return 0.0
+    delay = min(config.HTTP_BACKOFF_MAX, config.HTTP_BACKOFF_FACTOR * 2 ** (attempt - 1))
+    return delay + random.uniform(0, config.HTTP_BACKOFF_FACTOR)
+
+
+def with_retries(call: Callable[[], T], what: str) -> T:
+    """Return ``call()``, calling it again after a backoff if it raises ``BrokenBody``.
+
+    Args:
+        call: Request that reads a whole body; it must be safe to repeat.
+        what: Description for the log.
+
+    Raises:
+        BrokenBody: The body broke off ``config.HTTP_RETRIES + 1`` times.
+    """
+    attempt = 0
+    while True:
+        try:
+            return call()
+        except BrokenBody as exc:
+            if attempt == config.HTTP_RETRIES:
+                raise
+            attempt += 1
+            delay = backoff(attempt)
+            logger.warning(f"{what}: body broke off ({exc.__cause__}), retry in {delay:.1f} s.")
+            time.sleep(delay)
+
+
+def fetch_all(calls: Iterable[Callable[[], T]]) -> list[T]:
+    """Run *calls* concurrently on up to ``config.HTTP_MAX_WORKERS`` threads.
+
+    The session's connection pool is shared, so fetches from the same
+    portal reuse its connections.
+
+    Returns:
+        The results of *calls*, in order. The first exception raised by a
+        call is re-raised.
+    """
+    calls = list(calls)
+    if len(calls) <= 1:
+        return [call() for call in calls]
+    workers = min(config.HTTP_MAX_WORKERS, len(calls))
+    with ThreadPoolExecutor(workers, thread_name_prefix="fetch") as pool:
+        return list(pool.map(lambda call: call(), calls))
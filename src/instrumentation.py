@@ -0,0 +1,597 @@
+"""
+instrumentation.py
+
+Per-stage timing of the data pipeline and the page run.
+
+Stages are timed with :func:`stage` (a context manager, or ``start()`` /
+``stop()`` around top-level page code), :func:`timed` (a decorator) and
+:func:`timed_iter` (each item of a generator). Every sample records the
+wall time, the rows going in and out (``len`` of the first argument and
+of the result, where those are frames or arrays) and, while
+``tracemalloc`` is tracing, the change in traced memory. Samples are
+aggregated per stage into fixed-bucket histograms in the process-wide
+:data:`registry` and exposed as Prometheus text (:meth:`Registry.prometheus`,
+served on ``config.METRICS_PORT`` by :func:`serve`) and as a table for
+the diagnostics view.
+
+With ``config.METRICS_ENABLED`` off, :func:`timed` returns the function
+itself and :func:`stage` a shared no-op span, so instrumented code costs
+one call per stage at most.
+
+:class:`ProfileCapture` runs ``cProfile`` and ``tracemalloc`` around a
+single page run or pipeline call; both are process-wide, so one capture
+runs at a time.
+"""
+
+from __future__ import annotations
+
+import cProfile
+import functools
+import io
+import itertools
+import logging
+import pstats
+import threading
+import time
+import tracemalloc
+from bisect import bisect_left
+from collections.abc import Callable, Iterable, Iterator
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+
+import config
+
+logger = logging.getLogger(config.LOGGER_NAME)
+
+_PREFIX = "shelters_stage"
+_SUMMARY_COLUMNS = [
+    "stage", "calls", "errors", "total s", "mean ms", "p50 ms", "p95 ms", "max ms",
+    "rows in", "rows out", "alloc KiB",
+]
+
+
+class Histogram:
+    """Counts of observed values per bucket, in the Prometheus layout.
+
+    Args:
+        bounds: Increasing upper bucket bounds; a ``+Inf`` bucket is added.
+    """
+
+    def __init__(self, bounds: Iterable[float]):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        # Buckets are "less than or equal", as Prometheus' ``le``
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+        self.max = max(self.max, value)
+
+    def cumulative(self) -> list[int]:
+        """Return the cumulative counts of every bucket, ``+Inf`` last."""
+        return list(itertools.accumulate(self.counts))
+
+    def quantile(self, q: float) -> float:
+        """Estimate the *q* quantile by interpolating inside its bucket.
+
+        Values in the ``+Inf`` bucket are estimated as :attr:`max`.
+        """
+        if not self.count:
+            return float("nan")
+        rank = q * self.count
+        below = 0
+        for i, count in enumerate(self.counts):
+            if count and below + count >= rank:
+                if i == len(self.bounds):
+                    return self.max
+                lower = self.bounds[i - 1] if i else 0.0
+                upper = min(self.bounds[i], self.max)
+                return lower + (upper - lower) * (rank - below) / count
+            below += count
+        return self.max
+
+
+@dataclass
+class StageStats:
+    """Aggregated samples of one stage.
+
+    Attributes:
+        seconds: Wall time histogram.
+        alloc: Traced memory change histogram (bytes); only samples taken
+            while ``tracemalloc`` traces.
+        rows_in: Total rows passed in.
+        rows_out: Total rows returned.
+        errors: Samples that ended with an exception.
+        last_rows_in: Rows passed in by the last sample.
+        last_rows_out: Rows returned by the last sample.
+    """
+
+    seconds: Histogram
+    alloc: Histogram
+    rows_in: int = 0
+    rows_out: int = 0
+    errors: int = 0
+    last_rows_in: int | None = None
+    last_rows_out: int | None = None
+
+
+def _label(value: str) -> str:
+    return value.replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
+
+
+def _number(value: float) -> str:
+    return "+Inf" if value == float("inf") else repr(float(value))
+
+
+class Registry:
+    """Process-wide samples per stage name.
+
+    Args:
+        seconds_buckets: Bucket bounds of the wall time histograms.
+        bytes_buckets: Bucket bounds of the allocation histograms.
+    """
+
+    def __init__(
+        self,
+        seconds_buckets: Iterable[float] = config.METRICS_SECONDS_BUCKETS,
+        bytes_buckets: Iterable[float] = config.METRICS_BYTES_BUCKETS,
+    ):
+        self.seconds_buckets = tuple(seconds_buckets)
+        self.bytes_buckets = tuple(bytes_buckets)
+        self._stages: dict[str, StageStats] = {}
+        self._lock = threading.Lock()
+
+    def observe(
+        self,
+        name: str,
+        seconds: float,
+        rows_in: int | None = None,
+        rows_out: int | None = None,
+        alloc: int | None = None,
+        error: bool = False,
+    ) -> None:
+        """Record one sample of stage *name*."""
+        with self._lock:
+            stats = self._stages.get(name)
+            if stats is None:
+                stats = self._stages[name] = StageStats(
+                    Histogram(self.seconds_buckets), Histogram(self.bytes_buckets)
+                )
+            stats.seconds.observe(seconds)
+            if alloc is not None:
+                stats.alloc.observe(alloc)
+            if rows_in is not None:
+                stats.rows_in += rows_in
+            if rows_out is not None:
+                stats.rows_out += rows_out
+            stats.last_rows_in, stats.last_rows_out = rows_in, rows_out
+            stats.errors += error
+
+    def reset(self) -> None:
+        """Drop all samples."""
+        with self._lock:
+            self._stages.clear()
+
+    def summary(self) -> pd.DataFrame:
+        """Return one row per stage: calls, time quantiles, rows and memory."""
+        with self._lock:
+            rows = [
+                {
+                    "stage": name,
+                    "calls": stats.seconds.count,
+                    "errors": stats.errors,
+                    "total s": stats.seconds.sum,
+                    "mean ms": stats.seconds.sum / stats.seconds.count * 1000,
+                    "p50 ms": stats.seconds.quantile(0.5) * 1000,
+                    "p95 ms": stats.seconds.quantile(0.95) * 1000,
+                    "max ms": stats.seconds.max * 1000,
+                    "rows in": stats.last_rows_in,
+                    "rows out": stats.last_rows_out,
+                    "alloc KiB": (
+                        stats.alloc.sum / stats.alloc.count / 1024
+                        if stats.alloc.count
+                        else float("nan")
+                    ),
+                }
+                for name, stats in sorted(self._stages.items())
+            ]
+        summary = pd.DataFrame(rows, columns=_SUMMARY_COLUMNS)
+        return summary.astype({"rows in": "Int64", "rows out": "Int64"})
+
+    def prometheus(self) -> str:
+        """Return all stages in the Prometheus text exposition format."""
+        lines: list[str] = []
+
+        def histogram(metric: str, help_text: str, part: Callable) -> None:
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} histogram")
+            for name, stats in sorted(self._stages.items()):
+                hist = part(stats)
+                if not hist.count:
+                    continue
+                stage = f'stage="{_label(name)}"'
+                for bound, count in zip(hist.bounds + (float("inf"),), hist.cumulative()):
+                    lines.append(f'{metric}_bucket{{{stage},le="{_number(bound)}"}} {count}')
+                lines.append(f"{metric}_sum{{{stage}}} {_number(hist.sum)}")
+                lines.append(f"{metric}_count{{{stage}}} {hist.count}")
+
+        def counter(metric: str, help_text: str, part: Callable) -> None:
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} counter")
+            for name, stats in sorted(self._stages.items()):
+                lines.append(f'{metric}{{stage="{_label(name)}"}} {part(stats)}')
+
+        with self._lock:
+            histogram(
+                f"{_PREFIX}_seconds",
+                "Wall time of pipeline and page stages.",
+                lambda stats: stats.seconds,
+            )
+            histogram(
+                f"{_PREFIX}_alloc_bytes",
+                "Traced memory change of a stage, sampled while tracemalloc runs.",
+                lambda stats: stats.alloc,
+            )
+            counter(
+                f"{_PREFIX}_rows_in_total",
+                "Rows passed into a stage.",
+                lambda stats: stats.rows_in,
+            )
+            counter(
+                f"{_PREFIX}_rows_out_total",
+                "Rows returned by a stage.",
+                lambda stats: stats.rows_out,
+            )
+            counter(
+                f"{_PREFIX}_errors_total",
+                "Stage runs that raised.",
+                lambda stats: stats.errors,
+            )
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+def _rows(value: object) -> int | None:
+    """Return the rows of a frame, series or array (or the first of a tuple)."""
+    if isinstance(value, tuple) and value:
+        value = value[0]
+    if isinstance(value, (pd.DataFrame, pd.Series, np.ndarray)):
+        return len(value)
+    return None
+
+
+class Span:
+    """One timed run of a stage.
+
+    Used as a context manager, or with :meth:`start` and :meth:`stop`;
+    :attr:`rows_in` and :attr:`rows_out` may be set before it stops.
+    A span that never stops records nothing.
+    """
+
+    __slots__ = ("name", "rows_in", "rows_out", "_registry", "_started", "_traced")
+
+    def __init__(self, name: str, rows_in: int | None = None, registry: Registry = registry):
+        self.name = name
+        self.rows_in = rows_in
+        self.rows_out: int | None = None
+        self._registry = registry
+        self._started = 0.0
+        self._traced: int | None = None
+
+    def start(self) -> Span:
+        self._traced = tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else None
+        self._started = time.perf_counter()
+        return self
+
+    def stop(self, error: bool = False) -> float:
+        """Record the sample and return its wall time in seconds."""
+        seconds = time.perf_counter() - self._started
+        alloc = None
+        if self._traced is not None and tracemalloc.is_tracing():
+            alloc = max(tracemalloc.get_traced_memory()[0] - self._traced, 0)
+        self._registry.observe(self.name, seconds, self.rows_in, self.rows_out, alloc, error)
+        return seconds
+
+    def __enter__(self) -> Span:
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        # Streamlit's rerun and stop signals are not Exceptions
+        self.stop(error=isinstance(exc, Exception))
+
+
+class _NullSpan:
+    """Span of disabled instrumentation; records nothing."""
+
+    __slots__ = ()
+    rows_in = rows_out = None
+
+    def __setattr__(self, name: str, value: object) -> None:
+        pass
+
+    def start(self) -> _NullSpan:
+        return self
+
+    def stop(self, error: bool = False) -> float:
+        return 0.0
+
+    def __enter__(self) -> _NullSpan:
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def stage(name: str, rows_in: int | None = None) -> Span | _NullSpan:
+    """Return a span timing stage *name* (not started)."""
+    if not config.METRICS_ENABLED:
+        return _NULL_SPAN
+    return Span(name, rows_in)
+
+
+def timed(name: str) -> Callable[[Callable], Callable]:
+    """Time every call of the decorated function as stage *name*.
+
+    Rows in are those of the first argument, rows out those of the result.
+    """
+
+    def decorate(fn: Callable) -> Callable:
+        if not config.METRICS_ENABLED:
+            return fn
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            span = Span(name, _rows(args[0]) if args else None).start()
+            try:
+                result = fn(*args, **kwargs)
+            except Exception:
+                span.stop(error=True)
+                raise
+            span.rows_out = _rows(result)
+            span.stop()
+            return result
+
+        return wrapper
+
+    return decorate
+
+
+def call(name: str, fn: Callable, *args, **kwargs):
+    """Call ``fn(*args, **kwargs)`` timed as stage *name* (see :func:`timed`)."""
+    return timed(name)(fn)(*args, **kwargs)
+
+
+def timed_iter(name: str, items: Iterable) -> Iterator:
+    """Yield from *items*, timing the production of each item as stage *name*.
+
+    Rows out are those of the item; the consumer's time is not counted.
+    """
+    if not config.METRICS_ENABLED:
+        yield from items
+        return
+    iterator = iter(items)
+    while True:
+        span = Span(name).start()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        except Exception:
+            span.stop(error=True)
+            raise
+        span.rows_out = _rows(item)
+        span.stop()
+        yield item
+
+
+# ---------------------------------------------------------------------------
+# Profile capture
+# ---------------------------------------------------------------------------
+
+
+@dataclass(frozen=True)
+class Profile:
+    """Result of a :class:`ProfileCapture`.
+
+    Attributes:
+        seconds: Wall time of the capture.
+        functions: Top functions by cumulative time (``pstats`` columns).
+        allocations: Top source lines by memory allocated and still held
+            at the end of the capture.
+        peak_bytes: Peak traced memory during the capture.
+        text: ``pstats`` report of the top functions.
+    """
+
+    seconds: float
+    functions: pd.DataFrame
+    allocations: pd.DataFrame
+    peak_bytes: int
+    text: str = field(repr=False)
+
+
+class ProfileCapture:
+    """``cProfile`` and ``tracemalloc`` around one page run or call.
+
+    Use as a context manager, or with :meth:`start` and :meth:`stop`
+    around top-level page code. The profiler only sees the thread that
+    started it, while ``tracemalloc`` counts allocations of the whole
+    process.
+
+    Args:
+        top: Rows kept in the function and allocation tables.
+        max_seconds: Age after which an unfinished capture (its run was
+            interrupted before :meth:`stop`) no longer blocks new ones.
+    """
+
+    _active: ProfileCapture | None = None
+    _active_lock = threading.Lock()
+
+    def __init__(self, top: int = config.PROFILE_TOP, max_seconds: float = 300.0):
+        self.top = top
+        self.max_seconds = max_seconds
+        self._profile: cProfile.Profile | None = None
+        self._started = 0.0
+        self._traced_before = False
+        self.result: Profile | None = None
+
+    def start(self) -> bool:
+        """Start capturing; ``False`` if another capture is running."""
+        cls = type(self)
+        with cls._active_lock:
+            active = cls._active
+            if active is not None:
+                if time.perf_counter() - active._started < active.max_seconds:
+                    return False
+                active._abort()
+            self._traced_before = tracemalloc.is_tracing()
+            if not self._traced_before:
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            self._profile = cProfile.Profile()
+            try:
+                self._profile.enable()
+            except ValueError:  # another profiler is active in this process
+                self._profile = None
+                if not self._traced_before:
+                    tracemalloc.stop()
+                return False
+            self._started = time.perf_counter()
+            cls._active = self
+        return True
+
+    def stop(self) -> Profile | None:
+        """Stop capturing and return the result, ``None`` if not capturing.
+
+        The result is also kept in :attr:`result`.
+        """
+        cls = type(self)
+        with cls._active_lock:
+            if cls._active is not self or self._profile is None:
+                return None
+            self._profile.disable()
+            seconds = time.perf_counter() - self._started
+            snapshot = tracemalloc.take_snapshot()
+            peak = tracemalloc.get_traced_memory()[1]
+            if not self._traced_before:
+                tracemalloc.stop()
+            cls._active = None
+        self.result = self._result(seconds, snapshot, peak)
+        return self.result
+
+    def _abort(self) -> None:
+        """Stop an interrupted capture without a result (caller holds the lock)."""
+        if self._profile is not None:
+            try:
+                self._profile.disable()
+            except ValueError:
+                pass
+        if not self._traced_before:
+            tracemalloc.stop()
+        type(self)._active = None
+        logger.warning("Instrumentation: dropped an unfinished profile capture")
+
+    def _result(
+        self, seconds: float, snapshot: tracemalloc.Snapshot, peak: int
+    ) -> Profile:
+        stats = pstats.Stats(self._profile)
+        functions = pd.DataFrame(
+            [
+                {
+                    "function": f"{pstats.func_std_string(func)}",
+                    "calls": calls,
+                    "own s": own,
+                    "cumulative s": cumulative,
+                }
+                for func, (_prim, calls, own, cumulative, _callers) in stats.stats.items()
+            ],
+            columns=["function", "calls", "own s", "cumulative s"],
+        ).nlargest(self.top, "cumulative s")
+
+        snapshot = snapshot.filter_traces(
+            [tracemalloc.Filter(False, tracemalloc.__file__)]
+        )
+        allocations = pd.DataFrame(
+            [
+                {
+                    "line": str(stat.traceback[0]),
+                    "KiB": stat.size / 1024,
+                    "blocks": stat.count,
+                }
+                for stat in snapshot.statistics("lineno")[: self.top]
+            ],
+            columns=["line", "KiB", "blocks"],
+        )
+
+        text = io.StringIO()
+        stats.stream = text
+        stats.sort_stats("cumulative").print_stats(self.top)
+        return Profile(seconds, functions, allocations, peak, text.getvalue())
+
+    def __enter__(self) -> ProfileCapture:
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.stop()
+
+
+# ---------------------------------------------------------------------------
+# Prometheus endpoint
+# ---------------------------------------------------------------------------
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = registry.prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        logger.debug(f"Instrumentation: {self.address_string()} {format % args}")
+
+
+_server_started = False
+_server_lock = threading.Lock()
+
+
+def serve(port: int | None = config.METRICS_PORT) -> None:
+    """Serve ``GET /metrics`` on *port* from a daemon thread, once per process.
+
+    Does nothing if *port* is ``None`` or the instrumentation is disabled;
+    a port that cannot be bound is logged.
+    """
+    global _server_started
+    if port is None or not config.METRICS_ENABLED:
+        return
+    with _server_lock:
+        if _server_started:
+            return
+        _server_started = True  # a failed bind is not retried on every rerun
+        try:
+            server = ThreadingHTTPServer(("", port), _MetricsHandler)
+        except OSError as exc:
+            logger.error(f"Instrumentation: cannot serve metrics on port {port}: {exc}")
+            return
+        server.daemon_threads = True
+        threading.Thread(
+            target=server.serve_forever, name="metrics-server", daemon=True
+        ).start()
+    logger.info(f"Instrumentation: serving /metrics on port {port}")
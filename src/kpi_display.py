@@ -10,7 +10,10 @@ import pandas as pd
 import plotly.express as px
 import streamlit as st
 
+import instrumentation
 
+
+@instrumentation.timed("render.kpi_card")
 def display_kpi_card(
     title: str,
     kpis: list[int | float | str],
@@ -55,6 +58,7 @@ def display_kpi_card(
     )
 
 
+@instrumentation.timed("render.pie_chart")
 def display_pie_chart(
     df_sum: pd.DataFrame,
     color_palette: list[str] | None = None,
@@ -88,6 +92,7 @@ def display_pie_chart(
     st.plotly_chart(fig, width="stretch")
 
 
+@instrumentation.timed("render.bar_chart")
 def display_bar_chart(
     s: pd.Series,
     title: str | None = None,
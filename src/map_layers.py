@@ -0,0 +1,871 @@
+"""
+map_layers.py
+
+Shelter layers for the leafmap/folium map on the main page.
+
+Three rendering modes are available (``config.MAP_RENDER_MODE``):
+
+* ``"clustered"`` (default) — the cached map carries no shelter data.
+  The map reports its viewport to the server, which answers with the
+  clusters of that zoom level (:mod:`cluster_pyramid`), or past the
+  clustered zooms the individual shelters, inside the viewport only;
+  :class:`ShelterPyramid` draws them.
+* ``"fast"`` — all shelters are shipped as one compact, column-oriented
+  payload to a :class:`ShelterCluster`; markers, tooltips and popups are
+  created in the browser from that payload. The complete map HTML is
+  built once per dataset version and cached; sidebar filters only send
+  the visible shelter IDs to the already loaded map (see
+  :func:`show_shelter_map`).
+* ``"markers"`` — one ``folium.Marker`` with a server-rendered
+  ``folium.Popup`` per shelter (the original implementation), rebuilt on
+  every rerun.
+"""
+
+from __future__ import annotations
+
+import html
+import json
+
+import branca.colormap
+import folium
+import numpy as np
+import leafmap.foliumap as leafmap
+import pandas as pd
+import streamlit as st
+import streamlit.components.v1 as components
+import streamlit.components.v2 as components_v2
+from folium.elements import JSCSSMixin
+from folium.map import Layer
+from folium.plugins import MarkerCluster
+from folium.template import Template
+
+import config
+import data_processing as dp
+from cluster_pyramid import Bounds, ClusterPyramid
+from coverage import CoverageGrid, positions_key
+
+MAP_HEIGHT = 600
+COVERAGE_MAP_HEIGHT = 450
+
+# Heatmap colours from few to many reachable seats
+COVERAGE_COLORS = ["#ffffb2", "#fecc5c", "#fd8d3c", "#f03b20", "#bd0026"]
+
+# (display column, popup label) in popup order; the row index is the ID
+POPUP_FIELDS: list[tuple[str, str]] = [
+    ("Назва", "Назва"),
+    ("ОТГ", "ОТГ"),
+    ("Населений пункт", "Населений пункт"),
+    ("Адреса", "Адреса"),
+    ("Тип", "Тип"),
+    ("Місткість", "Місткість"),
+    ("Інклюзивність", "Інклюзивність"),
+]
+
+
+# Popup and tooltip helpers shared by the client-side layers; ``data`` is
+# a payload of :func:`shelter_payload`
+_POPUP_JS = """
+                var escapeHtml = function (value) {
+                    return String(value).replace(/[&<>"']/g, function (c) {
+                        return {"&": "&amp;", "<": "&lt;", ">": "&gt;",
+                                '"': "&quot;", "'": "&#39;"}[c];
+                    });
+                };
+                var field = function (data, f, i) {
+                    var code = data.fields[f].codes[i];
+                    return code < 0 ? "" : data.fields[f].values[code];
+                };
+                var popupHtml = function (data, i) {
+                    var html = '<div style="font-family:sans-serif; font-size:14px; min-width: 200px;">'
+                        + '<b>ID: </b>' + escapeHtml(data.id[i]) + '<br>';
+                    for (var f = 0; f < data.fields.length; f++) {
+                        html += '<b>' + data.fields[f].label + ': </b>'
+                            + escapeHtml(field(data, f, i)) + '<br>';
+                    }
+                    return html + '<a href="https://www.google.com/maps?q='
+                        + data.lat[i] + ',' + data.lon[i]
+                        + '" target="_blank">Відкрити в Google Maps</a></div>';
+                };
+                var bindShelter = function (marker, data, i) {
+                    marker.bindPopup(popupHtml.bind(null, data, i), {maxWidth: 300});
+                    marker.bindTooltip(escapeHtml(field(data, 0, i)));
+                    return marker;
+                };
+"""
+
+# Filter state handling shared by the client-side layers; expects ``map``
+# and ``applyFilter(state)`` in scope and defines ``report(name, value)``
+# and ``applyState(state)``
+_STATE_JS = """
+                // Map events (viewport, picked point) go to the events
+                // component of the Streamlit page, see show_shelter_map
+                var report = function (name, value) {
+                    try {
+                        window.parent.__tcMapEvent(name, value);
+                    } catch (e) {}  // standalone map or cross-origin host
+                };
+                // Nearest-shelter mode: a clicked point or the browser
+                // location becomes the query point
+                var picking = false;
+                var pointLayer = null;
+                var locateControl = null;
+                var fitted = null;
+                var pick = function (lat, lon) {
+                    report("pick", {lat: +lat.toFixed(5), lon: +lon.toFixed(5)});
+                };
+                map.on("click", function (e) {
+                    if (picking) pick(e.latlng.lat, e.latlng.lng);
+                });
+                var LocateControl = L.Control.extend({
+                    onAdd: function () {
+                        var button = L.DomUtil.create("button", "leaflet-bar");
+                        button.textContent = "📍";
+                        button.title = "Моє місцезнаходження";
+                        button.style.cssText = "width:34px;height:34px;cursor:pointer;background:#fff;";
+                        L.DomEvent.on(button, "click", function (e) {
+                            L.DomEvent.stop(e);
+                            if (!navigator.geolocation) return;
+                            navigator.geolocation.getCurrentPosition(function (p) {
+                                pick(p.coords.latitude, p.coords.longitude);
+                            }, function () {});
+                        });
+                        return button;
+                    }
+                });
+                var showPoint = function (point, fit) {
+                    if (pointLayer) map.removeLayer(pointLayer);
+                    pointLayer = null;
+                    if (!point) {
+                        fitted = null;
+                        return;
+                    }
+                    pointLayer = L.circleMarker(point, {
+                        radius: 8, color: "#d7263d", weight: 3, fillOpacity: 0.8
+                    }).addTo(map);
+                    // Zoom to a query only once, later reruns keep the user's view
+                    var key = JSON.stringify([point, fit]);
+                    if (key === fitted) return;
+                    fitted = key;
+                    map.fitBounds(fit || [point, point], {padding: [40, 40], maxZoom: 16});
+                };
+                var applyState = function (state) {
+                    applyFilter(state);
+                    picking = !!state.pick;
+                    if (picking && !locateControl) {
+                        locateControl = new LocateControl({position: "topleft"}).addTo(map);
+                    } else if (!picking && locateControl) {
+                        map.removeControl(locateControl);
+                        locateControl = null;
+                    }
+                    showPoint(state.point || null, state.fit || null);
+                };
+"""
+
+# Exposes ``tcApplyFilter`` and reads the state published before the map
+# loaded into ``published``
+_PUBLISHED_JS = """
+                window.tcApplyFilter = function (state) {
+                    if (state.version === {{ this.version_js }}) applyState(state);
+                };
+                var published = null;
+                try {
+                    published = window.parent.__tcVisibleIds || null;
+                } catch (e) {}  // standalone map or cross-origin host
+"""
+
+
+class ShelterCluster(MarkerCluster):
+    """Marker cluster whose markers are created in the browser.
+
+    The shelters are embedded once as a column-oriented payload: rounded
+    coordinates, IDs and, per popup field, a dictionary of distinct values
+    plus integer codes (OTG, city and type names repeat across hundreds of
+    rows). Markers are bulk-added with ``addLayers`` and popup HTML is only
+    built when a popup is opened.
+
+    The page exposes ``tcApplyFilter(state)``, which shows only the
+    markers whose ID is in ``state.ids`` (``null`` shows all) without
+    reloading the map. ``state.point`` (``[lat, lon]`` or ``null``) marks
+    a nearest-shelter query point and zooms to ``state.fit``, and with
+    ``state.pick`` a map click or the browser location is reported to
+    :func:`show_shelter_map` as the new query point. A state already
+    published by :func:`_filter_bridge_html` in the parent Streamlit page
+    is applied when the map loads.
+
+    Args:
+        payload: Output of :func:`shelter_payload`.
+        version: Dataset version; filters for another version are ignored.
+        name: Layer name for the layer control.
+    """
+
+    _template = Template(
+        """
+        {% macro script(this, kwargs) %}
+            var {{ this.get_name() }} = (function () {
+                var data = {{ this.payload_js }};
+                var map = {{ this._parent.get_name() }};"""
+        + _POPUP_JS
+        + """
+                var cluster = L.markerClusterGroup({{ this.options|tojavascript }});
+                var markers = new Array(data.id.length);
+                var rowOf = new Map();
+                for (var i = 0; i < data.id.length; i++) {
+                    markers[i] = bindShelter(L.marker([data.lat[i], data.lon[i]]), data, i);
+                    rowOf.set(data.id[i], i);
+                }
+                var applyFilter = function (state) {
+                    var visible = markers;
+                    if (state.ids !== null) {
+                        visible = [];
+                        for (var k = 0; k < state.ids.length; k++) {
+                            if (rowOf.has(state.ids[k])) visible.push(markers[rowOf.get(state.ids[k])]);
+                        }
+                    }
+                    cluster.clearLayers();
+                    cluster.addLayers(visible);
+                };"""
+        + _STATE_JS
+        + _PUBLISHED_JS
+        + """
+                cluster.addTo(map);
+                if (published && published.version === {{ this.version_js }}) {
+                    applyState(published);
+                } else {
+                    cluster.addLayers(markers);
+                }
+                return cluster;
+            })();
+        {% endmacro %}
+        """
+    )
+
+    def __init__(
+        self, payload: dict, version: str = "", name: str | None = None, **kwargs
+    ):
+        super().__init__(name=name, chunked_loading=True, **kwargs)
+        self._name = "ShelterCluster"
+        self.payload_js = _script_json(payload)
+        self.version_js = _script_json(version)
+
+
+class ShelterPyramid(JSCSSMixin, Layer):
+    """Shelter layer drawn from server-side clusters of the current viewport.
+
+    Embeds no shelter payload, only one :func:`pyramid_view`: the clusters
+    (count in the icon, total capacity in the tooltip, a click zooms in)
+    and single shelters of a zoom level, or past ``max_zoom`` the
+    individual shelters, inside a padded viewport. Once the map is panned
+    or zoomed out of that view, the new padded viewport is reported to
+    :func:`show_shelter_map`, which answers with the view for it through
+    ``state.view``. Markers are added and removed by difference, and
+    shelter markers are reused by ID, so an open popup survives a new
+    view. The Leaflet.markercluster script is not needed.
+
+    ``tcApplyFilter(state)`` works as for :class:`ShelterCluster`, except
+    that the filter is already applied to ``state.view``.
+
+    Args:
+        view: :func:`pyramid_view` shown until the first state arrives.
+        min_zoom: Lowest clustered zoom level.
+        max_zoom: Highest clustered zoom level.
+        version: Dataset version; filters for another version are ignored.
+        name: Layer name for the layer control.
+    """
+
+    _template = Template(
+        """
+        {% macro script(this, kwargs) %}
+            var {{ this.get_name() }} = (function () {
+                var initial = {{ this.view_js }};
+                var pyramid = {{ this.pyramid_js }};
+                var map = {{ this._parent.get_name() }};"""
+        + _POPUP_JS
+        + """
+                var layer = L.layerGroup();
+                var markers = new Map();  // shelter ID -> marker
+                var shown = new Map();  // layer key -> marker on the map
+                var clusterIcon = function (count) {
+                    var size = count < 10 ? "small" : count < 100 ? "medium" : "large";
+                    return L.divIcon({
+                        html: "<div><span>" + count + "</span></div>",
+                        className: "marker-cluster marker-cluster-" + size,
+                        iconSize: L.point(40, 40)
+                    });
+                };
+                var levelOf = function (zoom) {
+                    return zoom > pyramid.maxZoom ? pyramid.maxZoom + 1 : Math.max(zoom, pyramid.minZoom);
+                };
+                var view = initial;
+                var requested = null;
+                var covers = function (v) {
+                    return v !== null && levelOf(v.zoom) === levelOf(map.getZoom())
+                        && (v.bounds === null || L.latLngBounds(
+                            [v.bounds[0], v.bounds[1]], [v.bounds[2], v.bounds[3]]
+                        ).contains(map.getBounds()));
+                };
+                var render = function () {
+                    var next = new Map();
+                    var c = view.clusters;
+                    for (var j = 0; j < c.count.length; j++) {
+                        var ckey = "c" + c.lat[j] + "," + c.lon[j] + "," + c.count[j];
+                        var cluster = shown.get(ckey);
+                        if (!cluster) {
+                            var latlng = L.latLng(c.lat[j], c.lon[j]);
+                            cluster = L.marker(latlng, {icon: clusterIcon(c.count[j])});
+                            cluster.bindTooltip(
+                                "Укриттів: " + c.count[j] + ", місткість: " + c.capacity[j]
+                            );
+                            cluster.on("click", map.setView.bind(map, latlng, view.zoom + 2));
+                        }
+                        next.set(ckey, cluster);
+                    }
+                    var data = view.shelters;
+                    for (var i = 0; i < data.id.length; i++) {
+                        var marker = markers.get(data.id[i]);
+                        if (!marker) {
+                            marker = bindShelter(L.marker([data.lat[i], data.lon[i]]), data, i);
+                            markers.set(data.id[i], marker);
+                        }
+                        next.set("s" + data.id[i], marker);
+                    }
+                    shown.forEach(function (old, key) {
+                        if (!next.has(key)) layer.removeLayer(old);
+                    });
+                    next.forEach(function (marker, key) {
+                        if (!shown.has(key)) layer.addLayer(marker);
+                    });
+                    shown = next;
+                };
+                var update = function () {
+                    if (covers(view) || covers(requested)) return;
+                    var b = map.getBounds().pad(0.5);
+                    requested = {
+                        zoom: map.getZoom(),
+                        bounds: [b.getSouth(), b.getWest(), b.getNorth(), b.getEast()]
+                    };
+                    report("viewport", requested);
+                };
+                var applyFilter = function (state) {
+                    view = state.view || initial;
+                    requested = null;
+                    render();
+                };"""
+        + _STATE_JS
+        + _PUBLISHED_JS
+        + """
+                layer.addTo(map);
+                map.on("moveend", update);
+                if (published && published.version === {{ this.version_js }}) {
+                    applyState(published);
+                } else {
+                    render();
+                }
+                update();
+                return layer;
+            })();
+        {% endmacro %}
+        """
+    )
+
+    default_css = [
+        (
+            "markerclustercss",
+            "https://cdnjs.cloudflare.com/ajax/libs/leaflet.markercluster/1.1.0/MarkerCluster.css",
+        ),
+        (
+            "markerclusterdefaultcss",
+            "https://cdnjs.cloudflare.com/ajax/libs/leaflet.markercluster/1.1.0/MarkerCluster.Default.css",
+        ),
+    ]
+
+    def __init__(
+        self,
+        view: dict,
+        min_zoom: int,
+        max_zoom: int,
+        version: str = "",
+        name: str | None = None,
+    ):
+        super().__init__(name=name, overlay=True)
+        self._name = "ShelterPyramid"
+        self.view_js = _script_json(view)
+        self.pyramid_js = _script_json({"minZoom": min_zoom, "maxZoom": max_zoom})
+        self.version_js = _script_json(version)
+
+
+def _script_json(value: object) -> str:
+    """Serialise *value* as JSON that is safe inside a ``<script>`` block."""
+    return (
+        json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+        .replace("<", "\\u003c")
+        .replace(">", "\\u003e")
+        .replace("&", "\\u0026")
+    )
+
+
+def _located(df: pd.DataFrame) -> pd.DataFrame:
+    """Drop shelters without usable coordinates."""
+    return df.dropna(subset=["latitude", "longitude"])
+
+
+def shelter_payload(df: pd.DataFrame) -> dict:
+    """Return the column-oriented shelter payload for :class:`ShelterCluster`.
+
+    Built with whole-column operations only: coordinates are rounded to
+    six decimals (~0.1 m) and every popup field is dictionary-encoded via
+    ``pd.factorize``.
+
+    Args:
+        df: Filtered display DataFrame.
+    """
+    df = _located(df)
+    fields = []
+    for column, label in POPUP_FIELDS:
+        codes, uniques = pd.factorize(df[column])
+        fields.append(
+            {
+                "label": label,
+                "values": [_json_value(value) for value in uniques],
+                "codes": codes.tolist(),
+            }
+        )
+    return {
+        "lat": df["latitude"].astype(float).round(6).tolist(),
+        "lon": df["longitude"].astype(float).round(6).tolist(),
+        "id": df.index.tolist(),
+        "fields": fields,
+    }
+
+
+def _json_value(value: object) -> object:
+    """Convert NumPy scalars to plain Python values for ``json.dumps``."""
+    return value.item() if hasattr(value, "item") else value
+
+
+def add_shelter_fast_cluster(
+    m: folium.Map, df: pd.DataFrame, version: str = ""
+) -> None:
+    """Add all shelters as one client-side rendered marker cluster.
+
+    Args:
+        m: Map to add the layer to.
+        df: Display DataFrame.
+        version: Dataset version matched against published filters.
+    """
+    ShelterCluster(shelter_payload(df), version=version, name="").add_to(m)
+
+
+def pyramid_view(
+    df_all: pd.DataFrame,
+    pyramid: ClusterPyramid,
+    zoom: int,
+    bounds: Bounds | None = None,
+    positions: np.ndarray | None = None,
+) -> dict:
+    """Return what :class:`ShelterPyramid` draws for one viewport.
+
+    Up to ``pyramid.max_zoom`` these are the clusters of the zoom level
+    and the shelters alone in their cell, beyond it the individual
+    shelters; in both cases only those inside *bounds*.
+
+    Args:
+        df_all: Complete display DataFrame the pyramid was built for.
+        pyramid: Cluster pyramid of *df_all*.
+        zoom: Map zoom level.
+        bounds: ``(south, west, north, east)`` of the padded viewport;
+            ``None`` for the whole map.
+        positions: Row positions of the shelters to show; ``None`` for all.
+
+    Returns:
+        ``zoom`` and ``bounds`` as requested, ``clusters`` (columns
+        ``lat``, ``lon``, ``count`` and ``capacity``) and ``shelters``, a
+        :func:`shelter_payload`.
+    """
+    if zoom > pyramid.max_zoom:
+        lat = lon = capacity = np.empty(0)
+        count = np.empty(0, dtype=np.int64)
+        rows = pyramid.located(bounds, positions)
+    else:
+        lat, lon, count, capacity, rows = pyramid.clusters(zoom, positions, bounds)
+    return {
+        "zoom": zoom,
+        "bounds": [float(b) for b in bounds] if bounds is not None else None,
+        "clusters": {
+            "lat": np.round(lat, 5).tolist(),
+            "lon": np.round(lon, 5).tolist(),
+            "count": count.tolist(),
+            "capacity": np.round(capacity).astype(np.int64).tolist(),
+        },
+        "shelters": shelter_payload(df_all.iloc[np.sort(rows)]),
+    }
+
+
+def add_shelter_pyramid(
+    m: folium.Map, df: pd.DataFrame, pyramid: ClusterPyramid, version: str = ""
+) -> None:
+    """Add all shelters as server-side clusters drawn per viewport.
+
+    The layer starts with the lowest zoom level of the whole map.
+
+    Args:
+        m: Map to add the layer to.
+        df: Display DataFrame.
+        pyramid: Cluster pyramid built for *df*.
+        version: Dataset version matched against published filters.
+    """
+    ShelterPyramid(
+        pyramid_view(df, pyramid, pyramid.min_zoom),
+        pyramid.min_zoom,
+        pyramid.max_zoom,
+        version=version,
+        name="",
+    ).add_to(m)
+
+
+def add_shelter_markers(m: folium.Map, df: pd.DataFrame) -> None:
+    """Add one server-rendered ``folium.Marker`` with popup per shelter.
+
+    Values are HTML-escaped, as in the browser-built popups of the fast
+    mode.
+
+    Args:
+        m: Map to add the layer to.
+        df: Filtered display DataFrame.
+    """
+    marker_cluster = MarkerCluster(name="").add_to(m)
+    df = _located(df)
+    df = df.assign(**{"Посилання": dp.googlemaps_links(df)})
+    for shelter_id, row in df.iterrows():
+        text = {column: html.escape(str(value)) for column, value in row.items()}
+
+        popup_html = f"""
+        <div style="font-family:sans-serif; font-size:14px; min-width: 200px;">
+        <b>ID: </b>{html.escape(str(shelter_id))}<br>
+        <b>Назва: </b>{text['Назва']}<br>
+        <b>ОТГ: </b>{text['ОТГ']}<br>
+        <b>Населений пункт: </b>{text['Населений пункт']}<br>
+        <b>Адреса: </b>{text['Адреса']}<br>
+        <b>Тип: </b>{text['Тип']}<br>
+        <b>Місткість: </b>{text['Місткість']}<br>
+        <b>Інклюзивність: </b>{text['Інклюзивність']}<br>
+        <a href="{text['Посилання']}" target="_blank">Відкрити в Google Maps</a>
+        </div>
+        """
+
+        folium.Marker(
+            location=[row["latitude"], row["longitude"]],
+            popup=folium.Popup(popup_html, max_width=300),
+            tooltip=text["Назва"],  # Shows name when hovering over the marker
+        ).add_to(marker_cluster)
+
+
+def cluster_pyramid(df: pd.DataFrame) -> ClusterPyramid:
+    """Return a :class:`ClusterPyramid` of *df* with the configured zooms."""
+    return ClusterPyramid(
+        df,
+        min_zoom=config.MAP_MIN_ZOOM,
+        max_zoom=config.MAP_CLUSTER_MAX_ZOOM,
+        cell_px=config.MAP_CLUSTER_CELL_PX,
+    )
+
+
+def add_shelter_layer(
+    m: folium.Map, df: pd.DataFrame, mode: str = config.MAP_RENDER_MODE
+) -> None:
+    """Add the shelter layer using the configured rendering *mode*.
+
+    Args:
+        m: Map to add the layer to.
+        df: Filtered display DataFrame.
+        mode: ``"clustered"``, ``"fast"`` or ``"markers"``.
+    """
+    if mode == "markers":
+        add_shelter_markers(m, df)
+    elif mode == "fast":
+        add_shelter_fast_cluster(m, df)
+    else:
+        add_shelter_pyramid(m, df, cluster_pyramid(df))
+
+
+def base_map() -> leafmap.Map:
+    """Return the empty map of Zakarpattia with the HYBRID basemap."""
+    min_lon, min_lat, max_lon, max_lat = config.MAP_BOUNDS
+    m = leafmap.Map(
+        center=list(config.MAP_CENTER),
+        zoom=config.MAP_MIN_ZOOM,
+        min_zoom=config.MAP_MIN_ZOOM,
+        max_bounds=True,
+        min_lat=min_lat,
+        max_lat=max_lat,
+        min_lon=min_lon,
+        max_lon=max_lon,
+    )
+    m.add_basemap("HYBRID")
+    # m.add_basemap("Stadia.StamenTerrainLines")
+    # m.add_basemap("Stadia.StamenTerrainLabels")
+    return m
+
+
+@st.cache_data(max_entries=4)
+def _cached_map_html(
+    version: str, mode: str, _df: pd.DataFrame, _pyramid: ClusterPyramid | None
+) -> str:
+    """Build the full map with every shelter once per dataset *version*.
+
+    The returned HTML is byte-identical across reruns, so Streamlit keeps
+    the existing map iframe instead of reloading it. ``_df`` and
+    ``_pyramid`` are excluded from the cache key.
+    """
+    m = base_map()
+    if mode == "fast":
+        add_shelter_fast_cluster(m, _df, version)
+    else:
+        add_shelter_pyramid(m, _df, _pyramid, version)
+    m.add_layer_control()
+    return m.to_html()
+
+
+def _filter_bridge_html(
+    version: str,
+    ids: list | None,
+    point: tuple[float, float] | None = None,
+    pick: bool = False,
+    view: dict | None = None,
+    fit: list | None = None,
+) -> str:
+    """Return a script that hands the visible shelter IDs to the map.
+
+    The state is stored on the parent Streamlit page (for a map iframe
+    that is still loading) and passed to ``tcApplyFilter`` of every loaded
+    map iframe. Streamlit component iframes are same-origin with the page.
+    *view* is the :func:`pyramid_view` of the visible shelters for
+    :class:`ShelterPyramid`, *fit* the bounds to zoom to for *point*.
+    """
+    state = _script_json(
+        {
+            "version": version,
+            "ids": ids,
+            "point": list(point) if point is not None else None,
+            "fit": fit,
+            "pick": pick,
+            "view": view,
+        }
+    )
+    return f"""<script>
+    (function () {{
+        var state = {state};
+        var host = window.parent;
+        host.__tcVisibleIds = state;
+        var frames = host.document.querySelectorAll("iframe");
+        for (var i = 0; i < frames.length; i++) {{
+            try {{
+                var target = frames[i].contentWindow;
+                if (target && target.tcApplyFilter) {{
+                    target.tcApplyFilter(state);
+                }}
+            }} catch (e) {{}}
+        }}
+    }})();
+    </script>"""
+
+
+# Runs in the Streamlit page and defines ``__tcMapEvent(name, value)`` for
+# the map iframe: the padded viewport is kept as component state, a picked
+# point is sent as a trigger
+_MAP_EVENTS_JS = """
+export default function (component) {
+    const { setStateValue, setTriggerValue } = component;
+    window.__tcMapEvent = function (name, value) {
+        if (name === "viewport") {
+            setStateValue("viewport", value);
+        } else if (name === "pick") {
+            setTriggerValue("pick", value);
+        }
+    };
+}
+"""
+
+_map_events = components_v2.component("shelter_map_events", js=_MAP_EVENTS_JS)
+
+
+def _viewport(value: object) -> tuple[int, Bounds | None]:
+    """Return ``(zoom, bounds)`` of a viewport reported by the map.
+
+    Anything malformed, or no report yet, is the initial view: the lowest
+    zoom level over the whole map.
+    """
+    try:
+        zoom = int(value["zoom"])
+        south, west, north, east = (float(v) for v in value["bounds"])
+    except (KeyError, TypeError, ValueError):
+        return config.MAP_MIN_ZOOM, None
+    return zoom, (south, west, north, east)
+
+
+def _picked_point(value: object) -> tuple[float, float] | None:
+    """Return ``(lat, lon)`` of a point picked on the map, if valid."""
+    try:
+        return round(float(value["lat"]), 5), round(float(value["lon"]), 5)
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def _fit_bounds(
+    df_all: pd.DataFrame, positions: np.ndarray, point: tuple[float, float] | None
+) -> list | None:
+    """Return ``[[south, west], [north, east]]`` around *point* and the shelters."""
+    if point is None:
+        return None
+    shown = _located(df_all.iloc[positions])
+    lat = np.r_[point[0], shown["latitude"].to_numpy(dtype=float)]
+    lon = np.r_[point[1], shown["longitude"].to_numpy(dtype=float)]
+    return [[float(lat.min()), float(lon.min())], [float(lat.max()), float(lon.max())]]
+
+
+@st.fragment
+def show_shelter_map(
+    df_all: pd.DataFrame,
+    positions: np.ndarray,
+    mode: str = config.MAP_RENDER_MODE,
+    point: tuple[float, float] | None = None,
+    pick: bool = False,
+    pyramid: ClusterPyramid | None = None,
+) -> None:
+    """Render the shelter map in the Streamlit page.
+
+    In ``"clustered"`` and ``"fast"`` mode the map is served from
+    :func:`_cached_map_html` and each rerun only sends the filter state.
+    When clustered, that state holds the :func:`pyramid_view` of the
+    visible shelters for the viewport the map last reported; a new
+    viewport reruns only this fragment. In ``"fast"`` mode it holds the
+    IDs at *positions* and the browser hides and shows markers in place.
+    In ``"markers"`` mode the map is rebuilt from those rows every time.
+
+    A point picked on the map is written to the ``?lat=&lon=`` query
+    parameters and the page is rerun with it.
+
+    Args:
+        df_all: Complete display DataFrame.
+        positions: Row positions of the shelters to show.
+        mode: ``"clustered"``, ``"fast"`` or ``"markers"``.
+        point: ``(lat, lon)`` of a nearest-shelter query to mark and zoom to.
+        pick: Let a map click or the browser location set the query
+            point (not in ``"markers"`` mode).
+        pyramid: Cluster pyramid of *df_all* (``ShelterDataset.clusters``);
+            built on the fly if missing or stale.
+    """
+    fit = _fit_bounds(df_all, positions, point)
+    if mode == "markers":
+        m = base_map()
+        add_shelter_markers(m, df_all.iloc[positions])
+        if point is not None:
+            folium.CircleMarker(
+                location=list(point), radius=8, color="#d7263d", fill_opacity=0.8
+            ).add_to(m)
+            m.fit_bounds(fit)
+        m.to_streamlit(height=MAP_HEIGHT)
+        return
+
+    if mode != "fast" and (pyramid is None or not pyramid.matches(df_all)):
+        pyramid = cluster_pyramid(df_all)
+    version = dp.dataset_version(df_all)
+    components.html(
+        _cached_map_html(version, mode, df_all, pyramid), height=MAP_HEIGHT
+    )
+    events = _map_events(
+        key="shelter_map_events",
+        height="content",
+        on_viewport_change=lambda: None,
+        on_pick_change=lambda: None,
+    )
+    filtered = len(positions) != len(df_all)
+    ids, view = None, None
+    if mode == "fast":
+        ids = df_all.index[positions].tolist() if filtered else None
+    else:
+        zoom, bounds = _viewport(events.get("viewport"))
+        view = pyramid_view(
+            df_all, pyramid, zoom, bounds, positions if filtered else None
+        )
+    components.html(_filter_bridge_html(version, ids, point, pick, view, fit), height=0)
+
+    picked = _picked_point(events.get("pick"))
+    if pick and picked is not None and picked != point:
+        st.query_params.update(lat=f"{picked[0]:.5f}", lon=f"{picked[1]:.5f}")
+        st.rerun()
+
+
+def coverage_image(reachable: np.ndarray) -> tuple[np.ndarray, float]:
+    """Colour a reachable-seats grid for an ``ImageOverlay``.
+
+    Values are scaled logarithmically up to the maximum (one large shelter
+    would otherwise wash out the rest) and mapped through
+    :data:`COVERAGE_COLORS`; cells without any reachable seat stay
+    transparent.
+
+    Returns:
+        ``(RGBA uint8 image, maximum value)``.
+    """
+    top = float(reachable.max()) if reachable.size else 0.0
+    scale = np.log1p(reachable) / np.log1p(top) if top > 0 else np.zeros(reachable.shape)
+    stops = np.linspace(0, 1, len(COVERAGE_COLORS))
+    rgb = np.array(
+        [[int(c[i : i + 2], 16) for i in (1, 3, 5)] for c in COVERAGE_COLORS], dtype=float
+    )
+    image = np.empty(reachable.shape + (4,), dtype=np.uint8)
+    for channel in range(3):
+        image[..., channel] = np.interp(scale, stops, rgb[:, channel])
+    image[..., 3] = np.where(reachable > 0, 170, 0)
+    return image, top
+
+
+@st.cache_data(max_entries=16)
+def _coverage_map_html(
+    version: str,
+    radius_m: float,
+    key: bytes | None,
+    _grid: CoverageGrid,
+    _positions: np.ndarray | None,
+) -> str:
+    """Build the coverage heatmap once per dataset, radius and filter set.
+
+    *key* identifies the filtered positions; ``_grid`` and ``_positions``
+    are excluded from the cache key.
+    """
+    image, top = coverage_image(_grid.reachable(radius_m, _positions))
+    m = base_map()
+    folium.raster_layers.ImageOverlay(
+        image,
+        bounds=_grid.latlon_bounds,
+        mercator_project=True,
+        name=f"Місць у радіусі {radius_m:,} м",
+    ).add_to(m)
+    # The log scale of the image, as seat counts
+    index = np.expm1(np.linspace(0, np.log1p(max(top, 1.0)), len(COVERAGE_COLORS)))
+    legend = branca.colormap.LinearColormap(
+        COVERAGE_COLORS,
+        index=index.round(1).tolist(),
+        caption=f"Місць в укриттях у радіусі {radius_m:,} м",
+    )
+    legend.add_to(m)
+    return m.to_html()
+
+
+def show_coverage_map(
+    grid: CoverageGrid,
+    positions: np.ndarray | None,
+    radius_m: float,
+    version: str,
+) -> None:
+    """Render the reachable-capacity heatmap in the Streamlit page.
+
+    Args:
+        grid: Coverage grid of the dataset (``ShelterDataset.coverage``).
+        positions: Row positions allowed by the filters.
+        radius_m: Walking radius in metres.
+        version: Dataset version, part of the cache key.
+    """
+    html = _coverage_map_html(
+        version, radius_m, positions_key(positions), grid, positions
+    )
+    components.html(html, height=COVERAGE_MAP_HEIGHT)
@@ -0,0 +1,109 @@
+"""
+normalizer.py
+
+Single-pass text normalisation engine for the ``_clean_*`` column pipeline.
+
+A column's rule list (homoglyph translation, regex substitutions from
+``config_regex``, dictionary corrections, ...) is compiled into one
+``str -> str`` function. Applied to a Series, every distinct raw value is
+normalised exactly once and the results are broadcast back through
+factorized codes, instead of running one full-column ``Series.str`` pass
+per rule. Missing values (``None``/``NaN``) stay missing.
+"""
+
+from __future__ import annotations
+
+import re
+from collections.abc import Callable, Mapping
+from dataclasses import dataclass
+from functools import partial
+
+import numpy as np
+import pandas as pd
+
+Rule = Callable[[str], str]
+
+
+# ---------------------------------------------------------------------------
+# Rule constructors
+# ---------------------------------------------------------------------------
+
+
+def translate(table: Mapping[int, str | int | None]) -> Rule:
+    """Rule applying ``str.translate`` with *table*."""
+    return partial(_translate, table=table)
+
+
+def _translate(text: str, table: Mapping[int, str | int | None]) -> str:
+    return text.translate(table)
+
+
+def sub(pattern: re.Pattern[str], repl: str) -> Rule:
+    """Rule replacing every match of the compiled *pattern* with *repl*."""
+    return partial(pattern.sub, repl)
+
+
+def replace(old: str, new: str) -> Rule:
+    """Rule replacing every literal occurrence of *old* with *new*."""
+    return partial(_replace, old=old, new=new)
+
+
+def _replace(text: str, old: str, new: str) -> str:
+    return text.replace(old, new)
+
+
+def lookup(mapping: Mapping[str, str]) -> Rule:
+    """Rule replacing whole values found in *mapping* (like ``Series.replace``)."""
+    return partial(_lookup, mapping=mapping)
+
+
+def _lookup(text: str, mapping: Mapping[str, str]) -> str:
+    return mapping.get(text, text)
+
+
+def capitalize_first(text: str) -> str:
+    """Rule upper-casing only the first character of *text*."""
+    return text[:1].upper() + text[1:]
+
+
+strip: Rule = str.strip
+
+
+# ---------------------------------------------------------------------------
+# Engine
+# ---------------------------------------------------------------------------
+
+
+@dataclass(frozen=True)
+class Normalizer:
+    """A compiled, ordered list of string rules.
+
+    Attributes:
+        rules: Rules applied left to right to each value.
+    """
+
+    rules: tuple[Rule, ...]
+
+    def __add__(self, rules: tuple[Rule, ...]) -> Normalizer:
+        return Normalizer(self.rules + tuple(rules))
+
+    def __call__(self, text: str) -> str:
+        for rule in self.rules:
+            text = rule(text)
+        return text
+
+    def apply(self, s: pd.Series) -> pd.Series:
+        """Normalise a Series, running the rules once per distinct value.
+
+        Args:
+            s: Raw string Series.
+
+        Returns:
+            Normalised object Series aligned with *s*; missing values
+            stay missing.
+        """
+        codes, uniques = pd.factorize(s)
+        normalized = np.empty(len(uniques) + 1, dtype=object)
+        normalized[:-1] = [self(str(value)) for value in uniques]
+        normalized[-1] = np.nan
+        return pd.Series(normalized[codes], index=s.index, name=s.name)
@@ -0,0 +1,167 @@
+"""
+refresher.py
+
+Background refresh of the shared dataset (stale-while-revalidate).
+
+One :class:`DatasetRefresher` per process owns the current
+``ShelterDataset``. Page reruns only read the current dataset; a daemon
+thread revalidates upstream every ``config.REFRESH_INTERVAL`` seconds (or
+when woken, e.g. after the correction rules changed), builds the new
+version off the request path and swaps it in with a single assignment.
+While a refresh runs, or after it failed, the last good version keeps
+being served.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from collections.abc import Callable
+from dataclasses import dataclass, replace
+
+import config
+from dataset import ShelterDataset
+
+logger = logging.getLogger(config.LOGGER_NAME)
+
+# (revalidate upstream, current dataset) -> new, unchanged or no dataset
+Loader = Callable[[bool, "ShelterDataset | None"], "ShelterDataset | None"]
+# Called with every newly served dataset
+Publisher = Callable[["ShelterDataset"], None]
+
+
+class StaleData(Exception):
+    """Raised by a loader that could only produce data from a stale snapshot.
+
+    The carried dataset is served, but the refresh is recorded as failed.
+
+    Args:
+        dataset: Dataset built from the last stored snapshot.
+        reason: Why upstream could not be revalidated.
+    """
+
+    def __init__(self, dataset: ShelterDataset, reason: str):
+        super().__init__(reason)
+        self.dataset = dataset
+
+
+@dataclass(frozen=True)
+class RefreshStatus:
+    """Outcome of the most recent refreshes.
+
+    Attributes:
+        version: Version of the dataset being served, if any.
+        last_success: Unix time of the last successful refresh (upstream
+            revalidated, or the local snapshot loaded on start).
+        last_attempt: Unix time the last refresh started.
+        last_duration: Duration of the last finished refresh in seconds.
+        last_error: Error of the last refresh, ``None`` if it succeeded.
+        refreshing: ``True`` while a refresh is running.
+    """
+
+    version: str | None = None
+    last_success: float | None = None
+    last_attempt: float | None = None
+    last_duration: float | None = None
+    last_error: str | None = None
+    refreshing: bool = False
+
+
+class DatasetRefresher:
+    """Serves the current dataset and refreshes it on a background thread.
+
+    Args:
+        load: Loader returning the dataset to serve. Called with
+            ``revalidate=False`` once on start (local snapshot only) and
+            with ``revalidate=True`` from the background thread.
+        interval: Seconds between background refreshes.
+        on_publish: Called with each new dataset once it is served, on
+            the refreshing thread; must return quickly.
+    """
+
+    def __init__(
+        self,
+        load: Loader,
+        interval: float = config.REFRESH_INTERVAL,
+        on_publish: Publisher | None = None,
+    ):
+        self._load = load
+        self.interval = interval
+        self._on_publish = on_publish
+        self._dataset: ShelterDataset | None = None
+        self._status = RefreshStatus()
+        self._lock = threading.Lock()  # serialises refreshes
+        self._wake = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def current(self) -> ShelterDataset | None:
+        """Return the dataset being served, without ever blocking."""
+        return self._dataset
+
+    @property
+    def status(self) -> RefreshStatus:
+        return self._status
+
+    def start(self) -> DatasetRefresher:
+        """Load the local snapshot, then start the background thread once."""
+        if self._thread is not None:
+            return self
+        self.refresh(revalidate=False)
+        # The thread revalidates right away; report it as running already
+        self._status = replace(self._status, refreshing=True)
+        self._thread = threading.Thread(
+            target=self._run, name="dataset-refresher", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def request_refresh(self) -> None:
+        """Wake the background thread for an immediate refresh."""
+        self._wake.set()
+
+    def refresh(self, revalidate: bool = True) -> bool:
+        """Run one refresh and swap in its result.
+
+        Failures are logged and recorded in :attr:`status`; the current
+        dataset stays in place.
+
+        Returns:
+            ``True`` if a dataset is available after the refresh.
+        """
+        with self._lock:
+            started = time.time()
+            self._status = replace(self._status, last_attempt=started, refreshing=True)
+            error = None
+            try:
+                try:
+                    dataset = self._load(revalidate, self._dataset)
+                except StaleData as stale:
+                    dataset, error = stale.dataset, str(stale)
+                if dataset is None:
+                    error = "no data available"
+                elif dataset is not self._dataset:
+                    self._dataset = dataset  # atomic swap
+                    logger.info(f"Refresher: now serving dataset {dataset.version}")
+                    if self._on_publish is not None:
+                        self._on_publish(dataset)
+            except Exception as exc:
+                logger.exception("Refresher: refresh failed")
+                error = f"{type(exc).__name__}: {exc}"
+
+            finished = time.time()
+            self._status = RefreshStatus(
+                version=self._dataset.version if self._dataset is not None else None,
+                last_success=finished if error is None else self._status.last_success,
+                last_attempt=started,
+                last_duration=finished - started,
+                last_error=error,
+                refreshing=False,
+            )
+            return self._dataset is not None
+
+    def _run(self) -> None:
+        while True:
+            self.refresh(revalidate=True)
+            self._wake.wait(self.interval)
+            self._wake.clear()
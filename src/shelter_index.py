@@ -0,0 +1,155 @@
+"""
+shelter_index.py
+
+Inverted index over the display DataFrame for the sidebar filters.
+
+Built once per dataset version, it holds a sorted position array
+(posting list) per OTG, settlement, shelter type and accessibility value
+and the positions sorted by capacity. A filter combination is answered by
+intersecting the smallest posting lists instead of comparing every row's
+strings, and recent combinations are memoised with LRU eviction.
+
+Results are integer row positions, usable with ``df.iloc`` or
+``df.take`` without materialising an intermediate boolean mask.
+"""
+
+from __future__ import annotations
+
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+_EMPTY = np.empty(0, dtype=np.intp)
+_EMPTY.flags.writeable = False
+
+
+def _postings(s: pd.Series) -> dict[object, np.ndarray]:
+    """Return ``value -> sorted positions`` for every non-null value of *s*."""
+    codes, uniques = pd.factorize(s)
+    order = np.argsort(codes, kind="stable")
+    bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+    postings = {}
+    for code, value in enumerate(uniques):
+        positions = order[bounds[code] : bounds[code + 1]]
+        positions.flags.writeable = False
+        postings[value] = positions
+    return postings
+
+
+def _intersect(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    return np.intersect1d(a, b, assume_unique=True)
+
+
+class ShelterIndex:
+    """Posting lists and a capacity order for one display DataFrame.
+
+    Args:
+        df: Display-ready DataFrame (``get_extended_data`` output).
+        cache_size: Number of filter combinations memoised.
+    """
+
+    def __init__(self, df: pd.DataFrame, cache_size: int = 256):
+        self.size = len(df)
+        self.labels = df.index
+        self._city = _postings(df["Населений пункт"])
+        self._otg = _postings(df["ОТГ"])
+        self._type = _postings(df["Тип"])
+        self._all_typed = bool(df["Тип"].notna().all())
+        self._accessible = _postings(df["Інклюзивність"]).get("Так", _EMPTY)
+
+        capacity = df["Місткість"].to_numpy(dtype=float, na_value=np.nan)
+        self._capacity = capacity
+        self._capacity_order = np.argsort(capacity, kind="stable")
+        self._capacity_sorted = capacity[self._capacity_order]  # NaN last
+
+        self._cache_size = cache_size
+        self._cached_positions = lru_cache(maxsize=cache_size)(self._positions)
+
+    def __getstate__(self) -> dict:
+        # The memo wraps a bound method and is not picklable; it is rebuilt empty
+        state = self.__dict__.copy()
+        del state["_cached_positions"]
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._cached_positions = lru_cache(maxsize=self._cache_size)(self._positions)
+
+    def matches(self, df: pd.DataFrame) -> bool:
+        """Return ``True`` if the index was built for the rows of *df*."""
+        return len(df) == self.size and df.index.equals(self.labels)
+
+    def positions(
+        self,
+        city_name: str | None = None,
+        otg_name: str | None = None,
+        shelter_type: list[str] | None = None,
+        max_capacity: int | None = None,
+        accessible_only: bool | None = None,
+    ) -> np.ndarray:
+        """Return the sorted row positions matching the filters.
+
+        Arguments follow ``data_processing.search_data``: ``" "`` or
+        ``None`` disables the city/OTG filter and an empty type list or
+        falsy *max_capacity* disables those filters. The returned array is
+        shared with the memo and read-only.
+        """
+        types = tuple(sorted(set(shelter_type))) if shelter_type else None
+        return self._cached_positions(
+            None if city_name in (None, " ") else city_name,
+            None if otg_name in (None, " ") else otg_name,
+            types,
+            max_capacity or None,
+            bool(accessible_only),
+        )
+
+    def cache_info(self):
+        """Return the ``functools.lru_cache`` statistics of the memo."""
+        return self._cached_positions.cache_info()
+
+    def _positions(
+        self,
+        city_name: str | None,
+        otg_name: str | None,
+        types: tuple[str, ...] | None,
+        max_capacity: float | None,
+        accessible_only: bool,
+    ) -> np.ndarray:
+        lists: list[np.ndarray] = []
+        if city_name is not None:
+            lists.append(self._city.get(city_name, _EMPTY))
+        if otg_name is not None:
+            lists.append(self._otg.get(otg_name, _EMPTY))
+        if accessible_only:
+            lists.append(self._accessible)
+        all_types = self._all_typed and set(self._type) <= set(types or ())
+        if types is not None and not all_types:
+            selected = [self._type[t] for t in types if t in self._type]
+            lists.append(np.sort(np.concatenate(selected)) if selected else _EMPTY)
+
+        capacity = None
+        if max_capacity is not None:
+            count = np.searchsorted(self._capacity_sorted, max_capacity, side="right")
+            capacity = self._capacity_order[:count]
+
+        lists.sort(key=len)
+        if not lists:
+            result = (
+                np.arange(self.size) if capacity is None else np.sort(capacity)
+            )
+        else:
+            result = lists[0]
+            for other in lists[1:]:
+                if not len(result):
+                    break
+                result = _intersect(result, other)
+            if capacity is not None and len(result):
+                if len(capacity) < len(result):
+                    result = _intersect(result, capacity)
+                else:
+                    result = result[self._capacity[result] <= max_capacity]
+
+        result = np.asarray(result, dtype=np.intp)
+        result.flags.writeable = False
+        return result
@@ -0,0 +1,460 @@
+"""
+snapshot_store.py
+
+Versioned on-disk store for the raw shelter GeoJSON, the cleaned
+DataFrame and the built dataset, so that a restarted Streamlit process
+(or one started after an offline ``cli.py build``) can serve data from
+local files instead of re-fetching, re-cleaning and re-indexing the
+whole dataset.
+
+Layout of ``config.SNAPSHOT_DIR``::
+
+    manifest.json                      # snapshot history, newest last
+    manifest.lock                      # held while the manifest is updated
+    raw-<url key>-<hash>.geojson       # upstream payload, byte-for-byte
+    incoming-*.tmp                     # download in progress
+    clean-<url key>-<hash>-<ver>.parquet  # cleaned DataFrame
+    features-<url key>-<hash>.parquet  # per-feature identity and fingerprint
+    dataset-<url key>-<hash>-<ver>.pickle  # built ShelterDataset
+    <source id>/                       # same layout, per further source
+    merged/                            # merged snapshots of all sources
+
+The sub-directories are only used when further sources are configured
+(see ``sources``); each is a store of its own.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import pickle
+import tempfile
+import threading
+import time
+from collections.abc import Callable, Iterable
+from dataclasses import asdict, dataclass, replace
+from typing import BinaryIO
+
+import pandas as pd
+
+import config
+
+try:
+    import fcntl
+except ImportError:  # Windows: only the threads of one process are serialised
+    fcntl = None
+
+logger = logging.getLogger(config.LOGGER_NAME)
+
+# Serialises manifest updates of the threads of this process (the
+# refresher and the sessions); other processes (``cli.py``) are kept out
+# by an ``flock`` on the lock file
+_manifest_lock = threading.Lock()
+
+
+def content_hash(content: bytes) -> str:
+    """Return the SHA-256 hex digest used to version raw payloads."""
+    return hashlib.sha256(content).hexdigest()
+
+
+def _url_key(url: str) -> str:
+    return hashlib.sha256(url.encode("utf-8")).hexdigest()[:12]
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    """Metadata for one stored version of an upstream resource.
+
+    Attributes:
+        resource_url: URL of the GeoJSON resource on the CKAN portal.
+        content_hash: SHA-256 of the raw payload.
+        etag: ``ETag`` response header, if the server sent one.
+        last_modified: ``Last-Modified`` response header, if any.
+        metadata_modified: CKAN ``metadata_modified`` of the package.
+        fetched_at: Unix time the payload was downloaded.
+        checked_at: Unix time upstream was last revalidated.
+        members: For a merged snapshot (see ``federation``), the content
+            hash of each source's snapshot by source id.
+    """
+
+    resource_url: str
+    content_hash: str
+    etag: str | None = None
+    last_modified: str | None = None
+    metadata_modified: str | None = None
+    fetched_at: float = 0.0
+    checked_at: float = 0.0
+    members: dict[str, str] | None = None
+
+    @property
+    def version(self) -> str:
+        """Short, stable token identifying the payload content."""
+        return self.content_hash[:16]
+
+    def is_fresh(self, max_age: float = config.SNAPSHOT_MAX_AGE) -> bool:
+        """Return ``True`` if upstream was revalidated less than *max_age* ago."""
+        return time.time() - self.checked_at < max_age
+
+    def conditional_headers(self) -> dict[str, str]:
+        """Return ``If-None-Match`` / ``If-Modified-Since`` request headers."""
+        headers: dict[str, str] = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class SnapshotStore:
+    """File-based store of raw and cleaned dataset snapshots.
+
+    Args:
+        root: Directory holding the manifest and snapshot files.
+        keep: Number of snapshot versions kept per resource URL; older
+            files are removed when a new version is saved.
+    """
+
+    def __init__(
+        self,
+        root: str = config.SNAPSHOT_DIR,
+        keep: int = config.SNAPSHOT_KEEP_VERSIONS,
+    ) -> None:
+        self.root = root
+        self.keep = keep
+        self._manifest_path = os.path.join(root, "manifest.json")
+        self._lock_path = os.path.join(root, "manifest.lock")
+
+    # ------------------------------------------------------------------
+    # Manifest
+    # ------------------------------------------------------------------
+
+    def _read_manifest(self) -> list[Snapshot]:
+        try:
+            with open(self._manifest_path, encoding="utf-8") as fh:
+                entries = json.load(fh)
+        except FileNotFoundError:
+            return []
+        except (OSError, ValueError) as exc:
+            logger.error(f"Snapshot manifest is unreadable, ignoring it: {exc}")
+            return []
+        return [Snapshot(**entry) for entry in entries]
+
+    def _write_manifest(self, snapshots: list[Snapshot]) -> None:
+        tmp_path = f"{self._manifest_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as fh:
+            json.dump([asdict(s) for s in snapshots], fh, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self._manifest_path)
+
+    def _update_manifest(
+        self, change: Callable[[list[Snapshot]], list[Snapshot]]
+    ) -> None:
+        """Replace the manifest entries by ``change(entries)``.
+
+        The read-modify-write runs under the manifest lock, so concurrent
+        updates from threads and processes are applied one after another
+        and none is lost; readers see either version of the file.
+        """
+        os.makedirs(self.root, exist_ok=True)
+        with _manifest_lock, open(self._lock_path, "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)  # released on close
+            self._write_manifest(change(self._read_manifest()))
+
+    def latest(self, resource_url: str | None = None) -> Snapshot | None:
+        """Return the most recently fetched snapshot, optionally for one URL."""
+        snapshots = [
+            s
+            for s in self._read_manifest()
+            if resource_url is None or s.resource_url == resource_url
+        ]
+        return snapshots[-1] if snapshots else None
+
+    def get(self, content_hash: str) -> Snapshot | None:
+        """Return the stored snapshot with *content_hash*, if any."""
+        return next(
+            (s for s in self._read_manifest() if s.content_hash == content_hash), None
+        )
+
+    def previous(self, snapshot: Snapshot) -> list[Snapshot]:
+        """Return the stored snapshots of the same URL older than *snapshot*.
+
+        Newest first.
+        """
+        older = []
+        for s in self._read_manifest():
+            if s.content_hash == snapshot.content_hash:
+                break
+            if s.resource_url == snapshot.resource_url:
+                older.append(s)
+        return older[::-1]
+
+    # ------------------------------------------------------------------
+    # Paths
+    # ------------------------------------------------------------------
+
+    def raw_path(self, snapshot: Snapshot) -> str:
+        name = f"raw-{_url_key(snapshot.resource_url)}-{snapshot.version}.geojson"
+        return os.path.join(self.root, name)
+
+    def clean_path(self, snapshot: Snapshot, clean_version: str) -> str:
+        name = (
+            f"clean-{_url_key(snapshot.resource_url)}-{snapshot.version}"
+            f"-{clean_version}.parquet"
+        )
+        return os.path.join(self.root, name)
+
+    def dataset_path(self, snapshot: Snapshot, build_version: str) -> str:
+        name = (
+            f"dataset-{_url_key(snapshot.resource_url)}-{snapshot.version}"
+            f"-{build_version}.pickle"
+        )
+        return os.path.join(self.root, name)
+
+    def features_path(self, snapshot: Snapshot) -> str:
+        name = f"features-{_url_key(snapshot.resource_url)}-{snapshot.version}.parquet"
+        return os.path.join(self.root, name)
+
+    # ------------------------------------------------------------------
+    # Read / write
+    # ------------------------------------------------------------------
+
+    def save_raw(self, snapshot: Snapshot, content: bytes) -> Snapshot:
+        """Persist a new raw payload and record it as the latest snapshot.
+
+        Args:
+            snapshot: Metadata for the payload; ``content_hash`` must match.
+            content: Raw response body.
+
+        Returns:
+            The stored snapshot.
+        """
+        staged, _digest = self.stage_raw([content])
+        return self.commit_raw(snapshot, staged)
+
+    def stage_raw(self, chunks: Iterable[bytes]) -> tuple[str, str]:
+        """Write a raw payload to a temporary file, hashing it on the way.
+
+        The payload is never held in memory as a whole. Pass the returned
+        path to :meth:`commit_raw` or :meth:`discard`.
+
+        Args:
+            chunks: Raw response body in chunks.
+
+        Returns:
+            ``(staged file path, SHA-256 hex digest)``.
+        """
+        os.makedirs(self.root, exist_ok=True)
+        fd, path = tempfile.mkstemp(prefix="incoming-", suffix=".tmp", dir=self.root)
+        digest = hashlib.sha256()
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                for chunk in chunks:
+                    digest.update(chunk)
+                    fh.write(chunk)
+        except BaseException:
+            self.discard(path)
+            raise
+        return path, digest.hexdigest()
+
+    def commit_raw(self, snapshot: Snapshot, staged_path: str) -> Snapshot:
+        """Move a staged payload into place and record it as the latest snapshot.
+
+        Args:
+            snapshot: Metadata for the payload; ``content_hash`` must match.
+            staged_path: Path returned by :meth:`stage_raw`.
+
+        Returns:
+            The stored snapshot.
+        """
+        os.replace(staged_path, self.raw_path(snapshot))
+        self.record(snapshot)
+        logger.info(f"Snapshot: stored raw version {snapshot.version}.")
+        return snapshot
+
+    def record(self, snapshot: Snapshot) -> Snapshot:
+        """Record *snapshot* as the latest one in the manifest.
+
+        Merged snapshots are recorded without a raw payload: their content
+        is that of their members.
+        """
+
+        def add(snapshots: list[Snapshot]) -> list[Snapshot]:
+            snapshots = [s for s in snapshots if s.content_hash != snapshot.content_hash]
+            return self._prune([*snapshots, snapshot], snapshot.resource_url)
+
+        self._update_manifest(add)
+        return snapshot
+
+    def discard(self, staged_path: str) -> None:
+        """Remove a staged payload that is not going to be committed."""
+        try:
+            os.remove(staged_path)
+        except FileNotFoundError:
+            pass
+
+    def mark_checked(self, snapshot: Snapshot, **changes) -> Snapshot:
+        """Record a successful revalidation of *snapshot* against upstream.
+
+        Args:
+            snapshot: Snapshot that is still current upstream.
+            **changes: Updated validator fields (``etag``, ``last_modified``,
+                ``metadata_modified``).
+
+        Returns:
+            The updated snapshot.
+        """
+        updated = replace(snapshot, checked_at=time.time(), **changes)
+
+        def update(snapshots: list[Snapshot]) -> list[Snapshot]:
+            snapshots = [
+                updated if s.content_hash == snapshot.content_hash else s
+                for s in snapshots
+            ]
+            return snapshots if updated in snapshots else [*snapshots, updated]
+
+        self._update_manifest(update)
+        return updated
+
+    def open_raw(self, snapshot: Snapshot) -> BinaryIO | None:
+        """Return the raw payload of *snapshot* opened for binary reading.
+
+        Returns ``None`` if the file is missing.
+        """
+        try:
+            return open(self.raw_path(snapshot), "rb")
+        except FileNotFoundError:
+            logger.warning(f"Snapshot: raw file for {snapshot.version} is missing.")
+            return None
+
+    def load_clean(self, snapshot: Snapshot, clean_version: str) -> pd.DataFrame | None:
+        """Return the cleaned DataFrame of *snapshot* or ``None`` if not built.
+
+        Args:
+            snapshot: Snapshot whose cleaned data is requested.
+            clean_version: Version tag of the cleaning pipeline; a cleaned
+                file written by another pipeline version is ignored.
+        """
+        path = self.clean_path(snapshot, clean_version)
+        if not os.path.exists(path):
+            return None
+        try:
+            return pd.read_parquet(path)
+        except Exception as exc:
+            logger.error(f"Snapshot: cleaned file {path} is unreadable: {exc}")
+            return None
+
+    def save_clean(
+        self, snapshot: Snapshot, clean_version: str, df: pd.DataFrame
+    ) -> None:
+        """Persist the cleaned DataFrame for *snapshot*.
+
+        Failures are logged and swallowed: the cleaned file is only an
+        optimisation and is rebuilt from the raw payload when absent.
+        """
+        path = self.clean_path(snapshot, clean_version)
+        tmp_path = path + ".tmp"
+        try:
+            os.makedirs(self.root, exist_ok=True)
+            df.to_parquet(tmp_path, index=True)
+            os.replace(tmp_path, path)
+            # Cleaned files of the same payload built by older pipeline or
+            # correction-rule versions are superseded.
+            prefix = f"clean-{_url_key(snapshot.resource_url)}-{snapshot.version}-"
+            for name in os.listdir(self.root):
+                if name.startswith(prefix) and name != os.path.basename(path):
+                    os.remove(os.path.join(self.root, name))
+        except Exception as exc:
+            logger.error(f"Snapshot: could not store cleaned data: {exc}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def load_features(self, snapshot: Snapshot) -> pd.DataFrame | None:
+        """Return the feature table of *snapshot* or ``None`` if not built."""
+        path = self.features_path(snapshot)
+        if not os.path.exists(path):
+            return None
+        try:
+            # Arrow-backed columns skip the conversion to Python strings
+            return pd.read_parquet(path, dtype_backend="pyarrow")
+        except Exception as exc:
+            logger.error(f"Snapshot: feature table {path} is unreadable: {exc}")
+            return None
+
+    def save_features(self, snapshot: Snapshot, table: pd.DataFrame) -> None:
+        """Persist the feature table of *snapshot* (see ``feature_delta``).
+
+        Failures are logged and swallowed, as for :meth:`save_clean`.
+        """
+        path = self.features_path(snapshot)
+        tmp_path = path + ".tmp"
+        try:
+            os.makedirs(self.root, exist_ok=True)
+            table.to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, path)
+        except Exception as exc:
+            logger.error(f"Snapshot: could not store feature table: {exc}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def load_dataset(self, snapshot: Snapshot, build_version: str) -> object | None:
+        """Return the built dataset of *snapshot* or ``None`` if not built.
+
+        The file is a pickle written by :meth:`save_dataset` into the
+        local store; it is trusted like the rest of the store.
+
+        Args:
+            snapshot: Snapshot whose dataset is requested.
+            build_version: Version tag of the cleaning and build code;
+                a file written by another version is ignored.
+        """
+        path = self.dataset_path(snapshot, build_version)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "rb") as fh:
+                return pickle.load(fh)
+        except Exception as exc:
+            logger.error(f"Snapshot: dataset file {path} is unreadable: {exc}")
+            return None
+
+    def save_dataset(self, snapshot: Snapshot, build_version: str, dataset: object) -> None:
+        """Persist the built dataset of *snapshot*.
+
+        Failures are logged and swallowed, as for :meth:`save_clean`.
+        """
+        path = self.dataset_path(snapshot, build_version)
+        tmp_path = path + ".tmp"
+        try:
+            os.makedirs(self.root, exist_ok=True)
+            with open(tmp_path, "wb") as fh:
+                pickle.dump(dataset, fh, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+            prefix = f"dataset-{_url_key(snapshot.resource_url)}-{snapshot.version}-"
+            for name in os.listdir(self.root):
+                if name.startswith(prefix) and name != os.path.basename(path):
+                    os.remove(os.path.join(self.root, name))
+        except Exception as exc:
+            logger.error(f"Snapshot: could not store built dataset: {exc}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    # ------------------------------------------------------------------
+    # Housekeeping
+    # ------------------------------------------------------------------
+
+    def _prune(self, snapshots: list[Snapshot], resource_url: str) -> list[Snapshot]:
+        """Drop all but the newest ``keep`` versions of *resource_url*."""
+        same_url = [s for s in snapshots if s.resource_url == resource_url]
+        stale = same_url[: max(len(same_url) - self.keep, 0)]
+        if not stale:
+            return snapshots
+
+        stale_prefixes = [
+            f"-{_url_key(s.resource_url)}-{s.version}" for s in stale
+        ]
+        for name in os.listdir(self.root):
+            if any(prefix in name for prefix in stale_prefixes):
+                os.remove(os.path.join(self.root, name))
+        return [s for s in snapshots if s not in stale]
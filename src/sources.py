@@ -0,0 +1,242 @@
+"""
+sources.py
+
+Registry of the CKAN datasets merged into the shelter table, and the
+mapping of their resources onto registry-shaped GeoJSON features.
+
+The oblast registry (``config.URL_CARP_GOV_UA`` / ``config.ID_BOMBSHELTER``)
+is always the first source. Further datasets, e.g. the shelter lists of
+municipal portals or other resources of the same package, are listed in
+``config.SOURCES_FILE`` (JSON), in priority order::
+
+    {
+      "sources": [
+        {
+          "id": "uzhhorod",
+          "title": "Ужгородська міська рада",
+          "portal": "https://opendata.example.org/",
+          "dataset": "shelters",
+          "format": "csv",
+          "resource": "ukryttia.csv",
+          "read_options": {"sep": ";"},
+          "columns": {"Назва": "Name", "Адреса": "Adress",
+                      "Місткість": "People", "lat": "latitude", "lng": "longitude"},
+          "defaults": {"OTG": "Ужгородська", "City": "Ужгород", "Rajon": "Ужгородський"}
+        }
+      ]
+    }
+
+``format`` is the CKAN resource format to ingest (``geojson``, ``csv`` or
+``xlsx``; the latter needs ``openpyxl``), ``resource`` the name or id of
+the resource if the package has several of that format, and
+``read_options`` keyword arguments for ``pandas.read_csv`` /
+``read_excel``. ``columns`` maps source columns (or GeoJSON properties)
+onto the registry properties of :data:`PROPERTIES` or onto ``longitude``
+/ ``latitude``; columns named like those are taken as they are.
+``defaults`` fills registry properties a source leaves empty.
+
+Every source is mapped onto features shaped like the registry's, so
+cleaning, delta reuse and change detection work on all of them alike.
+The file is read once at start; a missing file means the registry alone,
+an invalid one is logged and ignored.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import re
+from collections.abc import Iterator, Mapping
+from dataclasses import dataclass, field
+from typing import BinaryIO
+
+import pandas as pd
+
+import config
+import geojson_stream
+
+logger = logging.getLogger(config.LOGGER_NAME)
+
+FORMATS = ("geojson", "csv", "xlsx")
+
+# Properties of the registry's features, as read by the cleaning pipeline
+PROPERTIES = (
+    "OTG", "Number", "City", "Name", "Area", "People",
+    "TypeZs", "Property", "Adress", "Rajon", "Type", "Bezbar",
+)
+COORDINATES = ("longitude", "latitude")
+
+# Directory names taken by the snapshot store
+_RESERVED_IDS = {"merged"}
+_RE_ID = re.compile(r"^[a-z0-9][a-z0-9_-]*$")
+
+
+@dataclass(frozen=True)
+class Source:
+    """One CKAN dataset ingested into the shelter table.
+
+    Attributes:
+        id: Short name; the sub-directory of its snapshots.
+        title: Name shown for its shelters.
+        portal: Base URL of the CKAN portal.
+        dataset: CKAN id or name of the package.
+        format: Resource format to ingest, one of :data:`FORMATS`.
+        resource: Name or id of the resource, if the package has several
+            of *format*.
+        columns: Source column -> registry property or coordinate.
+        defaults: Values for registry properties the source leaves empty.
+        read_options: Keyword arguments for the CSV/XLSX reader.
+    """
+
+    id: str
+    title: str
+    portal: str
+    dataset: str
+    format: str = "geojson"
+    resource: str | None = None
+    columns: Mapping[str, str] = field(default_factory=dict)
+    defaults: Mapping[str, object] = field(default_factory=dict)
+    read_options: Mapping[str, object] = field(default_factory=dict)
+
+    @property
+    def is_mapped(self) -> bool:
+        """``False`` for a GeoJSON source shaped like the registry."""
+        return self.format != "geojson" or bool(self.columns or self.defaults)
+
+    @property
+    def mapping_version(self) -> str:
+        """Short hash of the format and mapping, part of its cleaned version."""
+        spec = json.dumps(
+            [self.format, self.columns, self.defaults, self.read_options],
+            sort_keys=True,
+            ensure_ascii=False,
+            default=str,
+        )
+        return hashlib.sha256(spec.encode("utf-8")).hexdigest()[:8]
+
+    def matches(self, resource: Mapping) -> bool:
+        """Return ``True`` if the CKAN *resource* is the one to ingest."""
+        if (resource.get("format") or "").lower() != self.format:
+            return False
+        return self.resource is None or self.resource in (
+            resource.get("name"),
+            resource.get("id"),
+        )
+
+    def feature(self, values: Mapping, coordinates: list | None = None) -> dict:
+        """Return the registry-shaped feature of one source row or feature.
+
+        Args:
+            values: Source columns or GeoJSON properties.
+            coordinates: GeoJSON ``[lon, lat]``, unless mapped from *values*.
+        """
+        properties = {name: _value(values.get(name)) for name in PROPERTIES}
+        if coordinates:
+            point = dict(zip(COORDINATES, coordinates))
+        else:
+            point = {name: _value(values.get(name)) for name in COORDINATES}
+        for column, target in self.columns.items():
+            value = _value(values.get(column))
+            if target in point:
+                point[target] = value
+            elif value is not None:
+                properties[target] = value
+        for name, value in self.defaults.items():
+            if properties.get(name) is None:
+                properties[name] = value
+        return {
+            "type": "Feature",
+            "properties": properties,
+            "geometry": {"type": "Point", "coordinates": [point["longitude"], point["latitude"]]},
+        }
+
+    def iter_feature_texts(self, fh: BinaryIO) -> Iterator[tuple[dict, str]]:
+        """Yield ``(registry-shaped feature, source text)`` for the payload in *fh*.
+
+        The text of a tabular row is its JSON encoding; it only feeds the
+        row's change fingerprint (see ``feature_delta``).
+        """
+        if self.format == "geojson":
+            pairs = geojson_stream.iter_feature_texts(geojson_stream.iter_file_chunks(fh))
+            if not self.is_mapped:
+                yield from pairs
+                return
+            for raw, text in pairs:
+                geometry = raw.get("geometry") or {}
+                yield self.feature(raw.get("properties") or {}, geometry.get("coordinates")), text
+            return
+
+        for records in self._iter_records(fh):
+            for record in records:
+                yield self.feature(record), json.dumps(record, ensure_ascii=False)
+
+    def _iter_records(self, fh: BinaryIO) -> Iterator[list[dict]]:
+        options = {"dtype": str, "keep_default_na": False, **self.read_options}
+        if self.format == "csv":
+            options.setdefault("encoding", "utf-8-sig")
+            with pd.read_csv(fh, chunksize=config.INGEST_BATCH_SIZE, **options) as reader:
+                for chunk in reader:
+                    yield chunk.to_dict("records")
+        else:
+            yield pd.read_excel(fh, **options).to_dict("records")
+
+
+def _value(value: object) -> object:
+    """Return *value*, or ``None`` for an empty cell."""
+    if value is None or (isinstance(value, str) and not value.strip()):
+        return None
+    return value
+
+
+PRIMARY = Source(
+    id="oblast",
+    title="Обласний реєстр",
+    portal=config.URL_CARP_GOV_UA,
+    dataset=config.ID_BOMBSHELTER,
+)
+
+
+def _parse(entry: Mapping) -> Source:
+    source = Source(
+        id=entry["id"],
+        title=entry.get("title") or entry["id"],
+        portal=entry["portal"],
+        dataset=entry["dataset"],
+        format=(entry.get("format") or "geojson").lower(),
+        resource=entry.get("resource"),
+        columns=dict(entry.get("columns") or {}),
+        defaults=dict(entry.get("defaults") or {}),
+        read_options=dict(entry.get("read_options") or {}),
+    )
+    if not _RE_ID.match(source.id) or source.id in _RESERVED_IDS | {PRIMARY.id}:
+        raise ValueError(f"invalid source id {source.id!r}")
+    if source.format not in FORMATS:
+        raise ValueError(f"source {source.id!r}: unsupported format {source.format!r}")
+    unknown = set(source.columns.values()) - set(PROPERTIES) - set(COORDINATES)
+    if unknown:
+        raise ValueError(f"source {source.id!r}: unknown target columns {sorted(unknown)}")
+    return source
+
+
+def load(path: str = config.SOURCES_FILE) -> tuple[Source, ...]:
+    """Return the registry followed by the sources listed in *path*."""
+    try:
+        with open(path, encoding="utf-8") as fh:
+            entries = json.load(fh)["sources"]
+        extra = tuple(_parse(entry) for entry in entries)
+    except FileNotFoundError:
+        return (PRIMARY,)
+    except (OSError, ValueError, KeyError, TypeError, AttributeError) as exc:
+        logger.error(f"Sources: ignoring {path}, it is invalid: {exc}")
+        return (PRIMARY,)
+
+    ids = [source.id for source in extra]
+    if len(set(ids)) != len(ids):
+        logger.error(f"Sources: ignoring {path}, source ids are not unique")
+        return (PRIMARY,)
+    logger.info(f"Sources: merging the registry with {', '.join(ids) or 'nothing'}.")
+    return (PRIMARY, *extra)
+
+
+registry: tuple[Source, ...] = load()
@@ -0,0 +1,225 @@
+"""
+spatial_index.py
+
+Grid index over the shelter coordinates for nearest-shelter queries.
+
+Built once per dataset version, it buckets the located shelters into
+cells of roughly ``cell_km`` × ``cell_km`` (sorted positions plus one
+start offset per cell). A k-nearest query searches rings of cells
+outward from the query point and stops as soon as the k-th distance is
+closer than any unsearched cell can be; a radius query only visits the
+cells overlapping the circle's bounding box. Distances are great-circle
+(haversine) metres.
+
+Both queries take the row positions allowed by the sidebar filters
+(``ShelterIndex.positions``). Small allowed sets are scanned directly,
+which is faster than walking mostly rejected cells.
+"""
+
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+
+EARTH_RADIUS_M = 6_371_008.8
+
+_EMPTY = np.empty(0, dtype=np.intp)
+
+
+def haversine_m(
+    lat: float, lon: float, lats: np.ndarray, lons: np.ndarray
+) -> np.ndarray:
+    """Return the great-circle distances in metres from one point to many.
+
+    All coordinates are in degrees.
+    """
+    lat1, lon1 = np.radians(lat), np.radians(lon)
+    lat2, lon2 = np.radians(lats), np.radians(lons)
+    a = (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class SpatialIndex:
+    """Uniform grid over the ``latitude``/``longitude`` of a DataFrame.
+
+    Shelters without coordinates are never returned.
+
+    Args:
+        df: DataFrame with ``latitude`` and ``longitude`` columns
+            (cleaned or display data).
+        cell_km: Approximate cell edge length in kilometres.
+        brute_force_limit: Allowed sets up to this size are scanned
+            without the grid.
+    """
+
+    def __init__(
+        self, df: pd.DataFrame, cell_km: float = 2.0, brute_force_limit: int = 2048
+    ):
+        self.size = len(df)
+        self.labels = df.index
+        self.brute_force_limit = brute_force_limit
+        self._lat = df["latitude"].to_numpy(dtype=float, na_value=np.nan)
+        self._lon = df["longitude"].to_numpy(dtype=float, na_value=np.nan)
+        self._located = np.flatnonzero(~np.isnan(self._lat) & ~np.isnan(self._lon))
+
+        lat, lon = self._lat[self._located], self._lon[self._located]
+        bounds = (lat.min(), lat.max(), lon.min(), lon.max()) if len(lat) else (0,) * 4
+        self._lat0, self._lon0 = bounds[0], bounds[2]
+        max_abs_lat = min(max(abs(bounds[0]), abs(bounds[1])), 89.0)
+        self._dlat = np.degrees(cell_km * 1000 / EARTH_RADIUS_M)
+        self._dlon = self._dlat / np.cos(np.radians(max_abs_lat))
+        self._rows = int((bounds[1] - self._lat0) // self._dlat) + 1
+        self._cols = int((bounds[3] - self._lon0) // self._dlon) + 1
+        # Lower bound on the distance across one cell, in either direction
+        self._cell_m = self._dlat * np.pi / 180 * EARTH_RADIUS_M
+
+        cell = self._cell_of(lat, lon)
+        order = np.argsort(cell, kind="stable")
+        self._positions = self._located[order]
+        self._starts = np.searchsorted(
+            cell[order], np.arange(self._rows * self._cols + 1)
+        )
+
+    def matches(self, df: pd.DataFrame) -> bool:
+        """Return ``True`` if the index was built for the rows of *df*."""
+        return len(df) == self.size and df.index.equals(self.labels)
+
+    def _cell_of(self, lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+        row = ((lat - self._lat0) // self._dlat).astype(np.intp)
+        col = ((lon - self._lon0) // self._dlon).astype(np.intp)
+        return row * self._cols + col
+
+    def _block(self, rows: range, cols: range) -> np.ndarray:
+        """Return the positions in the given cell rows/columns (clipped)."""
+        rows = range(max(rows.start, 0), min(rows.stop, self._rows))
+        cols = range(max(cols.start, 0), min(cols.stop, self._cols))
+        if not len(rows) or not len(cols):
+            return _EMPTY
+        parts = []
+        for row in rows:
+            first = row * self._cols
+            start = self._starts[first + cols.start]
+            end = self._starts[first + cols.stop]
+            if end > start:
+                parts.append(self._positions[start:end])
+        return np.concatenate(parts) if parts else _EMPTY
+
+    def _ring(self, row: int, col: int, r: int) -> np.ndarray:
+        """Return the positions in the cells at Chebyshev distance *r*."""
+        if r == 0:
+            return self._block(range(row, row + 1), range(col, col + 1))
+        return np.concatenate(
+            (
+                self._block(range(row - r, row - r + 1), range(col - r, col + r + 1)),
+                self._block(range(row + r, row + r + 1), range(col - r, col + r + 1)),
+                self._block(range(row - r + 1, row + r), range(col - r, col - r + 1)),
+                self._block(range(row - r + 1, row + r), range(col + r, col + r + 1)),
+            )
+        )
+
+    def _allowed(self, positions: np.ndarray | None) -> np.ndarray | None:
+        """Return a row mask for *positions* (``None`` allows every row)."""
+        if positions is None:
+            return None
+        mask = np.zeros(self.size, dtype=bool)
+        mask[positions] = True
+        return mask
+
+    def _scan(
+        self, lat: float, lon: float, positions: np.ndarray | None
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Return all allowed located positions and their distances."""
+        candidates = self._located
+        if positions is not None:
+            candidates = np.intersect1d(positions, self._located, assume_unique=True)
+        return candidates, haversine_m(
+            lat, lon, self._lat[candidates], self._lon[candidates]
+        )
+
+    def nearest(
+        self, lat: float, lon: float, k: int = 5, positions: np.ndarray | None = None
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Return the *k* shelters closest to ``(lat, lon)``.
+
+        Args:
+            lat: Latitude of the query point in degrees.
+            lon: Longitude of the query point in degrees.
+            k: Number of shelters to return.
+            positions: Row positions allowed by the filters; ``None``
+                allows every shelter.
+
+        Returns:
+            ``(row positions, distances in metres)``, closest first.
+        """
+        if k <= 0 or not len(self._located):
+            return _EMPTY, np.empty(0)
+        row = int((lat - self._lat0) // self._dlat)
+        col = int((lon - self._lon0) // self._dlon)
+        outside = not (0 <= row < self._rows and 0 <= col < self._cols)
+        if outside or (positions is not None and len(positions) <= self.brute_force_limit):
+            found, dist = self._scan(lat, lon, positions)
+        else:
+            allowed = self._allowed(positions)
+            max_r = max(row, col, self._rows - 1 - row, self._cols - 1 - col)
+            found_parts, dist_parts = [], []
+            total = 0
+            for r in range(max_r + 1):
+                ring = self._ring(row, col, r)
+                if allowed is not None:
+                    ring = ring[allowed[ring]]
+                if len(ring):
+                    found_parts.append(ring)
+                    dist_parts.append(
+                        haversine_m(lat, lon, self._lat[ring], self._lon[ring])
+                    )
+                    total += len(ring)
+                # Anything outside the searched rings is at least r cells away
+                if total >= k:
+                    kth = np.partition(np.concatenate(dist_parts), k - 1)[k - 1]
+                    if kth <= r * self._cell_m:
+                        break
+            if not found_parts:
+                return _EMPTY, np.empty(0)
+            found, dist = np.concatenate(found_parts), np.concatenate(dist_parts)
+
+        order = np.argsort(dist, kind="stable")[:k]
+        return found[order], dist[order]
+
+    def within(
+        self,
+        lat: float,
+        lon: float,
+        radius_m: float,
+        positions: np.ndarray | None = None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Return the shelters within *radius_m* metres of ``(lat, lon)``.
+
+        Arguments and return value as for :meth:`nearest`.
+        """
+        if positions is not None and len(positions) <= self.brute_force_limit:
+            found, dist = self._scan(lat, lon, positions)
+        else:
+            span_lat = np.degrees(radius_m / EARTH_RADIUS_M)
+            edge = min(abs(lat) + span_lat, 89.0)
+            span_lon = span_lat / np.cos(np.radians(edge))
+            rows = range(
+                int((lat - span_lat - self._lat0) // self._dlat),
+                int((lat + span_lat - self._lat0) // self._dlat) + 1,
+            )
+            cols = range(
+                int((lon - span_lon - self._lon0) // self._dlon),
+                int((lon + span_lon - self._lon0) // self._dlon) + 1,
+            )
+            found = self._block(rows, cols)
+            allowed = self._allowed(positions)
+            if allowed is not None:
+                found = found[allowed[found]]
+            dist = haversine_m(lat, lon, self._lat[found], self._lon[found])
+
+        inside = dist <= radius_m
+        found, dist = found[inside], dist[inside]
+        order = np.argsort(dist, kind="stable")
+        return found[order], dist[order]
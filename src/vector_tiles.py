@@ -0,0 +1,478 @@
+"""
+vector_tiles.py
+
+Static vector tiles of the shelters: Mapbox Vector Tiles (MVT 2.1)
+written to an MBTiles (SQLite) file.
+
+Each tile has two point layers. ``clusters`` holds the server-side
+clusters of ``cluster_pyramid.ClusterPyramid`` (``count``,
+``capacity``); ``shelters`` holds the shelters alone in their cluster
+cell, and every shelter on the zoom level above the pyramid.
+
+The protobuf messages are encoded column-wise. All point features of a
+layer have the same field layout, so one zoom level is a matrix with one
+row per feature and one column per varint (field tags, lengths, tag
+indices, coordinates); :func:`encode_varints` encodes it in one pass,
+and since the matrix is flattened row by row the result is already the
+concatenation of the feature messages. Python only loops over tiles to
+join their layers.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import sqlite3
+import zlib
+from collections.abc import Iterator
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+import config
+from cluster_pyramid import ClusterPyramid, mercator
+
+logger = logging.getLogger(config.LOGGER_NAME)
+
+EXTENT = 4096
+
+# Protobuf field tags (field number << 3 | wire type) of vector_tile.proto
+_TILE_LAYER = 0x1A
+_LAYER_VERSION, _LAYER_NAME, _LAYER_FEATURE = 0x78, 0x0A, 0x12
+_LAYER_KEY, _LAYER_VALUE, _LAYER_EXTENT = 0x1A, 0x22, 0x28
+_FEATURE_ID, _FEATURE_TAGS, _FEATURE_TYPE, _FEATURE_GEOMETRY = 0x08, 0x12, 0x18, 0x22
+_VALUE_STRING, _VALUE_UINT = 0x0A, 0x28
+_POINT, _MOVE_TO_1 = 1, 9
+
+
+def varint_lengths(values: np.ndarray) -> np.ndarray:
+    """Return the number of bytes of each value as a protobuf varint."""
+    values = np.asarray(values, dtype=np.uint64)
+    lengths = np.ones(values.shape, dtype=np.int64)
+    for shift in range(7, 64, 7):
+        lengths += values >= np.uint64(1 << shift)
+    return lengths
+
+
+def encode_varints(values: np.ndarray, lengths: np.ndarray) -> bytes:
+    """Encode *values* as consecutive protobuf varints, in C order.
+
+    Args:
+        values: Non-negative integers of any shape.
+        lengths: :func:`varint_lengths` of *values*; entries set to 0 are
+            omitted from the output.
+    """
+    values = np.asarray(values, dtype=np.uint64).ravel()
+    lengths = np.asarray(lengths).ravel()
+    owner = np.repeat(np.arange(len(values)), lengths)
+    offset = np.arange(len(owner)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    data = (values[owner] >> (7 * offset).astype(np.uint64)) & np.uint64(0x7F)
+    more = offset < lengths[owner] - 1
+    return (data | (more.astype(np.uint64) << np.uint64(7))).astype(np.uint8).tobytes()
+
+
+def _varint(value: int) -> bytes:
+    """Encode one non-negative integer as a protobuf varint."""
+    out = bytearray()
+    while value >= 0x80:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def _message(tag: int, payload: bytes) -> bytes:
+    """Return a length-delimited field."""
+    return bytes([tag]) + _varint(len(payload)) + payload
+
+
+@dataclass(frozen=True)
+class Tag:
+    """One feature property of a layer.
+
+    Attributes:
+        key: Property name.
+        values: Integer value per feature, or the code into *labels*.
+        present: ``False`` where the feature has no value.
+        labels: String values for a string property, ``None`` for an
+            unsigned integer one.
+    """
+
+    key: str
+    values: np.ndarray
+    present: np.ndarray
+    labels: list[str] | None = None
+
+
+class _Layer:
+    """Encoded features of one layer on one zoom level, sliced per tile.
+
+    Args:
+        name: Layer name.
+        tile: Tile key of each feature, sorted.
+        px: Column of each feature within its tile, ``0..EXTENT - 1``.
+        py: Row of each feature within its tile.
+        ids: Feature IDs, ``None`` for features without one.
+        tags: Feature properties.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        tile: np.ndarray,
+        px: np.ndarray,
+        py: np.ndarray,
+        ids: np.ndarray | None,
+        tags: list[Tag],
+    ):
+        # String tags first, so that their values precede the integers
+        self._tags = sorted(tags, key=lambda tag: tag.labels is None)
+        self._header = bytes([_LAYER_VERSION, 2]) + _message(
+            _LAYER_NAME, name.encode("utf-8")
+        )
+        self._keys = b"".join(
+            _message(_LAYER_KEY, tag.key.encode("utf-8")) for tag in self._tags
+        )
+        self._footer = bytes([_LAYER_EXTENT]) + _varint(EXTENT)
+        # Value fields of every string label, concatenated over the tags
+        labels = [
+            _message(_LAYER_VALUE, _message(_VALUE_STRING, label.encode("utf-8")))
+            for tag in self._tags
+            for label in tag.labels or ()
+        ]
+        self._string_tag = np.array([tag.labels is not None for tag in self._tags])
+        self._label_base = np.cumsum([0] + [len(tag.labels or ()) for tag in self._tags])
+        self._label_offsets = np.cumsum([0] + [len(field) for field in labels])
+        self._string_fields = b"".join(labels)
+        self.tiles = np.unique(tile)
+        if not len(tile):
+            self._features = self._values = b""
+            return
+
+        value_index, unique = self._value_tables(tile)
+        self._features, offsets = self._encode_features(px, py, ids, value_index)
+        self._feature_slices = offsets[
+            np.r_[np.searchsorted(tile, self.tiles), len(tile)]
+        ]
+        unique_tile, unique_key, unique_value = unique
+        self._values, offsets = self._encode_values(unique_key, unique_value)
+        self._value_slices = offsets[
+            np.r_[np.searchsorted(unique_tile, self.tiles), len(unique_tile)]
+        ]
+
+    def _value_tables(
+        self, tile: np.ndarray
+    ) -> tuple[np.ndarray, tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        """Rank the distinct ``(tile, tag, value)`` triples.
+
+        Returns:
+            The value index of every feature and tag within its tile's
+            value table, and the ``(tile, tag, value)`` columns of the
+            distinct triples in table order.
+        """
+        tags = self._tags
+        rows = np.concatenate([np.flatnonzero(tag.present) for tag in tags])
+        keys = np.concatenate(
+            [np.full(np.count_nonzero(tag.present), k) for k, tag in enumerate(tags)]
+        )
+        values = np.concatenate([tag.values[tag.present] for tag in tags])
+        order = np.lexsort((values, keys, tile[rows]))
+        t, k, v = tile[rows][order], keys[order], values[order].astype(np.int64)
+
+        new = np.r_[True, (t[1:] != t[:-1]) | (k[1:] != k[:-1]) | (v[1:] != v[:-1])]
+        uid = np.cumsum(new) - 1
+        tile_start = np.flatnonzero(np.r_[True, t[1:] != t[:-1]])
+        first_uid = np.repeat(uid[tile_start], np.diff(np.r_[tile_start, len(t)]))
+        value_index = np.zeros((len(tile), len(tags)), dtype=np.int64)
+        value_index[rows[order], k] = uid - first_uid
+        return value_index, (t[new], k[new], v[new])
+
+    def _encode_features(
+        self,
+        px: np.ndarray,
+        py: np.ndarray,
+        ids: np.ndarray | None,
+        value_index: np.ndarray,
+    ) -> tuple[bytes, np.ndarray]:
+        """Return the feature fields and the byte offset of every feature."""
+        n, n_tags = value_index.shape
+        present = np.stack([tag.present for tag in self._tags], axis=1)
+        tag_cols = np.empty((n, 2 * n_tags), dtype=np.int64)
+        tag_cols[:, 0::2] = np.arange(n_tags)
+        tag_cols[:, 1::2] = value_index
+        tag_lengths = varint_lengths(tag_cols) * np.repeat(present, 2, axis=1)
+        id_cols = np.column_stack(
+            [np.full(n, _FEATURE_ID), np.zeros(n, dtype=np.int64) if ids is None else ids]
+        )
+        id_lengths = varint_lengths(id_cols) * (ids is not None)
+        geometry = np.column_stack([np.full(n, _MOVE_TO_1), 2 * px, 2 * py])
+        geometry_lengths = varint_lengths(geometry)
+
+        tag_size = tag_lengths.sum(axis=1)
+        geometry_size = geometry_lengths.sum(axis=1)
+        feature_size = id_lengths.sum(axis=1) + tag_size + geometry_size + 6
+        if n and feature_size.max() >= 128:
+            raise ValueError("feature too large for one-byte length prefixes")
+
+        ones = np.ones((n, 1), dtype=np.int64)
+        values = np.column_stack(
+            [
+                np.full(n, _LAYER_FEATURE),
+                feature_size,
+                id_cols,
+                np.full(n, _FEATURE_TAGS),
+                tag_size,
+                tag_cols,
+                np.full(n, _FEATURE_TYPE),
+                np.full(n, _POINT),
+                np.full(n, _FEATURE_GEOMETRY),
+                geometry_size,
+                geometry,
+            ]
+        )
+        lengths = np.column_stack(
+            [ones, ones, id_lengths, ones, ones, tag_lengths]
+            + [ones] * 4
+            + [geometry_lengths]
+        )
+        offsets = np.r_[0, np.cumsum(lengths.sum(axis=1))]
+        return encode_varints(values, lengths), offsets
+
+    def _encode_values(
+        self, key: np.ndarray, value: np.ndarray
+    ) -> tuple[bytes, np.ndarray]:
+        """Encode the value fields of the distinct ``(tile, tag, value)`` triples.
+
+        Unsigned integers are one matrix of ``[layer field, length, uint
+        field, value]``; string fields are copied from the pre-encoded
+        labels of their tag.
+
+        Returns:
+            The value fields in table order and the byte offset of each.
+        """
+        is_string = self._string_tag[key]
+        uints = value[~is_string]
+        m = len(uints)
+        uint_lengths = varint_lengths(uints)
+        matrix = np.column_stack(
+            [np.full(m, _LAYER_VALUE), uint_lengths + 1, np.full(m, _VALUE_UINT), uints]
+        )
+        lengths = np.column_stack([np.ones((m, 3), dtype=np.int64), uint_lengths])
+        uint_sizes = lengths.sum(axis=1)
+        source = np.frombuffer(
+            self._string_fields + encode_varints(matrix, lengths), dtype=np.uint8
+        )
+
+        starts = np.empty(len(key), dtype=np.int64)
+        sizes = np.empty(len(key), dtype=np.int64)
+        label = self._label_base[key[is_string]] + value[is_string]
+        starts[is_string] = self._label_offsets[label]
+        sizes[is_string] = self._label_offsets[label + 1] - self._label_offsets[label]
+        starts[~is_string] = len(self._string_fields) + np.cumsum(uint_sizes) - uint_sizes
+        sizes[~is_string] = uint_sizes
+        gather = np.repeat(starts - (np.cumsum(sizes) - sizes), sizes) + np.arange(sizes.sum())
+        return source[gather].tobytes(), np.r_[0, np.cumsum(sizes)]
+
+    def message(self, tile_key: int) -> bytes:
+        """Return the layer field of tile *tile_key*; empty if it has no features."""
+        i = int(np.searchsorted(self.tiles, tile_key))
+        if i == len(self.tiles) or self.tiles[i] != tile_key:
+            return b""
+        f0, f1 = self._feature_slices[i : i + 2]
+        v0, v1 = self._value_slices[i : i + 2]
+        layer = b"".join(
+            (
+                self._header,
+                self._features[f0:f1],
+                self._keys,
+                self._values[v0:v1],
+                self._footer,
+            )
+        )
+        return _message(_TILE_LAYER, layer)
+
+
+def _tile_points(
+    zoom: int, lat: np.ndarray, lon: np.ndarray
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Return the tile key (``y * 2**zoom + x``) and in-tile pixel of each point."""
+    x, y = mercator(lat, lon)
+    scale = (1 << zoom) * EXTENT
+    wx = np.minimum(x * scale, scale - 1).astype(np.int64)
+    wy = np.minimum(y * scale, scale - 1).astype(np.int64)
+    tile = (wy // EXTENT) * (1 << zoom) + wx // EXTENT
+    return tile, wx % EXTENT, wy % EXTENT
+
+
+def _sorted_by_tile(tile: np.ndarray, *columns: np.ndarray) -> list[np.ndarray]:
+    order = np.argsort(tile, kind="stable")
+    return [tile[order]] + [column[order] for column in columns]
+
+
+def _category_tag(key: str, s: pd.Series, positions: np.ndarray) -> Tag:
+    codes = pd.Categorical(s).codes[positions].astype(np.int64)
+    return Tag(key, np.maximum(codes, 0), codes >= 0, pd.Categorical(s).categories.tolist())
+
+
+def _zoom_layers(
+    zoom: int, df: pd.DataFrame, pyramid: ClusterPyramid, located: np.ndarray
+) -> list[_Layer]:
+    """Return the ``clusters`` and ``shelters`` layers of one zoom level."""
+    if zoom <= pyramid.max_zoom:
+        lat, lon, count, capacity, single = pyramid.clusters(zoom)
+    else:
+        lat, lon, count, capacity = (np.empty(0),) * 4
+        single = located
+
+    tile, px, py, count, capacity = _sorted_by_tile(
+        *_tile_points(zoom, lat, lon), count.astype(np.int64), np.round(capacity)
+    )
+    clusters = _Layer(
+        "clusters",
+        tile,
+        px,
+        py,
+        None,
+        [
+            Tag("count", count, np.ones(len(tile), dtype=bool)),
+            Tag("capacity", capacity.astype(np.int64), np.ones(len(tile), dtype=bool)),
+        ],
+    )
+
+    shelter_lat = df["latitude"].to_numpy(dtype=float, na_value=np.nan)[single]
+    shelter_lon = df["longitude"].to_numpy(dtype=float, na_value=np.nan)[single]
+    tile, px, py, single = _sorted_by_tile(
+        *_tile_points(zoom, shelter_lat, shelter_lon), single
+    )
+    shelter_capacity = df["Місткість"].to_numpy(dtype=float, na_value=np.nan)[single]
+    shelters = _Layer(
+        "shelters",
+        tile,
+        px,
+        py,
+        np.asarray(df.index)[single].astype(np.int64),
+        [
+            Tag(
+                "capacity",
+                np.nan_to_num(shelter_capacity).astype(np.int64),
+                ~np.isnan(shelter_capacity),
+            ),
+            _category_tag("type", df["Тип"], single),
+            _category_tag("accessible", df["Інклюзивність"], single),
+        ],
+    )
+    return [clusters, shelters]
+
+
+def iter_tiles(
+    df: pd.DataFrame,
+    min_zoom: int = config.MAP_MIN_ZOOM,
+    max_zoom: int = config.EXPORT_TILE_MAX_ZOOM,
+) -> Iterator[tuple[int, int, int, bytes]]:
+    """Yield ``(zoom, x, y, tile)`` for every non-empty tile.
+
+    Args:
+        df: Display DataFrame with an integer index (the shelter IDs),
+            ``latitude``, ``longitude``, ``Місткість``, ``Тип`` and
+            ``Інклюзивність`` columns.
+        min_zoom: Lowest zoom level.
+        max_zoom: Highest zoom level; levels above
+            ``config.MAP_CLUSTER_MAX_ZOOM`` hold unclustered shelters.
+    """
+    pyramid = ClusterPyramid(
+        df,
+        min_zoom=min_zoom,
+        max_zoom=min(config.MAP_CLUSTER_MAX_ZOOM, max_zoom),
+        cell_px=config.MAP_CLUSTER_CELL_PX,
+    )
+    lat = df["latitude"].to_numpy(dtype=float, na_value=np.nan)
+    lon = df["longitude"].to_numpy(dtype=float, na_value=np.nan)
+    located = np.flatnonzero(~np.isnan(lat) & ~np.isnan(lon))
+    for zoom in range(min_zoom, max_zoom + 1):
+        layers = _zoom_layers(zoom, df, pyramid, located)
+        for tile_key in np.union1d(layers[0].tiles, layers[1].tiles):
+            y, x = divmod(int(tile_key), 1 << zoom)
+            yield zoom, x, y, b"".join(layer.message(tile_key) for layer in layers)
+
+
+def write_mbtiles(
+    df: pd.DataFrame,
+    path: str,
+    min_zoom: int = config.MAP_MIN_ZOOM,
+    max_zoom: int = config.EXPORT_TILE_MAX_ZOOM,
+) -> int:
+    """Write the vector tiles of *df* to a new MBTiles file.
+
+    Tiles are gzip-compressed and stored with TMS row numbers, as the
+    MBTiles 1.3 specification requires; rows are inserted one zoom level
+    at a time.
+
+    Args:
+        df: Display DataFrame, see :func:`iter_tiles`.
+        path: Output file; an existing file is replaced.
+        min_zoom: Lowest zoom level.
+        max_zoom: Highest zoom level.
+
+    Returns:
+        Number of tiles written.
+    """
+    if os.path.exists(path):
+        os.remove(path)
+    min_lon, min_lat, max_lon, max_lat = config.MAP_BOUNDS
+    fields = {"capacity": "Number", "type": "String", "accessible": "String"}
+    metadata = {
+        "name": "shelters",
+        "format": "pbf",
+        "type": "overlay",
+        "version": "1",
+        "minzoom": str(min_zoom),
+        "maxzoom": str(max_zoom),
+        "bounds": f"{min_lon},{min_lat},{max_lon},{max_lat}",
+        "center": f"{config.MAP_CENTER[1]},{config.MAP_CENTER[0]},{min_zoom}",
+        "json": json.dumps(
+            {
+                "vector_layers": [
+                    {
+                        "id": "clusters",
+                        "fields": {"count": "Number", "capacity": "Number"},
+                        "minzoom": min_zoom,
+                        "maxzoom": max_zoom,
+                    },
+                    {
+                        "id": "shelters",
+                        "fields": fields,
+                        "minzoom": min_zoom,
+                        "maxzoom": max_zoom,
+                    },
+                ]
+            }
+        ),
+    }
+
+    count = 0
+    with sqlite3.connect(path) as db:
+        db.execute("CREATE TABLE metadata (name TEXT, value TEXT)")
+        db.execute(
+            "CREATE TABLE tiles (zoom_level INTEGER, tile_column INTEGER,"
+            " tile_row INTEGER, tile_data BLOB)"
+        )
+        db.executemany("INSERT INTO metadata VALUES (?, ?)", metadata.items())
+        batch: list[tuple[int, int, int, bytes]] = []
+        for zoom, x, y, tile in iter_tiles(df, min_zoom, max_zoom):
+            compressor = zlib.compressobj(wbits=31)  # gzip container
+            data = compressor.compress(tile) + compressor.flush()
+            batch.append((zoom, x, (1 << zoom) - 1 - y, data))
+            if len(batch) >= config.EXPORT_CHUNK_ROWS:
+                db.executemany("INSERT INTO tiles VALUES (?, ?, ?, ?)", batch)
+                count += len(batch)
+                batch.clear()
+        db.executemany("INSERT INTO tiles VALUES (?, ?, ?, ?)", batch)
+        count += len(batch)
+        db.execute(
+            "CREATE UNIQUE INDEX tile_index ON tiles (zoom_level, tile_column, tile_row)"
+        )
+    db.close()
+    logger.info(f"Vector tiles: wrote {count} tiles for {len(df)} shelters to {path}")
+    return count
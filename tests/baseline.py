@@ -0,0 +1,285 @@
+"""
+baseline.py
+
+Reference copies of ``data_processing`` functions as they were before
+they were replaced by faster implementations. The bodies are copied
+verbatim, bugs included; the tests compare the replacements against
+them.
+"""
+
+from functools import cmp_to_key
+
+import pandas as pd
+
+import config_regex as rx
+
+_HOMOGLYPHS: dict[str, str] = {
+    "A": "А",
+    "B": "В",
+    "C": "С",
+    "E": "Е",
+    "H": "Н",
+    "I": "І",
+    "K": "К",
+    "M": "М",
+    "O": "О",
+    "P": "Р",
+    "T": "Т",
+    "X": "Х",
+    "i": "і",
+    "y": "у",
+    "a": "а",
+    "c": "с",
+    "e": "е",
+    "o": "о",
+    "p": "р",
+    "x": "х",
+}
+_HOMOGLYPH_TABLE = str.maketrans(_HOMOGLYPHS)
+
+
+def _clean_str_base(s: pd.Series) -> pd.Series:
+    """Apply base string normalisation: homoglyphs, quotes, dash spacing.
+
+    Args:
+        s: Raw string Series.
+
+    Returns:
+        Cleaned string Series.
+    """
+    s_str = s.astype(dtype=str)
+    s_str = s.str.translate(_HOMOGLYPH_TABLE)
+
+    s_str = s_str.str.replace("`", "'", regex=False).str.replace(
+        "\u2019", "'", regex=False
+    )
+    s_str = rx._RE_DASH_SPACES.sub("-", s.str.cat(sep="\x00"))
+
+    s_str = s.str.replace(rx._RE_DASH_SPACES, "-", regex=True)
+    return s_str.str.strip()
+
+
+def _clean_str_strict(s: pd.Series) -> pd.Series:
+    """Strict string cleaning: removes newlines, stray digits, trailing letters.
+
+    Args:
+        s: Raw string Series.
+
+    Returns:
+        Cleaned string Series.
+    """
+    s_str = _clean_str_base(s.astype(dtype=str))
+
+    s_str = s_str.str.replace(rx._RE_NEWLINE_TAB, "", regex=True)
+    s_str = s_str.str.replace(rx._RE_TRAILING_LETTER, "", regex=True)
+    s_str = s_str.str.replace(rx._RE_DIGITS_QUOTES, "", regex=True)
+    s_str = s_str.str.replace(rx._RE_EDGE_DOT, "", regex=True)
+
+    return s_str.str.strip()
+
+
+
+def _clean_otg(s: pd.Series) -> pd.Series:
+    """Normalise OTG (community) names.
+
+    Args:
+        s: Raw OTG name Series.
+
+    Returns:
+        Normalised OTG name Series.
+    """
+    s = _clean_str_strict(s)
+    s = s.str.replace(rx._RE_OTG_SUFFIX, "", regex=True)
+
+    corrections: dict[str, str] = {
+        "Усть-Чорна": "Усть-Чорнянська",
+        "Косонська": "Косоньська",
+    }
+    return s.replace(corrections).str.strip()
+
+
+def _clean_city(s: pd.Series) -> pd.Series:
+    """Normalise settlement (city/village) names.
+
+    Args:
+        s: Raw city name Series.
+
+    Returns:
+        Normalised city name Series.
+    """
+    s = _clean_str_strict(s)
+    s = s.str.replace(rx._RE_CITY_STREET_SFX, "", regex=True)
+    s = s.str.replace(rx._RE_CITY_PREFIX, "", regex=True)
+    s = s.str.replace(rx._RE_EDGE_DOT_SPACE, "", regex=True)
+
+    abbreviation_map = {
+        "Вел. Бичків": "Великий Бичків",
+        "В.Бичків": "Великий Бичків",
+        "В.Ворота": "Верхні Ворота",
+        "В. Ворота": "Верхні Ворота",
+        "Н.Ворота": "Нижні Ворота",
+        "В.Коропець": "Верхній Коропець",
+        "Н.Коропець": "Нижній Коропець",
+        "В.Визниця": "Верхня Визниця",
+        "М.Раковець": "Малий Раковець",
+        "В.Раковець": "Великий Раковець",
+        "Р.Поле": "Руське Поле",
+        "Н.Селище": "Нижнє Селище",
+        "В.Водяне": "Верхнє Водяне",
+        "Н.Давидково": "Нове Давидково",
+        "Н. Ремета": "Нижні Ремети",
+    }
+    s = s.replace(abbreviation_map)
+
+    typo_correct = {
+        "Золотарево": "Золотарьово",
+        "Зарічово": "Зарічево",
+        "Копашнево": "Копашново",
+        "Кленовець": "Кленовець",
+        "Клиновець": "Кленовець",
+        "Верхне Водяне": "Верхнє Водяне",
+        "Горінчево": "Горінчово",
+        "Усть- Чорна": "Усть-Чорна",
+        "Бедевля": "Бедевля",
+        "Березово": "Березове",
+        "Оклі": "Оклі Гедь",
+        "Горинчево": "Горінчово",
+        "Вільхівські -Лази": "Вільхівські-Лази",
+        "Оклі Гедь Гедь": "Оклі Гедь",
+        "Неветленфолувул": "Неветленфолу",
+    }
+
+    return s.replace(typo_correct).str.strip()
+
+
+def _clean_name(s: pd.Series) -> pd.Series:
+    """Normalise shelter name: collapse whitespace, fix quotes, capitalise.
+
+    Args:
+        s: Raw name Series.
+
+    Returns:
+        Normalised name Series.
+    """
+    s = _clean_str_base(s)
+    s = s.str.replace(rx._RE_WHITESPACE, " ", regex=True)
+    s = s.str.replace(rx._RE_NAME_EDGE, "", regex=True)
+    s = s.str.replace(rx._RE_EXTRA_QUOTES, '"', regex=True)
+    # Capitalise first character using vectorised string operations
+    s = s.str[:1].str.upper() + s.str[1:]
+    return s.str.strip()
+
+
+def _clean_adress(s: pd.Series) -> pd.Series:
+    """Normalise Ukrainian postal address strings.
+
+    Args:
+        s: Raw address Series.
+
+    Returns:
+        Normalised address Series.
+    """
+    s_adress = s.astype(str)
+    s_adress = s_adress.str.replace(rx._RE_ADDR_NEWLINE, " ", regex=True)
+    s_adress = s_adress.str.replace(rx._RE_WHITESPACE, " ", regex=True)
+    s_adress = s_adress.str.replace(rx._RE_ADDR_EDGE_DOT, "", regex=True)
+    s_adress = s_adress.str.replace(rx._RE_EXTRA_QUOTES, '"', regex=True)
+    s_adress = s_adress.str.replace(rx._RE_ADDR_NUMBER_ONLY, "Відсутня", regex=True)
+    s_adress = s_adress.str.replace(rx._RE_ADDR_CITY_PREFIX, r"\1", regex=True)
+    s_adress = s_adress.str.replace(rx._RE_ADDR_SPLIT_LN, r"\1, \2", regex=True)
+    s_adress = s_adress.str.replace(rx._RE_ADDR_SPLIT_NL, r"\1 \2", regex=True)
+
+    exact_dict: dict[str, str] = {
+        "Миру": "вул. Миру",
+        "Шевченка": "вул. Шевченка",
+        "Студентська набережна": "наб. Студентська",
+        "без назви": "вул. Без Назви",
+        "Без назви": "вул. Без Назви",
+        "наб. Киівська, 16": "наб. Київська, 16",
+        "вул.Пушкіна (Й. Волощукв), 2": "вул. Пушкіна (Й. Волощука), 2",
+        "с.Руська Мокра, Тячівського району, Миру, 97": "вул. Миру, 97",
+        "вул. Визволення, 21 /2-пов будівля/": "вул. Визволення, 21",
+        "вул. Європейська, 18 Тячівського району": "вул. Європейська, 18",
+    }
+    s_adress = s_adress.replace(exact_dict)
+
+    s_adress = s_adress.str.replace(rx._RE_ADDR_VUL, "вул. ", regex=True)
+    s_adress = s_adress.str.replace(rx._RE_ADDR_PL, "пл. ", regex=True)
+    s_adress = s_adress.str.replace(rx._RE_ADDR_PR, "пр. ", regex=True)
+    s_adress = s_adress.str.replace(rx._RE_ADDR_BUD, "буд. ", regex=True)
+    s_adress = s_adress.str.replace(rx._RE_ADDR_BUDYNOK, "буд.", regex=True)
+    s_adress = s_adress.str.replace(rx._RE_ADDR_DUP_VUL, "вул. ", regex=True)
+    return s.str.strip()
+
+
+# Ukrainian alphabet order for sorting
+_UKR_ALPHABET = "АБВГҐДЕЄЖЗИІЇЙКЛМНОПРСТУФХЦЧШЩЬЮЯ"
+_UKR_SORT_MAP: dict[str, int] = {c: i for i, c in enumerate(_UKR_ALPHABET)}
+
+
+def _ukr_sort_key(text: str) -> list[int]:
+    """Return a sort key list based on Ukrainian alphabet order.
+
+    Args:
+        text: A Ukrainian (or mixed) string to sort.
+
+    Returns:
+        A list of integer positions in the Ukrainian alphabet.
+        Unknown characters map to 999 so they sort last.
+    """
+    return [_UKR_SORT_MAP.get(c.upper(), 999) for c in text]
+
+
+def _ukr_cmp(a: str, b: str) -> int:
+    """Comparator for Ukrainian strings, used with ``cmp_to_key``."""
+    ka, kb = _ukr_sort_key(a), _ukr_sort_key(b)
+    return (ka > kb) - (ka < kb)
+
+
+_UKR_KEY = cmp_to_key(_ukr_cmp)
+
+
+def search_data(
+    df: pd.DataFrame,
+    city_name: str | None = None,
+    otg_name: str | None = None,
+    shelter_type: list[str] | None = None,
+    max_capacity: int | None = None,
+    accessible_only: bool | None = None,
+) -> pd.DataFrame:
+    """Filter the display DataFrame by the given criteria.
+
+    Args:
+        df: Display-ready DataFrame (Ukrainian column names from
+            ``get_extended_data``).
+        city_name: Settlement to filter on; ``" "`` means no filter.
+        otg: OTG community name; ``" "`` means no filter.
+        shelter_type: List of shelter-type strings to include.
+        max_capacity: Upper bound on the ``Місткість`` column.
+        accessible_only: If ``True``, keep only wheelchair-accessible
+            shelters (``Інклюзивність == 'Так'``).
+
+    Returns:
+        Filtered DataFrame.
+    """
+
+    mask = pd.Series(True, index=df.index)
+
+    if city_name != " ":
+        mask &= df["Населений пункт"] == city_name
+
+    if otg_name != " ":
+        mask &= df["ОТГ"] == otg_name
+
+    if shelter_type and len(shelter_type) > 0:
+        mask &= df["Тип"].isin(shelter_type)
+
+    if accessible_only:
+
+        mask &= df["Інклюзивність"] == "Так"
+
+    if max_capacity:
+
+        mask &= df["Місткість"] <= max_capacity
+
+    return df[mask]
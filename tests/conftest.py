@@ -0,0 +1,124 @@
+"""
+conftest.py
+
+Shared fixtures of the test suite. The application modules are imported
+from ``src/`` and the synthetic registry from ``benchmarks/fixtures.py``
+(see ``[tool.pytest.ini_options]`` in ``pyproject.toml``).
+
+    python -m pytest
+"""
+
+from __future__ import annotations
+
+import itertools
+import json
+
+import fixtures
+import numpy as np
+import pandas as pd
+import pytest
+
+import config
+import corrections
+
+TEXT_COLUMNS = [
+    "properties.OTG",
+    "properties.City",
+    "properties.Name",
+    "properties.Adress",
+    "properties.Type",
+    "properties.TypeZs",
+    "properties.Rajon",
+]
+
+# Filter value that matches no shelter
+UNKNOWN = "Неіснуюче"
+
+# Values the synthetic registry does not cover, put in every text column
+EDGE_VALUES = [
+    None,
+    np.nan,
+    "",
+    "   ",
+    "Ужгоpод",  # Latin "p"
+    "O`Ніл",
+    "Кам’янка",
+    "Усть - Чорна",
+    "вул.Миру, 5",
+    "Миру",
+    "12",
+    "с. Кольчино вул.Гагаріна 4",
+    "Назва\nз переносом",
+    '""Школа""',
+]
+
+
+@pytest.fixture(scope="session", autouse=True)
+def gazetteer_cache(tmp_path_factory):
+    """Keep the gazetteer resolutions of the tests out of the project's data."""
+    with pytest.MonkeyPatch.context() as patch:
+        path = tmp_path_factory.mktemp("gazetteer") / "gazetteer_cache.json"
+        patch.setattr(config, "GAZETTEER_CACHE_FILE", str(path))
+        yield path
+
+
+@pytest.fixture(scope="session")
+def raw_registry() -> pd.DataFrame:
+    """The synthetic registry as ``pd.json_normalize`` output, plus edge values."""
+    df = pd.json_normalize(fixtures.synthetic_geojson(), record_path=["features"])
+    edge = pd.DataFrame({column: EDGE_VALUES for column in TEXT_COLUMNS}, dtype=object)
+    return pd.concat([df, edge], ignore_index=True)
+
+
+@pytest.fixture(scope="session")
+def display_registry() -> pd.DataFrame:
+    """The synthetic registry as ``get_extended_data`` output.
+
+    Some capacities and shelter types are missing. Shared by the tests:
+    do not modify it.
+    """
+    df = fixtures.display_frame()
+    df.loc[df.index[::17], "Місткість"] = pd.NA
+    df.loc[df.index[5::23], "Тип"] = np.nan
+    return df
+
+
+@pytest.fixture(scope="session")
+def baseline_display(display_registry) -> pd.DataFrame:
+    """``display_registry`` with the dtypes of the old pipeline.
+
+    Text columns are object and capacities float, missing ones ``NaN``.
+    """
+    text = display_registry.select_dtypes(["category", "string"]).columns
+    return display_registry.astype({**dict.fromkeys(text, object), "Місткість": float})
+
+
+@pytest.fixture(scope="session")
+def filter_combinations(display_registry) -> list[tuple]:
+    """Sidebar filter combinations in ``search_data`` argument order.
+
+    Include unknown values, empty type lists and selections that match
+    nothing or everything.
+    """
+    df = display_registry
+    cities = [" ", df["Населений пункт"].dropna().iloc[0], UNKNOWN]
+    otgs = [" ", df["ОТГ"].dropna().iloc[0], df["ОТГ"].dropna().iloc[-1], UNKNOWN]
+    types = sorted(df["Тип"].dropna().unique())
+    type_choices = [None, [], types[:1], types[1:3], types, [types[0], UNKNOWN], [UNKNOWN]]
+    capacities = [None, 0, 50, 500, 10**6]
+    return list(itertools.product(cities, otgs, type_choices, capacities, [False, True]))
+
+
+@pytest.fixture
+def exact_corrections(tmp_path, monkeypatch):
+    """Load the correction tables without near-miss (fuzzy) matching."""
+    with open(corrections.rules.path, encoding="utf-8") as fh:
+        data = json.load(fh)
+    data["fuzzy"] = []
+    path = tmp_path / "corrections.json"
+    path.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+    monkeypatch.setattr(corrections.rules, "path", str(path))
+    corrections.rules.reload_if_changed()
+    yield corrections.rules
+    monkeypatch.undo()
+    corrections.rules.reload_if_changed()
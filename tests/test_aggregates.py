@@ -0,0 +1,105 @@
+"""
+test_aggregates.py
+
+KPI card and chart inputs from ``ShelterCube`` cells against the row
+level ``len``/``sum``/``value_counts``/``groupby`` of the filtered
+``search_data`` result they replaced (``baseline.py``).
+"""
+
+from __future__ import annotations
+
+import baseline
+import numpy as np
+import pandas as pd
+import pytest
+
+import aggregates
+from aggregates import CAPACITY_COL, COUNT_COL, DIMENSIONS, ShelterCube
+
+UNKNOWN = "Неіснуюче"
+
+
+@pytest.fixture(scope="module")
+def cube(display_registry) -> ShelterCube:
+    return ShelterCube(display_registry)
+
+
+def _row_stats(filtered: pd.DataFrame) -> tuple[int, int, float]:
+    count = len(filtered)
+    capacity = int(filtered[CAPACITY_COL].sum())
+    pct = (
+        filtered["Інклюзивність"].value_counts(normalize=True).get("Так", 0) * 100
+        if count
+        else 0.0
+    )
+    return count, capacity, pct
+
+
+def test_cells_match_rows_per_combination(cube, baseline_display, filter_combinations):
+    for combo in filter_combinations:
+        filtered = baseline.search_data(baseline_display, *combo)
+        cells = cube.cells(*combo)
+
+        count, capacity, pct = aggregates.summary(cells)
+        expected = _row_stats(filtered)
+        assert (count, capacity) == expected[:2], combo
+        assert np.isclose(pct, expected[2]), combo
+
+        by_type = aggregates.capacity_by(cells, "Тип")
+        expected_by_type = filtered.groupby("Тип")[CAPACITY_COL].sum()
+        pd.testing.assert_series_equal(by_type, expected_by_type, check_names=False)
+
+
+def test_cells_match_rows_per_dimension(cube, baseline_display, filter_combinations):
+    for combo in filter_combinations:
+        filtered = baseline.search_data(baseline_display, *combo)
+        cells = cube.cells(*combo)
+
+        actual = cells.groupby(DIMENSIONS, dropna=False)[[COUNT_COL, CAPACITY_COL]].sum()
+        expected = filtered.groupby(DIMENSIONS, dropna=False).agg(
+            **{COUNT_COL: (CAPACITY_COL, "size"), CAPACITY_COL: (CAPACITY_COL, "sum")}
+        )
+        pd.testing.assert_frame_equal(actual, expected, check_dtype=False)
+
+
+def test_capacity_by_settlement_of_a_community(cube, baseline_display):
+    for otg in baseline_display["ОТГ"].dropna().unique():
+        rows = baseline_display[baseline_display["ОТГ"] == otg]
+        expected = rows.groupby("Населений пункт")[CAPACITY_COL].sum()
+
+        actual = aggregates.capacity_by(cube.cells(otg_name=otg), "Населений пункт")
+        pd.testing.assert_series_equal(actual, expected, check_names=False)
+
+
+def test_first_otg(cube, baseline_display):
+    for city in baseline_display["Населений пункт"].dropna().unique():
+        match = baseline_display.loc[baseline_display["Населений пункт"] == city, "ОТГ"]
+        assert cube.first_otg(city) == match.iloc[0]
+    assert cube.first_otg(UNKNOWN) is None
+
+
+def test_missing_capacity_counts_but_does_not_sum(cube, display_registry):
+    missing = display_registry["Місткість"].isna()
+    assert missing.any()
+
+    count, capacity, _pct = aggregates.summary(cube.cells())
+    assert count == len(display_registry)
+    assert capacity == int(display_registry["Місткість"].sum())
+
+    bounded, _capacity, _pct = aggregates.summary(cube.cells(max_capacity=10**6))
+    assert bounded == (~missing).sum()
+
+
+def test_empty_selection(cube):
+    cells = cube.cells(city_name=UNKNOWN)
+
+    assert cells.empty
+    assert aggregates.summary(cells) == (0, 0, 0.0)
+    assert aggregates.capacity_by(cells, "Тип").empty
+
+
+def test_empty_frame(display_registry):
+    cube = ShelterCube(display_registry.iloc[:0])
+
+    assert cube.n_cells == 0
+    assert aggregates.summary(cube.cells(max_capacity=100)) == (0, 0, 0.0)
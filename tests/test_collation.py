@@ -0,0 +1,114 @@
+"""
+test_collation.py
+
+The collation keys must reproduce the order of the ``cmp_to_key``
+comparator they replaced (see ``baseline.py``).
+"""
+
+from __future__ import annotations
+
+import random
+
+import baseline
+import pandas as pd
+import pytest
+
+from collation import ukr_categorical, ukr_sort_key, ukr_sort_keys, ukr_sorted
+
+VALUES = [
+    # Ґ after Г, Є after Е, І and Ї after И, either case
+    "Ґудзик",
+    "Гусак",
+    "гуска",
+    "Єва",
+    "Ева",
+    "Ейва",
+    "Ікла",
+    "Їжак",
+    "Иван",
+    "Йод",
+    "ґава",
+    "їда",
+    # apostrophes rank like any other non-letter, after Я
+    "Об'єкт",
+    "Об’єкт",
+    "Обєкт",
+    "Обя",
+    "Пір'я",
+    "Пірат",
+    # mixed Latin/Cyrillic and non-letters
+    "School №5",
+    "Школа №5",
+    "Шkола",
+    "Школа",
+    "1-ша лінія",
+    " Алея",
+    "Алея",
+    "Алея 2",
+    "Алея-2",
+    "Я",
+    "",
+]
+
+
+def _legacy_sorted(values: list[str]) -> list[str]:
+    return sorted(values, key=baseline._UKR_KEY)
+
+
+def _assert_legacy_order(values: list[str]) -> None:
+    # Strings the comparator ranks equal may come in either order
+    legacy_keys = [baseline._ukr_sort_key(v) for v in ukr_sorted(values)]
+    assert legacy_keys == sorted(legacy_keys)
+
+
+def test_matches_legacy_comparator():
+    values = list(VALUES)
+    random.Random(0).shuffle(values)
+    _assert_legacy_order(values)
+
+    distinct = list({tuple(baseline._ukr_sort_key(v)): v for v in values}.values())
+    assert ukr_sorted(distinct) == _legacy_sorted(distinct)
+
+
+def test_matches_legacy_comparator_on_random_names():
+    rng = random.Random(1)
+    alphabet = baseline._UKR_ALPHABET + baseline._UKR_ALPHABET.lower() + " -'’1AbZ"
+    values = {
+        "".join(rng.choices(alphabet, k=rng.randint(1, 6))) for _ in range(2_000)
+    }
+
+    _assert_legacy_order(list(values))
+
+
+def test_non_letters_sort_after_letters():
+    assert ukr_sorted(["1-ша", "Я", " А", "A", "Ґ"]) == ["Ґ", "Я", "A", " А", "1-ша"]
+
+
+def test_case_only_differences_sort_deterministically():
+    assert ukr_sorted(["їжак", "Їжак"]) == ukr_sorted(["Їжак", "їжак"])
+
+
+def test_sort_keys_keep_missing_values():
+    s = pd.Series(["Їжак", None, "Ґава", "Иван", "Ґава"], index=[5, 4, 3, 2, 1])
+
+    keys = ukr_sort_keys(s)
+
+    assert keys.index.equals(s.index)
+    assert keys.isna().tolist() == [False, True, False, False, False]
+    assert keys[3] == ukr_sort_key("Ґава")
+    assert s.sort_values(key=ukr_sort_keys).tolist()[:4] == [
+        "Ґава",
+        "Ґава",
+        "Иван",
+        "Їжак",
+    ]
+
+
+@pytest.mark.parametrize("values", [VALUES, ["Гусак", None, "Ґава", "Ґава"]])
+def test_categorical_order(values):
+    s = pd.Series(values)
+
+    result = ukr_categorical(s)
+
+    assert result.cat.ordered
+    assert list(result.cat.categories) == _legacy_sorted(s.dropna().unique().tolist())
@@ -0,0 +1,63 @@
+"""
+test_coverage.py
+
+The summed-area disk sum against a direct convolution, and the per-OTG
+rollup of ``CoverageGrid`` against a groupby of the filtered rows.
+"""
+
+from __future__ import annotations
+
+import numpy as np
+import pytest
+
+import config
+from coverage import CoverageGrid, disk_sum
+
+
+def _convolve(raster: np.ndarray, radius_cells: float) -> np.ndarray:
+    rows, cols = raster.shape
+    reach = int(radius_cells)
+    padded = np.pad(raster, reach)
+    out = np.zeros(raster.shape)
+    for dy in range(-reach, reach + 1):
+        for dx in range(-reach, reach + 1):
+            if dy * dy + dx * dx <= radius_cells**2:
+                out += padded[reach + dy : reach + dy + rows, reach + dx : reach + dx + cols]
+    return out
+
+
+@pytest.mark.parametrize("radius_cells", [0, 1, 2.5, 4, 8])
+def test_disk_sum_matches_convolution(radius_cells):
+    raster = np.random.default_rng(0).random((30, 40))
+
+    np.testing.assert_allclose(disk_sum(raster, radius_cells), _convolve(raster, radius_cells))
+
+
+@pytest.fixture(scope="module")
+def grid(display_registry) -> CoverageGrid:
+    return CoverageGrid(display_registry, config.MAP_BOUNDS, config.COVERAGE_CELL_M)
+
+
+@pytest.mark.parametrize("accessible_only", [False, True])
+def test_rollup_totals_match_rows(display_registry, grid, accessible_only):
+    df = display_registry
+    positions = None
+    rows = df.dropna(subset=["latitude", "longitude", "ОТГ"])
+    if accessible_only:
+        positions = np.flatnonzero(df["Інклюзивність"].eq("Так").to_numpy())
+        rows = rows[rows["Інклюзивність"] == "Так"]
+
+    rollup = grid.rollup(1_000, positions).set_index("ОТГ")
+
+    expected = rows.groupby("ОТГ", observed=True)["Місткість"].agg(["size", "sum"])
+    assert rollup["Укриттів"].to_dict() == expected["size"].to_dict()
+    assert rollup["Місткість"].to_dict() == expected["sum"].round().astype(int).to_dict()
+    assert (rollup["Площа покриття, км²"] > 0).all()
+
+
+def test_reachable_is_memoised_and_read_only(grid):
+    reachable = grid.reachable(500)
+
+    assert grid.reachable(500) is reachable
+    assert not reachable.flags.writeable
+    assert reachable.sum() >= grid.capacity_raster().sum()
@@ -0,0 +1,237 @@
+"""
+test_exports.py
+
+Every export format read back with a standard reader, for the whole
+registry (the cached export) and for a filtered subset: same shelters,
+same columns. Vector tiles are decoded from the MBTiles file with a
+minimal protobuf reader.
+"""
+
+from __future__ import annotations
+
+import gzip
+import io
+import json
+import math
+import sqlite3
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import config
+import exports
+import vector_tiles
+
+
+@pytest.fixture(scope="module")
+def registry(display_registry) -> pd.DataFrame:
+    """``display_registry`` with some coordinates missing."""
+    lat = display_registry["latitude"].copy()
+    lat.iloc[7::41] = np.nan
+    return display_registry.assign(latitude=lat)
+
+
+@pytest.fixture
+def dataset(registry, tmp_path, monkeypatch) -> SimpleNamespace:
+    monkeypatch.setattr(
+        exports, "store", exports.ExportStore(str(tmp_path / "exports"))
+    )
+    return SimpleNamespace(
+        version="test", display=registry, rows=lambda p: registry.iloc[p]
+    )
+
+
+@pytest.fixture(params=["full", "filtered"])
+def positions(request, registry) -> np.ndarray | None:
+    if request.param == "full":
+        return None
+    return np.flatnonzero(
+        registry["Тип"].eq(registry["Тип"].dropna().iloc[0]).to_numpy()
+    )
+
+
+def _expected(registry: pd.DataFrame, positions: np.ndarray | None) -> pd.DataFrame:
+    return exports.export_frame(
+        registry if positions is None else registry.iloc[positions]
+    )
+
+
+def _read(dataset, fmt: str, positions: np.ndarray | None) -> bytes:
+    with exports.open_export(dataset, fmt, positions) as f:
+        return f.read()
+
+
+def test_geojson_round_trip(dataset, registry, positions):
+    expected = _expected(registry, positions)
+
+    features = json.loads(_read(dataset, "geojson", positions))["features"]
+
+    assert len(features) == len(expected)
+    assert [f["id"] for f in features] == expected.index.tolist()
+    assert list(features[0]["properties"]) == [
+        c for c in expected.columns if c not in ("latitude", "longitude")
+    ]
+    assert [f["properties"]["Назва"] for f in features] == expected["Назва"].tolist()
+    located = expected["latitude"].notna() & expected["longitude"].notna()
+    assert [f["geometry"] is not None for f in features] == located.tolist()
+    coordinates = [f["geometry"]["coordinates"] for f in features if f["geometry"]]
+    np.testing.assert_allclose(
+        coordinates, expected.loc[located, ["longitude", "latitude"]].to_numpy(float)
+    )
+
+
+def test_csv_round_trip(dataset, registry, positions):
+    expected = _expected(registry, positions)
+
+    df = pd.read_csv(
+        io.BytesIO(_read(dataset, "csv", positions)),
+        encoding="utf-8-sig",
+        index_col="id",
+    )
+
+    assert df.columns.tolist() == expected.columns.tolist()
+    assert df.index.tolist() == expected.index.tolist()
+    assert df["Назва"].tolist() == expected["Назва"].astype(object).tolist()
+    np.testing.assert_allclose(df["latitude"], expected["latitude"].astype(float))
+
+
+def test_parquet_round_trip(dataset, registry, positions):
+    expected = _expected(registry, positions)
+
+    df = pd.read_parquet(io.BytesIO(_read(dataset, "parquet", positions)))
+
+    # pyarrow reads strings back with the python storage
+    pd.testing.assert_frame_equal(
+        df.set_index("id"), expected, check_dtype=False, check_categorical=False
+    )
+
+
+def _fields(data: bytes) -> list[tuple[int, int | bytes]]:
+    """Decode the fields of one protobuf message as ``(number, value)``."""
+
+    def varint(i: int) -> tuple[int, int]:
+        value = shift = 0
+        while True:
+            byte = data[i]
+            value |= (byte & 0x7F) << shift
+            shift += 7
+            i += 1
+            if byte < 0x80:
+                return value, i
+
+    fields, i = [], 0
+    while i < len(data):
+        key, i = varint(i)
+        if key & 7 == 0:
+            value, i = varint(i)
+        else:
+            assert key & 7 == 2, key
+            size, i = varint(i)
+            value, i = data[i : i + size], i + size
+        fields.append((key >> 3, value))
+    return fields
+
+
+def _unpack(data: bytes) -> list[int]:
+    """Decode a packed repeated varint field."""
+    values, value, shift = [], 0, 0
+    for byte in data:
+        value |= (byte & 0x7F) << shift
+        shift += 7
+        if byte < 0x80:
+            values.append(value)
+            value = shift = 0
+    return values
+
+
+def _decode_tile(data: bytes) -> dict[str, list[dict]]:
+    """Return the features of each layer: ``id``, ``x``, ``y`` and properties."""
+    layers = {}
+    for _number, layer in _fields(data):
+        fields = _fields(layer)
+        name = next(v.decode() for n, v in fields if n == 1)
+        keys = [v.decode() for n, v in fields if n == 3]
+        values = []
+        for _n, value in (f for f in fields if f[0] == 4):
+            ((kind, v),) = _fields(value)
+            values.append(v.decode() if kind == 1 else v)
+        features = []
+        for _n, feature in (f for f in fields if f[0] == 2):
+            parts = dict(_fields(feature))
+            tags = _unpack(parts.get(2, b""))
+            command, x, y = _unpack(parts[4])
+            assert command == 9 and parts[3] == 1
+            features.append(
+                {
+                    "id": parts.get(1),
+                    "x": x // 2,
+                    "y": y // 2,
+                    **{keys[k]: values[v] for k, v in zip(tags[::2], tags[1::2])},
+                }
+            )
+        layers[name] = features
+    return layers
+
+
+def _read_tiles(dataset, positions, path) -> tuple[dict[str, str], pd.DataFrame]:
+    with open(path, "wb") as f:
+        f.write(_read(dataset, "mbtiles", positions))
+    with sqlite3.connect(path) as db:
+        metadata = dict(db.execute("SELECT name, value FROM metadata"))
+        tiles = db.execute(
+            "SELECT zoom_level, tile_column, tile_row, tile_data FROM tiles"
+        ).fetchall()
+    db.close()
+    rows = []
+    for zoom, x, tms_row, data in tiles:
+        y = (1 << zoom) - 1 - tms_row
+        for layer, features in _decode_tile(gzip.decompress(data)).items():
+            for feature in features:
+                rows.append({"zoom": zoom, "tx": x, "ty": y, "layer": layer, **feature})
+    return metadata, pd.DataFrame(rows)
+
+
+def _lat_lon(features: pd.DataFrame) -> tuple[np.ndarray, np.ndarray]:
+    scale = (2.0 ** features["zoom"]) * vector_tiles.EXTENT
+    wx = features["tx"] * vector_tiles.EXTENT + features["x"] + 0.5
+    wy = features["ty"] * vector_tiles.EXTENT + features["y"] + 0.5
+    lon = wx / scale * 360 - 180
+    lat = np.degrees(np.arctan(np.sinh(math.pi * (1 - 2 * wy / scale))))
+    return lat.to_numpy(), lon.to_numpy()
+
+
+def test_vector_tiles_round_trip(dataset, registry, positions, tmp_path):
+    expected = _expected(registry, positions)
+    located = expected.dropna(subset=["latitude", "longitude"])
+
+    metadata, features = _read_tiles(dataset, positions, tmp_path / "read.mbtiles")
+
+    layers = json.loads(metadata["json"])["vector_layers"]
+    assert [layer["id"] for layer in layers] == ["clusters", "shelters"]
+    zooms = range(config.MAP_MIN_ZOOM, config.EXPORT_TILE_MAX_ZOOM + 1)
+    assert sorted(features["zoom"].unique()) == list(zooms)
+    for zoom in zooms:
+        level = features[features["zoom"] == zoom]
+        clusters = level[level["layer"] == "clusters"]
+        shelters = level[level["layer"] == "shelters"]
+        assert clusters["count"].sum() + len(shelters) == len(located), zoom
+        assert set(shelters["id"]) <= set(located.index)
+
+    top = features[
+        (features["zoom"] == config.EXPORT_TILE_MAX_ZOOM)
+        & (features["layer"] == "shelters")
+    ].set_index("id")
+    assert sorted(top.index) == sorted(located.index)
+    assert set(top.columns) >= {"capacity", "type", "accessible"}
+    top = top.loc[located.index]
+    assert (
+        top["type"].tolist()
+        == located["Тип"].astype(object).where(located["Тип"].notna()).tolist()
+    )
+    capacity = located["Місткість"].astype(float)
+    assert top["capacity"].dropna().tolist() == capacity.dropna().astype(int).tolist()
+    lat, lon = _lat_lon(top.reset_index())
+    np.testing.assert_allclose(lat, located["latitude"], atol=1e-4)
+    np.testing.assert_allclose(lon, located["longitude"], atol=1e-4)
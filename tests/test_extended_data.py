@@ -0,0 +1,55 @@
+"""
+test_extended_data.py
+
+Display columns of ``get_extended_data`` and the cleaned frame they are
+derived from, without relying on a process-wide pandas copy mode.
+"""
+
+from __future__ import annotations
+
+import fixtures
+import numpy as np
+import pandas as pd
+import pytest
+
+import data_processing as dp
+
+
+@pytest.fixture
+def cleaned() -> pd.DataFrame:
+    df = fixtures.cleaned_frame(500)
+    df.attrs["dataset_version"] = "test"
+    return df
+
+
+def test_cleaned_frame_is_left_unchanged(cleaned):
+    before = cleaned.copy()
+
+    display = dp.get_extended_data(cleaned)
+
+    pd.testing.assert_frame_equal(cleaned, before)
+    assert display["Інклюзивність"].isin(["Так", "Ні", "Невідомо"]).all()
+
+
+def test_unchanged_columns_share_buffers(cleaned):
+    display = dp.get_extended_data(cleaned)
+
+    assert np.shares_memory(display["latitude"].to_numpy(), cleaned["latitude"].to_numpy())
+    assert np.shares_memory(display["Площа"].to_numpy(), cleaned["properties.Area"].to_numpy())
+    assert display.attrs["dataset_version"] == "test"
+
+
+def test_copy_on_write_is_not_switched_on(cleaned):
+    dp.get_extended_data(cleaned)
+
+    assert not pd.get_option("mode.copy_on_write")
+
+
+def test_source_ids_are_shown_by_title(cleaned):
+    source = dp.sources.registry[0]
+    cleaned["source"] = source.id
+
+    display = dp.get_extended_data(cleaned)
+
+    assert (display["Джерело"] == source.title).all()
+    assert (cleaned["source"] == source.id).all()
@@ -0,0 +1,69 @@
+"""
+test_feature_delta.py
+
+Registry diffs between feature tables: an edit of a non-identity field
+is one changed shelter, an edit of an identity field is one removed and
+one added shelter.
+"""
+
+from __future__ import annotations
+
+import json
+
+import pandas as pd
+
+import feature_delta
+
+
+def _feature(name: str, capacity: int) -> dict:
+    return {
+        "type": "Feature",
+        "properties": {
+            "OTG": "Ужгородська",
+            "City": "Ужгород",
+            "Name": name,
+            "Adress": "вул. Миру, 5",
+            "Capacity": capacity,
+        },
+        "geometry": {"type": "Point", "coordinates": [22.29, 48.62]},
+    }
+
+
+def _table(features: list[dict]) -> pd.DataFrame:
+    table = feature_delta.FeatureTable()
+    for feature in features:
+        table.add(feature, json.dumps(feature, ensure_ascii=False))
+    return table.frame()
+
+
+PREVIOUS = _table([_feature("Школа №1", 50), _feature("Школа №2", 80)])
+
+
+def test_identical_tables_have_empty_diff():
+    delta = feature_delta.diff(PREVIOUS, PREVIOUS, "v1")
+
+    assert delta.is_empty
+    assert delta.unchanged == 2
+
+
+def test_non_identity_edit_is_one_change():
+    current = _table([_feature("Школа №1", 50), _feature("Школа №2", 120)])
+
+    delta = feature_delta.diff(PREVIOUS, current, "v1")
+
+    assert delta.changed.tolist() == [1]
+    assert len(delta.added) == 0
+    assert delta.removed.empty
+    assert delta.unchanged == 1
+    assert delta.summary() == "0 added, 0 removed, 1 changed, 1 unchanged since v1"
+
+
+def test_identity_edit_is_one_removal_and_one_addition():
+    current = _table([_feature("Школа №1", 50), _feature("Гімназія №2", 80)])
+
+    delta = feature_delta.diff(PREVIOUS, current, "v1")
+
+    assert len(delta.changed) == 0
+    assert delta.added.tolist() == [1]
+    assert delta.removed["Name"].tolist() == ["Школа №2"]
+    assert delta.unchanged == 1
@@ -0,0 +1,228 @@
+"""
+test_federation.py
+
+Duplicate rules, gap filling and the report of ``federation.merge``, the
+number of processes the sources are cleaned in, and the merged frame of
+stored source snapshots.
+"""
+
+from __future__ import annotations
+
+import json
+import time
+
+import fixtures
+import numpy as np
+import pandas as pd
+import pytest
+
+import config
+import data_processing as dp
+import feature_delta
+import federation
+import sources
+from snapshot_store import Snapshot, SnapshotStore, content_hash
+
+# Degrees of latitude per metre
+_M = 1 / 111_195
+
+
+def _frame(*rows: dict) -> pd.DataFrame:
+    columns = {
+        "properties.OTG": "Хустська",
+        "properties.City": "Хуст",
+        "properties.Name": None,
+        "properties.Adress": None,
+        "properties.People": np.nan,
+        "longitude": 23.29,
+        "latitude": 48.17,
+        "quality.Coords": "ok",
+    }
+    df = pd.DataFrame([{**columns, **row} for row in rows], columns=list(columns))
+    return df.astype({"properties.Name": "string", "properties.Adress": "string"})
+
+
+def _merge(*frames: pd.DataFrame):
+    ids = [f"s{k}" for k in range(len(frames))]
+    tables = [
+        pd.DataFrame({"feature": [f"{source}:{n}" for n in range(len(frame))]})
+        for source, frame in zip(ids, frames)
+    ]
+    return federation.merge(ids, frames, tables)
+
+
+def test_nearby_shelters_of_one_settlement_are_merged():
+    first = _frame({"properties.Name": "Школа"})
+    second = _frame(
+        {"latitude": 48.17 + 10 * _M, "properties.Name": "Школа №1"},
+        {"latitude": 48.17 + 40 * _M},
+        {"latitude": 48.17 + 10 * _M, "properties.City": "Кіреші"},
+    )
+
+    df, features, report = _merge(first, second)
+
+    assert df["properties.Name"].tolist() == ["Школа", pd.NA, pd.NA]
+    assert df["latitude"].tolist()[1:] == second["latitude"].tolist()[1:]
+    assert features["feature"].tolist() == ["s0:0", "s1:1", "s1:2"]
+    assert report["duplicates"].tolist() == [0, 1]
+
+
+def test_shelters_of_one_source_are_not_merged():
+    df, _features, report = _merge(_frame({}, {}), _frame({}))
+
+    assert len(df) == 2
+    assert report.loc["s1", "duplicates"] == 1
+
+
+def test_shelters_without_coordinates_match_by_address_or_name():
+    first = _frame(
+        {"properties.Adress": "вул. Миру, 5"},
+        {"properties.Name": "Школа", "longitude": np.nan, "latitude": np.nan},
+        {"properties.Adress": "вул. Духновича, 2", "latitude": 48.2},
+    )
+    second = _frame(
+        {"properties.Adress": "ВУЛ. МИРУ, 5", "longitude": np.nan, "latitude": np.nan},
+        {"properties.Name": "Школа", "latitude": 48.3},
+        # Both located and far apart: the address does not decide
+        {"properties.Adress": "вул. Духновича, 2", "latitude": 48.25},
+        # Same address in another community
+        {
+            "properties.Adress": "вул. Миру, 5",
+            "properties.OTG": "Тячівська",
+            "longitude": np.nan,
+            "latitude": np.nan,
+        },
+    )
+
+    df, _features, report = _merge(first, second)
+
+    assert report.loc["s1", "duplicates"] == 2
+    assert df["latitude"].tolist()[:3] == [48.17, 48.3, 48.2]
+    assert df["source"].tolist() == ["s0", "s0", "s0", "s1", "s1"]
+
+
+def test_chains_resolve_to_the_kept_shelter():
+    first = _frame({"properties.People": np.nan})
+    second = _frame({"latitude": 48.17 + 20 * _M, "properties.People": np.nan})
+    third = _frame({"latitude": 48.17 + 40 * _M, "properties.People": 120.0})
+
+    stacked = pd.concat([first, second, third], ignore_index=True)
+    match = federation.find_matches(stacked, np.array([0, 1, 2]))
+    df, _features, report = _merge(first, second, third)
+
+    assert match.tolist() == [-1, 0, 0]
+    assert len(df) == 1
+    assert df["properties.People"].tolist() == [120.0]
+    assert report["duplicates"].tolist() == [0, 1, 1]
+
+
+def test_gaps_are_filled_from_duplicates():
+    first = _frame(
+        {
+            "properties.Adress": "вул. Миру, 5",
+            "properties.People": np.nan,
+            "longitude": np.nan,
+            "latitude": np.nan,
+            "quality.Coords": "missing",
+        },
+        {"properties.People": 50.0, "properties.Name": "Школа", "latitude": 48.2},
+    )
+    second = _frame(
+        {
+            "properties.Adress": "вул. Миру, 5",
+            "properties.People": 80.0,
+            "properties.Name": "Ліцей",
+            "longitude": 23.3,
+            "latitude": 48.18,
+        },
+        # Missing capacity does not overwrite, the name is kept
+        {"properties.People": np.nan, "properties.Name": "Інша", "latitude": 48.2},
+    )
+
+    df, _features, _report = _merge(first, second)
+
+    assert len(df) == 2
+    assert df["properties.People"].tolist() == [80.0, 50.0]
+    assert df["properties.Name"].tolist() == ["Ліцей", "Школа"]
+    assert df.loc[0, ["longitude", "latitude", "quality.Coords"]].tolist() == [
+        23.3,
+        48.18,
+        "ok",
+    ]
+    assert df["source"].tolist() == ["s0", "s0"]
+
+
+def test_empty_sources():
+    frame = _frame({}, {"latitude": 48.2})
+
+    df, features, report = _merge(frame, frame.iloc[:0], frame)
+
+    assert len(df) == len(features) == 2
+    assert report["shelters"].tolist() == [2, 0, 2]
+    assert report["duplicates"].tolist() == [0, 0, 2]
+
+    df, features, report = _merge(frame.iloc[:0], frame.iloc[:0])
+    assert df.empty and features.empty
+    assert report["duplicates"].tolist() == [0, 0]
+
+
+@pytest.mark.parametrize(
+    "configured, pending, cpus, expected",
+    [
+        (4, 4, 8, 4),
+        (4, 2, 8, 2),
+        (4, 1, 8, 1),
+        (4, 0, 8, 1),
+        (4, 4, 2, 2),
+        (4, 4, 1, 1),
+        (4, 4, None, 1),
+        (1, 4, 8, 1),
+    ],
+)
+def test_ingest_workers(monkeypatch, configured, pending, cpus, expected):
+    monkeypatch.setattr(config, "INGEST_WORKERS", configured)
+    monkeypatch.setattr(dp.os, "cpu_count", lambda: cpus)
+
+    assert dp._ingest_workers(pending) == expected
+
+
+def _seed(source: sources.Source, features: list[dict]) -> Snapshot:
+    raw = json.dumps({"type": "FeatureCollection", "features": features}).encode()
+    now = time.time()
+    return dp._store_for(source).save_raw(
+        Snapshot(
+            f"{source.portal}{source.dataset}.geojson",
+            content_hash(raw),
+            fetched_at=now,
+            checked_at=now,
+        ),
+        raw,
+    )
+
+
+def test_merged_frame_of_stored_sources(tmp_path, monkeypatch):
+    extra = sources.Source(
+        id="extra", title="Extra", portal="http://extra.invalid/", dataset="extra"
+    )
+    monkeypatch.setattr(config, "SNAPSHOT_DIR", str(tmp_path))
+    monkeypatch.setattr(config, "INGEST_WORKERS", 1)
+    monkeypatch.setattr(sources, "registry", (sources.PRIMARY, extra))
+    monkeypatch.setattr(dp, "_store", SnapshotStore(str(tmp_path)))
+    monkeypatch.setattr(dp, "_stores", {})
+    monkeypatch.setattr(dp, "_merged_store", SnapshotStore(str(tmp_path / "merged")))
+    features = fixtures.synthetic_features(60)
+    # The extra source repeats ten of the registry's shelters
+    members = [_seed(sources.PRIMARY, features[:50]), _seed(extra, features[40:])]
+    snapshot = dp._federate(members)
+
+    df = dp._load_merged_frame(snapshot, dp._rules_version())
+
+    assert df["source"].value_counts().to_dict() == {"oblast": 50, "extra": 10}
+    assert df["quality.DuplicateOf"].dtype == "UInt64"
+    table = dp._merged_store.load_features(snapshot)
+    assert len(table) == len(df)
+    keys = set(table[feature_delta.KEY_COL])
+    assert set(df["quality.DuplicateOf"].dropna()) <= keys
+    again = dp._load_merged_frame(snapshot, dp._rules_version())
+    pd.testing.assert_frame_equal(again, df)
+    assert again.attrs["dataset_version"] == df.attrs["dataset_version"]
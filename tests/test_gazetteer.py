@@ -0,0 +1,110 @@
+"""
+test_gazetteer.py
+
+Settlement matching (``gazetteer``) and its use in the cleaning pipeline.
+"""
+
+from __future__ import annotations
+
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import config
+import data_processing as dp
+from gazetteer import Gazetteer, Match, ResolutionCache
+
+ENTRIES = [
+    ("Хустський", "Хустська", "Хуст"),
+    ("Хустський", "Хустська", "Горінчово"),
+    ("Мукачівський", "Мукачівська", "Горонда"),
+    ("Берегівський", "", "Оклі Гедь"),
+]
+
+
+@pytest.fixture
+def small() -> Gazetteer:
+    return Gazetteer(ENTRIES, version="test")
+
+
+def test_match_exact_folded_spelling(small):
+    assert small.match("Горинчово", "Хустська") == Match("Горінчово", 1.0)
+
+
+def test_match_is_scoped_to_the_community(small):
+    assert small.match("Горонда", "Хустська").name != "Горонда"
+    assert small.match("Горонда", "Мукачівська") == Match("Горонда", 1.0)
+
+
+def test_entries_without_community_apply_everywhere(small):
+    assert small.match("Оклі Гедь", "Хустська").name == "Оклі Гедь"
+    assert small.match("Оклі Гедь", None).name == "Оклі Гедь"
+
+
+def test_match_without_candidates(small):
+    assert small.match("Київ", "Невідома") == Match(None, 0.0)
+    assert Gazetteer([]).match("Хуст", "Хустська") == Match(None, 0.0)
+
+
+def test_snap_keeps_low_scores_and_missing_values(small):
+    city = pd.Series(["Хуст", "Горінчева", "Кваси", None], index=[7, 8, 9, 10])
+    otg = pd.Series(["Хустська", "Хустська", "Хустська", "Хустська"], index=city.index)
+
+    names, scores = small.snap(city, otg, min_score=0.9)
+
+    assert names.index.tolist() == [7, 8, 9, 10]
+    assert names.tolist()[:3] == ["Хуст", "Горінчева", "Кваси"]
+    assert names.isna().tolist() == [False, False, False, True]
+    assert scores[7] == 1.0
+    assert 0.0 < scores[8] < 0.9
+    assert np.isnan(scores[10])
+
+
+def test_snap_empty_selection(small):
+    names, scores = small.snap(pd.Series([], dtype=object), pd.Series([], dtype=object))
+
+    assert names.empty and scores.empty
+
+
+def test_resolution_cache_round_trip(tmp_path):
+    path = str(tmp_path / "cache.json")
+    cache = ResolutionCache(path, "v1")
+    cache.put("Хустська", "Хуст", Match("Хуст", 1.0))
+    cache.save()
+
+    assert ResolutionCache(path, "v1").get("Хустська", "Хуст") == Match("Хуст", 1.0)
+    assert ResolutionCache(path, "v2").get("Хустська", "Хуст") is None
+
+
+def test_cache_file_does_not_depend_on_working_directory(tmp_path):
+    env = {k: v for k, v in os.environ.items() if k != "TC_GAZETTEER_CACHE_FILE"}
+    env["PYTHONPATH"] = os.path.dirname(config.__file__)
+    path = subprocess.run(
+        [sys.executable, "-c", "import config; print(config.GAZETTEER_CACHE_FILE)"],
+        cwd=tmp_path,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout.strip()
+
+    project = os.path.dirname(os.path.dirname(os.path.abspath(config.__file__)))
+    assert path == os.path.join(project, "data", "gazetteer_cache.json")
+
+
+@pytest.mark.parametrize("snap", [False, True])
+def test_snap_settlements_is_gated(monkeypatch, snap):
+    monkeypatch.setattr(config, "GAZETTEER_SNAP", snap)
+    df = pd.DataFrame(
+        {"properties.City": ["Горинчово", "Неіснуюче"], "properties.OTG": ["Хустська"] * 2}
+    )
+
+    result = dp._snap_settlements(df)
+
+    expected = "Горінчово" if snap else "Горинчово"
+    assert result["properties.City"].tolist() == [expected, "Неіснуюче"]
+    assert result["properties.CityScore"].iloc[0] == 1.0
@@ -0,0 +1,251 @@
+"""
+test_geo_validation.py
+
+Coordinate repair, duplicate search and the location flags of
+``geo_validation``: community outliers without a boundaries file,
+point-in-polygon checks with one. Duplicates point at the identity key
+of the earlier shelter.
+"""
+
+from __future__ import annotations
+
+import json
+
+import fixtures
+import numpy as np
+import pandas as pd
+import pytest
+
+import config
+import data_processing as dp
+import feature_delta
+import geo_validation
+from spatial_index import haversine_m
+
+
+def _pairwise_duplicates(
+    lon: np.ndarray, lat: np.ndarray, radius_m: float
+) -> np.ndarray:
+    result = np.full(len(lon), -1)
+    for i in range(1, len(lon)):
+        if np.isnan(lon[i]) or np.isnan(lat[i]):
+            continue
+        close = np.flatnonzero(
+            haversine_m(lat[i], lon[i], lat[:i], lon[:i]) <= radius_m
+        )
+        if len(close):
+            result[i] = close[0]
+    return result
+
+
+def _community(otg: str, rajon: str, lon: float, lat: float, n: int) -> pd.DataFrame:
+    rng = np.random.default_rng(len(otg))
+    return pd.DataFrame(
+        {
+            "properties.OTG": otg,
+            "properties.Rajon": rajon,
+            "longitude": lon + rng.normal(0, 0.02, n),
+            "latitude": lat + rng.normal(0, 0.01, n),
+        }
+    )
+
+
+def _keys(df: pd.DataFrame) -> np.ndarray:
+    return np.arange(1_000, 1_000 + len(df), dtype=np.uint64)
+
+
+def _square(otg: str, rajon: str, lon: float, lat: float, size: float) -> dict:
+    ring = [
+        [lon - size, lat - size],
+        [lon + size, lat - size],
+        [lon + size, lat + size],
+        [lon - size, lat + size],
+        [lon - size, lat - size],
+    ]
+    return {
+        "type": "Feature",
+        "properties": {"otg": otg, "rajon": rajon},
+        "geometry": {"type": "Polygon", "coordinates": [ring]},
+    }
+
+
+@pytest.fixture
+def boundaries(tmp_path, monkeypatch):
+    """Two community squares with a hole in the second, loaded from GeoJSON."""
+    hole = _square("", "", 22.29, 48.62, 0.01)["geometry"]["coordinates"][0]
+    second = _square("Ужгородська", "Ужгородський", 22.29, 48.62, 0.1)
+    second["geometry"]["coordinates"].append(hole)
+    path = tmp_path / "boundaries.geojson"
+    path.write_text(
+        json.dumps(
+            {
+                "type": "FeatureCollection",
+                "features": [
+                    _square("Хустська", "Хустський", 23.29, 48.17, 0.1),
+                    second,
+                    {"type": "Feature", "properties": {}, "geometry": None},
+                ],
+            }
+        ),
+        encoding="utf-8",
+    )
+    loaded = geo_validation.Boundaries.from_geojson(str(path))
+    monkeypatch.setattr(geo_validation, "boundaries", loaded)
+    return loaded
+
+
+def _feature(name: str, lon: float, lat: float) -> dict:
+    feature = fixtures.synthetic_features(1)[0]
+    feature["properties"].update(Name=name, Adress="вул. Миру, 5")
+    feature["geometry"]["coordinates"] = [lon, lat]
+    return feature
+
+
+def _clean(features: list[dict]) -> tuple[pd.DataFrame, pd.DataFrame]:
+    payload = json.dumps({"type": "FeatureCollection", "features": features})
+    return dp._clean_stream(iter([payload.encode("utf-8")]))
+
+
+def test_fix_coordinates():
+    lon = pd.Series([22.3, 48.6, 0.0, 30.5, np.nan, 22.3])
+    lat = pd.Series([48.6, 22.3, 0.0, 50.4, 48.6, None])
+
+    fixed = geo_validation.fix_coordinates(lon, lat)
+
+    assert fixed["quality.Coords"].tolist() == [
+        "ok",
+        "swapped",
+        "missing",
+        "outside",
+        "missing",
+        "missing",
+    ]
+    assert fixed["longitude"].tolist()[:2] == [22.3, 22.3]
+    assert fixed["latitude"].tolist()[:2] == [48.6, 48.6]
+    assert fixed.iloc[2:][["longitude", "latitude"]].isna().all().all()
+
+
+def test_duplicates_match_pairwise_scan():
+    df = fixtures.cleaned_frame()
+    lon = df["longitude"].to_numpy(dtype=float, na_value=np.nan)
+    lat = df["latitude"].to_numpy(dtype=float, na_value=np.nan)
+
+    for radius_m in (config.GEO_DUPLICATE_M, 200.0, 2_000.0):
+        np.testing.assert_array_equal(
+            geo_validation.find_duplicates(lon, lat, radius_m),
+            _pairwise_duplicates(lon, lat, radius_m),
+        )
+
+
+def test_duplicates_without_enough_points():
+    nan = np.array([np.nan, np.nan])
+    assert geo_validation.find_duplicates(nan, nan, 5.0).tolist() == [-1, -1]
+    assert len(geo_validation.find_duplicates(np.empty(0), np.empty(0), 5.0)) == 0
+
+
+def test_flag_anomalies_flags_points_far_from_their_community():
+    df = pd.concat(
+        [
+            _community("Хустська", "Хустський", 23.29, 48.17, 20),
+            _community("Ужгородська", "Ужгородський", 22.29, 48.62, 20),
+            # Too few shelters to judge
+            _community("Рахівська", "Рахівський", 24.20, 48.06, 3),
+        ],
+        ignore_index=True,
+    )
+    # Declared in Хустська but placed in Ужгород
+    df.loc[3, ["longitude", "latitude"]] = [22.29, 48.62]
+    # Just as far from its community, which is too small to judge
+    df.loc[41, ["longitude", "latitude"]] = [22.29, 48.62]
+    df.loc[7, "longitude"] = np.nan
+    df.loc[9, "properties.OTG"] = None
+
+    result = geo_validation.flag_anomalies(df, _keys(df))
+
+    assert np.flatnonzero(result["quality.OtgMismatch"]).tolist() == [3]
+    assert np.flatnonzero(result["quality.RajonMismatch"]).tolist() == [3]
+    assert result["quality.DuplicateOf"].dtype == "UInt64"
+
+
+def test_boundaries_locate_points(boundaries):
+    lon = np.array([23.29, 22.29, 22.35, 22.29, 24.20, np.nan])
+    lat = np.array([48.17, 48.62, 48.65, 48.70, 48.06, 48.62])
+
+    assert len(boundaries) == 2
+    assert boundaries.otg.tolist() == ["Хустська", "Ужгородська"]
+    # The second point lies in the hole of the Ужгородська square
+    assert boundaries.locate(lon, lat).tolist() == [0, -1, 1, 1, -1, -1]
+
+
+def test_flag_anomalies_uses_boundaries(boundaries):
+    df = pd.DataFrame(
+        {
+            "properties.OTG": [
+                "Хустська",
+                "Хустська",
+                "Ужгородська",
+                "Ужгородська",
+                None,
+            ],
+            "properties.Rajon": [
+                "Хустський",
+                "Ужгородський",
+                "Ужгородський",
+                "Ужгородський",
+                "Ужгородський",
+            ],
+            # In its square; in the other square; outside both; missing;
+            # undeclared community
+            "longitude": [23.30, 22.35, 25.00, np.nan, 23.30],
+            "latitude": [48.18, 48.65, 48.00, np.nan, 48.18],
+        }
+    )
+
+    result = geo_validation.flag_anomalies(df, _keys(df))
+
+    assert result["quality.OtgMismatch"].tolist() == [False, True, True, False, False]
+    assert result["quality.RajonMismatch"].tolist() == [False, False, True, False, True]
+
+
+def test_rules_version_follows_boundaries(boundaries):
+    assert dp._rules_version().endswith(f".{boundaries.version}")
+    assert boundaries.version != "none"
+
+
+def test_flag_anomalies_duplicates_and_report():
+    df = _community("Хустська", "Хустський", 23.29, 48.17, 10)
+    df.loc[5, ["longitude", "latitude"]] = df.loc[
+        2, ["longitude", "latitude"]
+    ].to_numpy()
+    df["quality.Coords"] = pd.Categorical(
+        ["ok"] * 8 + ["swapped", "missing"], categories=geo_validation.COORDS_STATUSES
+    )
+
+    result = geo_validation.flag_anomalies(df, _keys(df))
+    counts = geo_validation.report(result)
+
+    assert result["quality.DuplicateOf"].iloc[5] == 1_002
+    assert result["quality.DuplicateOf"].isna().sum() == 9
+    assert counts.tolist() == [1, 0, 1, 0, 0, 1]
+
+
+def test_flag_anomalies_empty_frame():
+    df = _community("Хустська", "Хустський", 23.29, 48.17, 0)
+
+    result = geo_validation.flag_anomalies(df, _keys(df))
+
+    assert result[geo_validation.ANOMALY_COLUMNS].empty
+
+
+def test_duplicate_of_is_the_identity_key_of_the_earlier_shelter():
+    first = [_feature("Школа №1", 22.29, 48.62), _feature("Школа №2", 22.29, 48.62)]
+    # A new shelter ahead of both shifts every row position
+    moved = [_feature("Гімназія", 22.40, 48.70), *first]
+
+    df, table = _clean(first)
+    moved_df, moved_table = _clean(moved)
+
+    key = table[feature_delta.KEY_COL].iloc[0]
+    assert df["quality.DuplicateOf"].tolist() == [pd.NA, key]
+    assert moved_df["quality.DuplicateOf"].tolist() == [pd.NA, pd.NA, key]
+    assert moved_table[feature_delta.KEY_COL].iloc[1] == key
@@ -0,0 +1,164 @@
+"""
+test_instrumentation.py
+
+Stage timers: samples land in the registry and are exposed in the
+Prometheus text format; with ``TC_METRICS=0`` the timers are no-ops.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import socket
+import subprocess
+import sys
+import urllib.error
+import urllib.request
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import config
+import instrumentation
+from instrumentation import Registry
+
+# One sample line of the text exposition format: name, labels, value
+_SAMPLE = re.compile(
+    r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{(?:[a-zA-Z_]\w*="(?:[^"\\\n]|\\.)*",?)*\})? (\S+)$'
+)
+
+_DISABLED = """
+import instrumentation
+import data_processing as dp
+
+assert not instrumentation.config.METRICS_ENABLED
+assert not hasattr(dp._clean_num, "__wrapped__")
+assert not hasattr(dp._load_clean_frame, "__wrapped__")
+
+def fn(rows):
+    return rows[1:]
+
+assert instrumentation.timed("x")(fn) is fn
+assert instrumentation.stage("a") is instrumentation.stage("b")
+with instrumentation.stage("a") as span:
+    span.rows_out = 3
+assert span.rows_out is None
+assert instrumentation.call("y", fn, [1, 2, 3]) == [2, 3]
+assert list(instrumentation.timed_iter("z", iter([1, 2]))) == [1, 2]
+dp._clean_num(dp.pd.Series(["1", "2,5"]))
+instrumentation.serve(port=1)
+assert not instrumentation._server_started
+assert instrumentation.registry.summary().empty
+print("ok")
+"""
+
+
+def _samples(text: str) -> dict[str, float]:
+    """Parse the sample lines of *text*, keyed by name and labels."""
+    samples = {}
+    for line in text.splitlines():
+        if line.startswith("#"):
+            assert re.match(r"^# (HELP|TYPE) \w+ \S", line), line
+            continue
+        match = _SAMPLE.match(line)
+        assert match, line
+        samples[match[1] + (match[2] or "")] = float(match[3])
+    return samples
+
+
+def test_disabled_metrics_make_timers_no_ops():
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = {**os.environ, "TC_METRICS": "0", "PYTHONPATH": os.path.join(root, "src")}
+    env.pop("TC_METRICS_PORT", None)
+
+    result = subprocess.run(
+        [sys.executable, "-c", _DISABLED],
+        cwd=root,
+        env=env,
+        capture_output=True,
+        text=True,
+        timeout=120,
+    )
+
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == "ok"
+
+
+def test_timed_records_rows_and_errors():
+    if not config.METRICS_ENABLED:
+        pytest.skip("instrumentation disabled")
+
+    @instrumentation.timed("test.halve")
+    def halve(values):
+        if not len(values):
+            raise ValueError("empty")
+        return values[: len(values) // 2]
+
+    halve(np.arange(10))
+    with pytest.raises(ValueError):
+        halve(np.arange(0))
+
+    summary = instrumentation.registry.summary().set_index("stage")
+    assert summary.loc["test.halve", "calls"] == 2
+    assert summary.loc["test.halve", "errors"] == 1
+    assert summary.loc["test.halve", "rows in"] == 0
+    assert pd.isna(summary.loc["test.halve", "rows out"])
+    stats = instrumentation.registry._stages["test.halve"]
+    assert (stats.rows_in, stats.rows_out) == (10, 5)
+
+
+def test_prometheus_text_format():
+    registry = Registry(seconds_buckets=(0.01, 0.1, 1.0), bytes_buckets=(1024,))
+    for seconds in (0.005, 0.01, 0.05, 2.0):
+        registry.observe("clean", seconds, rows_in=100, rows_out=90)
+    registry.observe('odd "stage"\\\n', 0.2, alloc=4096, error=True)
+
+    text = registry.prometheus()
+    samples = _samples(text)
+
+    assert text.endswith("\n")
+    assert "# TYPE shelters_stage_seconds histogram" in text
+    assert "# TYPE shelters_stage_rows_in_total counter" in text
+    buckets = [
+        samples[f'shelters_stage_seconds_bucket{{stage="clean",le="{le}"}}']
+        for le in ("0.01", "0.1", "1.0", "+Inf")
+    ]
+    assert buckets == [2, 3, 3, 4]
+    assert samples['shelters_stage_seconds_count{stage="clean"}'] == 4
+    assert samples['shelters_stage_seconds_sum{stage="clean"}'] == pytest.approx(2.065)
+    assert samples['shelters_stage_rows_in_total{stage="clean"}'] == 400
+    assert samples['shelters_stage_rows_out_total{stage="clean"}'] == 360
+    assert samples['shelters_stage_errors_total{stage="clean"}'] == 0
+
+    odd = 'stage="odd \\"stage\\"\\\\\\n"'
+    assert samples[f"shelters_stage_errors_total{{{odd}}}"] == 1
+    assert samples[f'shelters_stage_alloc_bytes_bucket{{{odd},le="+Inf"}}'] == 1
+    # Stages without allocation samples have no allocation histogram
+    assert not any(
+        key.startswith("shelters_stage_alloc_bytes") and 'stage="clean"' in key
+        for key in samples
+    )
+
+
+def test_metrics_endpoint(monkeypatch):
+    if not config.METRICS_ENABLED:
+        pytest.skip("instrumentation disabled")
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    monkeypatch.setattr(instrumentation, "_server_started", False)
+    with instrumentation.stage("endpoint"):
+        pass
+
+    instrumentation.serve(port)
+
+    with urllib.request.urlopen(
+        f"http://127.0.0.1:{port}/metrics", timeout=10
+    ) as response:
+        assert response.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+        samples = _samples(response.read().decode("utf-8"))
+    assert samples['shelters_stage_seconds_count{stage="endpoint"}'] >= 1
+    with pytest.raises(urllib.error.HTTPError) as error:
+        urllib.request.urlopen(f"http://127.0.0.1:{port}/other", timeout=10)
+    assert error.value.code == 404
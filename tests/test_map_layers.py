@@ -0,0 +1,136 @@
+"""
+test_map_layers.py
+
+Popup values of the server-rendered markers mode must be HTML-escaped,
+and the clustered mode only sends what lies in the requested viewport.
+"""
+
+from __future__ import annotations
+
+import folium
+import numpy as np
+import pandas as pd
+import pytest
+
+import config
+import map_layers
+
+BOUNDS = (48.3, 22.2, 48.7, 22.8)
+
+
+def test_markers_popup_escapes_values():
+    df = pd.DataFrame(
+        {
+            "Назва": ['<img src=x onerror="alert(1)">'],
+            "ОТГ": ["Ужгородська"],
+            "Населений пункт": ["Ужгород"],
+            "Адреса": ["вул. Миру, 5 & 7"],
+            "Тип": ["Укриття"],
+            "Місткість": [50],
+            "Інклюзивність": ["Так"],
+            "latitude": [48.62],
+            "longitude": [22.29],
+        },
+        index=pd.Index(["<b>1</b>"], name="ID"),
+    )
+    m = folium.Map()
+
+    map_layers.add_shelter_layer(m, df, mode="markers")
+    page = m.get_root().render()
+
+    assert "<img src=x" not in page
+    assert "<b>1</b>" not in page
+    assert "&lt;img src=x onerror=&quot;alert(1)&quot;&gt;" in page
+    assert "вул. Миру, 5 &amp; 7" in page
+    assert "Відкрити в Google Maps" in page
+
+
+@pytest.fixture(scope="module")
+def pyramid(display_registry):
+    return map_layers.cluster_pyramid(display_registry)
+
+
+def _inside(df: pd.DataFrame, bounds) -> pd.Series:
+    south, west, north, east = bounds
+    lat, lon = df["latitude"].astype(float), df["longitude"].astype(float)
+    return lat.between(south, north) & lon.between(west, east)
+
+
+def test_clustered_map_embeds_no_shelters(display_registry):
+    m = folium.Map()
+
+    map_layers.add_shelter_layer(m, display_registry, mode="clustered")
+    page = m.get_root().render()
+
+    assert display_registry["Назва"].iloc[0] not in page
+    assert display_registry["Адреса"].iloc[0] not in page
+    assert "location.assign" not in page
+
+
+@pytest.mark.parametrize("filtered", [False, True])
+def test_view_counts_every_shelter_once(display_registry, pyramid, filtered):
+    df = display_registry
+    positions = None
+    if filtered:
+        positions = np.flatnonzero((df["Тип"] == df["Тип"].iloc[0]).to_numpy())
+    rows = df if positions is None else df.iloc[positions]
+    located = rows.dropna(subset=["latitude", "longitude"])
+
+    for zoom in range(pyramid.min_zoom, pyramid.max_zoom + 1):
+        view = map_layers.pyramid_view(df, pyramid, zoom, None, positions)
+        shelters = view["shelters"]["id"]
+        assert sum(view["clusters"]["count"]) + len(shelters) == len(located), zoom
+        assert set(shelters) <= set(located.index)
+
+
+def test_view_is_cut_to_the_viewport(display_registry, pyramid):
+    zoom = config.MAP_CLUSTER_MAX_ZOOM - 3
+    view = map_layers.pyramid_view(display_registry, pyramid, zoom, BOUNDS)
+    whole = map_layers.pyramid_view(display_registry, pyramid, zoom)
+
+    clusters = pd.DataFrame(view["clusters"]).rename(
+        columns={"lat": "latitude", "lon": "longitude"}
+    )
+    assert _inside(clusters, BOUNDS).all()
+    shelters = display_registry.loc[view["shelters"]["id"]]
+    assert _inside(shelters, BOUNDS).all()
+    assert 0 < len(view["shelters"]["id"]) < len(whole["shelters"]["id"])
+    assert 0 < len(view["clusters"]["count"]) < len(whole["clusters"]["count"])
+
+
+def test_view_past_clustered_zooms_lists_shelters(display_registry, pyramid):
+    df = display_registry
+    positions = np.flatnonzero(df["Інклюзивність"].eq("Так").to_numpy())
+
+    view = map_layers.pyramid_view(
+        df, pyramid, config.MAP_CLUSTER_MAX_ZOOM + 1, BOUNDS, positions
+    )
+
+    expected = df.iloc[positions]
+    expected = expected[_inside(expected, BOUNDS)]
+    assert view["clusters"]["count"] == []
+    assert view["shelters"]["id"] == expected.index.tolist()
+    assert view["shelters"]["lat"] == expected["latitude"].astype(float).round(6).tolist()
+
+
+@pytest.mark.parametrize(
+    ("value", "expected"),
+    [
+        ({"zoom": 12, "bounds": [48.3, 22.2, 48.7, 22.8]}, (12, BOUNDS)),
+        (None, (config.MAP_MIN_ZOOM, None)),
+        ({"zoom": 12}, (config.MAP_MIN_ZOOM, None)),
+        ({"zoom": "x", "bounds": [1, 2, 3, 4]}, (config.MAP_MIN_ZOOM, None)),
+        ({"zoom": 12, "bounds": [1, 2, 3]}, (config.MAP_MIN_ZOOM, None)),
+    ],
+)
+def test_reported_viewport(value, expected):
+    assert map_layers._viewport(value) == expected
+
+
+def test_picked_point():
+    assert map_layers._picked_point({"lat": 48.123456, "lon": "22.6"}) == (
+        48.12346,
+        22.6,
+    )
+    assert map_layers._picked_point({"lat": None, "lon": 22.6}) is None
+    assert map_layers._picked_point(None) is None
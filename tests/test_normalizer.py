@@ -0,0 +1,153 @@
+"""
+test_normalizer.py
+
+The compiled ``_clean_*`` normalisers against the chained Series
+functions they replaced (``baseline.py``).
+
+Two bugs of those functions were fixed by the replacement, so present
+values are compared with them with only these bugs patched:
+``_clean_str_base`` returned its untouched input (no homoglyph, quote or
+dash fixes) and ``_clean_adress`` returned its untouched input (no
+address rules). Missing values now stay missing instead of becoming
+``"None"``/``"nan"``.
+"""
+
+from __future__ import annotations
+
+import baseline
+import numpy as np
+import pandas as pd
+import pytest
+
+import config_regex as rx
+import data_processing as dp
+import normalizer as nz
+
+CASES = [
+    ("properties.OTG", "_clean_otg"),
+    ("properties.City", "_clean_city"),
+    ("properties.Name", "_clean_name"),
+    ("properties.Adress", "_clean_adress"),
+    ("properties.Type", "_clean_str_strict"),
+    ("properties.TypeZs", "_clean_str_strict"),
+    ("properties.Rajon", "_clean_str_strict"),
+]
+
+
+def _fixed_str_base(s: pd.Series) -> pd.Series:
+    s_str = s.str.translate(baseline._HOMOGLYPH_TABLE)
+    s_str = s_str.str.replace("`", "'", regex=False).str.replace("’", "'", regex=False)
+    s_str = s_str.str.replace(rx._RE_DASH_SPACES, "-", regex=True)
+    return s_str.str.strip()
+
+
+def _fixed_adress(s: pd.Series) -> pd.Series:
+    s_adress = s.astype(str)
+    s_adress = s_adress.str.replace(rx._RE_ADDR_NEWLINE, " ", regex=True)
+    s_adress = s_adress.str.replace(rx._RE_WHITESPACE, " ", regex=True)
+    s_adress = s_adress.str.replace(rx._RE_ADDR_EDGE_DOT, "", regex=True)
+    s_adress = s_adress.str.replace(rx._RE_EXTRA_QUOTES, '"', regex=True)
+    s_adress = s_adress.str.replace(rx._RE_ADDR_NUMBER_ONLY, "Відсутня", regex=True)
+    s_adress = s_adress.str.replace(rx._RE_ADDR_CITY_PREFIX, r"\1", regex=True)
+    s_adress = s_adress.str.replace(rx._RE_ADDR_SPLIT_LN, r"\1, \2", regex=True)
+    s_adress = s_adress.str.replace(rx._RE_ADDR_SPLIT_NL, r"\1 \2", regex=True)
+
+    exact_dict: dict[str, str] = {
+        "Миру": "вул. Миру",
+        "Шевченка": "вул. Шевченка",
+        "Студентська набережна": "наб. Студентська",
+        "без назви": "вул. Без Назви",
+        "Без назви": "вул. Без Назви",
+        "наб. Киівська, 16": "наб. Київська, 16",
+        "вул.Пушкіна (Й. Волощукв), 2": "вул. Пушкіна (Й. Волощука), 2",
+        "с.Руська Мокра, Тячівського району, Миру, 97": "вул. Миру, 97",
+        "вул. Визволення, 21 /2-пов будівля/": "вул. Визволення, 21",
+        "вул. Європейська, 18 Тячівського району": "вул. Європейська, 18",
+    }
+    s_adress = s_adress.replace(exact_dict)
+
+    s_adress = s_adress.str.replace(rx._RE_ADDR_VUL, "вул. ", regex=True)
+    s_adress = s_adress.str.replace(rx._RE_ADDR_PL, "пл. ", regex=True)
+    s_adress = s_adress.str.replace(rx._RE_ADDR_PR, "пр. ", regex=True)
+    s_adress = s_adress.str.replace(rx._RE_ADDR_BUD, "буд. ", regex=True)
+    s_adress = s_adress.str.replace(rx._RE_ADDR_BUDYNOK, "буд.", regex=True)
+    s_adress = s_adress.str.replace(rx._RE_ADDR_DUP_VUL, "вул. ", regex=True)
+    return s_adress.str.strip()
+
+
+@pytest.fixture
+def fixed_baseline(monkeypatch, exact_corrections):
+    """``baseline`` with the two bugs patched, and exact-match corrections."""
+    monkeypatch.setattr(baseline, "_clean_str_base", _fixed_str_base)
+    monkeypatch.setattr(baseline, "_clean_adress", _fixed_adress)
+    return baseline
+
+
+@pytest.mark.parametrize(("column", "function"), CASES)
+def test_present_values_match_fixed_baseline(raw_registry, fixed_baseline, column, function):
+    s = raw_registry[column]
+    present = s.notna()
+    reference = getattr(fixed_baseline, function)
+
+    expected = reference(s[present]).astype(object)
+    actual = getattr(dp, function)(s)[present]
+    pd.testing.assert_series_equal(actual, expected)
+
+
+@pytest.mark.parametrize(("column", "function"), CASES)
+def test_missing_values_stay_missing(column, function):
+    s = pd.Series([None, np.nan, "Ужгород"], dtype=object, name=column)
+
+    actual = getattr(dp, function)(s)
+    assert actual.isna().tolist() == [True, True, False]
+
+
+@pytest.mark.parametrize(("column", "function"), CASES)
+def test_empty_series(column, function):
+    s = pd.Series([], dtype=object, name=column)
+
+    actual = getattr(dp, function)(s)
+    assert actual.empty
+    assert actual.name == column
+
+
+@pytest.mark.parametrize(
+    ("function", "raw", "cleaned"),
+    [
+        ("_clean_str_strict", "Ужгоpод", "Ужгород"),
+        ("_clean_otg", "O`Ніл", "О'Ніл"),
+        ("_clean_name", "школа Кам’янка", "Школа Кам'янка"),
+        ("_clean_adress", "вул.Миру, 5", "вул. Миру, 5"),
+        ("_clean_adress", "Миру", "вул. Миру"),
+    ],
+)
+def test_fixes_over_baseline(exact_corrections, function, raw, cleaned):
+    s = pd.Series([raw], dtype=object)
+
+    assert getattr(dp, function)(s).tolist() == [cleaned]
+    assert getattr(baseline, function)(s).tolist() != [cleaned]
+
+
+def test_apply_runs_rules_once_per_distinct_value():
+    calls: list[str] = []
+
+    def upper(text: str) -> str:
+        calls.append(text)
+        return text.upper()
+
+    s = pd.Series(["а", "б", "а", None, "б"], index=[5, 4, 3, 2, 1], name="x")
+    result = nz.Normalizer((upper,)).apply(s)
+
+    assert sorted(calls) == ["а", "б"]
+    assert result.index.tolist() == [5, 4, 3, 2, 1]
+    assert result.name == "x"
+    assert result.tolist()[:3] == ["А", "Б", "А"]
+    assert result.isna().tolist() == [False, False, False, True, False]
+
+
+def test_apply_keeps_missing_values_missing():
+    s = pd.Series([None, np.nan, "o", "None"], dtype=object)
+    result = nz.Normalizer((nz.translate(dp._HOMOGLYPH_TABLE),)).apply(s)
+
+    assert result.isna().tolist() == [True, True, False, False]
+    assert result.tolist()[2:] == ["о", "Nоnе"]
@@ -0,0 +1,116 @@
+"""
+test_refresher.py
+
+Stale-while-revalidate serving of the shared dataset: sessions keep
+getting the last good version while a refresh runs or after it failed.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import data_processing as dp
+from refresher import DatasetRefresher, StaleData
+
+TIMEOUT = 10
+
+
+def _dataset(version: str) -> SimpleNamespace:
+    return SimpleNamespace(version=version, rules_version=dp._rules_version())
+
+
+class BlockingLoader:
+    """Loader whose revalidating calls wait until released by the test."""
+
+    def __init__(self, result):
+        self.old = _dataset("old")
+        self.result = result
+        self.entered = threading.Event()
+        self.release = threading.Event()
+
+    def __call__(self, revalidate, current):
+        if not revalidate:
+            return self.old
+        self.entered.set()
+        assert self.release.wait(TIMEOUT)
+        if isinstance(self.result, Exception):
+            raise self.result
+        return self.result
+
+
+def _wait_until_finished(refresher: DatasetRefresher) -> None:
+    for _ in range(TIMEOUT * 100):
+        if not refresher.status.refreshing:
+            return
+        time.sleep(0.01)
+    raise AssertionError("refresh did not finish")
+
+
+@pytest.fixture
+def serve(monkeypatch):
+    """Start a refresher for *loader* and serve it through ``get_dataset``."""
+
+    def start(loader: BlockingLoader) -> DatasetRefresher:
+        refresher = DatasetRefresher(loader, interval=3600).start()
+        monkeypatch.setattr(dp, "_get_refresher", lambda: refresher)
+        assert loader.entered.wait(TIMEOUT)
+        return refresher
+
+    return start
+
+
+def test_old_version_is_served_while_refreshing(serve):
+    loader = BlockingLoader(_dataset("new"))
+    refresher = serve(loader)
+
+    assert dp.get_dataset() is loader.old
+    assert dp.get_refresh_status().refreshing
+
+    loader.release.set()
+    _wait_until_finished(refresher)
+
+    assert dp.get_dataset() is loader.result
+    status = dp.get_refresh_status()
+    assert status.version == "new"
+    assert status.last_error is None
+
+
+def test_failed_refresh_keeps_last_good_version(serve):
+    loader = BlockingLoader(RuntimeError("portal down"))
+    refresher = serve(loader)
+    started = refresher.status.last_success
+
+    loader.release.set()
+    _wait_until_finished(refresher)
+
+    assert dp.get_dataset() is loader.old
+    status = dp.get_refresh_status()
+    assert status.version == "old"
+    assert status.last_error == "RuntimeError: portal down"
+    assert status.last_success == started
+
+
+def test_stale_data_is_served_and_recorded_as_failed():
+    stale = _dataset("stale")
+
+    def load(revalidate, current):
+        raise StaleData(stale, "upstream unavailable")
+
+    refresher = DatasetRefresher(load)
+
+    assert refresher.refresh()
+    assert refresher.current() is stale
+    assert refresher.status.last_error == "upstream unavailable"
+    assert refresher.status.last_success is None
+
+
+def test_no_data_is_an_error():
+    refresher = DatasetRefresher(lambda revalidate, current: None)
+
+    assert not refresher.refresh(revalidate=False)
+    assert refresher.current() is None
+    assert refresher.status.last_error == "no data available"
@@ -0,0 +1,107 @@
+"""
+test_revalidation.py
+
+Revalidation of the stored snapshot against the CKAN stand-in
+(``benchmarks/ckan_standin.py``): an unchanged ``metadata_modified``
+skips the download, an unchanged resource answers ``304`` to the ETag,
+and only a new version is downloaded again.
+"""
+
+from __future__ import annotations
+
+import dataclasses
+
+import fixtures
+import pytest
+from ckan_standin import Behaviour, Portal, StandIn
+
+import config
+import data_processing as dp
+import http_client
+import sources
+from snapshot_store import Snapshot, SnapshotStore
+
+
+@pytest.fixture
+def portal(tmp_path, monkeypatch):
+    """A stand-in portal with 200 shelters, and an empty snapshot store."""
+    portal = Portal(fixtures.synthetic_geojson(200))
+    with StandIn(portal) as standin:
+        monkeypatch.setattr(
+            sources, "PRIMARY", dataclasses.replace(sources.PRIMARY, portal=standin.url)
+        )
+        # A fresh session without the CKAN answer cache
+        monkeypatch.setattr(config, "HTTP_CACHE_PATH", "")
+        monkeypatch.setattr(http_client, "_session", None)
+        monkeypatch.setattr(dp, "_store", SnapshotStore(str(tmp_path)))
+        yield portal
+
+
+def _fetch(cached: Snapshot | None = None) -> Snapshot | None:
+    return dp._get_raw_api_info(cached, source=sources.PRIMARY)
+
+
+def _requests(portal: Portal) -> dict[str, int]:
+    return dict(portal.stats.as_dict()["requests"])
+
+
+def test_first_fetch_downloads_and_stores(portal):
+    snapshot = _fetch()
+
+    assert _requests(portal) == {"package_show 200": 1, "download 200": 1}
+    assert snapshot.etag == portal.version.etag
+    assert snapshot.metadata_modified == portal.version.metadata_modified
+    assert dp._store.latest() == snapshot
+
+
+def test_unchanged_metadata_skips_the_download(portal):
+    first = _fetch()
+
+    second = _fetch(first)
+
+    assert _requests(portal) == {"package_show 200": 2, "download 200": 1}
+    assert second.version == first.version
+    assert second.checked_at >= first.checked_at
+    assert dp._store.latest() == second
+
+
+def test_unchanged_resource_answers_304(portal):
+    first = _fetch()
+    # New metadata, same payload: the conditional download is not modified
+    portal.version = dataclasses.replace(
+        portal.version, metadata_modified="2030-01-01T00:00:00.000000"
+    )
+
+    second = _fetch(first)
+
+    assert _requests(portal) == {
+        "package_show 200": 2,
+        "download 200": 1,
+        "download 304": 1,
+    }
+    assert second.version == first.version
+    assert second.metadata_modified == "2030-01-01T00:00:00.000000"
+    assert [s.version for s in dp._store._read_manifest()] == [first.version]
+
+
+def test_published_version_is_downloaded(portal):
+    first = _fetch()
+    portal.publish()
+
+    second = _fetch(first)
+
+    assert _requests(portal)["download 200"] == 2
+    assert second.version != first.version
+    assert second.etag == portal.version.etag
+    assert dp._store.latest() == second
+
+
+def test_failed_download_keeps_the_stored_snapshot(portal):
+    first = _fetch()
+    portal.publish()
+    portal.behaviour = Behaviour(
+        failure_rate=1.0, failures=("503",), fail_on=("download",)
+    )
+
+    assert _fetch(first) is None
+    assert dp._store.latest() == first
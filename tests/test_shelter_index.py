@@ -0,0 +1,102 @@
+"""
+test_shelter_index.py
+
+Sidebar filters answered by ``ShelterIndex`` against the boolean-mask
+``search_data`` it replaced (``baseline.py``).
+"""
+
+from __future__ import annotations
+
+import pickle
+from types import SimpleNamespace
+
+import baseline
+import numpy as np
+import pandas as pd
+import pytest
+
+import data_processing as dp
+from shelter_index import ShelterIndex
+
+UNKNOWN = "Неіснуюче"
+
+
+@pytest.fixture(scope="module")
+def expected(baseline_display, filter_combinations) -> list[tuple[tuple, pd.Index]]:
+    """``(filters, selected labels)`` of the mask version."""
+    return [
+        (combo, baseline.search_data(baseline_display, *combo).index)
+        for combo in filter_combinations
+    ]
+
+
+def test_positions_match_baseline(display_registry, expected):
+    index = ShelterIndex(display_registry)
+
+    for combo, labels in expected:
+        positions = index.positions(*combo)
+        assert display_registry.index[positions].equals(labels), combo
+
+
+def test_search_data_matches_baseline(display_registry, expected):
+    for combo, labels in expected:
+        assert dp.search_data(display_registry, *combo).index.equals(labels), combo
+
+
+def test_combinations_cover_empty_and_missing(display_registry, expected):
+    sizes = [len(labels) for _combo, labels in expected]
+    assert 0 in sizes and len(display_registry) in sizes
+    assert display_registry["Місткість"].isna().any()
+    assert display_registry["Тип"].isna().any()
+
+
+def test_missing_capacity_is_excluded_by_a_capacity_filter(display_registry):
+    index = ShelterIndex(display_registry)
+    positions = index.positions(" ", " ", None, 10**6, False)
+
+    assert not display_registry["Місткість"].iloc[positions].isna().any()
+    assert len(positions) == display_registry["Місткість"].notna().sum()
+
+
+def test_none_disables_city_and_community_filters(display_registry):
+    index = ShelterIndex(display_registry)
+
+    assert np.array_equal(index.positions(None, None), index.positions(" ", " "))
+    assert len(index.positions()) == len(display_registry)
+
+
+def test_positions_are_sorted_and_read_only(display_registry):
+    index = ShelterIndex(display_registry)
+    positions = index.positions(" ", " ", None, 500, True)
+
+    assert np.all(np.diff(positions) > 0)
+    assert not positions.flags.writeable
+    assert index.positions(" ", " ", None, 500, True) is positions
+    assert index.cache_info().hits == 1
+
+
+def test_empty_frame(display_registry):
+    index = ShelterIndex(display_registry.iloc[:0])
+
+    assert len(index.positions()) == 0
+    assert len(index.positions(UNKNOWN, " ", [UNKNOWN], 10, True)) == 0
+
+
+def test_pickled_index_answers_the_same(display_registry):
+    index = ShelterIndex(display_registry)
+    restored = pickle.loads(pickle.dumps(index))
+    combo = (" ", display_registry["ОТГ"].iloc[0], None, 500, False)
+    assert np.array_equal(restored.positions(*combo), index.positions(*combo))
+    assert restored.matches(display_registry)
+    assert not restored.matches(display_registry.iloc[1:])
+
+
+def test_served_dataset_index_is_shared(display_registry, monkeypatch):
+    index = ShelterIndex(display_registry)
+    served = SimpleNamespace(index=index)
+    monkeypatch.setattr(dp, "_refresher", SimpleNamespace(current=lambda: served))
+
+    assert dp.get_shelter_index(display_registry) is index
+    filtered = display_registry.iloc[1:]
+    assert dp.get_shelter_index(filtered) is not index
+    assert dp.get_shelter_index(filtered).matches(filtered)
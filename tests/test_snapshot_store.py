@@ -0,0 +1,107 @@
+"""
+test_snapshot_store.py
+
+Tests of the on-disk snapshot store: versions are recorded, pruned and
+revalidated in the manifest, and concurrent writers (the refresher
+thread and a ``cli.py`` process) do not lose each other's entries.
+"""
+
+from __future__ import annotations
+
+import multiprocessing
+import os
+import threading
+
+import pandas as pd
+
+from snapshot_store import Snapshot, SnapshotStore, content_hash
+
+URL = "https://data.example/shelters.geojson"
+
+
+def _save(store: SnapshotStore, index: int, url: str = URL) -> Snapshot:
+    content = f'{{"type": "FeatureCollection", "url": "{url}", "n": {index}}}'.encode()
+    snapshot = Snapshot(url, content_hash(content), fetched_at=float(index))
+    return store.save_raw(snapshot, content)
+
+
+def _save_many(root: str, url: str, count: int) -> None:
+    store = SnapshotStore(root, keep=1000)
+    for index in range(count):
+        _save(store, index, url)
+
+
+def test_save_raw_records_latest(tmp_path):
+    store = SnapshotStore(str(tmp_path))
+    assert store.latest() is None
+
+    first = _save(store, 1)
+    second = _save(store, 2)
+
+    assert store.latest(URL) == second
+    assert store.latest("https://other.example/") is None
+    with open(store.raw_path(first), "rb") as fh:
+        assert content_hash(fh.read()) == first.content_hash
+
+
+def test_save_raw_prunes_old_versions(tmp_path):
+    store = SnapshotStore(str(tmp_path), keep=2)
+    first, second, third = (_save(store, index) for index in range(3))
+
+    assert not os.path.exists(store.raw_path(first))
+    assert os.path.exists(store.raw_path(second))
+    assert [s.version for s in store._read_manifest()] == [
+        second.version,
+        third.version,
+    ]
+
+
+def test_mark_checked_updates_validators(tmp_path):
+    store = SnapshotStore(str(tmp_path))
+    snapshot = _save(store, 1)
+
+    updated = store.mark_checked(snapshot, etag='"v2"')
+
+    assert store.latest() == updated
+    assert updated.etag == '"v2"'
+    assert updated.checked_at > 0
+
+
+def test_clean_round_trip(tmp_path):
+    store = SnapshotStore(str(tmp_path))
+    snapshot = _save(store, 1)
+    df = pd.DataFrame({"properties.Name": ["Укриття"], "latitude": [48.6]})
+
+    assert store.load_clean(snapshot, "v1") is None
+    store.save_clean(snapshot, "v1", df)
+
+    pd.testing.assert_frame_equal(store.load_clean(snapshot, "v1"), df)
+    assert store.load_clean(snapshot, "v2") is None
+
+
+def test_concurrent_threads_keep_every_entry(tmp_path):
+    threads = [
+        threading.Thread(target=_save_many, args=(str(tmp_path), f"{URL}?t={n}", 20))
+        for n in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(SnapshotStore(str(tmp_path))._read_manifest()) == 4 * 20
+
+
+def test_concurrent_processes_keep_every_entry(tmp_path):
+    context = multiprocessing.get_context("spawn")
+    processes = [
+        context.Process(target=_save_many, args=(str(tmp_path), f"{URL}?p={n}", 20))
+        for n in range(3)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+    assert all(process.exitcode == 0 for process in processes)
+    assert len(SnapshotStore(str(tmp_path))._read_manifest()) == 3 * 20
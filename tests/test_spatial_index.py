@@ -0,0 +1,203 @@
+"""
+test_spatial_index.py
+
+Nearest-shelter and radius queries of ``ShelterDataset`` (through
+``SpatialIndex``) against a brute-force haversine scan of the rows the
+sidebar filters select.
+"""
+
+from __future__ import annotations
+
+import random
+
+import baseline
+import fixtures
+import numpy as np
+import pandas as pd
+import pytest
+
+import config
+from aggregates import ShelterCube
+from cluster_pyramid import ClusterPyramid
+from coverage import CoverageGrid
+from dataset import ShelterDataset
+from shelter_index import ShelterIndex
+from spatial_index import SpatialIndex, haversine_m
+
+UNKNOWN = "Неіснуюче"
+RADII_M = [0, 500, 5_000, 50_000]
+
+
+@pytest.fixture(scope="module")
+def located(display_registry) -> pd.DataFrame:
+    """``display_registry`` with some coordinates missing."""
+    lat = display_registry["latitude"].copy()
+    lon = display_registry["longitude"].copy()
+    lat.iloc[3::29] = np.nan
+    lon.iloc[11::31] = np.nan
+    return display_registry.assign(latitude=lat, longitude=lon)
+
+
+def _dataset(df: pd.DataFrame, brute_force_limit: int) -> ShelterDataset:
+    return ShelterDataset.build(
+        version="test",
+        rules_version="test",
+        cleaned=df,
+        display=df,
+        index=ShelterIndex(df),
+        cube=ShelterCube(df),
+        spatial=SpatialIndex(df, cell_km=1.0, brute_force_limit=brute_force_limit),
+        clusters=ClusterPyramid(df, min_zoom=config.MAP_MIN_ZOOM, max_zoom=10),
+        coverage=CoverageGrid(df, config.MAP_BOUNDS, config.COVERAGE_CELL_M),
+    )
+
+
+# 0 walks the grid for every query, the default scans filtered sets directly
+@pytest.fixture(scope="module", params=[0, 2048], ids=["grid", "scan"])
+def dataset(request, located) -> ShelterDataset:
+    return _dataset(located, request.param)
+
+
+@pytest.fixture(scope="module")
+def points() -> list[tuple[float, float]]:
+    """Query points around the communities, plus one far outside the region."""
+    rng = random.Random(0)
+    around = [
+        (lat + rng.gauss(0, 0.05), lon + rng.gauss(0, 0.08))
+        for _otg, _rajon, lon, lat in fixtures._COMMUNITIES
+    ]
+    return around + [(50.45, 30.52)]
+
+
+@pytest.fixture(scope="module")
+def selections(located, filter_combinations) -> list[tuple[dict, np.ndarray]]:
+    """``(filters, row positions)`` of the mask version, on old dtypes."""
+    frame = located.astype(
+        {
+            **dict.fromkeys(located.select_dtypes(["category", "string"]).columns, object),
+            "Місткість": float,
+        }
+    )
+    names = ["city_name", "otg_name", "shelter_type", "max_capacity", "accessible_only"]
+    result = []
+    for combo in filter_combinations[::7]:
+        labels = baseline.search_data(frame, *combo).index
+        result.append((dict(zip(names, combo)), located.index.get_indexer(labels)))
+    return result
+
+
+def _brute(df: pd.DataFrame, lat: float, lon: float, positions: np.ndarray):
+    """Return the located *positions* and their distances, closest first."""
+    rows = df.iloc[positions]
+    keep = rows["latitude"].notna().to_numpy() & rows["longitude"].notna().to_numpy()
+    positions = positions[keep]
+    dist = haversine_m(
+        lat,
+        lon,
+        df["latitude"].to_numpy(float)[positions],
+        df["longitude"].to_numpy(float)[positions],
+    )
+    order = np.argsort(dist, kind="stable")
+    return positions[order], dist[order]
+
+
+def test_nearest_matches_brute_force(dataset, located, points, selections):
+    for filters, positions in selections:
+        for lat, lon in points:
+            _expected, distances = _brute(located, lat, lon, positions)
+            for k in (1, 5, 50):
+                found, dist = dataset.nearest(lat, lon, k, **filters)
+                assert np.allclose(dist, distances[:k]), (filters, lat, lon, k)
+                assert np.isin(found, positions).all()
+                np.testing.assert_allclose(
+                    haversine_m(
+                        lat,
+                        lon,
+                        located["latitude"].to_numpy(float)[found],
+                        located["longitude"].to_numpy(float)[found],
+                    ),
+                    dist,
+                )
+
+
+def test_within_matches_brute_force(dataset, located, points, selections):
+    for filters, positions in selections:
+        for lat, lon in points:
+            expected, distances = _brute(located, lat, lon, positions)
+            for radius_m in RADII_M:
+                found, dist = dataset.within(lat, lon, radius_m, **filters)
+                inside = distances <= radius_m
+                assert np.array_equal(np.sort(found), np.sort(expected[inside])), (
+                    filters,
+                    lat,
+                    lon,
+                    radius_m,
+                )
+                assert np.allclose(dist, distances[inside])
+
+
+def test_selections_cover_empty_and_missing(located, selections):
+    sizes = [len(positions) for _filters, positions in selections]
+    assert 0 in sizes and len(located) in sizes
+    assert located["latitude"].isna().any() and located["longitude"].isna().any()
+    assert located["Місткість"].isna().any()
+
+
+def test_missing_coordinates_are_never_returned(dataset, located):
+    missing = np.flatnonzero(
+        located["latitude"].isna().to_numpy() | located["longitude"].isna().to_numpy()
+    )
+    lat, lon = located["latitude"].mean(), located["longitude"].mean()
+
+    found, _dist = dataset.nearest(lat, lon, k=len(located))
+    assert not np.isin(missing, found).any()
+    assert len(found) == len(located) - len(missing)
+
+    found, _dist = dataset.within(lat, lon, 10**7)
+    assert len(found) == len(located) - len(missing)
+
+
+def test_missing_capacity_is_excluded_by_a_capacity_filter(dataset, located):
+    lat, lon = located["latitude"].mean(), located["longitude"].mean()
+    found, _dist = dataset.nearest(lat, lon, k=len(located), max_capacity=10**6)
+
+    assert len(found)
+    assert not located["Місткість"].iloc[found].isna().any()
+
+
+@pytest.mark.parametrize(
+    "filters",
+    [
+        dict(city_name=UNKNOWN),
+        dict(otg_name=UNKNOWN),
+        dict(shelter_type=[UNKNOWN]),
+    ],
+)
+def test_empty_selection(dataset, points, filters):
+    lat, lon = points[0]
+
+    for found, dist in (
+        dataset.nearest(lat, lon, 5, **filters),
+        dataset.within(lat, lon, 10**7, **filters),
+    ):
+        assert len(found) == len(dist) == 0
+
+
+def test_nearest_edge_cases(dataset, located, points):
+    lat, lon = points[0]
+
+    found, dist = dataset.nearest(lat, lon, k=0)
+    assert len(found) == len(dist) == 0
+
+    shelter = located["latitude"].first_valid_index()
+    row = located.index.get_loc(shelter)
+    lat, lon = float(located["latitude"].iloc[row]), float(located["longitude"].iloc[row])
+    found, dist = dataset.nearest(lat, lon, k=1)
+    assert dist[0] == 0.0
+
+
+def test_empty_frame(located):
+    dataset = _dataset(located.iloc[:0], 0)
+
+    assert len(dataset.nearest(48.6, 22.3, 5)[0]) == 0
+    assert len(dataset.within(48.6, 22.3, 10**7)[0]) == 0